@@ -0,0 +1,10 @@
+-- Généré par index_advisor.py : index composites (noms Prisma, reconnus par `prisma db push`)
+-- CONCURRENTLY : pas de verrou d'écriture ; à exécuter hors transaction.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Booking_fleetVehicleId_status_startDate_idx" ON "Booking" ("fleetVehicleId", "status", "startDate");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Booking_customerId_status_endDate_idx" ON "Booking" ("customerId", "status", "endDate");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Booking_status_endDate_idx" ON "Booking" ("status", "endDate");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Booking_depositStatus_startDate_idx" ON "Booking" ("depositStatus", "startDate");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Booking_agencyId_status_startDate_idx" ON "Booking" ("agencyId", "status", "startDate");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Booking_status_startDate_idx" ON "Booking" ("status", "startDate");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Booking_updatedAt_idx" ON "Booking" ("updatedAt");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Booking_createdAt_id_idx" ON "Booking" ("createdAt", "id");
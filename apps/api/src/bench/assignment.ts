@@ -0,0 +1,168 @@
+// Benchmark affectation flotte (hors ligne) : ancien score glouton (parcours de toutes les réservations
+// de chaque véhicule) vs frises triées de services/fleetAssignment, plus effet du mode batch.
+// Usage : npx ts-node src/bench/assignment.ts [units] [days]
+// Vérifie aussi que la réoptimisation ne déplace ni une location commencée, ni les réservations d'un véhicule loué,
+// qu'une réservation startDate = endDate occupe son véhicule comme dans la contrainte d'exclusion, et qu'une
+// réservation qui dépasse la fenêtre n'est pas posée sur une réservation commençant après celle-ci.
+import { performance } from 'perf_hooks'
+import { FleetTimeline, PlanBooking, PlanBookingRow, fragmentation, pickTimeline, planAssignments, reoptimizeAgency, toPlanBooking } from '../services/fleetAssignment'
+
+const UNITS = parseInt(process.argv[2] || '40', 10)
+const DAYS = parseInt(process.argv[3] || '180', 10)
+const DAY = 24 * 60 * 60 * 1000
+
+let seed = 11
+const random = () => { seed = (seed * 1103515245 + 12345) & 0x7fffffff; return seed / 0x7fffffff }
+
+const unitIds = Array.from({ length: UNITS }, (_, i) => 'unit-' + String(i).padStart(3, '0'))
+
+// Charge réalisable : réservations tirées véhicule par véhicule (durées 1 à 14 jours, trous de 0 à 3 jours),
+// puis mélangées pour simuler l'ordre d'arrivée. Une affectation sans refus existe donc toujours.
+const requests: { id: string; start: number; end: number }[] = []
+for (let u = 0; u < UNITS; u++) {
+  let cursor = Math.floor(random() * 3) * DAY
+  while (cursor < DAYS * DAY) {
+    const length = (1 + Math.floor(random() * (random() < 0.8 ? 4 : 14))) * DAY
+    requests.push({ id: 'b' + requests.length, start: cursor, end: cursor + length })
+    cursor += length + Math.floor(random() * 4) * DAY
+  }
+}
+for (let i = requests.length - 1; i > 0; i--) {
+  const j = Math.floor(random() * (i + 1));
+  [requests[i], requests[j]] = [requests[j], requests[i]]
+}
+const BOOKINGS = requests.length
+
+// Reproduction de l'ancien autoAssignVehicle (score "suite de location" sur toutes les réservations)
+const legacyAssign = () => {
+  const bookings = new Map<string, { start: number; end: number }[]>(unitIds.map(id => [id, []]))
+  let placed = 0
+  for (const r of requests) {
+    let best: { id: string; score: number } | null = null
+    for (const [id, list] of bookings) {
+      if (list.some(b => !(r.end <= b.start || r.start >= b.end))) continue
+      let score = 0
+      for (const b of list) {
+        const after = Math.floor((r.start - b.end) / DAY)
+        const before = Math.floor((b.start - r.end) / DAY)
+        if (after >= 0 && after <= 3) score += (4 - after) * 10
+        if (before >= 0 && before <= 3) score += (4 - before) * 10
+      }
+      score += list.length * 5
+      if (!best || score > best.score) best = { id, score }
+    }
+    if (best) { bookings.get(best.id)!.push(r); placed++ }
+  }
+  return { placed, timelines: [...bookings].map(([id, list]) => new FleetTimeline(id, list.map((b, i) => ({ id: id + i, ...b })))) }
+}
+
+const timelineAssign = () => {
+  const timelines = unitIds.map(id => new FleetTimeline(id))
+  let placed = 0
+  for (const r of requests) {
+    const best = pickTimeline(timelines, r.start, r.end)
+    if (best) { best.timeline.insert(r); placed++ }
+  }
+  return { placed, timelines }
+}
+
+const time = <T>(fn: () => T) => {
+  const t0 = performance.now()
+  const result = fn()
+  return { result, ms: performance.now() - t0 }
+}
+
+// Cas épinglés du mode batch (comme reoptimizeAgency) : 'rented' est loué (véhicule replanifiable),
+// 'maint' est parti en maintenance pendant une location en cours, 'free' est libre.
+const checkPinned = () => {
+  const now = new Date(10 * DAY)
+  const planning = new Set(['free', 'rented'])
+  const row = (id: string, fleetVehicleId: string, start: number, end: number, extra: Partial<PlanBookingRow> = {}): PlanBookingRow => ({
+    id, reference: id, fleetVehicleId, startDate: new Date(start * DAY), endDate: new Date(end * DAY),
+    status: 'CONFIRMED', checkedIn: false, assignmentType: 'AUTOMATIC', ...extra
+  })
+  const rows = [
+    row('checked-in', 'rented', 8, 12, { checkedIn: true, status: 'ACTIVE' }),
+    row('rented-next', 'rented', 12, 14),
+    row('active-maint', 'maint', 9, 13, { status: 'ACTIVE' }),
+    row('checked-in-maint', 'maint', 10, 11, { checkedIn: true }),
+    row('future-maint', 'maint', 15, 16)
+  ]
+  const plan = planAssignments(['free', 'rented'], rows.map(r => toPlanBooking(r, 'model', now, planning)))
+  const moved = new Map(plan.moves.map(m => [m.bookingId, m.toFleetId]))
+  const failures = [
+    moved.has('checked-in') && 'checked-in rental moved off its unit',
+    moved.has('rented-next') && 'future booking of a rented unit moved',
+    moved.has('active-maint') && 'active rental moved off a unit in maintenance',
+    moved.has('checked-in-maint') && 'checked-in rental moved off a unit in maintenance',
+    !planning.has(moved.get('future-maint') ?? '') && 'future booking left on a unit in maintenance',
+    plan.unplaced.length && `${plan.unplaced.length} bookings unplaced`
+  ].filter(Boolean)
+  console.log(failures.length ? `ERRORS: ${failures.join(', ')}` : 'Reoptimization keeps started rentals and rented units in place')
+  return failures.length
+}
+
+// Réservation d'un instant (startDate = endDate) : [at, at + 1 ms) occupé, comme tsrange(..., GREATEST(...)) en base
+const checkInstant = () => {
+  const at = 20 * DAY
+  const busy = new FleetTimeline('busy', [{ id: 'instant', start: at, end: at }])
+  const failures = [
+    busy.gapCost(at - DAY, at + DAY) !== null && 'booking over a same-instant booking accepted',
+    busy.gapCost(at, at) !== null && 'same-instant booking placed over another',
+    busy.gapCost(at - DAY, at) === null && 'booking ending at a same-instant booking refused',
+    busy.gapCost(at + 1, at + DAY) === null && 'booking starting after a same-instant booking refused',
+    pickTimeline([busy, new FleetTimeline('free')], at, at)?.timeline.fleetId !== 'free' && 'same-instant request not moved to the free unit'
+  ].filter(Boolean)
+  console.log(failures.length ? `ERRORS: ${failures.join(', ')}` : 'Same-instant bookings occupy their unit')
+  return failures.length
+}
+
+// Filtre where Prisma réduit aux opérateurs utilisés par reoptimizeAgency (égalité, in, lt, gt, gte)
+const matches = (row: any, where: any) => Object.entries(where).every(([key, cond]: [string, any]) => {
+  const value = row[key]
+  if (cond === null || typeof cond !== 'object' || cond instanceof Date) return value === cond
+  return (cond.in === undefined || cond.in.includes(value)) &&
+    (cond.lt === undefined || value < cond.lt) &&
+    (cond.gt === undefined || value > cond.gt) &&
+    (cond.gte === undefined || value >= cond.gte)
+})
+
+// Réservation déplaçable à cheval sur la fin de fenêtre (jours 12 à 17, fenêtre jusqu'au jour 14) : 'a' colle
+// à sa réservation précédente mais est repris au jour 15, seul 'b' convient.
+const checkWindowEdge = async () => {
+  const units = [{ id: 'a', vehicleId: 'model', status: 'AVAILABLE' }, { id: 'b', vehicleId: 'model', status: 'AVAILABLE' }]
+  const booking = (id: string, fleetVehicleId: string | null, start: number, end: number, assignmentType = 'AUTOMATIC') => ({
+    id, reference: id, agencyId: 'agency', fleetVehicleId, startDate: new Date(start * DAY), endDate: new Date(end * DAY),
+    status: 'CONFIRMED', checkedIn: false, assignmentType, items: [{ vehicleId: 'model' }]
+  })
+  const bookings = [booking('before', 'a', 11, 12, 'MANUAL'), booking('crossing', null, 12, 17), booking('after', 'a', 15, 16)]
+  const prisma: any = {
+    fleet: { findMany: async ({ where }: any) => units.filter(u => matches({ ...u, agencyId: 'agency' }, where)) },
+    booking: { findMany: async ({ where }: any) => bookings.filter(b => matches(b, where)) }
+  }
+  const result = await reoptimizeAgency(prisma, 'agency', { days: 4, now: new Date(10 * DAY) })
+  const placed = result.moves.find(m => m.bookingId === 'crossing')?.toFleetId
+  const failures = [
+    placed !== 'b' && `booking crossing the window end placed on ${placed ?? 'no unit'}`,
+    result.moves.some(m => m.bookingId === 'after') && 'booking after the window moved'
+  ].filter(Boolean)
+  console.log(failures.length ? `ERRORS: ${failures.join(', ')}` : 'Bookings crossing the window end avoid later bookings')
+  return failures.length
+}
+
+const main = async () => {
+  console.log(`${UNITS} units, ${BOOKINGS} requests over ${DAYS} days (feasible load)`)
+  const legacy = time(legacyAssign)
+  const online = time(timelineAssign)
+  const batch = time(() => planAssignments(unitIds, requests.map<PlanBooking>(r => ({
+    id: r.id, reference: r.id, vehicleId: 'model', fleetVehicleId: null, start: r.start, end: r.end, movable: true
+  }))))
+  const report = (name: string, ms: number, placed: number, timelines: FleetTimeline[]) =>
+    console.log(`${name.padEnd(9)} ${ms.toFixed(1).padStart(8)} ms  placed ${placed}/${BOOKINGS}  fragmentation ${fragmentation(timelines, 0, DAYS * DAY).toFixed(0)} j`)
+  report('legacy', legacy.ms, legacy.result.placed, legacy.result.timelines)
+  report('timeline', online.ms, online.result.placed, online.result.timelines)
+  report('batch', batch.ms, BOOKINGS - batch.result.unplaced.length, batch.result.timelines)
+  if (checkPinned() + checkInstant() + await checkWindowEdge()) process.exit(1)
+}
+
+main()
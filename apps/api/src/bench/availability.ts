@@ -0,0 +1,175 @@
+// Benchmark /api/fleet-availability : ancien scan fleet × réservations vs index en mémoire
+// Usage : npx ts-node src/bench/availability.ts [units] [bookingsPerUnit] [queries]
+// Vérifie aussi qu'une réservation startDate = endDate occupe [start, start + 1 ms), comme la contrainte d'exclusion,
+// qu'une écriture pendant le chargement d'une agence n'est pas effacée par celui-ci, et que les écritures d'une
+// transaction ne sont appliquées qu'après son commit (rien après un rollback).
+import { performance } from 'perf_hooks'
+import { AvailabilityIndex, IndexedBooking, IndexedUnit, monthDayRanges, trackAvailabilityWrites } from '../services/availabilityIndex'
+
+const UNITS = parseInt(process.argv[2] || '150', 10)
+const BOOKINGS_PER_UNIT = parseInt(process.argv[3] || '300', 10)
+const QUERIES = parseInt(process.argv[4] || '2000', 10)
+const MODELS = 12
+const DAY = 24 * 60 * 60 * 1000
+const ORIGIN = new Date('2023-01-01').getTime()
+
+// Générateur déterministe pour des résultats comparables d'un run à l'autre
+let seed = 42
+const random = () => { seed = (seed * 1103515245 + 12345) & 0x7fffffff; return seed / 0x7fffffff }
+
+const units: IndexedUnit[] = []
+const bookings: IndexedBooking[] = []
+const legacyFleets: { vehicleId: string; bookings: { startDate: Date; endDate: Date }[] }[] = []
+
+for (let u = 0; u < UNITS; u++) {
+  const unit = { fleetId: 'fleet-' + u, vehicleId: 'vehicle-' + (u % MODELS) }
+  units.push(unit)
+  const fleetBookings: { startDate: Date; endDate: Date }[] = []
+  let cursor = ORIGIN
+  for (let b = 0; b < BOOKINGS_PER_UNIT; b++) {
+    cursor += Math.floor(random() * 3) * DAY
+    const startDate = new Date(cursor)
+    const endDate = new Date(cursor + (1 + Math.floor(random() * 5)) * DAY)
+    cursor = endDate.getTime()
+    fleetBookings.push({ startDate, endDate })
+    bookings.push({ id: unit.fleetId + '-' + b, fleetVehicleId: unit.fleetId, startDate, endDate, status: 'CONFIRMED' })
+  }
+  legacyFleets.push({ vehicleId: unit.vehicleId, bookings: fleetBookings })
+}
+
+const span = bookings.reduce((max, b) => Math.max(max, b.endDate.getTime()), ORIGIN) - ORIGIN
+const queries = Array.from({ length: QUERIES }, () => {
+  const start = ORIGIN + Math.floor(random() * span / DAY) * DAY
+  return { start: new Date(start), end: new Date(start + (1 + Math.floor(random() * 7)) * DAY) }
+})
+
+// Copie de l'ancienne boucle de l'endpoint (hors requête SQL)
+const legacyCount = (start: Date, end: Date) => {
+  const availabilityMap: Record<string, number> = {}
+  legacyFleets.forEach(fleet => {
+    const isAvailable = !fleet.bookings.some(booking => {
+      const bookingStart = new Date(booking.startDate)
+      const bookingEnd = new Date(booking.endDate)
+      return !(end <= bookingStart || start >= bookingEnd)
+    })
+    if (isAvailable) availabilityMap[fleet.vehicleId] = (availabilityMap[fleet.vehicleId] || 0) + 1
+  })
+  return availabilityMap
+}
+
+const index = new AvailabilityIndex()
+const buildStart = performance.now()
+const entry = index.replaceAgency('agency', units, bookings)
+const buildMs = performance.now() - buildStart
+
+const time = (fn: (q: { start: Date; end: Date }) => Record<string, number>) => {
+  const results: Record<string, number>[] = []
+  const t0 = performance.now()
+  for (const q of queries) results.push(fn(q))
+  return { ms: performance.now() - t0, results }
+}
+
+const legacy = time(q => legacyCount(q.start, q.end))
+const indexed = time(q => index.countAvailable(entry.units, q.start, q.end))
+
+const mismatches = legacy.results.filter((r, i) => JSON.stringify(r) !== JSON.stringify(indexed.results[i])).length
+
+// Calendrier d'un mois : 1 requête par jour vs un passage batch
+const month = new Date(ORIGIN + span / 2).toISOString().slice(0, 7)
+const days = monthDayRanges(month)!
+const sameKeys = (a: Record<string, number>, b: Record<string, number>) =>
+  Object.keys({ ...a, ...b }).every(k => (a[k] || 0) === (b[k] || 0))
+let t0 = performance.now()
+const perDay = days.map(d => legacyCount(d.start, d.end))
+const perDayMs = performance.now() - t0
+index.countAvailableBatch(entry.units, days) // warm-up JIT
+t0 = performance.now()
+const batch = index.countAvailableBatch(entry.units, days)
+const batchMs = performance.now() - t0
+const batchMismatches = perDay.filter((r, i) => !sameKeys(r, batch[i])).length
+
+console.log(`Fleet units: ${UNITS}, bookings: ${bookings.length}, queries: ${QUERIES}`)
+console.log(`Index build: ${buildMs.toFixed(1)} ms`)
+console.log(`Legacy scan: ${(legacy.ms / QUERIES).toFixed(4)} ms/query`)
+console.log(`Index:       ${(indexed.ms / QUERIES).toFixed(4)} ms/query (x${(legacy.ms / indexed.ms).toFixed(1)})`)
+console.log(`Month ${month}: ${days.length} legacy scans ${perDayMs.toFixed(1)} ms, batch ${batchMs.toFixed(2)} ms`)
+// Réservation d'un instant : mêmes conflits que tsrange(start, GREATEST(end, start + 1 ms), '[)') en base
+const instantConflicts = () => {
+  const at = ORIGIN + 10 * DAY
+  const instant = new AvailabilityIndex()
+  const { units: instantUnits } = instant.replaceAgency('instant', [{ fleetId: 'u', vehicleId: 'v' }],
+    [{ id: 'i', fleetVehicleId: 'u', startDate: new Date(at), endDate: new Date(at), status: 'CONFIRMED' }])
+  const cases = [
+    { start: at - DAY, end: at + DAY, busy: true },
+    { start: at, end: at, busy: true },
+    { start: at, end: at + 1, busy: true },
+    { start: at - DAY, end: at, busy: false },
+    { start: at + 1, end: at + DAY, busy: false }
+  ]
+  return cases.filter(c => {
+    const range = { start: new Date(c.start), end: new Date(c.end) }
+    const single = !instant.countAvailable(instantUnits, range.start, range.end).v
+    const batched = !instant.countAvailableBatch(instantUnits, [range])[0].v
+    const unit = !instant.isUnitFree('u', range.start, range.end)
+    return single !== c.busy || batched !== c.busy || unit !== c.busy
+  }).length
+}
+const instantMismatches = instantConflicts()
+
+const written = (id: string): IndexedBooking =>
+  ({ id, agencyId: 'agency', fleetVehicleId: 'u', startDate: new Date(ORIGIN), endDate: new Date(ORIGIN + DAY), status: 'CONFIRMED' })
+
+// Chargement qui a lu les réservations avant une écriture, et se termine après : la réservation écrite doit rester
+const loadRace = async () => {
+  const rows: IndexedBooking[] = []
+  let release!: () => void
+  const gate = new Promise<void>(resolve => { release = resolve })
+  let loads = 0
+  const prisma: any = {
+    fleet: { findMany: async () => [{ id: 'u', vehicleId: 'v' }] },
+    booking: { findMany: async () => { const snapshot = [...rows]; if (loads++ === 0) await gate; return snapshot } }
+  }
+  const race = new AvailabilityIndex(prisma)
+  const loading = race.availability('agency', new Date(ORIGIN), new Date(ORIGIN + DAY))
+  await new Promise(resolve => setImmediate(resolve))
+  rows.push(written('during-load'))
+  race.onBookingWritten(written('during-load'))
+  release()
+  const counts = await loading
+  return counts.v || race.isUnitFree('u', new Date(ORIGIN), new Date(ORIGIN + DAY)) ? 1 : 0
+}
+
+// Middleware sur un client simulé : écritures dans $transaction appliquées au commit seulement
+const transactionWrites = async () => {
+  const tx = new AvailabilityIndex()
+  tx.replaceAgency('agency', [{ fleetId: 'u', vehicleId: 'v' }], [])
+  const free = () => tx.isUnitFree('u', new Date(ORIGIN), new Date(ORIGIN + DAY))
+  let middleware: any
+  const client: any = { $use: (fn: any) => { middleware = fn }, $transaction: (fn: () => Promise<unknown>) => fn() }
+  trackAvailabilityWrites(client, tx)
+  const create = (booking: IndexedBooking) =>
+    middleware({ model: 'Booking', action: 'create', args: {}, dataPath: [], runInTransaction: true }, async () => booking)
+  await client.$transaction(async () => {
+    await create(written('rolled-back'))
+    throw new Error('rollback')
+  }).catch(() => {})
+  const afterRollback = free()
+  let beforeCommit = false
+  await client.$transaction(async () => {
+    await create(written('committed'))
+    beforeCommit = free()
+  })
+  return [!afterRollback, !beforeCommit, free()].filter(Boolean).length
+}
+
+const main = async () => {
+  const raceFailures = await loadRace()
+  const transactionFailures = await transactionWrites()
+  console.log(mismatches + batchMismatches === 0 ? 'Results identical' : `MISMATCHES: ${mismatches} single, ${batchMismatches} batch`)
+  console.log(instantMismatches ? `MISMATCHES: ${instantMismatches} same-instant booking cases` : 'Same-instant bookings block like the exclusion constraint')
+  console.log(raceFailures ? 'ERROR: booking written during an agency load lost' : 'Writes during an agency load are kept')
+  console.log(transactionFailures ? `ERROR: ${transactionFailures} transaction cases applied at the wrong time` : 'Transaction writes applied after commit only')
+  if (mismatches + batchMismatches + instantMismatches + raceFailures + transactionFailures) process.exit(1)
+}
+
+main()
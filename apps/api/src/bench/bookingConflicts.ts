@@ -0,0 +1,145 @@
+// Test de concurrence multi-réplicas : pas de double réservation ni de cron exécuté deux fois.
+// Nécessite DATABASE_URL (base de test) avec le schéma à jour (prisma db push) ; crée la contrainte si absente.
+// Usage : npx ts-node src/bench/bookingConflicts.ts [replicas] [units] [requests] [concurrency]
+// Chaque réplica est un PrismaClient distinct (son propre pool), comme N instances de l'API derrière un répartiteur :
+// 1. réservations widget concurrentes sur une petite flotte (demande > capacité) : création + claimFleetUnit ;
+//    chaque écriture refusée par la contrainte est une double réservation que l'ancien lire-puis-écrire aurait validée
+// 2. affectation manuelle du même véhicule à des réservations qui se chevauchent, par tous les réplicas à la fois
+// 3. déclenchement simultané d'un cron sur tous les réplicas : un seul doit l'exécuter
+// Vérifie ensuite en SQL qu'aucun véhicule n'a deux réservations bloquantes qui se chevauchent.
+// Les données créées (agence BENCH-EXCL, réservations BENCH-EX-*) sont supprimées à la fin.
+import { PrismaClient } from '@prisma/client'
+import { performance } from 'perf_hooks'
+import { claimFleetUnit } from '../services/fleetAssignment'
+import { bookingOverlapEnforced, ensureBookingOverlapConstraint, findBookingOverlaps, isBookingOverlapError } from '../services/bookingOverlap'
+import { withClusterLock } from '../services/clusterLock'
+import { runPool } from '../services/pushDispatcher'
+
+const REPLICAS = parseInt(process.argv[2] || '4', 10)
+const UNITS = parseInt(process.argv[3] || '6', 10)
+const REQUESTS = parseInt(process.argv[4] || '400', 10)
+const CONCURRENCY = parseInt(process.argv[5] || '8', 10)
+const CRON_ROUNDS = 20
+const AGENCY_CODE = 'BENCH-EXCL'
+const REF_PREFIX = 'BENCH-EX-'
+const DAY = 24 * 60 * 60 * 1000
+
+let seed = 23
+const random = () => { seed = (seed * 1103515245 + 12345) & 0x7fffffff; return seed / 0x7fffffff }
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms))
+
+const prisma = new PrismaClient()
+const replicas = Array.from({ length: REPLICAS }, () => new PrismaClient())
+
+const cleanup = async () => {
+  await prisma.booking.deleteMany({ where: { reference: { startsWith: REF_PREFIX } } })
+  await prisma.fleet.deleteMany({ where: { agency: { code: AGENCY_CODE } } })
+  await prisma.vehicle.deleteMany({ where: { sku: 'BENCH-EXCL' } })
+  await prisma.category.deleteMany({ where: { code: 'BENCH-EXCL' } })
+  await prisma.customer.deleteMany({ where: { email: 'exclusion@bench.invalid' } })
+  await prisma.agency.deleteMany({ where: { code: AGENCY_CODE } })
+}
+
+const setup = async () => {
+  const agency = await prisma.agency.create({
+    data: { code: AGENCY_CODE, name: { es: 'Bench' }, address: '-', city: '-', postalCode: '-', phone: '-', email: 'agency@bench.invalid' }
+  })
+  const category = await prisma.category.create({ data: { code: 'BENCH-EXCL', name: { es: 'Bench' } } })
+  const vehicle = await prisma.vehicle.create({
+    data: { sku: 'BENCH-EXCL', name: { es: 'Bench' }, description: { es: '-' }, deposit: 100, categoryId: category.id }
+  })
+  const units = await Promise.all(Array.from({ length: UNITS }, (_, i) => prisma.fleet.create({
+    data: { vehicleNumber: `BENCH-EXCL-${i}`, chassisNumber: `BENCH-EXCL-${i}`, vehicleId: vehicle.id, agencyId: agency.id }
+  })))
+  const customer = await prisma.customer.create({ data: { firstName: 'Bench', lastName: 'Exclusion', email: 'exclusion@bench.invalid', phone: '-' } })
+  return { agency, vehicle, units, customer }
+}
+
+const main = async () => {
+  await cleanup()
+  const created = await ensureBookingOverlapConstraint(prisma)
+  if (!(await bookingOverlapEnforced(prisma))) {
+    console.log(`Constraint missing: ${created?.overlaps.length ?? '?'} overlapping bookings in this database (GET /api/fleet/overlaps)`)
+    process.exit(1)
+  }
+  const { agency, vehicle, units, customer } = await setup()
+  const origin = Date.UTC(2031, 0, 1)
+  let failures = 0
+
+  // 1. Réservations widget : 1 à 4 jours dans une fenêtre de 30 jours, environ deux fois la capacité de la flotte
+  const requests = Array.from({ length: REQUESTS }, (_, i) => {
+    const start = origin + Math.floor(random() * 30) * DAY
+    return { i, start: new Date(start), end: new Date(start + (1 + Math.floor(random() * 4)) * DAY) }
+  })
+  const stats = { assigned: 0, unassigned: 0, retried: 0, rejectedWrites: 0 }
+  const t0 = performance.now()
+  await Promise.all(replicas.map((client, r) => runPool(requests.filter(q => q.i % REPLICAS === r), CONCURRENCY, async q => {
+    const booking = await client.booking.create({
+      data: {
+        reference: `${REF_PREFIX}${q.i}`, agencyId: agency.id, customerId: customer.id, startDate: q.start, endDate: q.end,
+        startTime: '10:00', endTime: '10:00', totalPrice: 0, depositAmount: 0, status: 'PENDING'
+      }
+    })
+    const claim = await claimFleetUnit(client, booking.id, vehicle.id, agency.id, q.start, q.end)
+    if (claim.fleetId) stats.assigned++
+    else stats.unassigned++
+    if (claim.conflicts) stats.retried++
+    stats.rejectedWrites += claim.conflicts
+  })))
+  const claimMs = performance.now() - t0
+  console.log(`Widget bookings: ${REQUESTS} requests on ${UNITS} units from ${REPLICAS} replicas x ${CONCURRENCY} in ${claimMs.toFixed(0)} ms`)
+  console.log(`  assigned ${stats.assigned}, fully booked ${stats.unassigned}, retried after a conflict ${stats.retried}, writes rejected by the constraint ${stats.rejectedWrites}`)
+
+  // 2. Affectation manuelle : chaque réplica place sa réservation sur le même véhicule, mêmes dates
+  const manualStart = new Date(origin + 60 * DAY)
+  const manual = await Promise.all(replicas.map(async (client, r) => {
+    const booking = await client.booking.create({
+      data: {
+        reference: `${REF_PREFIX}M${r}`, agencyId: agency.id, customerId: customer.id, startDate: manualStart, endDate: new Date(manualStart.getTime() + 3 * DAY),
+        startTime: '10:00', endTime: '10:00', totalPrice: 0, depositAmount: 0, status: 'CONFIRMED'
+      }
+    })
+    try {
+      await client.booking.update({ where: { id: booking.id }, data: { fleetVehicleId: units[0].id, assignmentType: 'MANUAL', assignedAt: new Date() } })
+      return 'assigned'
+    } catch (error) {
+      if (isBookingOverlapError(error)) return 'conflict'
+      throw error
+    }
+  }))
+  const manualAssigned = manual.filter(m => m === 'assigned').length
+  console.log(`Manual assignment of one unit by ${REPLICAS} replicas at once: ${manualAssigned} accepted, ${manual.length - manualAssigned} rejected with 409`)
+  if (manualAssigned !== 1) failures++
+
+  // 3. Cron déclenché sur tous les réplicas en même temps (connexions déjà ouvertes : départs quasi simultanés)
+  await Promise.all(replicas.map(client => client.$queryRaw`SELECT 1`))
+  let overlappingRuns = 0
+  let singleLeader = 0
+  for (let round = 0; round < CRON_ROUNDS; round++) {
+    let running = 0
+    const runs = await Promise.all(replicas.map(client => withClusterLock(client, 'bench:cron', async () => {
+      running++
+      if (running > 1) overlappingRuns++
+      await sleep(300)
+      running--
+    })))
+    if (runs.filter(run => run.acquired).length === 1) singleLeader++
+  }
+  console.log(`Cron triggered on ${REPLICAS} replicas x ${CRON_ROUNDS}: exactly one runner in ${singleLeader}/${CRON_ROUNDS} rounds, ${overlappingRuns} overlapping runs`)
+  if (singleLeader !== CRON_ROUNDS || overlappingRuns) failures++
+
+  // Invariant, vérifié sans passer par la contrainte
+  const overlaps = await findBookingOverlaps(prisma)
+  const [{ count }] = await prisma.$queryRaw<{ count: number }[]>`
+    SELECT count(*)::int AS "count" FROM "Booking" WHERE "reference" LIKE ${REF_PREFIX + '%'} AND "fleetVehicleId" IS NOT NULL`
+  console.log(`${count} assigned bench bookings, ${overlaps.length} overlapping pairs in the database`)
+  if (overlaps.length) failures++
+  if (!stats.rejectedWrites) console.log('Note: no write was rejected, raise requests or concurrency for more contention')
+
+  await cleanup()
+  await Promise.all([prisma, ...replicas].map(client => client.$disconnect()))
+  console.log(failures ? 'ERRORS: invariant violated' : 'No double booking, one cron runner per trigger')
+  if (failures) process.exit(1)
+}
+
+main()
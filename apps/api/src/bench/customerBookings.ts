@@ -0,0 +1,177 @@
+// Portail client, "mes réservations" : ancien chargement (réservations + agence, véhicule, lignes, options, contrat,
+// extensions) contre le modèle de lecture par client (services/customerBookings).
+// Nécessite DATABASE_URL (base de test) et le schéma à jour (prisma db push).
+// Usage : npx ts-node src/bench/customerBookings.ts [tailles] [runs]   (tailles : 50,200,1000 réservations par défaut)
+// Pour chaque taille, un client de test avec ses réservations, contrats, extensions et options, puis :
+// ancien include, construction à froid, relecture après changement de version, version en cache, 304,
+// délai de mise à jour après une extension écrite (trigger, puis worker outbox), et extension modifiée dans une
+// transaction annulée : liste inchangée. Les données créées sont supprimées à la fin.
+import { PrismaClient } from '@prisma/client'
+import { performance } from 'perf_hooks'
+import { CUSTOMER_BOOKINGS_TOPIC, CustomerBookingSummaries, ensureCustomerBookingTriggers, formatBookingSummary, registerCustomerBookingRefresh } from '../services/customerBookings'
+import { OutboxWorker } from '../services/outbox'
+
+const SIZES = (process.argv[2] || '50,200,1000').split(',').map(n => parseInt(n, 10))
+const RUNS = parseInt(process.argv[3] || '9', 10)
+const CODE = 'BENCH-CB'
+const DAY = 24 * 60 * 60 * 1000
+
+// Résumés réécrits par un worker dédié au topic, vidé (drain) après chaque écriture
+const seed = new PrismaClient()
+const prisma = new PrismaClient()
+const summaries = new CustomerBookingSummaries(prisma, 100)
+const worker = new OutboxWorker(prisma, { topics: [CUSTOMER_BOOKINGS_TOPIC] })
+registerCustomerBookingRefresh(worker, summaries)
+
+const median = async <T>(fn: () => Promise<T>, before?: () => Promise<unknown>) => {
+  const times: number[] = []
+  let result!: T
+  for (let i = 0; i < RUNS; i++) {
+    if (before) await before()
+    const t0 = performance.now()
+    result = await fn()
+    times.push(performance.now() - t0)
+  }
+  return { ms: times.sort((a, b) => a - b)[Math.floor(times.length / 2)], result }
+}
+
+const cleanup = async () => {
+  const customers = await seed.customer.findMany({ where: { email: { endsWith: '@customer-bookings.bench.invalid' } }, select: { id: true } })
+  const ids = customers.map(c => c.id)
+  await seed.$executeRaw`DELETE FROM "CustomerBookingSummary" WHERE "customerId" = ANY(${ids})`
+  await seed.$executeRaw`DELETE FROM "CustomerBookingVersion" WHERE "customerId" = ANY(${ids})`
+  await seed.rentalContract.deleteMany({ where: { customerId: { in: ids } } })
+  await seed.booking.deleteMany({ where: { customerId: { in: ids } } })
+  await seed.customer.deleteMany({ where: { id: { in: ids } } })
+  await seed.fleet.deleteMany({ where: { agency: { code: CODE } } })
+  await seed.vehicle.deleteMany({ where: { sku: CODE } })
+  await seed.category.deleteMany({ where: { code: CODE } })
+  await seed.option.deleteMany({ where: { code: CODE } })
+  await seed.agency.deleteMany({ where: { code: CODE } })
+  await worker.drain()
+}
+
+const setup = async () => {
+  const agency = await seed.agency.create({
+    data: { code: CODE, name: { es: 'Bench' }, address: '-', city: '-', postalCode: '-', phone: '-', email: 'agency@customer-bookings.bench.invalid' }
+  })
+  const category = await seed.category.create({ data: { code: CODE, name: { es: 'Bench' } } })
+  const vehicle = await seed.vehicle.create({
+    data: { sku: CODE, name: { es: 'Bench' }, description: { es: '-' }, deposit: 100, categoryId: category.id }
+  })
+  const option = await seed.option.create({ data: { code: CODE, name: { es: 'Casco' } } })
+  return { agency, vehicle, option }
+}
+
+// Client de test sur son propre véhicule (contrainte anti-chevauchement) : une réservation tous les 3 jours (dates distinctes),
+// contrat pour chacune, une extension sur trois, une option sur deux
+const createCustomer = async (size: number, { agency, vehicle, option }: Awaited<ReturnType<typeof setup>>) => {
+  const unit = await seed.fleet.create({ data: { vehicleNumber: `${CODE}-${size}`, chassisNumber: `${CODE}-${size}`, vehicleId: vehicle.id, agencyId: agency.id } })
+  const customer = await seed.customer.create({
+    data: { firstName: 'Bench', lastName: `${size}`, email: `c${size}@customer-bookings.bench.invalid`, phone: '-' }
+  })
+  const origin = Date.UTC(2024, 0, 1)
+  const bookings = Array.from({ length: size }, (_, i) => ({
+    id: `${customer.id}-b${i}`, reference: `${CODE}-${size}-${i}`, agencyId: agency.id, customerId: customer.id, fleetVehicleId: unit.id,
+    startDate: new Date(origin + i * 3 * DAY), endDate: new Date(origin + (i * 3 + 2) * DAY),
+    startTime: '10:00', endTime: '10:00', totalPrice: 60, paidAmount: 60, depositAmount: 100, status: 'COMPLETED'
+  }))
+  await seed.booking.createMany({ data: bookings })
+  await seed.bookingOption.createMany({
+    data: bookings.filter((_, i) => i % 2 === 0).map(b => ({ bookingId: b.id, optionId: option.id, quantity: 1, unitPrice: 5, totalPrice: 10 }))
+  })
+  await seed.rentalContract.createMany({
+    data: bookings.map((b, i) => ({
+      id: `${b.id}-c`, contractNumber: `${b.reference}-C`, bookingId: b.id, fleetVehicleId: unit.id, agencyId: agency.id, customerId: customer.id,
+      originalStartDate: b.startDate, originalEndDate: b.endDate, currentStartDate: b.startDate, currentEndDate: b.endDate,
+      source: 'ONLINE_WIDGET' as const, dailyRate: 30, totalDays: 2, subtotal: 60, taxAmount: 0, totalAmount: 60, depositAmount: 100,
+      status: i % 10 === 0 ? 'ACTIVE' as const : 'COMPLETED' as const
+    }))
+  })
+  await seed.contractExtension.createMany({
+    data: bookings.filter((_, i) => i % 3 === 0).map(b => ({
+      extensionNumber: `${b.reference}-E1`, contractId: `${b.id}-c`, previousEndDate: b.endDate, requestedEndDate: new Date(b.endDate.getTime() + DAY),
+      additionalDays: 1, requestSource: 'CUSTOMER_PORTAL' as const, dailyRate: 30, subtotal: 30, taxAmount: 0, totalAmount: 30
+    }))
+  })
+  return customer.id
+}
+
+// Ancien GET /bookings
+const legacy = (customerId: string) => prisma.booking.findMany({
+  where: { customerId },
+  include: {
+    agency: true,
+    fleetVehicle: { include: { vehicle: true } },
+    items: { include: { vehicle: true } },
+    options: { include: { option: true } },
+    contract: { include: { extensions: { orderBy: { createdAt: 'desc' } } } }
+  },
+  orderBy: { startDate: 'desc' }
+}).then(bookings => Buffer.from(JSON.stringify(bookings.map(formatBookingSummary))))
+
+const main = async () => {
+  await ensureCustomerBookingTriggers(prisma)
+  await cleanup()
+  const fixtures = await setup()
+  let failures = 0
+  for (const size of SIZES) {
+    const customerId = await createCustomer(size, fixtures)
+    await worker.drain()
+    const old = await median(() => legacy(customerId))
+
+    // Construction complète (liste stale, résumés absents), puis relecture d'une nouvelle version, puis cache
+    const forget = async () => {
+      await prisma.$executeRaw`DELETE FROM "CustomerBookingSummary" WHERE "customerId" = ${customerId}`
+      await summaries.markStale(customerId)
+    }
+    const cold = await median(() => summaries.get(customerId), forget)
+    const bump = () => prisma.$executeRaw`UPDATE "CustomerBookingVersion" SET "version" = "version" + 1 WHERE "customerId" = ${customerId}`
+    const miss = await median(() => summaries.get(customerId), bump)
+    const hit = await median(() => summaries.get(customerId))
+    const etag = hit.result.etag
+    const notModified = await median(async () => (await summaries.get(customerId)).etag === etag)
+
+    const same = JSON.stringify(JSON.parse(hit.result.body.toString())) === old.result.toString()
+    if (!same || !notModified.result) failures++
+
+    // Extension payée : nouvelle version, montant visible dans la liste ; puis modifiée dans une transaction annulée
+    const extension = await prisma.contractExtension.findFirst({ where: { contract: { customerId } } })
+    let refreshMs = 0
+    let visible = false
+    let rolledBack = false
+    if (extension) {
+      const listed = async (amount: number) => JSON.parse((await summaries.get(customerId)).body.toString())
+        .some((b: any) => b.contract?.extensions.some((e: any) => e.id === extension.id && e.paymentStatus === 'PAID' && e.totalAmount === amount))
+      const t0 = performance.now()
+      await prisma.contractExtension.update({ where: { id: extension.id }, data: { paymentStatus: 'PAID', totalAmount: 45 } })
+      await worker.drain()
+      refreshMs = performance.now() - t0
+      visible = await listed(45)
+      await prisma.$transaction(async tx => {
+        await tx.contractExtension.update({ where: { id: extension.id }, data: { totalAmount: 99 } })
+        throw new Error('rollback')
+      }).catch(() => {})
+      await worker.drain()
+      rolledBack = await listed(45)
+      if (!visible || !rolledBack) failures++
+    }
+
+    console.log(`\n${size} bookings (${(old.result.length / 1024).toFixed(0)} KB)`)
+    console.log(`  legacy include + format     median ${old.ms.toFixed(1)} ms`)
+    console.log(`  read model, cold build      median ${cold.ms.toFixed(1)} ms`)
+    console.log(`  read model, new version     median ${miss.ms.toFixed(2)} ms`)
+    console.log(`  read model, cached version  median ${hit.ms.toFixed(2)} ms (x${(old.ms / hit.ms).toFixed(0)})`)
+    console.log(`  If-None-Match (304)         median ${notModified.ms.toFixed(2)} ms`)
+    console.log(`  extension update + summary  ${refreshMs.toFixed(1)} ms, visible in list: ${visible}, same body as legacy: ${same}`)
+    console.log(`  rolled back update          list unchanged: ${rolledBack}`)
+  }
+
+  console.log(`\n${JSON.stringify(summaries.stats())}`)
+  await cleanup()
+  await Promise.all([seed.$disconnect(), prisma.$disconnect()])
+  console.log(failures ? 'ERRORS: read model differs from the bookings' : 'Read model matches the bookings')
+  if (failures) process.exit(1)
+}
+
+main()
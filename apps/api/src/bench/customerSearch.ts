@@ -0,0 +1,96 @@
+// Benchmark /api/customers/search : ancien OR de 4 ILIKE '%q%' vs index trigramme (services/customerSearch)
+// Nécessite DATABASE_URL (base de test) avec le schéma à jour (prisma db push).
+// Usage : npx ts-node src/bench/customerSearch.ts [customers] [--cleanup]
+// Les clients générés ont un email @bench.invalid ; --cleanup les supprime à la fin.
+import { PrismaClient } from '@prisma/client'
+import { performance } from 'perf_hooks'
+import { customerSearchFields, searchCustomers } from '../services/customerSearch'
+
+const COUNT = parseInt(process.argv[2] || '300000', 10)
+const CLEANUP = process.argv.includes('--cleanup')
+const BATCH = 5000
+const EMAIL_DOMAIN = '@bench.invalid'
+
+const FIRST_NAMES = ['José', 'María', 'Jean', 'Lucía', 'Pierre', 'Ana', 'Chloé', 'Javier', 'Zoë', 'Miguel', 'Sofía', 'Hugo', 'Émilie', 'Iñaki', 'Noël', 'Björn']
+const LAST_NAMES = ['García', 'Martínez', 'Dupont', 'López', 'Müller', 'Fernández', 'Lefèvre', 'Sánchez', 'Rossi', 'Pérez', 'Gómez', 'Moreau', 'Núñez', 'Ibáñez', 'Schmidt', 'Díaz']
+const QUERIES = ['jose', 'Jose Garcia', 'garcía', 'lefevre', 'ibanez', 'user12345', '612 34', '+34 6', 'chloe mor', 'fernandes', 'zo', 'muller schmidt']
+
+let seed = 7
+const random = () => { seed = (seed * 1103515245 + 12345) & 0x7fffffff; return seed / 0x7fffffff }
+const pick = <T>(values: T[]) => values[Math.floor(random() * values.length)]
+
+const percentile = (values: number[], p: number) => {
+  const sorted = [...values].sort((a, b) => a - b)
+  return sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * p))]
+}
+
+const prisma = new PrismaClient()
+
+const seedCustomers = async () => {
+  const existing = await prisma.customer.count({ where: { email: { endsWith: EMAIL_DOMAIN } } })
+  const t0 = performance.now()
+  for (let i = existing; i < COUNT; i += BATCH) {
+    const data = Array.from({ length: Math.min(BATCH, COUNT - i) }, (_, k) => {
+      const n = i + k
+      const customer = {
+        firstName: pick(FIRST_NAMES) + (random() < 0.2 ? ' ' + pick(FIRST_NAMES) : ''),
+        lastName: pick(LAST_NAMES) + ' ' + pick(LAST_NAMES),
+        email: `user${n}${EMAIL_DOMAIN}`,
+        phone: '+34 6' + String(Math.floor(random() * 1e8)).padStart(8, '0')
+      }
+      // createMany ne passe pas par le middleware : colonnes de recherche calculées ici
+      return { ...customer, ...customerSearchFields(customer) }
+    })
+    await prisma.customer.createMany({ data })
+  }
+  return { existing, seedMs: performance.now() - t0 }
+}
+
+const legacySearch = (q: string) => prisma.customer.findMany({
+  where: {
+    OR: [
+      { firstName: { contains: q, mode: 'insensitive' } },
+      { lastName: { contains: q, mode: 'insensitive' } },
+      { email: { contains: q, mode: 'insensitive' } },
+      { phone: { contains: q } }
+    ]
+  },
+  take: 10
+})
+
+const measure = async (name: string, fn: (q: string) => Promise<any[]>) => {
+  const timings: number[] = []
+  const hits: Record<string, number> = {}
+  for (let round = 0; round < 5; round++) {
+    for (const q of QUERIES) {
+      const t0 = performance.now()
+      const rows = await fn(q)
+      timings.push(performance.now() - t0)
+      hits[q] = rows.length
+    }
+  }
+  console.log(`${name.padEnd(8)} p50 ${percentile(timings, 0.5).toFixed(1)} ms, p95 ${percentile(timings, 0.95).toFixed(1)} ms, max ${Math.max(...timings).toFixed(1)} ms`)
+  return hits
+}
+
+const main = async () => {
+  const { existing, seedMs } = await seedCustomers()
+  const total = await prisma.customer.count()
+  console.log(`Customers: ${total} (${COUNT - Math.min(existing, COUNT)} seeded in ${(seedMs / 1000).toFixed(1)} s)`)
+
+  const legacyHits = await measure('legacy', legacySearch)
+  const indexedHits = await measure('indexed', q => searchCustomers(prisma, q))
+  for (const q of QUERIES) console.log(`  "${q}": legacy ${legacyHits[q]}, indexed ${indexedHits[q]}`)
+
+  const plan = await prisma.$queryRawUnsafe<any[]>(`EXPLAIN SELECT id FROM "Customer" WHERE "searchText" LIKE '%lefevre%'`)
+  console.log('Plan:', plan.map(row => row['QUERY PLAN']).join(' | '))
+
+  if (CLEANUP) {
+    const { count } = await prisma.customer.deleteMany({ where: { email: { endsWith: EMAIL_DOMAIN } } })
+    console.log(`Removed ${count} bench customers`)
+  }
+}
+
+main()
+  .catch(e => { console.error(e); process.exitCode = 1 })
+  .finally(() => prisma.$disconnect())
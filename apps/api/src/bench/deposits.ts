@@ -0,0 +1,58 @@
+// Benchmark cron authorize-deposits contre un Stripe simulé (hors ligne)
+// Usage : npx ts-node src/bench/deposits.ts [bookings] [latencyMs] [concurrency]
+import { performance } from 'perf_hooks'
+import { DepositCandidate, createStubGateway, processDeposits } from '../services/depositAuthorization'
+
+const BOOKINGS = parseInt(process.argv[2] || '200', 10)
+const LATENCY_MS = parseInt(process.argv[3] || '150', 10)
+const CONCURRENCY = parseInt(process.argv[4] || '4', 10)
+const BRANDS = ['VOLTRIDE', 'MOTOR-RENT']
+
+const candidates: DepositCandidate[] = Array.from({ length: BOOKINGS }, (_, i) => ({
+  bookingId: 'booking-' + i,
+  reference: 'REF-' + i,
+  brand: BRANDS[i % BRANDS.length],
+  amount: i % 25 === 0 ? 0 : 100 + (i % 5) * 50,
+  stripeCustomerId: 'cus_' + i,
+  paymentMethodId: 'pm_' + i
+}))
+
+const main = async () => {
+  // Ancien comportement : une réservation après l'autre, toutes marques confondues
+  const sequentialStub = createStubGateway({ latencyMs: LATENCY_MS })
+  let t0 = performance.now()
+  const sequential = await processDeposits(candidates.map(c => ({ ...c, brand: 'ALL' })), sequentialStub.gateway, { concurrency: 1 })
+  const sequentialMs = performance.now() - t0
+
+  const pooledStub = createStubGateway({ latencyMs: LATENCY_MS, transientRate: 0.02 })
+  t0 = performance.now()
+  const pooled = await processDeposits(candidates, pooledStub.gateway, { concurrency: CONCURRENCY, baseDelayMs: 20 })
+  const pooledMs = performance.now() - t0
+
+  // Passage interrompu par la deadline puis repris : chaque réservation n'est autorisée qu'une fois
+  const resumeStub = createStubGateway({ latencyMs: LATENCY_MS })
+  const first = await processDeposits(candidates, resumeStub.gateway, { concurrency: CONCURRENCY, deadline: Date.now() + pooledMs / 3 })
+  const second = await processDeposits(first.remaining, resumeStub.gateway, { concurrency: CONCURRENCY })
+  const resumed = [...first.outcomes, ...second.outcomes]
+  const authorizedIds = resumed.filter(o => o.status === 'AUTHORIZED').map(o => o.bookingId)
+
+  // Rejeu complet avec les mêmes clés d'idempotence : aucun nouveau PaymentIntent
+  const createdBeforeReplay = resumeStub.calls.created
+  await processDeposits(candidates, resumeStub.gateway, { concurrency: CONCURRENCY })
+
+  const rate = (n: number, ms: number) => (n / ms * 1000).toFixed(1)
+  console.log(`Bookings: ${BOOKINGS}, brands: ${BRANDS.length}, stub latency: ${LATENCY_MS} ms, concurrency/brand: ${CONCURRENCY}`)
+  console.log(`Sequential: ${sequentialMs.toFixed(0)} ms (${rate(sequential.outcomes.length, sequentialMs)} bookings/s)`)
+  console.log(`Pooled:     ${pooledMs.toFixed(0)} ms (${rate(pooled.outcomes.length, pooledMs)} bookings/s, x${(sequentialMs / pooledMs).toFixed(1)}, ${pooledStub.calls.total - pooledStub.calls.created} retried calls)`)
+  console.log(`Resume:     ${first.outcomes.length} before deadline, ${second.outcomes.length} on re-run`)
+
+  const errors: string[] = []
+  if (resumed.length !== BOOKINGS) errors.push(`resume processed ${resumed.length}/${BOOKINGS}`)
+  if (new Set(authorizedIds).size !== authorizedIds.length) errors.push('booking authorized twice')
+  if (resumeStub.calls.created !== createdBeforeReplay) errors.push('replay created new payment intents')
+  if (pooled.outcomes.some(o => o.status === 'ERROR')) errors.push('transient errors not retried')
+  console.log(errors.length ? 'ERRORS: ' + errors.join(', ') : 'Idempotent replay and resume OK')
+  if (errors.length) process.exit(1)
+}
+
+main()
@@ -0,0 +1,106 @@
+// Latence du compteur de notifications non lues quand l'historique grossit (services/notificationInbox)
+// Usage : npx ts-node src/bench/notifications.ts [maxRows] [users] [iterations]   (DATABASE_URL : base de test)
+// Paliers de 10 000 lignes jusqu'à maxRows (x10 par palier, puis maxRows) : à chaque palier, ancien COUNT(*) WHERE NOT isRead
+// (global et par utilisateur) comparé à la lecture du compteur, plus première page de la liste et aller-retour
+// création + lecture par la boîte de réception. Lignes insérées en SQL (generate_series), supprimées à la fin.
+import { PrismaClient } from '@prisma/client'
+import { performance } from 'perf_hooks'
+import { ALL_KEY, NotificationInbox } from '../services/notificationInbox'
+import { ChangeFeed } from '../services/changeFeed'
+
+const MAX_ROWS = parseInt(process.argv[2] || '2000000', 10)
+const USERS = parseInt(process.argv[3] || '50', 10)
+const ITERATIONS = parseInt(process.argv[4] || '50', 10)
+const PREFIX = 'bench-notif-'
+
+const prisma = new PrismaClient()
+const inbox = new NotificationInbox(prisma, new ChangeFeed())
+
+const steps = () => {
+  const sizes: number[] = []
+  for (let size = 10000; size < MAX_ROWS; size *= 10) sizes.push(size)
+  return [...sizes, MAX_ROWS]
+}
+
+const percentile = (sorted: number[], p: number) => sorted[Math.min(sorted.length - 1, Math.ceil(p / 100 * sorted.length) - 1)]
+
+const measure = async (fn: (i: number) => Promise<unknown>) => {
+  await fn(0)
+  const samples: number[] = []
+  for (let i = 0; i < ITERATIONS; i++) {
+    const t0 = performance.now()
+    await fn(i)
+    samples.push(performance.now() - t0)
+  }
+  samples.sort((a, b) => a - b)
+  return { p50: percentile(samples, 50), p95: percentile(samples, 95) }
+}
+
+// Lignes from..to : un utilisateur par ligne en rotation, 1 sur 5 non lue, réparties sur 180 jours
+const grow = (from: number, to: number) => prisma.$executeRaw`
+  INSERT INTO "Notification" ("id", "userId", "title", "body", "data", "isRead", "createdAt")
+  SELECT ${PREFIX} || g, ${PREFIX} || (g % ${USERS}), 'Bench', 'Notification ' || g, '{}', (g / ${USERS}) % 5 <> 0,
+         (now() AT TIME ZONE 'UTC') - make_interval(secs => (g % 15552000)::float8)
+  FROM generate_series(${from}::int, ${to - 1}::int) g`
+
+const cleanup = async () => {
+  await prisma.$executeRaw`DELETE FROM "Notification" WHERE "userId" LIKE ${PREFIX + '%'}`
+  await prisma.$executeRaw`DELETE FROM "NotificationCounter" WHERE "key" LIKE ${PREFIX + '%'}`
+}
+
+const main = async () => {
+  await cleanup()
+  const user = (i: number) => PREFIX + (i % USERS)
+  const rows: string[] = []
+  let consistent = true
+  let size = 0
+  for (const target of steps()) {
+    await grow(size, target)
+    size = target
+    await prisma.$executeRaw`ANALYZE "Notification"`
+    // Lignes insérées hors service : compteurs recalculés une fois par palier
+    await inbox.rebuildCounters()
+
+    const legacyAll = await measure(() => prisma.notification.count({ where: { isRead: false } }))
+    const legacyUser = await measure(i => prisma.notification.count({ where: { userId: user(i), isRead: false } }))
+    const counterAll = await measure(() => inbox.unreadCount())
+    const counterUser = await measure(i => inbox.unreadCount(user(i)))
+    const firstPage = await measure(i => inbox.list({ userId: user(i), cursor: null, limit: 20 }))
+    const roundTrip = await measure(async i => {
+      await inbox.create({ userId: user(i), title: 'Bench', body: 'Round trip' })
+      const { items } = await inbox.list({ userId: user(i), cursor: null, limit: 1 })
+      await inbox.markRead(items[0].id)
+    })
+
+    const [expectedAll, expectedUser] = await Promise.all([
+      prisma.notification.count({ where: { isRead: false } }),
+      prisma.notification.count({ where: { userId: user(0), isRead: false } })
+    ])
+    const [all, first] = await Promise.all([inbox.unreadCount(), inbox.unreadCount(user(0))])
+    if (all !== expectedAll || first !== expectedUser) {
+      consistent = false
+      console.log(`Counter mismatch at ${size} rows: ${ALL_KEY} ${all} vs ${expectedAll}, ${user(0)} ${first} vs ${expectedUser}`)
+    }
+    rows.push([
+      String(size).padStart(9),
+      `${legacyAll.p50.toFixed(2)} / ${legacyAll.p95.toFixed(2)}`.padStart(17),
+      `${legacyUser.p50.toFixed(2)} / ${legacyUser.p95.toFixed(2)}`.padStart(17),
+      `${counterAll.p50.toFixed(2)} / ${counterAll.p95.toFixed(2)}`.padStart(15),
+      `${counterUser.p50.toFixed(2)} / ${counterUser.p95.toFixed(2)}`.padStart(15),
+      `${firstPage.p50.toFixed(2)}`.padStart(10),
+      `${roundTrip.p50.toFixed(2)}`.padStart(10)
+    ].join(' '))
+    console.log(`${size} rows measured`)
+  }
+
+  console.log(`\nUnread count latency, p50 / p95 in ms (${USERS} users, ${ITERATIONS} iterations)`)
+  console.log('     rows     COUNT(*) all    COUNT(*) user    counter all   counter user  page (20)  write+read')
+  rows.forEach(row => console.log(row))
+  await cleanup()
+  await inbox.rebuildCounters()
+  await prisma.$disconnect()
+  console.log(consistent ? 'Counters match COUNT(*) at every step' : 'ERRORS: counters drifted from COUNT(*)')
+  if (!consistent) process.exit(1)
+}
+
+main()
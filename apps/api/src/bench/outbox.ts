@@ -0,0 +1,153 @@
+// Benchmark webhook Stripe + outbox, hors ligne (Resend simulé, événements Stripe générés, pas de signature)
+// Nécessite DATABASE_URL (base de test) avec le schéma à jour (prisma db push).
+// Usage : npx ts-node src/bench/outbox.ts [events] [mailLatencyMs] [deliveryConcurrency] [workerConcurrency]
+// Compare la latence de réponse du webhook (ancien traitement avec envoi des emails vs transaction + outbox),
+// puis mesure le débit du worker et vérifie : rejeu Stripe ignoré, un seul email par destinataire, reprise après arrêt.
+// Les données créées (agence BENCH-OUTBOX, réservations BENCH-OB-*, messages) sont supprimées à la fin.
+import { PrismaClient } from '@prisma/client'
+import { performance } from 'perf_hooks'
+import { createStubMailer, Mailer } from '../services/mailer'
+import { OutboxWorker, enqueueOutbox } from '../services/outbox'
+import { runPool } from '../services/pushDispatcher'
+import { StripeEventLike, acceptStripeEvent } from '../services/stripeWebhook'
+
+const EVENTS = parseInt(process.argv[2] || '300', 10)
+const MAIL_LATENCY_MS = parseInt(process.argv[3] || '250', 10)
+const DELIVERY_CONCURRENCY = parseInt(process.argv[4] || '10', 10)
+const WORKER_CONCURRENCY = parseInt(process.argv[5] || '8', 10)
+const AGENCY_CODE = 'BENCH-OUTBOX'
+const REF_PREFIX = 'BENCH-OB-'
+
+const prisma = new PrismaClient()
+
+const percentile = (values: number[], p: number) => {
+  const sorted = [...values].sort((a, b) => a - b)
+  return sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * p))]
+}
+const summary = (values: number[]) =>
+  `p50 ${percentile(values, 0.5).toFixed(1)} ms, p95 ${percentile(values, 0.95).toFixed(1)} ms, p99 ${percentile(values, 0.99).toFixed(1)} ms`
+
+const event = (bookingId: string, run: string): StripeEventLike => ({
+  id: `evt_bench_${run}_${bookingId}`,
+  type: 'checkout.session.completed',
+  data: { object: { id: `cs_bench_${bookingId}`, metadata: { bookingId } } }
+})
+
+const cleanup = async () => {
+  await prisma.outboxMessage.deleteMany({ where: { dedupeKey: { startsWith: 'booking.confirmed:bench-' } } })
+  await prisma.outboxMessage.deleteMany({ where: { topic: 'bench.crash' } })
+  await prisma.stripeWebhookEvent.deleteMany({ where: { stripeEventId: { startsWith: 'evt_bench_' } } })
+  await prisma.booking.deleteMany({ where: { reference: { startsWith: REF_PREFIX } } })
+  await prisma.customer.deleteMany({ where: { email: 'outbox@bench.invalid' } })
+  await prisma.agency.deleteMany({ where: { code: AGENCY_CODE } })
+}
+
+const seed = async () => {
+  const agency = await prisma.agency.create({
+    data: { code: AGENCY_CODE, name: { es: 'Bench' }, address: '-', city: '-', postalCode: '-', phone: '-', email: 'agency@bench.invalid' }
+  })
+  const customer = await prisma.customer.create({ data: { firstName: 'Bench', lastName: 'Outbox', email: 'outbox@bench.invalid', phone: '-' } })
+  const start = new Date(Date.now() + 7 * 86400000)
+  await prisma.booking.createMany({
+    data: Array.from({ length: EVENTS }, (_, i) => ({
+      id: `bench-${i}`, reference: REF_PREFIX + i, agencyId: agency.id, customerId: customer.id,
+      startDate: start, endDate: start, startTime: '10:00', endTime: '18:00', totalPrice: 50, depositAmount: 100
+    }))
+  })
+}
+
+// Handlers de la forme de ceux d'index.ts, sans le rendu HTML
+const registerHandlers = (worker: OutboxWorker, mailer: Mailer) => {
+  worker.register('booking.confirmed', async ({ bookingId }) => {
+    const booking = await prisma.booking.findUnique({ where: { id: bookingId }, include: { customer: true } })
+    if (!booking) return
+    const email = { from: 'bench@bench.invalid', subject: booking.reference, html: '<p>' + booking.reference + '</p>' }
+    await enqueueOutbox(prisma, [
+      { topic: 'email', payload: { ...email, to: booking.customer.email }, dedupeKey: `booking.confirmed:${bookingId}:customer` },
+      { topic: 'email', payload: { ...email, to: 'admin@bench.invalid' }, dedupeKey: `booking.confirmed:${bookingId}:admin` }
+    ])
+  })
+  worker.register('email', async (message, { id }) => { await mailer.send(message, id) })
+}
+
+const main = async () => {
+  await cleanup()
+  await seed()
+  const ids = Array.from({ length: EVENTS }, (_, i) => `bench-${i}`)
+
+  // 1. Ancien webhook : mise à jour, relecture complète, puis les deux emails attendus avant la réponse
+  const inlineStub = createStubMailer({ latencyMs: MAIL_LATENCY_MS })
+  const inlineLatencies: number[] = []
+  await runPool(ids, DELIVERY_CONCURRENCY, async bookingId => {
+    const t0 = performance.now()
+    await prisma.booking.update({ where: { id: bookingId }, data: { status: 'CONFIRMED' } })
+    const booking = await prisma.booking.findUnique({ where: { id: bookingId }, include: { customer: true, agency: true, items: { include: { vehicle: true } }, fleetVehicle: true } })
+    await inlineStub.mailer.send({ from: 'bench@bench.invalid', to: booking!.customer.email, subject: booking!.reference, html: '' })
+    await inlineStub.mailer.send({ from: 'bench@bench.invalid', to: 'admin@bench.invalid', subject: booking!.reference, html: '' })
+    inlineLatencies.push(performance.now() - t0)
+  })
+  await prisma.booking.updateMany({ where: { reference: { startsWith: REF_PREFIX } }, data: { status: 'PENDING' } })
+
+  // 2. Nouveau webhook : transaction événement + réservation + outbox
+  const outboxLatencies: number[] = []
+  await runPool(ids, DELIVERY_CONCURRENCY, async bookingId => {
+    const t0 = performance.now()
+    await acceptStripeEvent(prisma, event(bookingId, 'a'))
+    outboxLatencies.push(performance.now() - t0)
+  })
+
+  // 3. Rejeu Stripe des mêmes événements (mêmes ids) : rien de nouveau en base
+  const replays = await Promise.all(ids.map(bookingId => acceptStripeEvent(prisma, event(bookingId, 'a'))))
+
+  // 4. Vidage de l'outbox : worker séquentiel vs concurrent, Resend simulé avec 3 % d'erreurs temporaires
+  const stub = createStubMailer({ latencyMs: MAIL_LATENCY_MS, failureRate: 0.03 })
+  const worker = new OutboxWorker(prisma, { concurrency: WORKER_CONCURRENCY, batchSize: WORKER_CONCURRENCY * 4, baseDelayMs: 10, topics: ['booking.confirmed', 'email'] })
+  registerHandlers(worker, stub.mailer)
+  let t0 = performance.now()
+  let drained = 0
+  while (true) {
+    drained += await worker.drain()
+    const left = await prisma.outboxMessage.count({ where: { dedupeKey: { startsWith: 'booking.confirmed:bench-' }, status: { in: ['PENDING', 'PROCESSING'] } } })
+    if (!left) break
+    await new Promise(resolve => setTimeout(resolve, 20)) // backoff des messages en échec
+  }
+  const drainMs = performance.now() - t0
+
+  // 5. Instance arrêtée en plein lot : ses messages sont repris à l'expiration du bail, traités une seule fois
+  await enqueueOutbox(prisma, ids.slice(0, 20).map(id => ({ topic: 'bench.crash', payload: { id } })))
+  const crashed = new OutboxWorker(prisma, { leaseMs: 200, batchSize: 20, topics: ['bench.crash'] })
+  crashed.register('bench.crash', () => new Promise(() => {})) // ne rend jamais la main
+  crashed.runOnce()
+  await new Promise(resolve => setTimeout(resolve, 400))
+  const handled: string[] = []
+  const survivor = new OutboxWorker(prisma, { batchSize: 50, topics: ['bench.crash'] })
+  survivor.register('bench.crash', async ({ id }) => { handled.push(id) })
+  await survivor.drain()
+
+  const counts = await prisma.outboxMessage.groupBy({ by: ['status'], where: { dedupeKey: { startsWith: 'booking.confirmed:bench-' } }, _count: { _all: true } })
+  const byStatus = Object.fromEntries(counts.map(c => [c.status, c._count._all]))
+  const stats = await worker.stats()
+
+  console.log(`Events: ${EVENTS}, concurrent deliveries: ${DELIVERY_CONCURRENCY}, stub Resend latency: ${MAIL_LATENCY_MS} ms`)
+  console.log(`Webhook inline emails: ${summary(inlineLatencies)}`)
+  console.log(`Webhook + outbox:      ${summary(outboxLatencies)}`)
+  console.log(`Drain: ${drained} messages in ${drainMs.toFixed(0)} ms (${(drained / drainMs * 1000).toFixed(1)} msg/s, concurrency ${WORKER_CONCURRENCY}, ${stats.worker.retried} retried)`)
+  console.log(`Outbox status: ${JSON.stringify(byStatus)}, emails delivered: ${stub.delivered.size}`)
+
+  const errors: string[] = []
+  if (replays.some(r => !r.duplicate)) errors.push('replayed event accepted twice')
+  if (stub.delivered.size !== EVENTS * 2) errors.push(`expected ${EVENTS * 2} emails, delivered ${stub.delivered.size}`)
+  if (byStatus.DEAD) errors.push(`${byStatus.DEAD} dead messages`)
+  if (handled.length !== 20 || new Set(handled).size !== 20) errors.push(`crash recovery handled ${handled.length}/20`)
+  console.log(errors.length ? 'ERRORS: ' + errors.join(', ') : 'Idempotent replay, single delivery and lease recovery OK')
+
+  await cleanup()
+  await prisma.$disconnect()
+  if (errors.length) process.exit(1)
+}
+
+main().catch(async e => {
+  console.error(e)
+  await cleanup().catch(() => {})
+  process.exit(1)
+})
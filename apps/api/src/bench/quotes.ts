@@ -0,0 +1,73 @@
+// Benchmark du moteur de devis (services/quoteEngine), hors ligne : grilles générées, pas de base
+// Usage : npx ts-node src/bench/quotes.ts [vehicles] [options] [quotes]
+// Compare le calcul du widget (un véhicule à la fois, lecture des colonnes day1..day14 par nom de clé)
+// au devis vectorisé mémorisé, et vérifie que les deux donnent les mêmes prix (extraDayPrice renseigné sur une
+// grille sur deux : le widget l'ignore, day14 / 14 au-delà de 14 jours).
+import { performance } from 'perf_hooks'
+import { QuoteEngine } from '../services/quoteEngine'
+
+const VEHICLES = parseInt(process.argv[2] || '200', 10)
+const OPTIONS = parseInt(process.argv[3] || '40', 10)
+const QUOTES = parseInt(process.argv[4] || '20000', 10)
+
+const grid = (base: number) => Object.fromEntries(Array.from({ length: 14 }, (_, d) => ['day' + (d + 1), Math.round(base * (d + 1) * (1 - d * 0.02))]))
+const pricing = Array.from({ length: VEHICLES }, (_, i) => ({
+  id: 'p' + i, vehicleId: 'v' + i, ...grid(15 + (i % 30)), extraDayPrice: i % 2 ? 12 + (i % 7) : 0, extraHour1: 5, extraHour2: 5, extraHour3: 4, extraHour4: 4
+}))
+const options = Array.from({ length: OPTIONS }, (_, i) => ({ id: 'o' + i, ...grid(2 + (i % 5)) }))
+
+// Ancien calcul du widget (getVehiclePrice / getOptionPrice)
+const widgetVehiclePrice = (p: any, days: number, extraHours: number) => {
+  let total = Number(p[`day${Math.min(days, 14)}`]) || 0
+  if (days > 14) total += Math.floor((days - 14) * (Number(p.day14) || 0) / 14)
+  for (let i = 1; i <= Math.min(extraHours, 4); i++) total += Number(p[`extraHour${i}`]) || 0
+  return total
+}
+const widgetOptionPrice = (o: any, days: number) => {
+  let total = Number(o[`day${Math.min(days, 14)}`]) || 0
+  if (days > 14) total += Math.floor((days - 14) * (Number(o.day14) || 0) / 14)
+  return total
+}
+
+// Durées demandées : surtout des locations courtes, comme le widget
+const durations = Array.from({ length: QUOTES }, (_, i) => ({ days: 1 + ((i * 7919) % 21), extraHours: (i * 31) % 5 }))
+
+const main = async () => {
+  let t0 = performance.now()
+  let checksum = 0
+  for (const { days, extraHours } of durations) {
+    for (const p of pricing) checksum += widgetVehiclePrice(p, days, extraHours)
+    for (const o of options) checksum += widgetOptionPrice(o, days)
+  }
+  const scalarMs = performance.now() - t0
+
+  const engine = new QuoteEngine(async () => ({ pricing, options }), 60000)
+  t0 = performance.now()
+  let engineChecksum = 0
+  for (const { days, extraHours } of durations) {
+    const quote = await engine.quote(days, extraHours)
+    for (const id in quote.vehicles) engineChecksum += quote.vehicles[id]
+    for (const id in quote.options) engineChecksum += quote.options[id]
+  }
+  const engineMs = performance.now() - t0
+
+  // Sans mémorisation : tarifs modifiés avant chaque devis (pire cas, un rechargement à chaque fois)
+  const cold = new QuoteEngine(async () => ({ pricing, options }), 60000)
+  t0 = performance.now()
+  const coldQuotes = Math.min(QUOTES, 2000)
+  for (let i = 0; i < coldQuotes; i++) {
+    cold.invalidate()
+    await cold.quote(durations[i].days, durations[i].extraHours)
+  }
+  const coldMs = performance.now() - t0
+
+  console.log(`${QUOTES} quotes x (${VEHICLES} vehicles + ${OPTIONS} options)`)
+  console.log(`Widget per-vehicle pricing: ${scalarMs.toFixed(0)} ms (${(scalarMs * 1000 / QUOTES).toFixed(1)} µs/quote)`)
+  console.log(`Quote engine (memoized):    ${engineMs.toFixed(0)} ms (${(engineMs * 1000 / QUOTES).toFixed(1)} µs/quote), ${JSON.stringify(engine.stats())}`)
+  console.log(`Quote engine (cold):        ${(coldMs * 1000 / coldQuotes).toFixed(1)} µs/quote including table rebuild`)
+  const ok = checksum === engineChecksum
+  console.log(ok ? 'Same prices as the widget formula' : `ERROR: checksum ${checksum} vs ${engineChecksum}`)
+  if (!ok) process.exit(1)
+}
+
+main()
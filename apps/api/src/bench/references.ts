@@ -0,0 +1,91 @@
+// Test de concurrence des références de réservation (services/referenceAllocator)
+// Usage : npx ts-node src/bench/references.ts [bookings] [instances] [blockSize] [--db]
+// Sans --db : compteur en mémoire partagé par plusieurs allocateurs (une instance API chacun), latence simulée.
+// Avec --db (DATABASE_URL, base de test) : un PrismaClient par instance, réservations réellement insérées
+// (contrainte @unique sur reference), comparées à l'ancien findFirst + incrément. Données BENCH-REF supprimées à la fin.
+import { PrismaClient } from '@prisma/client'
+import { performance } from 'perf_hooks'
+import { ReferenceAllocator, createMemoryCounterStore, formatBookingReference, prismaCounterStore } from '../services/referenceAllocator'
+
+const BOOKINGS = parseInt(process.argv[2] || '500', 10)
+const INSTANCES = parseInt(process.argv[3] || '4', 10)
+const BLOCK_SIZE = parseInt(process.argv[4] || '10', 10)
+const USE_DB = process.argv.includes('--db')
+const PREFIX = 'BR-'
+const KEY = 'booking:' + PREFIX
+
+const duplicates = (references: string[]) => references.length - new Set(references).size
+
+// Toutes les réservations partent en même temps, réparties entre les instances
+const fire = async (allocators: ReferenceAllocator[], create?: (reference: string) => Promise<void>) => {
+  const t0 = performance.now()
+  const references = await Promise.all(Array.from({ length: BOOKINGS }, async (_, i) => {
+    const reference = formatBookingReference(PREFIX, await allocators[i % allocators.length].next(KEY))
+    if (create) await create(reference)
+    return reference
+  }))
+  return { references, ms: performance.now() - t0 }
+}
+
+const memoryRun = async () => {
+  const { store, calls } = createMemoryCounterStore(2)
+  const allocators = Array.from({ length: INSTANCES }, () => new ReferenceAllocator(store, BLOCK_SIZE, async () => 41))
+  const { references, ms } = await fire(allocators)
+  const numbers = references.map(r => parseInt(r.slice(PREFIX.length), 10))
+  console.log(`Memory store: ${BOOKINGS} references from ${INSTANCES} instances in ${ms.toFixed(0)} ms, ${calls.reserve} counter round trips (block ${BLOCK_SIZE})`)
+  console.log(`Range ${Math.min(...numbers)}..${Math.max(...numbers)}, duplicates: ${duplicates(references)}`)
+  return duplicates(references) === 0 && Math.min(...numbers) === 42
+}
+
+const dbRun = async () => {
+  const clients = Array.from({ length: INSTANCES }, () => new PrismaClient())
+  const prisma = clients[0]
+  const cleanup = async () => {
+    await prisma.booking.deleteMany({ where: { reference: { startsWith: PREFIX } } })
+    await prisma.referenceCounter.deleteMany({ where: { key: KEY } })
+    await prisma.customer.deleteMany({ where: { email: 'references@bench.invalid' } })
+    await prisma.agency.deleteMany({ where: { code: 'BENCH-REF' } })
+  }
+  await cleanup()
+  const agency = await prisma.agency.create({ data: { code: 'BENCH-REF', name: { es: 'Bench' }, address: '-', city: '-', postalCode: '-', phone: '-', email: 'agency@bench.invalid' } })
+  const customer = await prisma.customer.create({ data: { firstName: 'Bench', lastName: 'References', email: 'references@bench.invalid', phone: '-' } })
+  const day = new Date(Date.now() + 30 * 86400000)
+  const insert = (client: PrismaClient, reference: string) => client.booking.create({
+    data: { reference, agencyId: agency.id, customerId: customer.id, startDate: day, endDate: day, startTime: '10:00', endTime: '18:00', totalPrice: 0, depositAmount: 0 }
+  })
+
+  // Ancien générateur : lecture du plus grand numéro puis incrément, en concurrence
+  let collisions = 0
+  let t0 = performance.now()
+  await Promise.all(Array.from({ length: BOOKINGS }, async (_, i) => {
+    const client = clients[i % clients.length]
+    const last = await client.booking.findFirst({ where: { reference: { startsWith: PREFIX } }, orderBy: { reference: 'desc' } })
+    const next = last ? parseInt(last.reference.slice(PREFIX.length), 10) + 1 : 1
+    await insert(client, formatBookingReference(PREFIX, next)).catch(e => { if (e.code === 'P2002') collisions++; else throw e })
+  }))
+  const legacyMs = performance.now() - t0
+  await prisma.booking.deleteMany({ where: { reference: { startsWith: PREFIX } } })
+
+  const allocators = clients.map(client => new ReferenceAllocator(prismaCounterStore(client), BLOCK_SIZE, async () => 0))
+  let failures = 0
+  t0 = performance.now()
+  const { references, ms } = await fire(allocators, async reference => {
+    await insert(clients[0], reference).catch(() => { failures++ })
+  })
+  const created = await prisma.booking.count({ where: { reference: { startsWith: PREFIX } } })
+  const counter = await prisma.referenceCounter.findUnique({ where: { key: KEY } })
+
+  console.log(`Legacy findFirst + increment: ${legacyMs.toFixed(0)} ms, ${collisions}/${BOOKINGS} bookings rejected on duplicate reference`)
+  console.log(`Block allocator: ${ms.toFixed(0)} ms, ${created}/${BOOKINGS} bookings created, ${failures} failures, counter at ${counter?.value} (block ${BLOCK_SIZE} x ${INSTANCES} instances)`)
+  await cleanup()
+  await Promise.all(clients.map(c => c.$disconnect()))
+  return failures === 0 && created === BOOKINGS && duplicates(references) === 0
+}
+
+const main = async () => {
+  const ok = USE_DB ? await dbRun() : await memoryRun()
+  console.log(ok ? 'No duplicate references' : 'ERRORS: duplicate or missing references')
+  if (!ok) process.exit(1)
+}
+
+main()
@@ -0,0 +1,104 @@
+// Rapports de direction : agrégats ReportDaily (services/reportRollups) contre l'ancien export des contrats
+// (tous les contrats de la période avec paiements, extensions et déductions, agrégés côté client comme le tableur).
+// Nécessite DATABASE_URL (base de test avec contrats) et le schéma à jour (prisma db push).
+// Usage : npx ts-node src/bench/reports.ts [from] [to] [runs]   (saison : AAAA-MM-JJ, 120 derniers jours par défaut)
+// Mesure aussi la mise à jour incrémentale : une déduction ajoutée puis supprimée doit apparaître puis disparaître.
+import { PrismaClient } from '@prisma/client'
+import { performance } from 'perf_hooks'
+import { dayNumber, formatDay } from '../services/agencyCalendar'
+import { ReportFilter, ReportRollups, trackReportWrites } from '../services/reportRollups'
+
+const DAY = 24 * 60 * 60 * 1000
+const TODAY = Math.floor(Date.now() / DAY)
+const TO = Math.min(process.argv[3] ? dayNumber(process.argv[3]) : TODAY, TODAY)
+const FROM = process.argv[2] ? dayNumber(process.argv[2]) : TO - 119
+const RUNS = parseInt(process.argv[4] || '7', 10)
+
+const prisma = new PrismaClient()
+const rollups = new ReportRollups(prisma)
+trackReportWrites(prisma, rollups)
+
+const median = async <T>(fn: () => Promise<T>) => {
+  const times: number[] = []
+  let result!: T
+  for (let i = 0; i < RUNS; i++) {
+    const t0 = performance.now()
+    result = await fn()
+    times.push(performance.now() - t0)
+  }
+  return { ms: times.sort((a, b) => a - b)[Math.floor(times.length / 2)], result }
+}
+
+const inSeason = (date: Date | null) => !!date && date.getTime() >= FROM * DAY && date.getTime() < (TO + 1) * DAY
+
+// Ancienne méthode : export complet puis agrégation (chiffre d'affaires et jours loués de la saison)
+const fromContracts = async () => {
+  const contracts = await prisma.rentalContract.findMany({
+    where: { currentStartDate: { lt: new Date((TO + 1) * DAY) }, currentEndDate: { gte: new Date(FROM * DAY) } },
+    include: { payments: true, extensions: true, deductions: true, fleetVehicle: { select: { vehicleId: true } } }
+  })
+  let rows = contracts.length
+  let revenue = 0
+  let rentedDays = 0
+  for (const contract of contracts) {
+    rows += contract.payments.length + contract.extensions.length + contract.deductions.length
+    for (const p of contract.payments) if (p.type === 'RENTAL' && (p.status === 'COMPLETED' || p.status === 'REFUNDED') && inSeason(p.completedAt)) revenue += Number(p.amount)
+    for (const e of contract.extensions) if (e.paymentStatus === 'PAID' && inSeason(e.paidAt)) revenue += Number(e.paidAmount ?? e.totalAmount)
+    if (['ACTIVE', 'COMPLETED', 'DISPUTED'].includes(contract.status)) {
+      const start = Math.floor(contract.currentStartDate.getTime() / DAY)
+      const end = Math.max(Math.floor(contract.currentEndDate.getTime() / DAY) - 1, start)
+      rentedDays += Math.max(0, Math.min(end, TO) - Math.max(start, FROM) + 1)
+    }
+  }
+  return { rows, revenue, rentedDays }
+}
+
+const main = async () => {
+  console.log(`Season ${formatDay(FROM)} -> ${formatDay(TO)}, ${RUNS} runs`)
+  const rebuilt = await rollups.rebuild(FROM, TO)
+  console.log(`Rollups rebuilt: ${rebuilt.keys} agency x model keys, ${rebuilt.rows} rows in ${rebuilt.durationMs} ms`)
+
+  const filter: ReportFilter = { from: formatDay(FROM), to: formatDay(TO), interval: 'month', groupBy: ['agency', 'vehicle'] }
+  const [{ count: rollupRows }] = await prisma.$queryRaw<{ count: number }[]>`
+    SELECT count(*)::int AS "count" FROM "ReportDaily" WHERE "day" BETWEEN ${filter.from}::date AND ${filter.to}::date`
+  const rollup = await median(() => rollups.query(filter))
+  const totals = await rollups.query({ ...filter, interval: 'total', groupBy: [] })
+  const rollupRevenue = (totals[0]?.rentalRevenue ?? 0) + (totals[0]?.extensionRevenue ?? 0)
+  const rollupRented = totals[0]?.rentedDays ?? 0
+  const legacy = await median(fromContracts)
+
+  console.log(`\n/api/reports/summary?interval=month&groupBy=agency,vehicle  median ${rollup.ms.toFixed(1)} ms, ${rollupRows} daily rows read, ${rollup.result.length} rows returned`)
+  console.log(`contracts export + aggregation                         median ${legacy.ms.toFixed(1)} ms, ${legacy.result.rows} rows read`)
+  console.log(`speedup x${(legacy.ms / rollup.ms).toFixed(1)}`)
+  // Le CA des agrégats compte aussi les paiements de la saison sur des contrats hors saison (acomptes) : écart possible
+  console.log(`revenue ${rollupRevenue.toFixed(2)} vs ${legacy.result.revenue.toFixed(2)}, rented days ${rollupRented} vs ${legacy.result.rentedDays}`)
+  let failures = rollupRented !== legacy.result.rentedDays ? 1 : 0
+
+  // Mise à jour incrémentale par le middleware : déduction sur un contrat de la saison, puis suppression
+  const contract = await prisma.rentalContract.findFirst({ where: { currentStartDate: { gte: new Date(FROM * DAY), lt: new Date(TODAY * DAY) } } })
+  if (contract) {
+    const read = async () => (await rollups.query({ ...filter, interval: 'total', groupBy: [], to: formatDay(TODAY) }))[0]?.deductions ?? 0
+    const before = await read()
+    const deduction = await prisma.contractDeduction.create({
+      data: { contractId: contract.id, type: 'OTHER', description: 'bench', unitPrice: 12.34, totalPrice: 12.34 }
+    })
+    let t0 = performance.now()
+    await rollups.flush()
+    const addMs = performance.now() - t0
+    const added = await read()
+    await prisma.contractDeduction.delete({ where: { id: deduction.id } })
+    t0 = performance.now()
+    await rollups.flush()
+    const removeMs = performance.now() - t0
+    const removed = await read()
+    console.log(`\nIncremental: deduction +12.34 -> ${(added - before).toFixed(2)} (flush ${addMs.toFixed(0)} ms), removed -> ${(removed - before).toFixed(2)} (flush ${removeMs.toFixed(0)} ms)`)
+    if (Math.abs(added - before - 12.34) > 0.001 || Math.abs(removed - before) > 0.001) failures++
+  }
+
+  console.log(`\n${JSON.stringify(await rollups.stats())}`)
+  await prisma.$disconnect()
+  console.log(failures ? 'ERRORS: rollups differ from source tables' : 'Rollups match source tables')
+  if (failures) process.exit(1)
+}
+
+main()
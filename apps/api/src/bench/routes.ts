@@ -0,0 +1,67 @@
+// Ordre des routes : une route statique enregistrée après une route à paramètre du même préfixe n'est jamais
+// atteinte (GET /api/fleet/overlaps servi par /api/fleet/:id avec id = 'overlaps').
+// 1. chaque GET / PUT / POST / DELETE sans paramètre doit être la première route qui accepte son propre chemin
+// 2. GET /api/fleet/overlaps appelé sur les routeurs montés comme dans index.ts : rapport { enforced, overlaps }
+// Nécessite DATABASE_URL (base de test, lecture seule) pour l'appel.
+// Usage : npx ts-node src/bench/routes.ts
+import express from 'express'
+import { AddressInfo } from 'net'
+import { prisma } from '../db'
+
+// Même ordre que index.ts
+const ROUTERS = ['catalog', 'bookings', 'payments', 'fleet', 'contracts', 'admin', 'notifications', 'media', 'portal', 'reports']
+
+interface RouteLayer {
+  path: string
+  method: string
+  match: (path: string) => boolean
+}
+
+const routeLayers = (routers: express.Router[]) => {
+  const layers: RouteLayer[] = []
+  for (const router of routers) {
+    for (const layer of (router as any).stack) {
+      if (!layer.route) continue
+      for (const method of Object.keys(layer.route.methods)) {
+        layers.push({ path: layer.route.path, method, match: (path: string) => layer.match(path) })
+      }
+    }
+  }
+  return layers
+}
+
+const main = async () => {
+  const routers: express.Router[] = ROUTERS.map(name => require(`../routes/${name}`).default)
+  const layers = routeLayers(routers)
+  let failures = 0
+
+  for (const [i, route] of layers.entries()) {
+    if (typeof route.path !== 'string' || route.path.includes(':')) continue
+    const first = layers.findIndex(other => other.method === route.method && other.match(route.path))
+    if (first !== i) {
+      failures++
+      console.log(`  ${route.method.toUpperCase()} ${route.path} shadowed by ${layers[first].path}`)
+    }
+  }
+  console.log(`${layers.length} routes, ${failures} static routes shadowed by a parameterized route`)
+
+  const app = express()
+  for (const router of routers) app.use(router)
+  const server = app.listen(0)
+  try {
+    const { port } = server.address() as AddressInfo
+    const response = await fetch(`http://127.0.0.1:${port}/api/fleet/overlaps`)
+    const body: any = await response.json()
+    const ok = response.ok && typeof body?.enforced === 'boolean' && Array.isArray(body?.overlaps)
+    if (!ok) failures++
+    console.log(`GET /api/fleet/overlaps -> ${response.status} ${JSON.stringify(body).slice(0, 120)}`)
+  } finally {
+    server.close()
+    await prisma.$disconnect()
+  }
+
+  console.log(failures ? 'ERRORS: unreachable routes' : 'All static routes reachable')
+  process.exit(failures ? 1 : 0)
+}
+
+main()
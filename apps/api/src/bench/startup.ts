@@ -0,0 +1,71 @@
+// Démarrage à froid de l'API : délai entre le lancement du process et la première réponse (time-to-first-request),
+// comparé à STARTUP_TARGET_MS, puis détail des phases renvoyé par GET /api/startup (services/startup).
+// Usage : npx ts-node src/bench/startup.ts [runs] [path]   (DATABASE_URL : base de test ; dist/index.js si compilé)
+import { spawn } from 'child_process'
+import { existsSync } from 'fs'
+import path from 'path'
+import { performance } from 'perf_hooks'
+
+const RUNS = parseInt(process.argv[2] || '5', 10)
+const PROBE = process.argv[3] || '/api/health'
+const TARGET_MS = parseInt(process.env.STARTUP_TARGET_MS || '1500', 10)
+const TIMEOUT_MS = 60000
+
+const root = path.join(__dirname, '..', '..')
+const compiled = path.join(root, 'dist', 'index.js')
+// Build de production si présent (ce qui tourne en déploiement), sinon les sources via ts-node
+const command = existsSync(compiled)
+  ? { bin: process.execPath, args: [compiled] }
+  : { bin: process.execPath, args: ['-r', 'ts-node/register/transpile-only', path.join(root, 'src', 'index.ts')] }
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms))
+
+const run = async (port: number) => {
+  const t0 = performance.now()
+  const child = spawn(command.bin, command.args, { cwd: root, env: { ...process.env, PORT: String(port) }, stdio: ['ignore', 'ignore', 'inherit'] })
+  try {
+    // Sondage serré : la première réponse obtenue mesure le délai vu par le répartiteur de charge
+    while (performance.now() - t0 < TIMEOUT_MS) {
+      if (child.exitCode !== null) throw new Error(`API exited with code ${child.exitCode}`)
+      const ok = await fetch(`http://127.0.0.1:${port}${PROBE}`).then(r => r.ok, () => false)
+      if (ok) {
+        const ttfr = performance.now() - t0
+        const report = await fetch(`http://127.0.0.1:${port}/api/startup`).then(r => r.json())
+        return { ttfr, report }
+      }
+      await sleep(5)
+    }
+    throw new Error(`No response on ${PROBE} after ${TIMEOUT_MS} ms`)
+  } finally {
+    child.kill()
+    await new Promise(resolve => child.exitCode !== null ? resolve(null) : child.once('exit', resolve))
+  }
+}
+
+const main = async () => {
+  console.log(`${path.relative(root, command.args[command.args.length - 1])}, probe ${PROBE}, ${RUNS} runs`)
+  const results: Awaited<ReturnType<typeof run>>[] = []
+  for (let i = 0; i < RUNS; i++) {
+    const result = await run(20000 + Math.floor(Math.random() * 20000))
+    results.push(result)
+    console.log(`run ${i + 1}: first request after ${result.ttfr.toFixed(0)} ms (listening at ${result.report.listeningMs} ms in-process)`)
+  }
+
+  const median = [...results].sort((a, b) => a.ttfr - b.ttfr)[Math.floor(results.length / 2)]
+  // Détail de la course médiane : imports des modules de routes, connexion Prisma, chargements différés déjà déclenchés
+  console.log('\nPhases (median run)')
+  for (const phase of median.report.phases) {
+    console.log(`${phase.kind.padEnd(7)} ${phase.name.padEnd(24)} start ${String(phase.startMs).padStart(7)} ms  ${String(phase.durationMs).padStart(7)} ms`)
+  }
+  console.log(`\nnode boot ${median.report.bootMs} ms, listening ${median.report.listeningMs} ms`)
+  console.log(`time-to-first-request median ${median.ttfr.toFixed(0)} ms, target ${TARGET_MS} ms`)
+  if (median.ttfr > TARGET_MS) {
+    console.log('OVER TARGET')
+    process.exit(1)
+  }
+}
+
+main().catch(error => {
+  console.error(error)
+  process.exit(1)
+})
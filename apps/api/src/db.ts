@@ -0,0 +1,65 @@
+import { PrismaClient } from '@prisma/client';
+import { getAvailabilityIndex, trackAvailabilityWrites } from './services/availabilityIndex';
+import { getChangeFeed, trackChanges } from './services/changeFeed';
+import { getPdfCache, trackPdfInvalidation } from './services/pdfCache';
+import { trackCustomerSearch } from './services/customerSearch';
+import { getCatalogCache, trackCatalogInvalidation } from './services/catalogCache';
+import { getAgencyCalendarCache, trackCalendarInvalidation } from './services/agencyCalendar';
+import { getQuoteEngine, trackTariffChanges } from './services/quoteEngine';
+import { trackInlineMedia } from './services/media';
+import { getQueryMetrics, trackQueries } from './services/queryMetrics';
+import { getReportRollups, trackReportWrites } from './services/reportRollups';
+import { trackCustomerBookings } from './services/customerBookings';
+import { getOutboxWorker } from './services/outbox';
+
+// Client Prisma unique du processus API (index.ts, routes, services) : un seul pool de connexions.
+// Même principe que packages/database/src/index.ts (singleton sur globalThis), avec en plus :
+// - taille du pool : DATABASE_POOL_SIZE (connection_limit, 10 par défaut), DATABASE_POOL_TIMEOUT en secondes
+//   (paramètres déjà présents dans DATABASE_URL prioritaires)
+// - mesures par modèle / opération et journal des requêtes lentes (services/queryMetrics)
+// - middlewares d'invalidation des index et caches, des agrégats de reporting, des résumés
+//   de réservations du portail client et de sortie des images base64,
+//   enregistrés une seule fois
+
+const DEFAULT_POOL_SIZE = 10;
+
+export function pooledDatabaseUrl(url: string | undefined, poolSize?: string, poolTimeout?: string) {
+  if (!url) return url;
+  try {
+    const parsed = new URL(url);
+    if (!parsed.searchParams.has('connection_limit')) {
+      parsed.searchParams.set('connection_limit', String(parseInt(poolSize || '', 10) || DEFAULT_POOL_SIZE));
+    }
+    if (poolTimeout && !parsed.searchParams.has('pool_timeout')) parsed.searchParams.set('pool_timeout', poolTimeout);
+    return parsed.toString();
+  } catch {
+    return url;
+  }
+}
+
+function createClient() {
+  const url = pooledDatabaseUrl(process.env.DATABASE_URL, process.env.DATABASE_POOL_SIZE, process.env.DATABASE_POOL_TIMEOUT);
+  const client = new PrismaClient(url ? { datasources: { db: { url } } } : undefined);
+  trackQueries(client, getQueryMetrics());
+  trackAvailabilityWrites(client, getAvailabilityIndex(client));
+  trackChanges(client, getChangeFeed());
+  trackPdfInvalidation(client, getPdfCache());
+  trackCatalogInvalidation(client, getCatalogCache());
+  trackCalendarInvalidation(client, getAgencyCalendarCache(client));
+  trackTariffChanges(client, getQuoteEngine(client));
+  trackReportWrites(client, getReportRollups(client));
+  trackCustomerBookings(client, getOutboxWorker(client));
+  trackCustomerSearch(client);
+  trackInlineMedia(client);
+  return client;
+}
+
+const globalForPrisma = globalThis as unknown as {
+  prisma: PrismaClient | undefined;
+};
+
+export const prisma = globalForPrisma.prisma ?? createClient();
+
+if (process.env.NODE_ENV !== 'production') {
+  globalForPrisma.prisma = prisma;
+}
@@ -1,4 +1,5 @@
 import PDFDocument from 'pdfkit';
+import { decodeDataUrl, mediaHashFromUrl, readMedia } from './services/mediaStore';
 
 const LOGOS: Record<string, string> = {
   'VOLTRIDE': 'https://res.cloudinary.com/dis5pcnfr/image/upload/v1769278425/IMG-20260111-WA0001_1_-removebg-preview_zzajxa.png',
@@ -8,6 +9,7 @@ const LOGOS: Record<string, string> = {
 async function fetchImageBuffer(url: string): Promise<Buffer | null> {
   try {
     const response = await fetch(url);
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
     const arrayBuffer = await response.arrayBuffer();
     return Buffer.from(arrayBuffer);
   } catch (e) {
@@ -16,6 +18,61 @@ async function fetchImageBuffer(url: string): Promise<Buffer | null> {
   }
 }
 
+// Images du contrat : lues directement dans le stockage média (/api/media/<hash>), sans repasser par HTTP ;
+// les anciennes images base64 sont décodées, les autres URLs (Cloudinary) téléchargées
+async function loadImage(ref: string | null | undefined): Promise<Buffer | null> {
+  if (!ref) return null;
+  if (ref.startsWith('data:')) return decodeDataUrl(ref)?.buffer ?? null;
+  const hash = mediaHashFromUrl(ref);
+  if (hash) {
+    try {
+      return await readMedia(hash);
+    } catch (e) {
+      console.error('Error reading media:', e);
+      return null;
+    }
+  }
+  return fetchImageBuffer(ref);
+}
+
+// Avec onChunk, les morceaux du PDF sont transmis au fil du rendu et la promesse se résout avec un Buffer vide
+export type PdfChunkHandler = (chunk: Buffer) => void;
+
+// Logos gardés en mémoire : téléchargés une fois (au démarrage via preloadPdfAssets), pas à chaque rendu
+const logoCache = new Map<string, Promise<Buffer | null>>();
+// Rendus faits sans leur logo (échec réseau) : un tel PDF est servi mais pas mis en cache (voir pdfWorker)
+let missingLogos = 0;
+
+export const missingLogoCount = () => missingLogos;
+
+function getLogo(brand: string): Promise<Buffer | null> {
+  const url = LOGOS[brand] || LOGOS['VOLTRIDE'];
+  let logo = logoCache.get(url);
+  if (!logo) {
+    logo = fetchImageBuffer(url).then(buffer => {
+      // Échec réseau : on retentera au prochain rendu
+      if (!buffer) logoCache.delete(url);
+      return buffer;
+    });
+    logoCache.set(url, logo);
+  }
+  return logo.then(buffer => {
+    if (!buffer) missingLogos++;
+    return buffer;
+  });
+}
+
+// Précharge les logos et les polices standard (fichiers AFM de pdfkit) avant la première requête
+export async function preloadPdfAssets() {
+  const start = Date.now();
+  await Promise.all(Object.keys(LOGOS).map(getLogo));
+  const doc = new PDFDocument({ size: 'A4' });
+  doc.font('Helvetica').text('').font('Helvetica-Bold').text('');
+  doc.on('data', () => {});
+  doc.end();
+  console.log(`PDF assets preloaded in ${Date.now() - start} ms`);
+}
+
 function formatDate(date: Date | string, lang: string = 'fr'): string {
   const d = new Date(date);
   const options: Intl.DateTimeFormatOptions = { day: '2-digit', month: '2-digit', year: 'numeric' };
@@ -120,7 +177,7 @@ const translations: Record<string, Record<string, string>> = {
   }
 };
 
-export async function generateContractPDF(contract: any, brandSettings: any, clientLang: string = 'fr'): Promise<Buffer> {
+export async function generateContractPDF(contract: any, brandSettings: any, clientLang: string = 'fr', onChunk?: PdfChunkHandler): Promise<Buffer> {
   return new Promise(async (resolve, reject) => {
     try {
       const contractLang = 'es';
@@ -129,25 +186,20 @@ export async function generateContractPDF(contract: any, brandSettings: any, cli
       const doc = new PDFDocument({ size: 'A4', margin: 40, bufferPages: false });
       const chunks: Buffer[] = [];
       
-      doc.on('data', (chunk: Buffer) => chunks.push(chunk));
+      doc.on('data', (chunk: Buffer) => onChunk ? onChunk(chunk) : chunks.push(chunk));
       doc.on('end', () => resolve(Buffer.concat(chunks)));
       doc.on('error', reject);
 
       const brand = contract.fleetVehicle?.vehicle?.category?.brand || 'VOLTRIDE';
-      const logoUrl = LOGOS[brand] || LOGOS['VOLTRIDE'];
-      const logoBuffer = await fetchImageBuffer(logoUrl);
+      const [logoBuffer, signatureBuffer] = await Promise.all([getLogo(brand), loadImage(contract.customerSignature)]);
 
       // Helper: draw signature block
       const drawSignature = (yPos: number) => {
         doc.fontSize(10).font('Helvetica-Bold').text(t.signature, 40, yPos);
         doc.rect(40, yPos + 15, 200, 60).stroke();
-        if (contract.customerSignature) {
+        if (signatureBuffer) {
           try {
-            const sigData = contract.customerSignature.split(',')[1];
-            if (sigData) {
-              const sigBuffer = Buffer.from(sigData, 'base64');
-              doc.image(sigBuffer, 45, yPos + 20, { width: 190, height: 50 });
-            }
+            doc.image(signatureBuffer, 45, yPos + 20, { width: 190, height: 50 });
           } catch (e) { console.error('Signature error:', e); }
         }
         const signDate = contract.customerSignedAt ? formatDate(contract.customerSignedAt, contractLang) : '_______________';
@@ -268,7 +320,7 @@ export async function generateContractPDF(contract: any, brandSettings: any, cli
       for (const vDoc of vehicleDocs) {
         if (vDoc.fileUrl) {
           try {
-            const docBuffer = await fetchImageBuffer(vDoc.fileUrl);
+            const docBuffer = await loadImage(vDoc.fileUrl);
             if (docBuffer) {
               doc.addPage();
               y = 40;
@@ -305,7 +357,7 @@ export async function generateContractPDF(contract: any, brandSettings: any, cli
         
         for (let pi = 0; pi < checkInPhotos.length; pi++) {
           try {
-            const photoBuffer = await fetchImageBuffer(checkInPhotos[pi].url);
+            const photoBuffer = await loadImage(checkInPhotos[pi].url);
             if (photoBuffer) {
               if (y > 500) { doc.addPage(); y = 40; }
               doc.fontSize(9).font('Helvetica-Bold').text(checkInPhotos[pi].label, 40, y);
@@ -326,20 +378,19 @@ export async function generateContractPDF(contract: any, brandSettings: any, cli
   });
 }
 
-export async function generateInvoicePDF(contract: any, brandSettings: any, lang: string = 'fr'): Promise<Buffer> {
+export async function generateInvoicePDF(contract: any, brandSettings: any, lang: string = 'fr', onChunk?: PdfChunkHandler): Promise<Buffer> {
   return new Promise(async (resolve, reject) => {
     try {
       const t = translations[lang] || translations.fr;
       const doc = new PDFDocument({ size: 'A4', margin: 40 });
       const chunks: Buffer[] = [];
       
-      doc.on('data', (chunk: Buffer) => chunks.push(chunk));
+      doc.on('data', (chunk: Buffer) => onChunk ? onChunk(chunk) : chunks.push(chunk));
       doc.on('end', () => resolve(Buffer.concat(chunks)));
       doc.on('error', reject);
 
       const brand = contract.fleetVehicle?.vehicle?.category?.brand || 'VOLTRIDE';
-      const logoUrl = LOGOS[brand] || LOGOS['VOLTRIDE'];
-      const logoBuffer = await fetchImageBuffer(logoUrl);
+      const logoBuffer = await getLogo(brand);
 
       if (logoBuffer) {
         doc.image(logoBuffer, 40, 30, { width: 120 });
@@ -361,7 +412,8 @@ export async function generateInvoicePDF(contract: any, brandSettings: any, lang
       const invNum = 'FAC-' + contract.contractNumber;
       doc.fontSize(10).font('Helvetica');
       doc.text(t.invoiceNumber + ': ' + invNum, 40, 160);
-      doc.text(t.date + ': ' + formatDate(new Date(), lang), 40, 175);
+      // Date enregistrée (retour du véhicule, sinon création du contrat) : un PDF en cache reste exact
+      doc.text(t.date + ': ' + formatDate(contract.actualEndDate || contract.createdAt, lang), 40, 175);
       doc.text(t.contractNumber + ': ' + contract.contractNumber, 40, 190);
 
       doc.moveTo(40, 210).lineTo(555, 210).stroke();
@@ -481,7 +533,7 @@ export async function generateInvoicePDF(contract: any, brandSettings: any, lang
   });
 }
 
-export async function generateExtensionPDF(extension: any, booking: any, brandSettings: any, lang: string = 'fr'): Promise<Buffer> {
+export async function generateExtensionPDF(extension: any, booking: any, brandSettings: any, lang: string = 'fr', onChunk?: PdfChunkHandler): Promise<Buffer> {
   return new Promise(async (resolve, reject) => {
     try {
       const t = translations[lang] || translations.fr;
@@ -489,13 +541,12 @@ export async function generateExtensionPDF(extension: any, booking: any, brandSe
       const doc = new PDFDocument({ size: 'A4', margin: 40 });
       const chunks: Buffer[] = [];
       
-      doc.on('data', (chunk: Buffer) => chunks.push(chunk));
+      doc.on('data', (chunk: Buffer) => onChunk ? onChunk(chunk) : chunks.push(chunk));
       doc.on('end', () => resolve(Buffer.concat(chunks)));
       doc.on('error', reject);
 
       const brand = booking.agency?.brand || 'VOLTRIDE';
-      const logoUrl = LOGOS[brand] || LOGOS['VOLTRIDE'];
-      const logoBuffer = await fetchImageBuffer(logoUrl);
+      const logoBuffer = await getLogo(brand);
 
       // Header
       if (logoBuffer) {
@@ -643,3 +694,87 @@ export async function generateExtensionPDF(extension: any, booking: any, brandSe
     }
   });
 }
+
+export async function generateMaintenancePDF(fleet: any, onChunk?: PdfChunkHandler): Promise<Buffer> {
+  return new Promise(async (resolve, reject) => {
+    try {
+      const doc = new PDFDocument({ size: 'A4', margin: 40 });
+      const chunks: Buffer[] = [];
+
+      doc.on('data', (chunk: Buffer) => onChunk ? onChunk(chunk) : chunks.push(chunk));
+      doc.on('end', () => resolve(Buffer.concat(chunks)));
+      doc.on('error', reject);
+
+      // Logo
+      const logoBuffer = await getLogo('VOLTRIDE');
+      if (logoBuffer) {
+        doc.image(logoBuffer, 40, 30, { width: 100 });
+      }
+
+      // Header
+      doc.fontSize(18).font('Helvetica-Bold');
+      doc.text('Historial de Mantenimiento', 160, 40, { align: 'right' });
+      doc.fontSize(10).font('Helvetica');
+      doc.text('Fecha: ' + new Date().toLocaleDateString('es-ES'), 160, 65, { align: 'right' });
+      doc.moveTo(40, 90).lineTo(555, 90).stroke();
+
+      // Vehicle info
+      const catName = fleet.vehicle?.category?.name || '';
+      const vehName = fleet.vehicle?.name?.es || fleet.vehicle?.name?.fr || '';
+      doc.fontSize(12).font('Helvetica-Bold');
+      doc.text(fleet.vehicleNumber + ' - ' + vehName, 40, 100);
+      doc.fontSize(9).font('Helvetica');
+      doc.text('Categoría: ' + catName + '  |  Agencia: ' + (fleet.agency?.name || '') + '  |  KM: ' + fleet.currentMileage, 40, 118);
+      doc.text('Intervalo KM: ' + (fleet.maintenanceIntervalKm || '-') + '  |  Intervalo días: ' + (fleet.maintenanceIntervalDays || '-') + '  |  Próx. KM: ' + (fleet.nextMaintenanceMileage || '-'), 40, 132);
+
+      // Table header
+      let y = 160;
+      doc.rect(40, y, 515, 20).fill('#ffaf10');
+      doc.fillColor('white').fontSize(8).font('Helvetica-Bold');
+      doc.text('Fecha', 45, y + 5, { width: 70 });
+      doc.text('Tipo', 115, y + 5, { width: 60 });
+      doc.text('Descripción', 175, y + 5, { width: 200 });
+      doc.text('Estado', 375, y + 5, { width: 60 });
+      doc.text('Prioridad', 435, y + 5, { width: 50 });
+      doc.text('Coste', 490, y + 5, { width: 60 });
+      y += 20;
+
+      // Records
+      doc.fillColor('black').font('Helvetica').fontSize(7);
+      const records: any[] = fleet.maintenanceRecords || [];
+      for (const m of records) {
+        if (y > 760) { doc.addPage(); y = 40; }
+        const bg = m.status === 'SCHEDULED' ? '#fff3cd' : m.status === 'COMPLETED' ? '#d4edda' : '#ffffff';
+        doc.rect(40, y, 515, 18).fill(bg).stroke('#e0e0e0');
+        doc.fillColor('black');
+        const date = m.completedAt || m.scheduledDate || m.createdAt;
+        doc.text(date ? new Date(date).toLocaleDateString('es-ES') : '-', 45, y + 4, { width: 70 });
+        doc.text(m.type || '-', 115, y + 4, { width: 60 });
+        doc.text((m.description || '-').substring(0, 50), 175, y + 4, { width: 200 });
+        doc.text(m.status === 'COMPLETED' ? '✓ Hecho' : m.status === 'SCHEDULED' ? '⏳ Pendiente' : m.status, 375, y + 4, { width: 60 });
+        doc.text(m.priority || '-', 435, y + 4, { width: 50 });
+        doc.text(Number(m.totalCost || 0).toFixed(2) + '€', 490, y + 4, { width: 60 });
+        y += 18;
+      }
+
+      if (records.length === 0) {
+        doc.fontSize(10).text('Sin registros de mantenimiento', 40, y + 10);
+      }
+
+      // Total
+      const total = records.filter(m => m.status === 'COMPLETED').reduce((sum, m) => sum + Number(m.totalCost || 0), 0);
+      y += 10;
+      if (y > 760) { doc.addPage(); y = 40; }
+      doc.fontSize(10).font('Helvetica-Bold');
+      doc.text('Coste total mantenimiento: ' + total.toFixed(2) + '€', 350, y, { align: 'right' });
+
+      // Footer
+      doc.fontSize(7).font('Helvetica').fillColor('gray');
+      doc.text('Generado por Voltride Maintenance - ' + new Date().toLocaleString('es-ES'), 40, 780);
+
+      doc.end();
+    } catch (e) {
+      reject(e);
+    }
+  });
+}
@@ -0,0 +1,62 @@
+import { parentPort } from 'worker_threads';
+import { generateContractPDF, generateExtensionPDF, generateInvoicePDF, generateMaintenancePDF, missingLogoCount, preloadPdfAssets, PdfChunkHandler } from './pdfGenerator';
+
+// Thread de rendu PDF (voir services/pdfPool) : reçoit { id, kind, args } et renvoie les morceaux
+// du document au fil de l'eau ({ id, chunk }), puis { id, done, complete } ou { id, error }.
+// complete = false : rendu sans logo (téléchargement en échec), à ne pas mettre en cache. Un seul document
+// à la fois par thread : le compteur d'avant / après le rendu ne concerne que celui-ci.
+// Contrôle de flux : { id, pause } quand le flux de sortie du pool est plein, { id, resume } à son drain
+// (ou quand il est abandonné). En pause, les morceaux restent ici et "done" attend qu'ils soient partis.
+
+const RENDERERS: Record<string, (args: any[], onChunk: PdfChunkHandler) => Promise<Buffer>> = {
+  contract: ([contract, brandSettings, lang], onChunk) => generateContractPDF(contract, brandSettings, lang, onChunk),
+  invoice: ([contract, brandSettings, lang], onChunk) => generateInvoicePDF(contract, brandSettings, lang, onChunk),
+  extension: ([extension, booking, brandSettings, lang], onChunk) => generateExtensionPDF(extension, booking, brandSettings, lang, onChunk),
+  maintenance: ([fleet], onChunk) => generateMaintenancePDF(fleet, onChunk)
+};
+
+const port = parentPort!;
+
+let current = 0;
+let paused = false;
+let pending: Uint8Array[] = [];
+let flushed: (() => void) | null = null;
+
+const flush = () => {
+  while (!paused && pending.length) {
+    const chunk = pending.shift()!;
+    port.postMessage({ id: current, chunk }, [chunk.buffer]);
+  }
+  if (!pending.length && flushed) {
+    flushed();
+    flushed = null;
+  }
+};
+
+preloadPdfAssets().catch(e => console.error('PDF worker preload error:', e));
+
+port.on('message', async ({ id, kind, args, pause, resume }: { id: number; kind?: string; args?: any[]; pause?: boolean; resume?: boolean }) => {
+  if (pause || resume) {
+    if (id !== current) return;
+    paused = !!pause;
+    flush();
+    return;
+  }
+  current = id;
+  paused = false;
+  pending = [];
+  try {
+    const render = kind && RENDERERS[kind];
+    if (!render) throw new Error('Unknown PDF kind: ' + kind);
+    const missingBefore = missingLogoCount();
+    await render(args || [], chunk => {
+      // Copie dans un ArrayBuffer dédié (les Buffer de pdfkit peuvent partager un pool) puis transfert sans copie
+      pending.push(new Uint8Array(chunk));
+      flush();
+    });
+    if (pending.length) await new Promise<void>(resolve => { flushed = resolve; });
+    port.postMessage({ id, done: true, complete: missingLogoCount() === missingBefore });
+  } catch (e: any) {
+    port.postMessage({ id, error: e?.message || String(e) });
+  }
+});
@@ -0,0 +1,315 @@
+import { Router } from 'express'
+import bcrypt from 'bcryptjs'
+import jwt from 'jsonwebtoken'
+import { prisma } from '../db'
+import { JWT_SECRET } from '../services/operatorAuth'
+
+// Administration : authentification, utilisateurs, permissions, réglages de l'application
+
+const router = Router()
+
+// ============== SETTINGS ==============
+
+// Get settings
+router.get('/api/settings', async (req, res) => {
+  try {
+    const settings = await prisma.appSettings.findFirst({
+      where: { key: 'legal_texts' }
+    })
+    if (settings) {
+      res.json(settings.value)
+    } else {
+      res.json(null)
+    }
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Save settings
+router.post('/api/settings', async (req, res) => {
+  try {
+    const settings = await prisma.appSettings.upsert({
+      where: { key: 'legal_texts' },
+      update: { value: req.body },
+      create: { key: 'legal_texts', value: req.body }
+    })
+    res.json(settings)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+
+
+
+
+// ============== AUTHENTICATION ==============
+// Login
+router.post('/api/auth/login', async (req, res) => {
+  try {
+    const { email, password } = req.body
+    const user = await prisma.user.findUnique({ where: { email } })
+    
+    if (!user || !user.isActive) {
+      return res.status(401).json({ error: 'Email ou mot de passe incorrect' })
+    }
+    
+    const validPassword = await bcrypt.compare(password, user.password)
+    if (!validPassword) {
+      return res.status(401).json({ error: 'Email ou mot de passe incorrect' })
+    }
+    
+    // Update last login
+    await prisma.user.update({
+      where: { id: user.id },
+      data: { lastLoginAt: new Date() }
+    })
+    
+    const token = jwt.sign(
+      { userId: user.id, email: user.email, role: user.role, brands: user.brands, agencyIds: user.agencyIds },
+      JWT_SECRET,
+      { expiresIn: '24h' }
+    )
+    
+    res.json({
+      token,
+      user: {
+        id: user.id,
+        email: user.email,
+        firstName: user.firstName,
+        lastName: user.lastName,
+        role: user.role,
+        brands: user.brands,
+        agencyIds: user.agencyIds,
+        allowedApps: user.allowedApps || [],
+        language: user.language
+      }
+    })
+  } catch (e: any) {
+    console.error('Login error:', e)
+    res.status(500).json({ error: 'Erreur de connexion' })
+  }
+})
+
+// Verify token
+router.get('/api/auth/me', async (req, res) => {
+  try {
+    const authHeader = req.headers.authorization
+    if (!authHeader || !authHeader.startsWith('Bearer ')) {
+      return res.status(401).json({ error: 'Token manquant' })
+    }
+    
+    const token = authHeader.split(' ')[1]
+    const decoded = jwt.verify(token, JWT_SECRET) as any
+    
+    const user = await prisma.user.findUnique({ where: { id: decoded.userId } })
+    if (!user || !user.isActive) {
+      return res.status(401).json({ error: 'Utilisateur non trouvé' })
+    }
+    
+    res.json({
+      id: user.id,
+      email: user.email,
+      firstName: user.firstName,
+      lastName: user.lastName,
+      role: user.role,
+      brands: user.brands,
+      agencyIds: user.agencyIds,
+      allowedApps: user.allowedApps || []
+    })
+  } catch (e) {
+    res.status(401).json({ error: 'Token invalide' })
+  }
+})
+
+// Create user (admin only)
+router.post('/api/users', async (req, res) => {
+  try {
+    const hashedPassword = await bcrypt.hash(req.body.password, 10)
+    const user = await prisma.user.create({
+      data: {
+        email: req.body.email,
+        password: hashedPassword,
+        firstName: req.body.firstName,
+        lastName: req.body.lastName,
+        role: req.body.role || 'OPERATOR',
+        brands: req.body.brands || ['VOLTRIDE', 'MOTOR-RENT'],
+        agencyIds: req.body.agencyIds || [],
+        allowedApps: req.body.allowedApps || [],
+        language: req.body.language || 'es'
+      }
+    })
+    res.json({ ...user, password: undefined })
+  } catch (e: any) {
+    console.error('Create user error:', e)
+    res.status(500).json({ error: 'Erreur création utilisateur' })
+  }
+})
+
+// Get all users
+router.get('/api/users', async (req, res) => {
+  try {
+    const users = await prisma.user.findMany({
+      select: { id: true, email: true, firstName: true, lastName: true, role: true, brands: true, agencyIds: true, allowedApps: true, language: true, isActive: true, lastLoginAt: true, createdAt: true }
+    })
+    res.json(users)
+  } catch (e) {
+    res.status(500).json({ error: 'Erreur récupération utilisateurs' })
+  }
+})
+
+// Update user
+router.put('/api/users/:id', async (req, res) => {
+  try {
+    const data: any = { ...req.body }
+    if (data.password) {
+      data.password = await bcrypt.hash(data.password, 10)
+    }
+    const user = await prisma.user.update({
+      where: { id: req.params.id },
+      data
+    })
+    res.json({ ...user, password: undefined })
+  } catch (e) {
+    res.status(500).json({ error: 'Erreur mise à jour utilisateur' })
+  }
+})
+
+// Delete user
+router.delete('/api/users/:id', async (req, res) => {
+  try {
+    await prisma.user.delete({ where: { id: req.params.id } })
+    res.json({ success: true })
+  } catch (e) {
+    res.status(500).json({ error: 'Erreur suppression utilisateur' })
+  }
+})
+
+
+// ============== ROLE PERMISSIONS ==============
+// Get all permissions
+router.get('/api/permissions', async (req, res) => {
+  try {
+    const permissions = await prisma.rolePermission.findMany({
+      orderBy: [{ role: 'asc' }, { permission: 'asc' }]
+    })
+    res.json(permissions)
+  } catch (e) {
+    res.status(500).json({ error: 'Failed to fetch permissions' })
+  }
+})
+
+// Get permissions by role
+router.get('/api/permissions/:role', async (req, res) => {
+  try {
+    const permissions = await prisma.rolePermission.findMany({
+      where: { role: req.params.role as any }
+    })
+    res.json(permissions)
+  } catch (e) {
+    res.status(500).json({ error: 'Failed to fetch permissions' })
+  }
+})
+
+// Update or create permission
+router.post('/api/permissions', async (req, res) => {
+  try {
+    const { role, permission, allowed } = req.body
+    const result = await prisma.rolePermission.upsert({
+      where: { role_permission: { role, permission } },
+      update: { allowed },
+      create: { role, permission, allowed }
+    })
+    res.json(result)
+  } catch (e: any) {
+    console.error('Permission error:', e)
+    res.status(500).json({ error: 'Failed to update permission' })
+  }
+})
+
+// Bulk update permissions
+router.post('/api/permissions/bulk', async (req, res) => {
+  try {
+    const { permissions } = req.body // Array of { role, permission, allowed }
+    const results = await Promise.all(
+      permissions.map((p: any) =>
+        prisma.rolePermission.upsert({
+          where: { role_permission: { role: p.role, permission: p.permission } },
+          update: { allowed: p.allowed },
+          create: { role: p.role, permission: p.permission, allowed: p.allowed }
+        })
+      )
+    )
+    res.json(results)
+  } catch (e) {
+    res.status(500).json({ error: 'Failed to update permissions' })
+  }
+})
+
+// Initialize default permissions
+router.post('/api/permissions/init', async (req, res) => {
+  try {
+    const roles = ['ADMIN', 'MANAGER', 'OPERATOR']
+    const perms = ['dashboard', 'planning', 'bookings', 'fleet', 'checkout', 'customers', 'contracts', 'invoices', 'settings', 'users']
+    
+    const defaults: Record<string, Record<string, boolean>> = {
+      ADMIN: { dashboard: true, planning: true, bookings: true, fleet: true, checkout: true, customers: true, contracts: true, invoices: true, settings: true, users: true },
+      MANAGER: { dashboard: true, planning: true, bookings: true, fleet: true, checkout: true, customers: true, contracts: true, invoices: true, settings: false, users: false },
+      OPERATOR: { dashboard: true, planning: true, bookings: true, fleet: false, checkout: true, customers: false, contracts: false, invoices: false, settings: false, users: false }
+    }
+    
+    const results = []
+    for (const role of roles) {
+      for (const perm of perms) {
+        const result = await prisma.rolePermission.upsert({
+          where: { role_permission: { role: role as any, permission: perm } },
+          update: { allowed: defaults[role][perm] },
+          create: { role: role as any, permission: perm, allowed: defaults[role][perm] }
+        })
+        results.push(result)
+      }
+    }
+    res.json({ message: 'Permissions initialized', count: results.length })
+  } catch (e: any) {
+    console.error('Init permissions error:', e)
+    res.status(500).json({ error: 'Failed to initialize permissions' })
+  }
+})
+
+// ============== APP SETTINGS (ENTREPRISE) ==============
+// GET - Récupérer un paramètre par clé
+router.get('/api/settings/:key', async (req, res) => {
+  try {
+    const setting = await prisma.appSettings.findUnique({
+      where: { key: req.params.key }
+    })
+    if (setting) {
+      res.json(setting.value)
+    } else {
+      res.json(null)
+    }
+  } catch (error) {
+    console.error('Error fetching setting:', error)
+    res.status(500).json({ error: 'Failed to fetch setting' })
+  }
+})
+
+// PUT - Sauvegarder un paramètre
+router.put('/api/settings/:key', async (req, res) => {
+  try {
+    const setting = await prisma.appSettings.upsert({
+      where: { key: req.params.key },
+      update: { value: req.body },
+      create: { key: req.params.key, value: req.body }
+    })
+    res.json(setting)
+  } catch (error) {
+    console.error('Error saving setting:', error)
+    res.status(500).json({ error: 'Failed to save setting' })
+  }
+})
+
+console.log('App settings routes loaded')
+
+export default router
@@ -0,0 +1,1402 @@
+import { Router } from 'express'
+import { KEYSET_ORDER_BY, decodeCursor, isPaginated, keysetWhere, parseLimit, parseQueryDate, toPage } from '../services/pagination'
+import { getChangeFeed } from '../services/changeFeed'
+import { getNotificationInbox } from '../services/notificationInbox'
+import { authenticateOperator } from '../services/operatorAuth'
+import { searchCustomers } from '../services/customerSearch'
+import { prisma } from '../db'
+import { claimFleetUnit, reoptimizeAgency } from '../services/fleetAssignment'
+import { BOOKING_OVERLAP_MESSAGE, isBookingOverlapError } from '../services/bookingOverlap'
+import { MailMessage, getResendClient } from '../services/mailer'
+import { enqueueOutbox, getOutboxWorker } from '../services/outbox'
+import { nextBookingReference } from '../services/referenceAllocator'
+import { getQuoteEngine, rentalDays, rentalExtraHours } from '../services/quoteEngine'
+import { BOOKING_FULL_INCLUDE, BOOKING_PLANNING_SELECT, FLEET_LIST_INCLUDE, CONTRACT_LIST_SELECT, loadQRCode } from './shared'
+
+// Réservations : clients, réservations, sessions tablette / walk-in, affectation de flotte, e-mails de confirmation
+
+const router = Router()
+const changeFeed = getChangeFeed()
+const outboxWorker = getOutboxWorker(prisma)
+const notificationInbox = getNotificationInbox(prisma)
+
+// ============== CUSTOMERS ==============
+router.get('/api/customers', async (req, res) => {
+  try { const customers = await prisma.customer.findMany({ orderBy: { createdAt: 'desc' } }); res.json(customers) }
+  catch (error) { res.status(500).json({ error: 'Failed to fetch customers' }) }
+})
+
+// Supprimer un client
+router.delete("/api/customers/:id", async (req, res) => {
+  try {
+    const { id } = req.params;
+    await prisma.booking.deleteMany({ where: { customerId: id } });
+    await prisma.rentalContract.deleteMany({ where: { customerId: id } });
+    await prisma.customer.delete({ where: { id } });
+    res.json({ success: true });
+  } catch (error) {
+    console.error(error);
+    res.status(500).json({ error: "Failed to delete customer" });
+  }
+});
+
+// Créer un client (avec vérification doublons)
+router.post('/api/customers', async (req, res) => {
+  try {
+    const { email, phone } = req.body
+    
+    // Vérifier si un client existe déjà avec cet email ou téléphone
+    const existingCustomer = await prisma.customer.findFirst({
+      where: {
+        OR: [
+          { email: email },
+          { phone: phone }
+        ]
+      }
+    })
+    
+    if (existingCustomer) {
+      return res.status(400).json({ 
+        error: 'duplicate',
+        message: existingCustomer.email === email ? 'Un client avec cet email existe déjà' : 'Un client avec ce téléphone existe déjà',
+        existingCustomer
+      })
+    }
+    
+    const customer = await prisma.customer.create({
+      data: {
+        firstName: req.body.firstName,
+        lastName: req.body.lastName,
+        email: req.body.email,
+        phone: req.body.phone,
+        address: req.body.address,
+        postalCode: req.body.postalCode,
+        city: req.body.city,
+        country: req.body.country || 'ES',
+        language: req.body.language || 'es'
+      }
+    })
+    res.json(customer)
+  } catch (error) {
+    console.error(error)
+    res.status(500).json({ error: 'Failed to create customer' })
+  }
+})
+
+// Modifier un client
+router.put('/api/customers/:id', async (req, res) => {
+  try {
+    const { id } = req.params
+    const { email, phone } = req.body
+    
+    // Vérifier si un autre client existe avec cet email ou téléphone (seulement si email/phone fournis)
+    if (email || phone) {
+      const orConditions = []
+      if (email) orConditions.push({ email })
+      if (phone) orConditions.push({ phone })
+      const existingCustomer = await prisma.customer.findFirst({
+        where: { AND: [{ id: { not: id } }, { OR: orConditions }] }
+      })
+      if (existingCustomer) {
+        return res.status(400).json({ 
+          error: 'duplicate',
+          message: existingCustomer.email === email ? 'Un client avec cet email existe déjà' : 'Un client avec ce téléphone existe déjà',
+          existingCustomer
+        })
+      }
+    }
+    
+    const customer = await prisma.customer.update({
+      where: { id },
+      data: {
+        ...(req.body.firstName && { firstName: req.body.firstName }),
+        ...(req.body.lastName && { lastName: req.body.lastName }),
+        ...(req.body.email && { email: req.body.email }),
+        ...(req.body.phone && { phone: req.body.phone }),
+        ...(req.body.address !== undefined && { address: req.body.address }),
+        ...(req.body.postalCode !== undefined && { postalCode: req.body.postalCode }),
+        ...(req.body.city !== undefined && { city: req.body.city }),
+        ...(req.body.country && { country: req.body.country }),
+        ...(req.body.language && { language: req.body.language }),
+        ...(req.body.idDocumentUrl && { idDocumentUrl: req.body.idDocumentUrl }),
+        ...(req.body.licenseDocumentUrl && { licenseDocumentUrl: req.body.licenseDocumentUrl }),
+        ...(req.body.idDocumentExpiry && { idDocumentExpiry: new Date(req.body.idDocumentExpiry) }),
+        ...(req.body.licenseDocumentExpiry && { licenseDocumentExpiry: new Date(req.body.licenseDocumentExpiry) }),
+      }
+    })
+    res.json(customer)
+  } catch (error) {
+    console.error(error)
+    res.status(500).json({ error: 'Failed to update customer' })
+  }
+})
+
+// Filtres : agencyId, brand, status (liste séparée par des virgules), customerId, fleetVehicleId,
+// from/to (réservations qui chevauchent la fenêtre), includeOpen=true (+ locations en cours hors fenêtre).
+// view=planning pour la projection légère. Avec limit et/ou cursor : { items, nextCursor } paginé par keyset.
+router.get('/api/bookings', async (req, res) => {
+  try {
+    const { agencyId, brand, status, customerId, fleetVehicleId, from, to, includeOpen, view } = req.query
+    const where: any = {}
+    if (agencyId) where.agencyId = agencyId as string
+    if (brand) where.agency = { brand: (brand as string).toUpperCase() }
+    if (status) where.status = { in: (status as string).split(',') }
+    if (customerId) where.customerId = customerId as string
+    if (fleetVehicleId) where.fleetVehicleId = fleetVehicleId as string
+    const and: any[] = []
+    if (from || to) {
+      const fromDate = from ? parseQueryDate(from) : null
+      const toDate = to ? parseQueryDate(to) : null
+      if ((from && !fromDate) || (to && !toDate)) return res.status(400).json({ error: 'Invalid from/to date' })
+      const window: any = {}
+      if (toDate) window.startDate = { lte: toDate }
+      if (fromDate) window.endDate = { gte: fromDate }
+      and.push(includeOpen === 'true' ? { OR: [window, { checkedIn: true, checkedOut: false }] } : window)
+    }
+    const projection: any = view === 'planning' ? { select: BOOKING_PLANNING_SELECT } : { include: BOOKING_FULL_INCLUDE }
+
+    if (!isPaginated(req.query)) {
+      if (and.length) where.AND = and
+      const bookings = await prisma.booking.findMany({ where, ...projection, orderBy: KEYSET_ORDER_BY })
+      return res.json(bookings)
+    }
+
+    const cursor = decodeCursor(req.query.cursor as string)
+    if (req.query.cursor && !cursor) return res.status(400).json({ error: 'Invalid cursor' })
+    const limit = parseLimit(req.query.limit)
+    if (cursor) and.push(keysetWhere(cursor))
+    if (and.length) where.AND = and
+    const rows = await prisma.booking.findMany({ where, ...projection, orderBy: KEYSET_ORDER_BY, take: limit + 1 })
+    res.json(toPage(rows as any[], limit))
+  } catch (error) { console.error('Fetch bookings error:', error); res.status(500).json({ error: 'Failed to fetch bookings' }) }
+})
+
+router.get('/api/bookings/:id', async (req, res) => {
+  try {
+    const booking = await prisma.booking.findUnique({ where: { id: req.params.id }, include: BOOKING_FULL_INCLUDE })
+    if (!booking) return res.status(404).json({ error: 'Booking not found' })
+    res.json(booking)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch booking' }) }
+})
+
+// ============== SYNC OPÉRATEUR (delta + SSE) ==============
+// Flux SSE, authentifié (?token=, EventSource n'envoie pas d'en-têtes) : "ready" { serverTime } à la connexion,
+// un événement "change" { entity, id, op } par écriture Booking / RentalContract / Fleet / Notification visible
+// par l'utilisateur, et "unread" { '*', <userId>: non lues } à chaque changement de ces compteurs
+router.get('/api/events', async (req, res) => {
+  try {
+    const operator = await authenticateOperator(prisma, req)
+    if (!operator) return res.status(401).json({ error: 'Unauthorized' })
+    changeFeed.subscribe(res, operator)
+  } catch (error) { console.error('Events error:', error); res.status(500).json({ error: 'Failed to open event stream' }) }
+})
+
+// Delta depuis `since` (serverTime en ms renvoyé par l'appel précédent) :
+// { serverTime, reset, bookings, contracts, fleet, deleted: { bookings, contracts, fleet }, notifications, unread }
+// Authentifié (Authorization: Bearer) et limité aux agences de l'utilisateur.
+// unread : non lues de l'utilisateur avec ?userId (toutes sans userId), lecture du compteur
+// Mêmes projections que le planning (view=planning), la liste des contrats (view=list) et /api/fleet.
+// reset=true : le journal ne remonte pas jusqu'à `since` (redémarrage, suppression en masse), recharger tout.
+// deleted : suppressions du journal filtrées sur l'agence qu'il a gardée de la ligne (absente de la base) ;
+// agence inconnue : un utilisateur restreint recharge tout plutôt que de recevoir des ids hors de son périmètre.
+const SYNC_OVERLAP_MS = 2000
+
+router.get('/api/sync', async (req, res) => {
+  try {
+    const operator = await authenticateOperator(prisma, req)
+    if (!operator) return res.status(401).json({ error: 'Unauthorized' })
+    const since = parseInt(req.query.since as string, 10)
+    if (isNaN(since)) return res.status(400).json({ error: 'since required' })
+    const serverTime = Date.now()
+    const changes = changeFeed.since(since - SYNC_OVERLAP_MS)
+    if (!changes) return res.json({ serverTime, reset: true })
+
+    // updatedAt couvre les écritures des autres instances, le journal les modèles enfants et les suppressions
+    const sinceDate = new Date(since - SYNC_OVERLAP_MS)
+    const idsFor = (entity: string, op: string) => changes.filter(c => c.entity === entity && c.op === op && c.id).map(c => c.id)
+    const changedWhere = (entity: string) => ({ OR: [{ updatedAt: { gte: sinceDate } }, { id: { in: idsFor(entity, 'upsert') } }] })
+    const scopeWhere = {
+      ...(req.query.brand ? { agency: { brand: (req.query.brand as string).toUpperCase() } } : {}),
+      ...(operator.agencyIds ? { agencyId: { in: operator.agencyIds } } : {})
+    }
+    const deletions = changes.filter(c => c.op === 'delete' && c.id && c.entity !== 'notification')
+    if (operator.agencyIds && deletions.some(c => !c.agencyId)) return res.json({ serverTime, reset: true })
+    const brandAgencies = req.query.brand && deletions.length
+      ? new Set((await prisma.agency.findMany({ where: { brand: (req.query.brand as string).toUpperCase() }, select: { id: true } })).map(a => a.id))
+      : null
+    const deletedIds = (entity: string) => deletions
+      .filter(c => c.entity === entity && (!c.agencyId || ((!operator.agencyIds || operator.agencyIds.includes(c.agencyId)) && (!brandAgencies || brandAgencies.has(c.agencyId)))))
+      .map(c => c.id)
+
+    const [bookings, contracts, fleet, unread] = await Promise.all([
+      prisma.booking.findMany({ where: { ...scopeWhere, ...changedWhere('booking') }, select: BOOKING_PLANNING_SELECT }),
+      prisma.rentalContract.findMany({ where: { ...scopeWhere, ...changedWhere('contract') }, select: CONTRACT_LIST_SELECT }),
+      prisma.fleet.findMany({ where: { ...scopeWhere, ...changedWhere('fleet') }, include: FLEET_LIST_INCLUDE }),
+      notificationInbox.unreadCount(req.query.userId ? operator.userId : undefined)
+    ])
+
+    res.json({
+      serverTime,
+      reset: false,
+      bookings,
+      contracts,
+      fleet,
+      deleted: { bookings: deletedIds('booking'), contracts: deletedIds('contract'), fleet: deletedIds('fleet') },
+      notifications: changes.some(c => c.entity === 'notification'),
+      unread
+    })
+  } catch (error) { console.error('Sync error:', error); res.status(500).json({ error: 'Failed to sync' }) }
+})
+
+// Prix d'une réservation widget recalculés côté serveur ; écart avec le total affiché au client -> 409
+const PRICE_TOLERANCE = 0.5
+
+// Generateur de numero de reservation sequentiel : compteur par marque réservé par blocs (services/referenceAllocator)
+const generateBookingReference = (brand: string) => nextBookingReference(prisma, brand)
+
+router.post('/api/bookings', async (req, res) => {
+  try {
+    const priced = await getQuoteEngine(prisma).priceBooking(
+      rentalDays(req.body.startDate, req.body.endDate),
+      rentalExtraHours(req.body.startTime, req.body.endTime),
+      (req.body.items || []).map((item: any) => ({ id: item.vehicleId, quantity: Number(item.quantity) || 0 })),
+      (req.body.options || []).map((opt: any) => ({ id: opt.optionId, quantity: Number(opt.quantity) || 0 }))
+    )
+    if (!priced.items.length) return res.status(400).json({ error: 'No vehicle selected' })
+    if (Math.abs(priced.total - Number(req.body.totalPrice)) > PRICE_TOLERANCE) {
+      console.warn(`Booking price mismatch: client ${req.body.totalPrice}, server ${priced.total}`)
+      return res.status(409).json({ error: 'PRICE_CHANGED', totalPrice: priced.total, items: priced.items, options: priced.options })
+    }
+    // Recuperer l'agence pour connaitre la marque
+    const agency = await prisma.agency.findUnique({ where: { id: req.body.agencyId } })
+    const reference = await generateBookingReference(agency?.brand || 'VOLTRIDE')
+    let customer = await prisma.customer.findFirst({ where: { email: req.body.customer.email } })
+    if (customer) {
+      customer = await prisma.customer.update({ where: { id: customer.id }, data: { firstName: req.body.customer.firstName, lastName: req.body.customer.lastName, phone: req.body.customer.phone, address: req.body.customer.address, postalCode: req.body.customer.postalCode, city: req.body.customer.city, country: req.body.customer.country || customer.country } })
+    }
+    if (!customer) {
+      customer = await prisma.customer.create({ data: { firstName: req.body.customer.firstName, lastName: req.body.customer.lastName, email: req.body.customer.email, phone: req.body.customer.phone, address: req.body.customer.address, postalCode: req.body.customer.postalCode, city: req.body.customer.city, country: req.body.customer.country || 'ES', language: req.body.customer.language || 'es' } })
+    }
+    // Récupérer la caution du véhicule
+    const vehicleId = req.body.items?.[0]?.vehicleId
+    const vehicle = vehicleId ? await prisma.vehicle.findUnique({ where: { id: vehicleId } }) : null
+    const vehicleDeposit = vehicle?.deposit || 100
+    
+    // paidAmount = acompte payé par le client (ce que le widget envoie comme depositAmount)
+    // depositAmount = vraie caution du véhicule
+    const paidAmount = req.body.depositAmount || 0
+    
+    // Créer la réservation d'abord
+    const booking = await prisma.booking.create({
+      data: {
+        reference,
+        agencyId: req.body.agencyId, customerId: customer.id, startDate: new Date(req.body.startDate), endDate: new Date(req.body.endDate), startTime: req.body.startTime, endTime: req.body.endTime, totalPrice: priced.total, depositAmount: vehicleDeposit, paidAmount: paidAmount, language: req.body.language || 'es',
+        source: 'WIDGET',
+        items: { create: priced.items },
+        options: { create: priced.options }
+      },
+      include: { agency: true, customer: true, items: { include: { vehicle: true } }, options: { include: { option: true } } }
+    })
+
+    // Auto-assignation pour les réservations WIDGET
+    if (booking.items && booking.items.length > 0) {
+      const vehicleTypeId = booking.items[0].vehicleId
+      const { fleetId, reason, attempts } = await autoAssignVehicle(
+        booking.id,
+        vehicleTypeId,
+        booking.agencyId,
+        new Date(req.body.startDate),
+        new Date(req.body.endDate)
+      )
+      
+      if (fleetId) {
+        console.log(`Booking ${booking.reference} auto-assigned to fleet ${fleetId}: ${reason}${attempts > 1 ? ` (attempt ${attempts})` : ''}`)
+      } else {
+        console.log(`Booking ${booking.reference} not auto-assigned: ${reason}`)
+      }
+    }
+
+    // Recharger le booking avec les infos d'assignation
+    const finalBooking = await prisma.booking.findUnique({
+      where: { id: booking.id },
+      include: { agency: true, customer: true, items: { include: { vehicle: true } }, options: { include: { option: true } }, fleetVehicle: true }
+    })
+    
+    // Notification nouvelle réservation, envoyée par le worker outbox
+    await enqueueOutbox(prisma, {
+      topic: 'push',
+      payload: {
+        type: 'new_booking',
+        title: '🆕 Nouvelle réservation',
+        body: `${customer.firstName} ${customer.lastName} - ${new Date(req.body.startDate).toLocaleDateString('fr-FR')}`,
+        data: { bookingId: booking.id, reference: booking.reference }
+      },
+      dedupeKey: `new_booking:${booking.id}`
+    }).catch(e => console.error('Outbox enqueue error:', e))
+    outboxWorker.wake()
+    res.json(finalBooking)
+  } catch (error) { console.error(error); res.status(500).json({ error: 'Failed to create booking' }) }
+})
+
+router.put('/api/bookings/:id/status', async (req, res) => {
+  try { const booking = await prisma.booking.update({ where: { id: req.params.id }, data: { status: req.body.status } }); res.json(booking) }
+  catch (error) {
+    if (isBookingOverlapError(error)) return res.status(409).json({ error: BOOKING_OVERLAP_MESSAGE })
+    res.status(500).json({ error: 'Failed to update booking status' })
+  }
+})
+// Cancel booking
+router.put("/api/bookings/:id/cancel", async (req, res) => {
+  try {
+    const booking = await prisma.booking.update({
+      where: { id: req.params.id },
+      data: { status: "CANCELLED" }
+    });
+    if (booking.fleetVehicleId) {
+      await prisma.fleet.update({ where: { id: booking.fleetVehicleId }, data: { status: "AVAILABLE" } });
+    }
+    res.json(booking);
+  } catch (error) {
+    console.error("Cancel booking error:", error);
+    res.status(500).json({ error: "Failed to cancel booking" });
+  }
+
+})
+
+// Send invoice by email
+router.post('/api/bookings/:id/send-invoice', async (req, res) => {
+  try {
+    const booking = await prisma.booking.findUnique({
+      where: { id: req.params.id },
+      include: { agency: true, customer: true, items: { include: { vehicle: true } }, options: { include: { option: true } } }
+    })
+    if (!booking) return res.status(404).json({ error: 'Booking not found' })
+    const language = req.body.language || booking.language || 'es'
+    const brand = booking.agency?.brand || 'VOLTRIDE'
+    const brandName = brand === 'MOTOR-RENT' ? 'Motor-Rent' : 'Voltride'
+    const fromEmail = brand === 'VOLTRIDE' ? 'reservations@voltride.es' : 'reservations@motor-rent.es'
+    const translations: Record<string, any> = {
+      fr: { subject: 'Votre facture', title: 'Facture', ref: 'Référence', date: 'Date', agency: 'Agence', vehicle: 'Véhicule', qty: 'Qté', period: 'Période', unitPrice: 'Prix unit.', total: 'Total', subtotal: 'Sous-total', tax: 'TVA (21%)', totalTTC: 'Total TTC', deposit: 'Acompte payé', remaining: 'Reste à payer', paid: 'Payé', thanks: 'Merci pour votre confiance !' },
+      es: { subject: 'Su factura', title: 'Factura', ref: 'Referencia', date: 'Fecha', agency: 'Agencia', vehicle: 'Vehículo', qty: 'Cant.', period: 'Período', unitPrice: 'Precio unit.', total: 'Total', subtotal: 'Subtotal', tax: 'IVA (21%)', totalTTC: 'Total con IVA', deposit: 'Anticipo pagado', remaining: 'Pendiente de pago', paid: 'Pagado', thanks: '¡Gracias por su confianza!' },
+      en: { subject: 'Your invoice', title: 'Invoice', ref: 'Reference', date: 'Date', agency: 'Agency', vehicle: 'Vehicle', qty: 'Qty', period: 'Period', unitPrice: 'Unit price', total: 'Total', subtotal: 'Subtotal', tax: 'VAT (21%)', totalTTC: 'Total incl. VAT', deposit: 'Deposit paid', remaining: 'Remaining', paid: 'Paid', thanks: 'Thank you for your trust!' }
+    }
+    const t = translations[language] || translations.es
+    const formatD = (d: string | Date) => new Date(d).toLocaleDateString(language === 'en' ? 'en-GB' : language === 'es' ? 'es-ES' : 'fr-FR')
+    const totalTTC = booking.totalPrice
+    const taxRate = 21
+    const subtotal = Math.round(totalTTC / 1.21 * 100) / 100
+    const taxAmount = Math.round((totalTTC - subtotal) * 100) / 100
+    const paidAmount = booking.paidAmount || 0
+    const remainingAmt = Math.max(0, totalTTC - paidAmount)
+
+
+
+
+
+    const gn = (obj: any) => typeof obj === 'object' ? (obj[language] || obj.es || '') : (obj || '')
+    let itemRows = ''
+    for (const item of booking.items) {
+      itemRows += '<tr><td style="padding:8px;border-bottom:1px solid #eee">' + gn(item.vehicle?.name) + '</td>'
+        + '<td style="padding:8px;border-bottom:1px solid #eee;text-align:center">' + item.quantity + '</td>'
+        + '<td style="padding:8px;border-bottom:1px solid #eee;text-align:right">' + item.unitPrice.toFixed(2) + '&#8364;</td>'
+        + '<td style="padding:8px;border-bottom:1px solid #eee;text-align:right">' + item.totalPrice.toFixed(2) + '&#8364;</td></tr>'
+    }
+    for (const opt of booking.options) {
+      itemRows += '<tr><td style="padding:8px;border-bottom:1px solid #eee">' + gn(opt.option?.name) + '</td>'
+        + '<td style="padding:8px;border-bottom:1px solid #eee;text-align:center">' + opt.quantity + '</td>'
+        + '<td style="padding:8px;border-bottom:1px solid #eee;text-align:right">' + opt.unitPrice.toFixed(2) + '&#8364;</td>'
+        + '<td style="padding:8px;border-bottom:1px solid #eee;text-align:right">' + opt.totalPrice.toFixed(2) + '&#8364;</td></tr>'
+    }
+    const pc = brand === 'VOLTRIDE' ? '#ffaf10' : '#e53e3e'
+    let totals = '<div style="display:flex;justify-content:space-between;margin-bottom:5px"><span>' + t.subtotal + '</span><span>' + subtotal.toFixed(2) + '&#8364;</span></div>'
+      + '<div style="display:flex;justify-content:space-between;margin-bottom:5px"><span>' + t.tax + '</span><span>' + taxAmount.toFixed(2) + '&#8364;</span></div>'
+      + '<div style="display:flex;justify-content:space-between;font-weight:bold;font-size:16px;border-top:2px solid #ddd;padding-top:10px;margin-top:10px"><span>' + t.totalTTC + '</span><span>' + totalTTC.toFixed(2) + '&#8364;</span></div>'
+    if (paidAmount > 0) totals += '<div style="display:flex;justify-content:space-between;margin-top:10px;color:green"><span>' + t.deposit + '</span><span>-' + paidAmount.toFixed(2) + '&#8364;</span></div>'
+    if (remainingAmt > 0) totals += '<div style="display:flex;justify-content:space-between;font-weight:bold;color:#e53e3e"><span>' + t.remaining + '</span><span>' + remainingAmt.toFixed(2) + '&#8364;</span></div>'
+    else totals += '<div style="text-align:center;color:green;font-weight:bold;margin-top:5px">&#10003; ' + t.paid + '</div>'
+    const html = '<!DOCTYPE html><html><head><meta charset="utf-8"></head>'
+      + '<body style="font-family:Arial,sans-serif;max-width:600px;margin:0 auto;background:#f9f9f9;padding:20px">'
+      + '<div style="background:white;border-radius:12px;overflow:hidden;box-shadow:0 2px 8px rgba(0,0,0,0.1)">'
+      + '<div style="background:' + pc + ';color:white;padding:20px;text-align:center">'
+      + '<h1 style="margin:0;font-size:24px">' + brandName + '</h1>'
+      + '<p style="margin:5px 0 0;opacity:0.9">' + t.title + ' - ' + booking.reference + '</p></div>'
+      + '<div style="padding:20px">'
+      + '<table style="width:100%;margin-bottom:20px;font-size:14px">'
+      + '<tr><td style="color:#666">' + t.ref + '</td><td style="font-weight:bold">' + booking.reference + '</td></tr>'
+      + '<tr><td style="color:#666">' + t.date + '</td><td>' + formatD(booking.createdAt) + '</td></tr>'
+      + '<tr><td style="color:#666">' + t.agency + '</td><td>' + gn(booking.agency?.name) + '</td></tr>'
+      + '<tr><td style="color:#666">' + t.period + '</td><td>' + formatD(booking.startDate) + ' ' + booking.startTime + ' - ' + formatD(booking.endDate) + ' ' + booking.endTime + '</td></tr></table>'
+      + '<table style="width:100%;border-collapse:collapse;font-size:14px"><thead><tr style="background:#f5f5f5">'
+      + '<th style="padding:8px;text-align:left">' + t.vehicle + '</th><th style="padding:8px;text-align:center">' + t.qty + '</th>'
+      + '<th style="padding:8px;text-align:right">' + t.unitPrice + '</th><th style="padding:8px;text-align:right">' + t.total + '</th></tr></thead>'
+      + '<tbody>' + itemRows + '</tbody></table>'
+      + '<div style="margin-top:20px;padding:15px;background:#f9f9f9;border-radius:8px;font-size:14px">' + totals + '</div>'
+      + '<p style="text-align:center;color:#666;margin-top:20px">' + t.thanks + '</p></div>'
+      + '<div style="text-align:center;padding:15px;color:#999;font-size:12px">' + brandName + '</div>'
+      + '</div></body></html>'
+    const result = await getResendClient().emails.send({ from: brandName + ' <' + fromEmail + '>', to: booking.customer.email, subject: t.subject + ' - ' + booking.reference, html })
+    console.log('[INVOICE] Sent to', booking.customer.email, 'for', booking.reference)
+    res.json({ success: true, resendResponse: result })
+  } catch (error: any) {
+    console.error('[INVOICE] Error:', error)
+    res.status(500).json({ error: 'Failed to send invoice', details: error?.message })
+  }
+})
+
+// Delete booking
+router.delete('/api/bookings/:id', async (req, res) => {
+  try {
+    // Supprimer d'abord les items et options liés
+    await prisma.bookingItem.deleteMany({ where: { bookingId: req.params.id } })
+    await prisma.bookingOption.deleteMany({ where: { bookingId: req.params.id } })
+    // Supprimer la réservation
+    await prisma.booking.delete({ where: { id: req.params.id } })
+    res.json({ success: true })
+  } catch (error) {
+    console.error('Delete booking error:', error)
+    res.status(500).json({ error: 'Failed to delete booking' })
+  }
+})
+
+// Emails de confirmation (client + agence) après paiement Stripe
+function bookingConfirmationEmails(booking: any): MailMessage[] {
+  const messages: MailMessage[] = []
+  const vehicleItem = booking.items?.[0]
+  const brand = booking.agency?.brand || 'VOLTRIDE'
+  const language = (booking.language || 'es') as 'fr' | 'es' | 'en'
+  const rawVehicleName = vehicleItem?.vehicle?.name
+  const vehicleName = typeof rawVehicleName === 'object' && rawVehicleName !== null
+    ? ((rawVehicleName as any)[language] || (rawVehicleName as any).es || (rawVehicleName as any).fr || (rawVehicleName as any).en || 'Véhicule')
+    : (rawVehicleName || 'Véhicule')
+  const vehicleNumber = booking.fleetVehicle?.licensePlate || booking.fleetVehicle?.vehicleNumber || (typeof rawVehicleName === 'string' ? rawVehicleName : '') || ''
+  const isRegisteredVehicle = vehicleItem?.vehicle?.hasPlate ?? false
+  const t = emailTemplates[language] || emailTemplates.fr
+  const brandName = brand === 'VOLTRIDE' ? 'Voltride' : brand === 'MOTOR-RENT' ? 'Motor-Rent' : 'Trivium Buggy'
+  const brandColor = brand === 'VOLTRIDE' ? '#0e7490' : brand === 'MOTOR-RENT' ? '#ffaf10' : '#16a34a'
+  const logoUrl = brand === 'VOLTRIDE' 
+    ? 'https://res.cloudinary.com/dis5pcnfr/image/upload/v1766883143/IMG-20251228-WA0001-removebg-preview_n0fsq5.png'
+    : brand === 'MOTOR-RENT'
+    ? 'https://res.cloudinary.com/dof8xnabp/image/upload/v1737372450/MOTOR_RENT_LOGO_copy_kxwqjk.png'
+    : 'https://res.cloudinary.com/dis5pcnfr/image/upload/v1766883143/IMG-20251228-WA0001-removebg-preview_n0fsq5.png'
+
+  const documents = isRegisteredVehicle ? t.documentsRegistered : t.documentsNonRegistered
+  const remainingAmount = booking.totalPrice - booking.paidAmount
+
+  const formatDate = (date: Date) => {
+    return date.toLocaleDateString(language === 'en' ? 'en-GB' : language === 'es' ? 'es-ES' : 'fr-FR')
+  }
+
+  // Adresse de l'agence formatée
+  const rawAgencyName = booking.agency?.name
+  const agencyName = typeof rawAgencyName === 'object' && rawAgencyName !== null
+    ? ((rawAgencyName as any)[language] || (rawAgencyName as any).es || (rawAgencyName as any).fr || (rawAgencyName as any).en || '')
+    : (rawAgencyName || '')
+  const agencyAddress = booking.agency 
+    ? `${agencyName} - ${booking.agency.address}, ${booking.agency.postalCode} ${booking.agency.city}`
+    : ''
+
+  const agencyAddressLabel = language === 'es' ? 'Dirección de recogida' : language === 'en' ? 'Pick-up location' : 'Adresse de retrait'
+
+  const html = `
+  <!DOCTYPE html>
+  <html>
+  <head><meta charset="UTF-8"></head>
+  <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f5f5f5;">
+    <div style="background: ${brandColor}; color: white; padding: 30px 20px; text-align: center; border-radius: 10px 10px 0 0;">
+      <img src="${logoUrl}" alt="${brandName}" style="max-width: 200px; max-height: 80px; margin-bottom: 10px;" />
+      <p style="margin: 10px 0 0 0; font-size: 18px;">${t.subject}</p>
+    </div>
+    <div style="padding: 25px; border: 1px solid #ddd; border-top: none; background: white;">
+      <p style="font-size: 16px;">${t.greeting} ${booking.customer.firstName},</p>
+      <p>${t.confirmationText}</p>
+
+      <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 20px 0; border-left: 4px solid ${brandColor};">
+        <h3 style="margin-top: 0; color: ${brandColor};">🚲 ${t.vehicleLabel}</h3>
+        <p style="margin: 0; font-size: 16px;"><strong>${vehicleNumber}</strong>${vehicleNumber !== vehicleName ? ' - ' + vehicleName : ''}</p>
+      </div>
+
+      <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 20px 0; border-left: 4px solid ${brandColor};">
+        <h3 style="margin-top: 0; color: ${brandColor};">📅 ${t.periodLabel}</h3>
+        <p style="margin: 0;">${t.from} <strong>${formatDate(booking.startDate)}</strong> ${t.at} <strong>${booking.startTime || ''}</strong></p>
+        <p style="margin: 5px 0 0 0;">${t.to} <strong>${formatDate(booking.endDate)}</strong> ${t.at} <strong>${booking.endTime || ''}</strong></p>
+      </div>
+
+      <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 20px 0; border-left: 4px solid ${brandColor};">
+        <h3 style="margin-top: 0; color: ${brandColor};">📍 ${agencyAddressLabel}</h3>
+        <p style="margin: 0;">${agencyAddress}</p>
+      </div>
+
+      <div style="background: #e8f4f8; padding: 15px; border-radius: 8px; margin: 20px 0;">
+        <h3 style="margin-top: 0; color: #0e7490;">💰 ${t.paymentTitle}</h3>
+        <table style="width: 100%; border-collapse: collapse;">
+          <tr><td style="padding: 8px 0;">${t.totalLabel}</td><td style="text-align: right; padding: 8px 0;"><strong>${booking.totalPrice}€</strong></td></tr>
+          <tr><td style="padding: 8px 0;">${t.paidLabel} (${t.card})</td><td style="text-align: right; padding: 8px 0; color: green;"><strong>${booking.paidAmount}€</strong></td></tr>
+          ${remainingAmount > 0 ? '<tr><td style="padding: 8px 0;">' + t.remainingLabel + '</td><td style="text-align: right; padding: 8px 0; color: orange;"><strong>' + remainingAmount.toFixed(2) + '€</strong></td></tr>' : ''}
+          <tr style="border-top: 2px solid #ccc;"><td style="padding: 12px 0; font-weight: bold;">${t.depositLabel}</td><td style="text-align: right; padding: 12px 0;"><strong>${booking.depositAmount || 100}€</strong></td></tr>
+        </table>
+      </div>
+
+      <div style="background: #fff3cd; padding: 15px; border-radius: 8px; margin: 20px 0; border: 1px solid #ffc107;">
+        <h3 style="margin-top: 0; color: #856404;">📋 ${t.documentsTitle}</h3>
+        <ul style="margin: 0; padding-left: 20px; color: #856404;">
+          ${documents.map((doc: string) => '<li style="margin-bottom: 8px;">' + doc + '</li>').join('')}
+        </ul>
+      </div>
+
+      <p style="text-align: center; color: #666; margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee;">
+<div style="text-align: center; margin: 30px 0; padding: 20px; background: #f0f9ff; border-radius: 8px;">
+  <p style="color: #555; margin-bottom: 15px;">${t.portalDescription}</p>
+  <a href="${t.portalUrl}" style="display: inline-block; padding: 14px 30px; background-color: ${brandColor}; color: white; text-decoration: none; border-radius: 8px; font-weight: bold; font-size: 16px;">${t.portalButton}</a>
+</div>
+        ${t.footer}<br/>
+        <strong>${t.team} ${brandName}</strong>
+      </p>
+    </div>
+    <div style="text-align: center; padding: 15px; color: #999; font-size: 12px;">
+      © ${new Date().getFullYear()} ${brandName} - Todos los derechos reservados
+    </div>
+  </body>
+  </html>
+  `
+
+  const fromEmail = brand === 'VOLTRIDE' ? 'reservations@voltride.es' : brand === 'MOTOR-RENT' ? 'reservations@motor-rent.es' : 'reservations@voltride.es'
+  const from = brandName + ' <' + fromEmail + '>'
+  messages.push({ from, to: booking.customer.email, subject: t.subject + ' - ' + booking.reference, html })
+  const adminEmail = brand === 'VOLTRIDE' ? 'info@voltride.es' : 'info@motor-rent.es'
+  messages.push({
+    from,
+    to: adminEmail,
+    subject: '🆕 Nueva reserva ' + booking.reference + ' (pago confirmado)',
+    html: '<div style="font-family:Arial;max-width:600px;margin:0 auto">'
+      + '<h2 style="color:#0e7490">🆕 Nueva reserva - ' + booking.reference + '</h2>'
+      + '<p style="background:#d4edda;padding:10px;border-radius:8px;color:#155724">✅ Pago confirmado por Stripe</p>'
+      + '<table style="width:100%;border-collapse:collapse">'
+      + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Cliente</td><td style="padding:8px;border-bottom:1px solid #eee;font-weight:bold">' + booking.customer?.firstName + ' ' + booking.customer?.lastName + '</td></tr>'
+      + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Email</td><td style="padding:8px;border-bottom:1px solid #eee">' + booking.customer?.email + '</td></tr>'
+      + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Teléfono</td><td style="padding:8px;border-bottom:1px solid #eee">' + (booking.customer?.phone || '-') + '</td></tr>'
+      + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Vehículo</td><td style="padding:8px;border-bottom:1px solid #eee">' + vehicleName + '</td></tr>'
+      + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Período</td><td style="padding:8px;border-bottom:1px solid #eee">' + booking.startDate.toLocaleDateString('es-ES') + ' ' + booking.startTime + ' → ' + booking.endDate.toLocaleDateString('es-ES') + ' ' + booking.endTime + '</td></tr>'
+      + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Precio total</td><td style="padding:8px;border-bottom:1px solid #eee;font-weight:bold;color:#0e7490">' + booking.totalPrice.toFixed(2) + '€</td></tr>'
+      + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Anticipo pagado</td><td style="padding:8px;border-bottom:1px solid #eee;font-weight:bold;color:#28a745">' + booking.paidAmount.toFixed(2) + '€</td></tr>'
+      + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Origen</td><td style="padding:8px;border-bottom:1px solid #eee">🌐 Widget (online)</td></tr>'
+      + '<tr><td style="padding:8px;color:#666">Agencia</td><td style="padding:8px">' + agencyName + '</td></tr>'
+      + '</table></div>'
+  })
+  return messages
+}
+
+// ============== TABLET SESSIONS ==============
+
+// Get pending session for agency (tablet polls this)
+router.get('/api/tablet-sessions/agency/:agencyId', async (req, res) => {
+  try {
+    const session = await prisma.tabletSession.findFirst({
+      where: {
+        agencyId: req.params.agencyId,
+        status: 'pending'
+      },
+      orderBy: { createdAt: 'desc' }
+    })
+    res.json(session)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Session en attente pour plusieurs agences (avant /:sessionId, sinon capturée comme un identifiant)
+router.get('/api/tablet-sessions/agencies', async (req, res) => {
+  try {
+    const agencyIds = (req.query.ids as string)?.split(',') || []
+    const session = await prisma.tabletSession.findFirst({
+      where: {
+        agencyId: { in: agencyIds },
+        status: 'pending'
+      },
+      orderBy: { createdAt: 'desc' }
+    })
+    res.json(session)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Get session by ID
+router.get('/api/tablet-sessions/:sessionId', async (req, res) => {
+  try {
+    const session = await prisma.tabletSession.findUnique({
+      where: { sessionId: req.params.sessionId }
+    })
+    res.json(session)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Create new session (from operator app)
+router.post('/api/tablet-sessions', async (req, res) => {
+  try {
+    const session = await prisma.tabletSession.create({
+      data: {
+        sessionId: req.body.sessionId,
+        bookingId: req.body.bookingId,
+        agencyId: req.body.agencyId,
+        type: req.body.type || 'checkin',
+        language: req.body.language || 'fr',
+        customerName: req.body.customerName,
+        cgvText: req.body.cgvText,
+        rgpdText: req.body.rgpdText,
+        status: 'pending',
+        expiresAt: new Date(Date.now() + 30 * 60 * 1000) // 30 min expiry
+      }
+    })
+    res.json(session)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Update session (signature from tablet)
+router.put('/api/tablet-sessions/:sessionId', async (req, res) => {
+  try {
+    const session = await prisma.tabletSession.update({
+      where: { sessionId: req.params.sessionId },
+      data: {
+        signature: req.body.signature,
+        termsAccepted: req.body.termsAccepted,
+        rgpdAccepted: req.body.rgpdAccepted,
+        status: req.body.status || 'signed',
+        signedAt: req.body.status === 'signed' ? new Date() : undefined
+      }
+    })
+    res.json(session)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Delete/cancel session
+router.delete('/api/tablet-sessions/:sessionId', async (req, res) => {
+  try {
+    await prisma.tabletSession.delete({
+      where: { sessionId: req.params.sessionId }
+    })
+    res.json({ success: true })
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+
+
+// ============== WALKIN SESSIONS ==============
+
+// Get pending walkin for agency (tablet polls this)
+router.get('/api/walkin-sessions/agency/:agencyId', async (req, res) => {
+  try {
+    const session = await prisma.walkinSession.findFirst({
+      where: {
+        agencyId: req.params.agencyId,
+        status: 'pending'
+      },
+      orderBy: { createdAt: 'desc' }
+    })
+    res.json(session)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Get pending walkin for multiple agencies (tablet polls this)
+router.get('/api/walkin-sessions/agencies', async (req, res) => {
+  try {
+    const agencyIds = (req.query.ids as string)?.split(',') || []
+    const session = await prisma.walkinSession.findFirst({
+      where: {
+        agencyId: { in: agencyIds },
+        status: 'pending'
+      },
+      orderBy: { createdAt: 'desc' }
+    })
+    res.json(session)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Get walkin by sessionId
+router.get('/api/walkin-sessions/:sessionId', async (req, res) => {
+  try {
+    const session = await prisma.walkinSession.findUnique({
+      where: { sessionId: req.params.sessionId }
+    })
+    res.json(session)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Create walkin session (from operator app)
+router.post('/api/walkin-sessions', async (req, res) => {
+  try {
+    const session = await prisma.walkinSession.create({
+      data: {
+        sessionId: req.body.sessionId,
+        agencyId: req.body.agencyId,
+        language: req.body.language || 'fr',
+        brand: req.body.brand,
+        status: 'pending',
+        expiresAt: new Date(Date.now() + 30 * 60 * 1000)
+      }
+    })
+    res.json(session)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Update walkin session (customer data from tablet)
+router.put('/api/walkin-sessions/:sessionId', async (req, res) => {
+  try {
+    const session = await prisma.walkinSession.update({
+      where: { sessionId: req.params.sessionId },
+      data: {
+        firstName: req.body.firstName,
+        lastName: req.body.lastName,
+        email: req.body.email,
+        phone: req.body.phone,
+        phonePrefix: req.body.phonePrefix,
+        address: req.body.address,
+        city: req.body.city,
+        postalCode: req.body.postalCode,
+        country: req.body.country,
+        status: req.body.status || 'completed',
+        completedAt: req.body.status === 'completed' ? new Date() : undefined
+      }
+    })
+    res.json(session)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Delete walkin session
+router.delete('/api/walkin-sessions/:sessionId', async (req, res) => {
+  try {
+    await prisma.walkinSession.delete({
+      where: { sessionId: req.params.sessionId }
+    })
+    res.json({ success: true })
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+
+
+
+// ============== AUTO-ASSIGNMENT FUNCTION ==============
+// Logique: Privilégier les véhicules qui ont déjà des réservations proches
+// pour garder des véhicules complètement libres pour les longues locations (services/fleetAssignment).
+// Choix et écriture ensemble, avec nouvel essai si un autre réplica prend le véhicule (contrainte d'exclusion)
+async function autoAssignVehicle(bookingId: string, vehicleTypeId: string, agencyId: string, startDate: Date, endDate: Date): Promise<{ fleetId: string | null, reason: string, attempts: number }> {
+  try {
+    return await claimFleetUnit(prisma, bookingId, vehicleTypeId, agencyId, startDate, endDate)
+  } catch (error) {
+    console.error('Auto-assign error:', error)
+    return { fleetId: null, reason: 'Erreur lors de l\'assignation automatique', attempts: 1 }
+  }
+}
+
+// Réoptimisation des N prochains jours d'une agence (ex. véhicule passé en maintenance).
+// Simulation par défaut ; { apply: true } applique les déplacements et trace les réallocations.
+router.post('/api/agencies/:id/reoptimize', async (req, res) => {
+  try {
+    const { days, vehicleId, apply, performedBy } = req.body || {}
+    const result = await reoptimizeAgency(prisma, req.params.id, {
+      days: days ? parseInt(days) : undefined,
+      vehicleId: vehicleId || undefined,
+      apply: apply === true,
+      performedBy
+    })
+    res.json(result)
+  } catch (error) {
+    // Une réservation a été affectée par ailleurs entre le calcul et l'application : relancer la réoptimisation
+    if (isBookingOverlapError(error)) return res.status(409).json({ error: BOOKING_OVERLAP_MESSAGE })
+    console.error('Reoptimize error:', error)
+    res.status(500).json({ error: 'Failed to reoptimize assignments' })
+  }
+})
+
+// ============== OUTBOX ==============
+// Effets de bord traités par le worker outbox (services/outbox) : l'id du message sert de clé d'idempotence Resend
+
+// Paiement confirmé : un message par email, chacun avec ses propres tentatives
+outboxWorker.register('booking.confirmed', async ({ bookingId }) => {
+  const booking = await prisma.booking.findUnique({
+    where: { id: bookingId },
+    include: { customer: true, agency: true, items: { include: { vehicle: true } }, fleetVehicle: true }
+  })
+  if (!booking?.customer?.email) return
+  const [customer, admin] = bookingConfirmationEmails(booking)
+  await enqueueOutbox(prisma, [
+    { topic: 'email', payload: customer as any, dedupeKey: `booking.confirmed:${bookingId}:customer` },
+    { topic: 'email', payload: admin as any, dedupeKey: `booking.confirmed:${bookingId}:admin` }
+  ])
+  outboxWorker.wake()
+})
+
+// ============== BOOKING ASSIGNMENT ==============
+
+// Assign fleet vehicle to booking
+router.put('/api/bookings/:id/assign', async (req, res) => {
+  try {
+    const { id } = req.params
+    const { fleetVehicleId } = req.body
+    
+    const booking = await prisma.booking.update({
+      where: { id },
+      data: {
+        fleetVehicleId,
+        assignmentType: 'MANUAL',
+        assignedAt: new Date()
+      },
+      include: {
+        agency: true,
+        customer: true,
+        items: { include: { vehicle: true } }
+      }
+    })
+    
+    // Update fleet vehicle status if booking starts today
+    const today = new Date().toISOString().split('T')[0]
+    const startDate = booking.startDate.toISOString().split('T')[0]
+    if (startDate === today && fleetVehicleId) {
+      await prisma.fleet.update({
+        where: { id: fleetVehicleId },
+        data: { status: 'RESERVED' }
+      })
+    }
+    
+    res.json(booking)
+  } catch (e: any) {
+    if (isBookingOverlapError(e)) return res.status(409).json({ error: BOOKING_OVERLAP_MESSAGE })
+    console.error(e)
+    res.status(500).json({ error: 'Failed to assign vehicle' })
+  }
+})
+
+// Update booking dates/times
+router.put('/api/bookings/:id', async (req, res) => {
+  try {
+    const { id } = req.params
+    const { startDate, endDate, startTime, endTime, fleetVehicleId, status, checkedIn, checkedInAt, checkedOut, checkedOutAt, options } = req.body
+    
+    const updateData: any = {}
+    if (startDate) updateData.startDate = new Date(startDate)
+    if (endDate) updateData.endDate = new Date(endDate)
+    if (startTime) updateData.startTime = startTime
+    if (endTime) updateData.endTime = endTime
+    if (fleetVehicleId !== undefined) {
+      updateData.fleetVehicleId = fleetVehicleId
+      updateData.assignmentType = fleetVehicleId ? 'MANUAL' : null
+      updateData.assignedAt = fleetVehicleId ? new Date() : null
+    }
+    if (status) updateData.status = status
+    if (checkedIn !== undefined) updateData.checkedIn = checkedIn
+    if (checkedInAt) updateData.checkedInAt = new Date(checkedInAt)
+    if (checkedOut !== undefined) updateData.checkedOut = checkedOut
+    if (checkedOutAt) updateData.checkedOutAt = new Date(checkedOutAt)
+    
+    // Check-in fields
+    if (req.body.startMileage !== undefined) updateData.startMileage = req.body.startMileage
+    if (req.body.fuelLevelStart) updateData.fuelLevelStart = req.body.fuelLevelStart
+    if (req.body.depositMethod) updateData.depositMethod = req.body.depositMethod
+    if (req.body.paidAmount !== undefined) updateData.paidAmount = req.body.paidAmount
+    if (req.body.idCardUrl) updateData.idCardUrl = req.body.idCardUrl
+    if (req.body.idCardReversoUrl) updateData.idCardVersoUrl = req.body.idCardReversoUrl
+    if (req.body.licenseUrl) updateData.licenseUrl = req.body.licenseUrl
+    if (req.body.licenseReversoUrl) updateData.licenseVersoUrl = req.body.licenseReversoUrl
+    if (req.body.signatureUrl) updateData.signatureUrl = req.body.signatureUrl
+    // Check-in photos
+    if (req.body.checkInPhotos) {
+      const photos = req.body.checkInPhotos
+      if (photos.front) updateData.photoFront = photos.front
+      if (photos.left) updateData.photoLeft = photos.left
+      if (photos.right) updateData.photoRight = photos.right
+      if (photos.rear) updateData.photoRear = photos.rear
+      if (photos.counter) updateData.photoCounter = photos.counter
+    }
+    
+    // Mise à jour des options si fournies
+    if (options && Array.isArray(options)) {
+      console.log('Updating options for booking:', id, 'Options:', JSON.stringify(options))
+      
+      // Supprimer les anciennes options
+      await prisma.bookingOption.deleteMany({ where: { bookingId: id } })
+      console.log('Deleted old options')
+      
+      // Récupérer les dates de la réservation
+      const existingBooking = await prisma.booking.findUnique({ where: { id } })
+      const start = updateData.startDate || existingBooking?.startDate
+      const end = updateData.endDate || existingBooking?.endDate
+      const days = start && end ? rentalDays(start, end) : 1
+      console.log('Days calculated:', days)
+      
+      // Ajouter les nouvelles options, prix du moteur de devis
+      const requested = options.filter((opt: any) => opt.quantity > 0 && opt.optionId)
+      const known = new Set((await prisma.option.findMany({ where: { id: { in: requested.map((opt: any) => opt.optionId) } }, select: { id: true } })).map(o => o.id))
+      const priced = await getQuoteEngine(prisma).priceBooking(days, 0, [], requested.filter((opt: any) => known.has(opt.optionId)).map((opt: any) => ({ id: opt.optionId, quantity: opt.quantity })))
+      if (priced.options.length) {
+        await prisma.bookingOption.createMany({ data: priced.options.map(opt => ({ bookingId: id, ...opt })) })
+      }
+      console.log('Options created:', priced.options.length)
+    }
+    // Recalculer le prix si les dates ont changé
+    if (startDate || endDate) {
+      const existingBooking = await prisma.booking.findUnique({ 
+        where: { id },
+        include: { items: true }
+      })
+      if (existingBooking) {
+        const newStart = updateData.startDate || existingBooking.startDate
+        const newEnd = updateData.endDate || existingBooking.endDate
+        const days = rentalDays(newStart, newEnd)
+        
+        const { total: newTotal } = await getQuoteEngine(prisma).priceBooking(days, 0, existingBooking.items.map(item => ({ id: item.vehicleId, quantity: item.quantity })))
+        
+        if (newTotal > 0) {
+          updateData.totalPrice = newTotal
+          console.log('Recalculated price:', { days, newTotal })
+        }
+      }
+    }
+    const booking = await prisma.booking.update({
+      where: { id },
+      data: updateData,
+      include: {
+        agency: true,
+        customer: true,
+        fleetVehicle: { include: { vehicle: true } },
+        options: { include: { option: true } },
+        items: { include: { vehicle: true } }
+      }
+    })
+    
+    // Mettre à jour le contrat avec les docs CNI
+    if (req.body.idCardReversoUrl || req.body.idCardUrl) {
+      const existingContract = await prisma.rentalContract.findUnique({ where: { bookingId: id } })
+      if (existingContract) {
+        await prisma.rentalContract.update({
+          where: { id: existingContract.id },
+          data: {
+            ...(req.body.idCardUrl && { customerIdCardUrl: req.body.idCardUrl }),
+            ...(req.body.idCardReversoUrl && { customerIdCardVersoUrl: req.body.idCardReversoUrl })
+          }
+        })
+      }
+    }
+    res.json(booking)
+  } catch (e: any) {
+    if (isBookingOverlapError(e)) return res.status(409).json({ error: BOOKING_OVERLAP_MESSAGE })
+    console.error(e)
+    res.status(500).json({ error: 'Failed to update booking' })
+  }
+})
+
+// Create new booking (operator)
+router.post('/api/bookings/operator', async (req, res) => {
+  try {
+    const {
+      agencyId,
+      fleetVehicleId,
+      customerId,
+      customerData, // { firstName, lastName, email, phone }
+      startDate,
+      endDate,
+      startTime,
+      endTime,
+      vehicleId,
+      quantity = 1,
+      unitPrice,
+      totalPrice,
+      depositAmount,
+      paidAmount = 0,
+      paymentMethod,
+      language = 'fr'
+    } = req.body
+    
+    // Create or find customer
+    let customer
+    if (customerId) {
+      customer = await prisma.customer.findUnique({ where: { id: customerId } })
+    } else if (customerData) {
+      // Check if customer exists by email
+      customer = await prisma.customer.findFirst({ where: { email: customerData.email } })
+      if (!customer) {
+        customer = await prisma.customer.create({
+          data: {
+            firstName: customerData.firstName,
+            lastName: customerData.lastName,
+            email: customerData.email,
+            phone: customerData.phone,
+            language
+          }
+        })
+      }
+    }
+    
+    if (!customer) {
+      return res.status(400).json({ error: 'Customer required' })
+    }
+    
+    // Generate reference avec la marque de l'agence
+    const agencyForRef = await prisma.agency.findUnique({ where: { id: agencyId } })
+    const reference = await generateBookingReference(agencyForRef?.brand || 'VOLTRIDE')
+    
+    // Create booking
+    const booking = await prisma.booking.create({
+      data: {
+        reference,
+        agencyId,
+        customerId: customer.id,
+        fleetVehicleId,
+        assignmentType: fleetVehicleId ? 'MANUAL' : null,
+        assignedAt: fleetVehicleId ? new Date() : null,
+        startDate: new Date(startDate),
+        endDate: new Date(endDate),
+        startTime,
+        endTime,
+        totalPrice,
+        depositAmount,
+        paidAmount: paidAmount || 0,
+        paymentMethod: paymentMethod || null,
+        status: 'CONFIRMED',
+        language,
+        source: 'WALK_IN',
+        items: {
+          create: [{
+            vehicleId,
+            quantity,
+            unitPrice: unitPrice || totalPrice,
+            totalPrice: (unitPrice || totalPrice) * quantity
+          }]
+        }
+      },
+      include: {
+        agency: true,
+        customer: true,
+        items: { include: { vehicle: true } }
+      }
+    })
+    
+    // Update fleet vehicle status
+    if (fleetVehicleId) {
+      const today = new Date().toISOString().split('T')[0]
+      const startDateStr = new Date(startDate).toISOString().split('T')[0]
+      if (startDateStr === today) {
+        await prisma.fleet.update({
+          where: { id: fleetVehicleId },
+          data: { status: 'RESERVED' }
+        })
+      }
+    }
+   // Email notification admin
+    try {
+      const adminEmail = booking.agency?.brand === 'VOLTRIDE' ? 'info@voltride.es' : 'info@motor-rent.es'
+      const fromEmail2 = booking.agency?.brand === 'VOLTRIDE' ? 'reservations@voltride.es' : 'reservations@motor-rent.es'
+      const brandName2 = booking.agency?.brand === 'VOLTRIDE' ? 'Voltride' : 'Motor-Rent'
+      const vehicleName2 = booking.items?.[0]?.vehicle?.name
+      const vName2 = typeof vehicleName2 === 'object' ? ((vehicleName2 as any)?.es || (vehicleName2 as any)?.fr || '') : (vehicleName2 || '')
+      await getResendClient().emails.send({
+        from: brandName2 + ' <' + fromEmail2 + '>',
+        to: adminEmail,
+        subject: '🆕 Nueva reserva ' + booking.reference,
+        html: '<div style="font-family:Arial;max-width:600px;margin:0 auto">'
+          + '<h2 style="color:#0e7490">🆕 Nueva reserva - ' + booking.reference + '</h2>'
+          + '<table style="width:100%;border-collapse:collapse">'
+          + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Cliente</td><td style="padding:8px;border-bottom:1px solid #eee;font-weight:bold">' + booking.customer?.firstName + ' ' + booking.customer?.lastName + '</td></tr>'
+          + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Email</td><td style="padding:8px;border-bottom:1px solid #eee">' + booking.customer?.email + '</td></tr>'
+          + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Teléfono</td><td style="padding:8px;border-bottom:1px solid #eee">' + (booking.customer?.phone || '-') + '</td></tr>'
+          + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Vehículo</td><td style="padding:8px;border-bottom:1px solid #eee">' + vName2 + '</td></tr>'
+          + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Período</td><td style="padding:8px;border-bottom:1px solid #eee">' + new Date(booking.startDate).toLocaleDateString('es-ES') + ' ' + booking.startTime + ' → ' + new Date(booking.endDate).toLocaleDateString('es-ES') + ' ' + booking.endTime + '</td></tr>'
+          + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Precio</td><td style="padding:8px;border-bottom:1px solid #eee;font-weight:bold;color:#0e7490">' + booking.totalPrice?.toFixed(2) + '€</td></tr>'
+          + '<tr><td style="padding:8px;border-bottom:1px solid #eee;color:#666">Origen</td><td style="padding:8px;border-bottom:1px solid #eee">🏪 Agencia (operador)</td></tr>'
+          + '<tr><td style="padding:8px;color:#666">Agencia</td><td style="padding:8px">' + ((booking.agency?.name as any)?.es || (booking.agency?.name as any)?.fr || '') + '</td></tr>'
+          + '</table></div>'
+      })
+    } catch (emailErr) { console.error('Admin notification email error:', emailErr) } 
+    res.json(booking)
+  } catch (e: any) {
+    if (isBookingOverlapError(e)) return res.status(409).json({ error: BOOKING_OVERLAP_MESSAGE })
+    console.error(e)
+    res.status(500).json({ error: 'Failed to create booking' })
+  }
+})
+
+// Get available fleet vehicles for a date range
+
+// Search customers (index trigramme, voir services/customerSearch)
+router.get('/api/customers/search', async (req, res) => {
+  try {
+    const q = (req.query.q as string) || ''
+    const customers = await searchCustomers(prisma, q, { limit: parseInt(req.query.limit as string) || undefined })
+    res.json(customers)
+  } catch (e: any) {
+    console.error(e)
+    res.status(500).json({ error: 'Failed to search customers' })
+  }
+})
+
+console.log('Booking assignment and operator routes loaded')
+
+// ============== EMAIL CONFIRMATION ==============
+
+const emailTemplates = {
+  fr: {
+    subject: 'Confirmation de réservation',
+    greeting: 'Bonjour',
+    confirmationText: 'Votre réservation a bien été enregistrée.',
+    vehicleLabel: 'Véhicule',
+    periodLabel: 'Période de location',
+    from: 'du',
+    to: 'au',
+    at: 'à',
+    totalLabel: 'Total de la réservation',
+    paidLabel: 'Montant payé',
+    remainingLabel: 'Reste à payer sur place',
+    depositLabel: 'Caution (à prévoir au check-in)',
+    documentsTitle: 'Documents à prévoir le jour de la location',
+    documentsRegistered: [
+      "Pièce d'identité ou passeport (le permis de conduire étranger ne fait pas office de pièce d'identité)",
+      "Permis de conduire physique valide",
+      "Carte de crédit ou espèces (pas de carte de débit)"
+    ],
+    documentsNonRegistered: [
+      "Pièce d'identité ou passeport (le permis de conduire étranger ne fait pas office de pièce d'identité)",
+      "Carte de crédit ou espèces (pas de carte de débit)"
+    ],
+    paymentTitle: 'Récapitulatif du paiement',
+    paymentMethod: 'Mode de paiement',
+    card: 'Carte bancaire',
+    cash: 'Espèces',
+    portalUrl: 'https://voltride.es/espace-client',
+    portalButton: 'Accéder à mon espace client',
+    portalDescription: 'Suivez, modifiez ou prolongez votre réservation depuis votre espace client :',
+    footer: "Merci pour votre confiance. À bientôt !",
+    team: "L'équipe"
+  },
+  es: {
+    subject: 'Confirmación de reserva',
+    greeting: 'Hola',
+    confirmationText: 'Su reserva ha sido registrada correctamente.',
+    vehicleLabel: 'Vehículo',
+    periodLabel: 'Período de alquiler',
+    from: 'del',
+    to: 'al',
+    at: 'a las',
+    totalLabel: 'Total de la reserva',
+    paidLabel: 'Importe pagado',
+    remainingLabel: 'Resto a pagar en el local',
+    depositLabel: 'Fianza (a prever en el check-in)',
+    documentsTitle: 'Documentos necesarios el día del alquiler',
+    documentsRegistered: [
+      "Documento de identidad o pasaporte (el permiso de conducir extranjero no sirve como documento de identidad)",
+      "Permiso de conducir físico válido",
+      "Tarjeta de crédito o efectivo (no tarjeta de débito)"
+    ],
+    documentsNonRegistered: [
+      "Documento de identidad o pasaporte (el permiso de conducir extranjero no sirve como documento de identidad)",
+      "Tarjeta de crédito o efectivo (no tarjeta de débito)"
+    ],
+    paymentTitle: 'Resumen del pago',
+    paymentMethod: 'Método de pago',
+    card: 'Tarjeta bancaria',
+    cash: 'Efectivo',
+    portalUrl: 'https://voltride.es/mi-cuenta',
+    portalButton: 'Acceder a mi espacio cliente',
+    portalDescription: 'Consulte, modifique o prolongue su reserva desde su espacio cliente :',
+    footer: "Gracias por su confianza. ¡Hasta pronto!",
+    team: "El equipo"
+  },
+  en: {
+    subject: 'Booking Confirmation',
+    greeting: 'Hello',
+    confirmationText: 'Your booking has been successfully registered.',
+    vehicleLabel: 'Vehicle',
+    periodLabel: 'Rental period',
+    from: 'from',
+    to: 'to',
+    at: 'at',
+    totalLabel: 'Total booking amount',
+    paidLabel: 'Amount paid',
+    remainingLabel: 'Remaining to pay on site',
+    depositLabel: 'Deposit (required at check-in)',
+    documentsTitle: 'Documents required on rental day',
+    documentsRegistered: [
+      "ID card or passport (foreign driving license does not serve as ID)",
+      "Valid physical driving license",
+      "Credit card or cash (no debit card)"
+    ],
+    documentsNonRegistered: [
+      "ID card or passport (foreign driving license does not serve as ID)",
+      "Credit card or cash (no debit card)"
+    ],
+    paymentTitle: 'Payment summary',
+    paymentMethod: 'Payment method',
+    card: 'Credit card',
+    cash: 'Cash',
+    portalUrl: 'https://voltride.es/my-account',
+    portalButton: 'Access my customer portal',
+    portalDescription: 'Track, modify or extend your booking from your customer portal :',
+    footer: "Thank you for your trust. See you soon!",
+    team: "The team"
+  }
+}
+
+router.post('/api/send-booking-confirmation', async (req, res) => {
+  console.log('[EMAIL] === Starting email send ===')
+  console.log('[EMAIL] Request body:', JSON.stringify(req.body, null, 2))
+  
+  try {
+    const { 
+      bookingId, email, firstName, lastName, vehicleName, vehicleNumber,
+      startDate, endDate, startTime, endTime, totalPrice, paidAmount, 
+      remainingAmount, paymentMethod, brand, language = 'fr', isRegisteredVehicle = false
+    } = req.body
+
+    console.log('[EMAIL] Parsed data - email:', email, 'brand:', brand, 'language:', language, 'isRegistered:', isRegisteredVehicle)
+
+    const t = emailTemplates[language as keyof typeof emailTemplates] || emailTemplates.fr
+    const brandName = brand === 'VOLTRIDE' ? 'Voltride' : 'Motor-Rent'
+    const brandColor = brand === 'VOLTRIDE' ? '#0e7490' : '#ffaf10'
+    const logoUrl = brand === 'VOLTRIDE' 
+      ? 'https://res.cloudinary.com/dis5pcnfr/image/upload/v1766883143/IMG-20251228-WA0001-removebg-preview_n0fsq5.png'
+      : 'https://res.cloudinary.com/dof8xnabp/image/upload/v1737372450/MOTOR_RENT_LOGO_copy_kxwqjk.png'
+
+    const documents = isRegisteredVehicle ? t.documentsRegistered : t.documentsNonRegistered
+
+    const formatDate = (date: string) => {
+      const d = new Date(date)
+      return d.toLocaleDateString(language === 'en' ? 'en-GB' : language === 'es' ? 'es-ES' : 'fr-FR')
+    }
+    // Generate QR code for booking and upload to Cloudinary
+    const operatorUrl = brand === 'VOLTRIDE' ? 'https://operator-production-188c.up.railway.app' : 'https://motor-rent-operator-production.up.railway.app'
+    const qrUrl = operatorUrl + '?scan=' + bookingId
+    const qrDataUrl = await loadQRCode().toDataURL(qrUrl, { width: 300, margin: 1 })
+    let qrImageUrl = qrDataUrl
+    try {
+      const timestamp = Math.round(Date.now() / 1000)
+      const folder = 'qrcodes/bookings'
+      const publicId = 'qr-' + bookingId
+      const crypto = require('crypto')
+      const apiSecret = process.env.CLOUDINARY_API_SECRET || ''
+      const signStr = 'folder=' + folder + '&public_id=' + publicId + '&timestamp=' + timestamp + apiSecret
+      const signature = crypto.createHash('sha1').update(signStr).digest('hex')
+      
+      const formData = new URLSearchParams()
+      formData.append('file', qrDataUrl)
+      formData.append('folder', folder)
+      formData.append('public_id', publicId)
+      formData.append('timestamp', String(timestamp))
+      formData.append('api_key', process.env.CLOUDINARY_API_KEY || '485395684484158')
+      formData.append('signature', signature)
+      
+      const cloudRes = await fetch('https://api.cloudinary.com/v1_1/dis5pcnfr/image/upload', {
+        method: 'POST',
+        body: formData
+      })
+      const cloudData: any = await cloudRes.json()
+      if (cloudData.secure_url) {
+        qrImageUrl = cloudData.secure_url
+        console.log('[QR] Uploaded to Cloudinary:', qrImageUrl)
+      } else {
+        console.error('[QR] Cloudinary error:', cloudData)
+      }
+    } catch (e) { console.error('[QR] Upload error:', e) }
+
+    const html = `
+    <!DOCTYPE html>
+    <html>
+    <head><meta charset="UTF-8"></head>
+    <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f5f5f5;">
+      <div style="background: ${brandColor}; color: white; padding: 30px 20px; text-align: center; border-radius: 10px 10px 0 0;">
+        <img src="${logoUrl}" alt="${brandName}" style="max-width: 200px; max-height: 80px; margin-bottom: 10px;" />
+        <p style="margin: 10px 0 0 0; font-size: 18px;">${t.subject}</p>
+      </div>
+      <div style="padding: 25px; border: 1px solid #ddd; border-top: none; background: white;">
+        <p style="font-size: 16px;">${t.greeting} ${firstName},</p>
+        <p>${t.confirmationText}</p>
+        
+        <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 20px 0; border-left: 4px solid ${brandColor};">
+          <h3 style="margin-top: 0; color: ${brandColor};">🚲 ${t.vehicleLabel}</h3>
+          <p style="margin: 0; font-size: 16px;"><strong>${vehicleNumber}</strong> - ${vehicleName}</p>
+        </div>
+        
+        <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 20px 0; border-left: 4px solid ${brandColor};">
+          <h3 style="margin-top: 0; color: ${brandColor};">📅 ${t.periodLabel}</h3>
+          <p style="margin: 0;">${t.from} <strong>${formatDate(startDate)}</strong> ${t.at} <strong>${startTime}</strong></p>
+          <p style="margin: 5px 0 0 0;">${t.to} <strong>${formatDate(endDate)}</strong> ${t.at} <strong>${endTime}</strong></p>
+        </div>
+        
+        <div style="background: #e8f4f8; padding: 15px; border-radius: 8px; margin: 20px 0;">
+          <h3 style="margin-top: 0; color: #0e7490;">💰 ${t.paymentTitle}</h3>
+          <table style="width: 100%; border-collapse: collapse;">
+            <tr><td style="padding: 8px 0;">${t.totalLabel}</td><td style="text-align: right; padding: 8px 0;"><strong>${totalPrice}€</strong></td></tr>
+            <tr><td style="padding: 8px 0;">${t.paidLabel} (${paymentMethod === 'card' ? t.card : t.cash})</td><td style="text-align: right; padding: 8px 0; color: green;"><strong>${paidAmount}€</strong></td></tr>
+            ${remainingAmount > 0 ? '<tr><td style="padding: 8px 0;">' + t.remainingLabel + '</td><td style="text-align: right; padding: 8px 0; color: orange;"><strong>' + remainingAmount + '€</strong></td></tr>' : ''}
+            <tr style="border-top: 2px solid #ccc;"><td style="padding: 12px 0; font-weight: bold;">${t.depositLabel}</td><td style="text-align: right; padding: 12px 0;"><strong>${req.body.depositAmount || 100}€</strong></td></tr>
+          </table>
+        </div>
+        <div style="text-align: center; margin: 30px 0; padding: 20px; background: #f0f9ff; border-radius: 8px;">
+          <p style="color: #555; margin-bottom: 15px;">${t.portalDescription}</p>
+          <a href="${t.portalUrl}" style="display: inline-block; padding: 14px 30px; background-color: ${brandColor}; color: white; text-decoration: none; border-radius: 8px; font-weight: bold; font-size: 16px;">${t.portalButton}</a>
+        </div>
+        
+        <div style="background: #fff3cd; padding: 15px; border-radius: 8px; margin: 20px 0; border: 1px solid #ffc107;">
+          <h3 style="margin-top: 0; color: #856404;">📋 ${t.documentsTitle}</h3>
+          <ul style="margin: 0; padding-left: 20px; color: #856404;">
+            ${documents.map((doc: string) => '<li style="margin-bottom: 8px;">' + doc + '</li>').join('')}
+          </ul>
+        </div>
+        
+        <div style="text-align: center; margin: 25px 0; padding: 20px; background: #f8f9fa; border-radius: 8px; border: 1px dashed #ddd;">
+          <p style="font-weight: bold; color: #333; margin-bottom: 10px;">📱 QR Code - Check-in</p>
+          <img src="${qrImageUrl}" alt="QR Code" style="width: 180px; height: 180px;" />
+          <p style="font-size: 12px; color: #888; margin-top: 8px;">${vehicleNumber}</p>
+        </div>
+
+        <p style="text-align: center; color: #666; margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee;">
+          ${t.footer}<br/>
+          <strong>${t.team} ${brandName}</strong>
+        </p>
+      </div>
+      <div style="text-align: center; padding: 15px; color: #999; font-size: 12px;">
+        © ${new Date().getFullYear()} ${brandName} - Tous droits réservés
+      </div>
+    </body>
+    </html>
+    `
+
+    const fromEmail = brand === 'VOLTRIDE' ? 'reservations@voltride.es' : 'reservations@motor-rent.es'
+    
+    console.log('[EMAIL] Sending email from:', fromEmail, 'to:', email)
+    
+    const result = await getResendClient().emails.send({
+      from: brandName + ' <' + fromEmail + '>',
+      to: email,
+      subject: t.subject + ' - ' + vehicleNumber,
+      html
+    })
+
+    console.log('[EMAIL] Resend response:', JSON.stringify(result, null, 2))
+    console.log('[EMAIL] Confirmation sent to ' + email + ' for booking ' + bookingId)
+    res.json({ success: true, resendResponse: result })
+  } catch (error: any) {
+    console.error('[EMAIL] Error details:', error)
+    res.status(500).json({ error: error.message || 'Failed to send email' })
+  }
+})
+
+console.log('Email confirmation routes loaded')
+
+export default router
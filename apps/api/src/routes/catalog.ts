@@ -0,0 +1,705 @@
+import { Router } from 'express'
+import { getAvailabilityIndex, monthDayRanges } from '../services/availabilityIndex'
+import { prisma } from '../db'
+import { getCatalogCache, sendCatalog } from '../services/catalogCache'
+import { MAX_CALENDAR_DAYS, dayNumber, formatDay, getAgencyCalendarCache } from '../services/agencyCalendar'
+import { MAX_QUOTE_DAYS, getQuoteEngine, rentalDays, rentalExtraHours } from '../services/quoteEngine'
+
+// Catalogue : agences, catégories, véhicules, options, disponibilités, devis, horaires et réglages de marque / widget
+
+const router = Router()
+const availabilityIndex = getAvailabilityIndex(prisma)
+
+// ============== AGENCIES ==============
+// Lectures du catalogue servies par services/catalogCache (ETag + 304), invalidées par les écritures Prisma
+const catalogAgencies = (brand?: string) =>
+  prisma.agency.findMany({ where: { isActive: true, ...(brand ? { brand } : {}) }, orderBy: { code: 'asc' } })
+const catalogCategories = (brand?: string) =>
+  prisma.category.findMany({ where: brand ? { brand } : {}, orderBy: { code: 'asc' }, include: { _count: { select: { vehicles: true } }, options: { include: { option: true } } } })
+const catalogVehicles = (brand?: string) =>
+  prisma.vehicle.findMany({ where: { isActive: true, ...(brand ? { category: { brand } } : {}) }, include: { category: true, pricing: true, inventory: true, characteristics: { where: { isActive: true }, orderBy: { order: "asc" } } }, orderBy: { sku: 'asc' } })
+const catalogOptions = () =>
+  prisma.option.findMany({ where: { isActive: true }, include: { categories: { include: { category: true } } }, orderBy: [{ includedByDefault: 'asc' }, { sortOrder: 'asc' }, { code: 'asc' }] })
+const catalogWidgetSettings = async (brand: string) =>
+  (await prisma.appSettings.findUnique({ where: { key: `widget-${brand.toLowerCase()}` } }))?.value || null
+
+router.get('/api/agencies', async (req, res) => {
+  try {
+    await sendCatalog(req, res, 'agencies', () => catalogAgencies())
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch agencies' }) }
+})
+
+router.post('/api/agencies', async (req, res) => {
+  try {
+    const agency = await prisma.agency.create({
+      data: { code: req.body.code, name: req.body.name, address: req.body.address, city: req.body.city, postalCode: req.body.postalCode, country: req.body.country || 'ES', phone: req.body.phone, email: req.body.email, brand: req.body.brand || 'VOLTRIDE', isActive: req.body.isActive ?? true, closedOnSunday: req.body.closedOnSunday ?? false, agencyType: req.body.agencyType || 'OWN', commissionRate: req.body.commissionRate || null, commissionEmail: req.body.commissionEmail || null, showStockUrgency: req.body.showStockUrgency || false }
+    })
+    res.json(agency)
+  } catch (error) { res.status(500).json({ error: 'Failed to create agency' }) }
+})
+
+router.put('/api/agencies/:id', async (req, res) => {
+  try {
+    const agency = await prisma.agency.update({ where: { id: req.params.id }, data: { code: req.body.code, name: req.body.name, address: req.body.address, city: req.body.city, postalCode: req.body.postalCode, country: req.body.country, phone: req.body.phone, email: req.body.email, brand: req.body.brand, isActive: req.body.isActive, closedOnSunday: req.body.closedOnSunday, agencyType: req.body.agencyType, commissionRate: req.body.commissionRate, commissionEmail: req.body.commissionEmail, showStockUrgency: req.body.showStockUrgency } })
+    res.json(agency)
+  } catch (error) { res.status(500).json({ error: 'Failed to update agency' }) }
+})
+
+router.delete('/api/agencies/:id', async (req, res) => {
+  try { await prisma.agency.delete({ where: { id: req.params.id } }); res.json({ success: true }) }
+  catch (error) { res.status(500).json({ error: 'Failed to delete agency' }) }
+})
+
+// Chargement du widget en une requête : agences, véhicules (tarifs, stock, caractéristiques), options et réglages de la marque.
+// Réponse pré-sérialisée, partageable par les CDN / navigateurs CATALOG_MAX_AGE secondes (60 par défaut)
+const CATALOG_MAX_AGE = parseInt(process.env.CATALOG_MAX_AGE || '60', 10)
+
+router.get('/api/widget/bootstrap/:brand', async (req, res) => {
+  try {
+    const brand = req.params.brand.toUpperCase()
+    await sendCatalog(req, res, 'bootstrap:' + brand, async () => {
+      const [agencies, vehicles, options, settings] = await Promise.all([
+        catalogAgencies(brand), catalogVehicles(brand), catalogOptions(), catalogWidgetSettings(brand)
+      ])
+      return { brand, agencies, vehicles, options, settings, generatedAt: new Date().toISOString() }
+    }, CATALOG_MAX_AGE)
+  } catch (error) {
+    console.error('Widget bootstrap error:', error)
+    res.status(500).json({ error: 'Failed to load widget data' })
+  }
+})
+
+router.get('/api/catalog-cache/stats', (req, res) => { res.json(getCatalogCache().stats()) })
+
+// ============== CATEGORIES ==============
+// ===== ENDPOINTS FILTRES PAR BRAND =====
+
+// Get agencies by brand (VOLTRIDE or MOTOR-RENT)
+router.get('/api/agencies/brand/:brand', async (req, res) => {
+  try {
+    const brand = req.params.brand.toUpperCase()
+    await sendCatalog(req, res, 'agencies:' + brand, () => catalogAgencies(brand))
+  } catch (error) {
+    res.status(500).json({ error: 'Failed to fetch agencies by brand' })
+  }
+})
+
+// Get categories by brand (VOLTRIDE or MOTOR-RENT)
+router.get('/api/categories/brand/:brand', async (req, res) => {
+  try {
+    const brand = req.params.brand.toUpperCase()
+    await sendCatalog(req, res, 'categories:' + brand, () => catalogCategories(brand))
+  } catch (error) {
+    res.status(500).json({ error: 'Failed to fetch categories by brand' })
+  }
+})
+
+// ===== FIN ENDPOINTS FILTRES PAR BRAND =====
+router.get('/api/categories', async (req, res) => {
+  try {
+    await sendCatalog(req, res, 'categories', () => catalogCategories())
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch categories' }) }
+})
+
+router.post('/api/categories', async (req, res) => {
+  try {
+    const category = await prisma.category.create({ data: { code: req.body.code, name: req.body.name, brand: req.body.brand || 'VOLTRIDE', bookingFee: req.body.bookingFee || 0, bookingFeePercentLow: req.body.bookingFeePercentLow || 50, bookingFeePercentHigh: req.body.bookingFeePercentHigh || 20 } })
+    res.json(category)
+  } catch (error) { res.status(500).json({ error: 'Failed to create category' }) }
+})
+
+router.put('/api/categories/:id', async (req, res) => {
+  try {
+    const category = await prisma.category.update({ where: { id: req.params.id }, data: { code: req.body.code, name: req.body.name, brand: req.body.brand, bookingFee: req.body.bookingFee, bookingFeePercentLow: req.body.bookingFeePercentLow, bookingFeePercentHigh: req.body.bookingFeePercentHigh } })
+    res.json(category)
+  } catch (error) { res.status(500).json({ error: 'Failed to update category' }) }
+})
+
+router.delete('/api/categories/:id', async (req, res) => {
+  try { await prisma.category.delete({ where: { id: req.params.id } }); res.json({ success: true }) }
+  catch (error) { res.status(500).json({ error: 'Failed to delete category' }) }
+})
+
+// ============== VEHICLES ==============
+router.get('/api/vehicles', async (req, res) => {
+  try {
+    await sendCatalog(req, res, 'vehicles', () => catalogVehicles())
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch vehicles' }) }
+})
+
+router.post('/api/vehicles', async (req, res) => {
+  try {
+    const vehicle = await prisma.vehicle.create({
+      data: { sku: req.body.sku, name: req.body.name, description: req.body.description || {}, deposit: req.body.deposit, hasPlate: req.body.hasPlate || false, licenseType: req.body.licenseType || '', kmIncluded: req.body.kmIncluded || '', helmetIncluded: req.body.helmetIncluded ?? true, kmIncludedPerDay: req.body.kmIncludedPerDay || 100, extraKmPrice: req.body.extraKmPrice || 0.15, imageUrl: req.body.imageUrl, categoryId: req.body.categoryId, isActive: req.body.isActive ?? true, pricing: { create: req.body.pricing || {} } },
+      include: { category: true, pricing: true, characteristics: { where: { isActive: true }, orderBy: { order: "asc" } } }
+    })
+    res.json(vehicle)
+  } catch (error) { console.error(error); res.status(500).json({ error: 'Failed to create vehicle' }) }
+})
+
+router.put('/api/vehicles/:id', async (req, res) => {
+  try {
+    const vehicle = await prisma.vehicle.update({ where: { id: req.params.id }, data: { sku: req.body.sku, name: req.body.name, description: req.body.description, deposit: req.body.deposit, hasPlate: req.body.hasPlate, licenseType: req.body.licenseType, kmIncluded: req.body.kmIncluded, helmetIncluded: req.body.helmetIncluded, kmIncludedPerDay: req.body.kmIncludedPerDay, extraKmPrice: req.body.extraKmPrice, imageUrl: req.body.imageUrl, categoryId: req.body.categoryId, isActive: req.body.isActive }, include: { category: true, pricing: true, characteristics: { where: { isActive: true }, orderBy: { order: "asc" } } } })
+    if (req.body.pricing) { await prisma.pricing.updateMany({ where: { vehicleId: req.params.id }, data: req.body.pricing }) }
+    res.json(vehicle)
+  } catch (error) { res.status(500).json({ error: 'Failed to update vehicle' }) }
+})
+router.delete("/api/vehicles/:id", async (req, res) => {
+  try { await prisma.vehicle.delete({ where: { id: req.params.id } }); res.json({ success: true }) }
+  catch (error) { res.status(500).json({ error: "Failed to delete vehicle" }) }
+})
+
+
+// ============== VEHICLE CHARACTERISTICS ==============
+console.log("Vehicle characteristics routes loaded")
+router.get("/api/vehicles/:vehicleId/characteristics", async (req, res) => {
+  try {
+    const characteristics = await prisma.vehicleCharacteristic.findMany({ where: { vehicleId: req.params.vehicleId }, orderBy: { order: "asc" } })
+    res.json(characteristics)
+  } catch (error) { res.status(500).json({ error: "Failed to fetch characteristics" }) }
+})
+
+router.post("/api/vehicles/:vehicleId/characteristics", async (req, res) => {
+  try {
+    const char = await prisma.vehicleCharacteristic.create({ data: { vehicleId: req.params.vehicleId, label: req.body.label, shortLabel: req.body.shortLabel, description: req.body.description, icon: req.body.icon || null, color: req.body.color || "#3b82f6", order: req.body.order || 0, isActive: req.body.isActive !== undefined ? req.body.isActive : true } })
+    res.json(char)
+  } catch (error) { console.error(error); res.status(500).json({ error: "Failed to create characteristic" }) }
+})
+
+router.put("/api/characteristics/:id", async (req, res) => {
+  try {
+    const char = await prisma.vehicleCharacteristic.update({ where: { id: req.params.id }, data: { label: req.body.label, shortLabel: req.body.shortLabel, description: req.body.description, icon: req.body.icon, color: req.body.color, order: req.body.order, isActive: req.body.isActive } })
+    res.json(char)
+  } catch (error) { res.status(500).json({ error: "Failed to update characteristic" }) }
+})
+
+router.delete("/api/characteristics/:id", async (req, res) => {
+  try {
+    await prisma.vehicleCharacteristic.delete({ where: { id: req.params.id } })
+    res.json({ success: true })
+  } catch (error) { res.status(500).json({ error: "Failed to delete characteristic" }) }
+})
+
+// ============== FLEET AVAILABILITY FOR WIDGET ==============
+// Retourne le nombre de véhicules Fleet disponibles par type de véhicule pour une agence et des dates
+// Répond depuis l'index en mémoire (services/availabilityIndex), tenu à jour par le middleware Prisma
+router.get('/api/fleet-availability', async (req, res) => {
+  try {
+    const { agencyId, startDate, endDate } = req.query
+    
+    if (!agencyId) {
+      return res.status(400).json({ error: 'agencyId required' })
+    }
+
+    // Si des dates sont fournies, filtrer par disponibilité
+    const start = startDate ? new Date(startDate as string) : null
+    const end = endDate ? new Date(endDate as string) : null
+
+    const availabilityMap = await availabilityIndex.availability(agencyId as string, start, end)
+    res.json(availabilityMap)
+  } catch (error) {
+    console.error('Fleet availability error:', error)
+    res.status(500).json({ error: 'Failed to get fleet availability' })
+  }
+})
+
+// Disponibilités pour plusieurs périodes en une seule requête (calendrier du widget)
+// Body : { agencyId, ranges: [{ startDate, endDate }] } ou { agencyId, month: 'YYYY-MM' } (un créneau par jour)
+const MAX_BATCH_RANGES = 400
+
+// Élément de `ranges` : objet avec startDate / endDate en chaîne ISO ou timestamp
+const isRangeInput = (r: any) => !!r && typeof r === 'object'
+  && ['string', 'number'].includes(typeof r.startDate) && ['string', 'number'].includes(typeof r.endDate)
+
+router.post('/api/fleet-availability/batch', async (req, res) => {
+  try {
+    const { agencyId, ranges, month } = req.body
+
+    if (!agencyId || typeof agencyId !== 'string') {
+      return res.status(400).json({ error: 'agencyId required' })
+    }
+    if (!month && Array.isArray(ranges)) {
+      if (ranges.length > MAX_BATCH_RANGES) return res.status(400).json({ error: `Too many ranges (max ${MAX_BATCH_RANGES})` })
+      if (!ranges.every(isRangeInput)) return res.status(400).json({ error: 'Invalid range' })
+    }
+
+    const dateRanges = month
+      ? monthDayRanges(month)
+      : (Array.isArray(ranges) ? ranges.map((r: any) => ({ start: new Date(r.startDate), end: new Date(r.endDate) })) : null)
+
+    if (!dateRanges || dateRanges.length === 0) {
+      return res.status(400).json({ error: 'ranges or month (YYYY-MM) required' })
+    }
+    if (dateRanges.length > MAX_BATCH_RANGES) {
+      return res.status(400).json({ error: `Too many ranges (max ${MAX_BATCH_RANGES})` })
+    }
+    if (dateRanges.some(r => isNaN(r.start.getTime()) || isNaN(r.end.getTime()) || r.end <= r.start)) {
+      return res.status(400).json({ error: 'Invalid range' })
+    }
+
+    const results = await availabilityIndex.availabilityBatch(agencyId, dateRanges)
+    res.json({
+      ranges: dateRanges.map((r, i) => ({ startDate: r.start.toISOString(), endDate: r.end.toISOString(), availability: results[i] }))
+    })
+  } catch (error) {
+    console.error('Fleet availability batch error:', error)
+    res.status(500).json({ error: 'Failed to get fleet availability' })
+  }
+})
+
+// Disponibilités jour par jour d'un mois : { month, days: { 'YYYY-MM-DD': { vehicleId: count } } }
+router.get('/api/fleet-availability/calendar', async (req, res) => {
+  try {
+    const { agencyId, month } = req.query
+
+    if (!agencyId) {
+      return res.status(400).json({ error: 'agencyId required' })
+    }
+    const dateRanges = monthDayRanges((month as string) || '')
+    if (!dateRanges) {
+      return res.status(400).json({ error: 'month (YYYY-MM) required' })
+    }
+
+    const results = await availabilityIndex.availabilityBatch(agencyId as string, dateRanges)
+    const days: Record<string, Record<string, number>> = {}
+    dateRanges.forEach((r, i) => { days[r.start.toISOString().split('T')[0]] = results[i] })
+    res.json({ month, days })
+  } catch (error) {
+    console.error('Fleet availability calendar error:', error)
+    res.status(500).json({ error: 'Failed to get fleet availability' })
+  }
+})
+
+
+
+// ============== OPTIONS ==============
+router.get('/api/options', async (req, res) => {
+  try {
+    await sendCatalog(req, res, 'options', catalogOptions)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch options' }) }
+})
+
+router.post('/api/options', async (req, res) => {
+  try {
+    const option = await prisma.option.create({
+      data: {
+        code: req.body.code, name: req.body.name, description: req.body.description, maxQuantity: req.body.maxQuantity || 10, includedByDefault: req.body.includedByDefault || false, imageUrl: req.body.imageUrl || null,
+        day1: req.body.day1 || 0, day2: req.body.day2 || 0, day3: req.body.day3 || 0, day4: req.body.day4 || 0, day5: req.body.day5 || 0, day6: req.body.day6 || 0, day7: req.body.day7 || 0,
+        day8: req.body.day8 || 0, day9: req.body.day9 || 0, day10: req.body.day10 || 0, day11: req.body.day11 || 0, day12: req.body.day12 || 0, day13: req.body.day13 || 0, day14: req.body.day14 || 0,
+        isActive: req.body.isActive ?? true
+      }
+    })
+    if (req.body.categoryIds && req.body.categoryIds.length > 0) {
+      await prisma.optionCategory.createMany({ data: req.body.categoryIds.map((catId: string) => ({ optionId: option.id, categoryId: catId })) })
+    }
+    res.json(option)
+  } catch (error) { console.error(error); res.status(500).json({ error: 'Failed to create option' }) }
+})
+
+// Reorder options
+router.put("/api/options/reorder", async (req, res) => {
+  try {
+    const { orderedIds } = req.body;
+    const updates = orderedIds.map((id: string, index: number) =>
+      prisma.option.update({ where: { id }, data: { sortOrder: index } })
+    );
+    await Promise.all(updates);
+    res.json({ success: true });
+  } catch (error) {
+    console.error("Reorder options error:", error);
+    res.status(500).json({ error: "Failed to reorder options" });
+  }
+});
+router.put('/api/options/:id', async (req, res) => {
+  try {
+    const option = await prisma.option.update({
+      where: { id: req.params.id },
+      data: {
+        code: req.body.code, name: req.body.name, description: req.body.description, maxQuantity: req.body.maxQuantity, includedByDefault: req.body.includedByDefault, imageUrl: req.body.imageUrl,
+        day1: req.body.day1, day2: req.body.day2, day3: req.body.day3, day4: req.body.day4, day5: req.body.day5, day6: req.body.day6, day7: req.body.day7,
+        day8: req.body.day8, day9: req.body.day9, day10: req.body.day10, day11: req.body.day11, day12: req.body.day12, day13: req.body.day13, day14: req.body.day14,
+        isActive: req.body.isActive
+      }
+    })
+    if (req.body.categoryIds) {
+      await prisma.optionCategory.deleteMany({ where: { optionId: req.params.id } })
+      if (req.body.categoryIds.length > 0) {
+        await prisma.optionCategory.createMany({ data: req.body.categoryIds.map((catId: string) => ({ optionId: option.id, categoryId: catId })) })
+      }
+    }
+    res.json(option)
+  } catch (error) { res.status(500).json({ error: 'Failed to update option' }) }
+})
+
+router.delete('/api/options/:id', async (req, res) => {
+  try { await prisma.option.delete({ where: { id: req.params.id } }); res.json({ success: true }) }
+  catch (error) { res.status(500).json({ error: 'Failed to delete option' }) }
+})
+
+// ============== INVENTORY ==============
+router.get('/api/vehicle-inventory', async (req, res) => {
+  try {
+    const inventory = await prisma.inventory.findMany({ include: { vehicle: { include: { category: true, pricing: true } }, agency: true } })
+    res.json(inventory)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch inventory' }) }
+})
+
+
+// Devis : prix de tous les modèles et options pour une durée (services/quoteEngine), utilisé par le widget et l'opérateur.
+// ?startDate=&endDate=&startTime=&endTime= ou ?days=&extraHours=
+router.get('/api/quote', async (req, res) => {
+  try {
+    const { startDate, endDate, startTime, endTime } = req.query as Record<string, string | undefined>
+    const days = startDate && endDate ? rentalDays(startDate, endDate) : parseInt(String(req.query.days || '1'), 10)
+    const extraHours = startTime || endTime ? rentalExtraHours(startTime, endTime) : parseInt(String(req.query.extraHours || '0'), 10)
+    if (isNaN(days) || days > MAX_QUOTE_DAYS) return res.status(400).json({ error: `days must be between 1 and ${MAX_QUOTE_DAYS}` })
+    res.json(await getQuoteEngine(prisma).quote(days, extraHours))
+  } catch (error) { res.status(500).json({ error: 'Failed to compute quote' }) }
+})
+
+// ============== VEHICLE NUMBERING CATEGORIES ==============
+router.get('/api/numbering-categories', async (req, res) => {
+  try {
+    const categories = await prisma.vehicleNumberingCategory.findMany({ where: { isActive: true }, orderBy: { code: 'asc' }, include: { categories: true } })
+    res.json(categories)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch numbering categories' }) }
+})
+
+router.post('/api/numbering-categories', async (req, res) => {
+  try {
+    const category = await prisma.vehicleNumberingCategory.create({
+      data: { code: req.body.code, prefix: req.body.prefix, name: req.body.name, description: req.body.description, numberPadding: req.body.numberPadding || 3, inspectionType: req.body.inspectionType || 'FULL', isActive: true }
+    })
+    res.json(category)
+  } catch (error) { res.status(500).json({ error: 'Failed to create numbering category' }) }
+})
+
+router.put('/api/numbering-categories/:id', async (req, res) => {
+  try {
+    const category = await prisma.vehicleNumberingCategory.update({ where: { id: req.params.id }, data: { code: req.body.code, prefix: req.body.prefix, name: req.body.name, description: req.body.description, numberPadding: req.body.numberPadding, inspectionType: req.body.inspectionType, isActive: req.body.isActive } })
+    res.json(category)
+  } catch (error) { res.status(500).json({ error: 'Failed to update numbering category' }) }
+})
+
+// ============== BRAND SETTINGS ==============
+router.get('/api/brand-settings', async (req, res) => {
+  try {
+    const settings = await prisma.brandSettings.findMany({ orderBy: { brand: 'asc' } })
+    res.json(settings)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch brand settings' }) }
+})
+
+router.get('/api/brand-settings/:brand', async (req, res) => {
+  try {
+    const settings = await prisma.brandSettings.findUnique({ where: { brand: req.params.brand } })
+    if (!settings) return res.status(404).json({ error: 'Brand settings not found' })
+    res.json(settings)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch brand settings' }) }
+})
+
+router.post('/api/brand-settings', async (req, res) => {
+  try {
+    const settings = await prisma.brandSettings.create({
+      data: {
+        brand: req.body.brand,
+        name: req.body.name,
+        legalName: req.body.legalName,
+        logoUrl: req.body.logoUrl,
+        primaryColor: req.body.primaryColor,
+        secondaryColor: req.body.secondaryColor,
+        email: req.body.email,
+        phone: req.body.phone,
+        website: req.body.website,
+        address: req.body.address,
+        city: req.body.city,
+        postalCode: req.body.postalCode,
+        country: req.body.country || 'ES',
+        taxId: req.body.taxId,
+        stripePublishableKey: req.body.stripePublishableKey,
+        stripeSecretKey: req.body.stripeSecretKey,
+        stripeWebhookSecret: req.body.stripeWebhookSecret,
+        stripeAccountId: req.body.stripeAccountId,
+        contractTemplateUrl: req.body.contractTemplateUrl,
+        invoiceTemplateUrl: req.body.invoiceTemplateUrl,
+        termsAndConditionsUrl: req.body.termsAndConditionsUrl,
+        privacyPolicyUrl: req.body.privacyPolicyUrl,
+        emailFromName: req.body.emailFromName,
+        emailFromAddress: req.body.emailFromAddress,
+        cgvResume: req.body.cgvResume,
+        cgvComplete: req.body.cgvComplete,
+        rgpd: req.body.rgpd,
+        mentionsLegales: req.body.mentionsLegales
+      }
+    })
+    res.json(settings)
+  } catch (error) { res.status(500).json({ error: 'Failed to create brand settings' }) }
+})
+
+router.put('/api/brand-settings/:brand', async (req, res) => {
+  try {
+    const settings = await prisma.brandSettings.update({
+      where: { brand: req.params.brand },
+      data: {
+        name: req.body.name,
+        legalName: req.body.legalName,
+        logoUrl: req.body.logoUrl,
+        primaryColor: req.body.primaryColor,
+        secondaryColor: req.body.secondaryColor,
+        email: req.body.email,
+        phone: req.body.phone,
+        website: req.body.website,
+        address: req.body.address,
+        city: req.body.city,
+        postalCode: req.body.postalCode,
+        country: req.body.country,
+        taxId: req.body.taxId,
+        stripePublishableKey: req.body.stripePublishableKey,
+        stripeSecretKey: req.body.stripeSecretKey,
+        stripeWebhookSecret: req.body.stripeWebhookSecret,
+        stripeAccountId: req.body.stripeAccountId,
+        contractTemplateUrl: req.body.contractTemplateUrl,
+        invoiceTemplateUrl: req.body.invoiceTemplateUrl,
+        termsAndConditionsUrl: req.body.termsAndConditionsUrl,
+        privacyPolicyUrl: req.body.privacyPolicyUrl,
+        emailFromName: req.body.emailFromName,
+        emailFromAddress: req.body.emailFromAddress,
+        isActive: req.body.isActive,
+        cgvResume: req.body.cgvResume,
+        cgvComplete: req.body.cgvComplete,
+        rgpd: req.body.rgpd,
+        mentionsLegales: req.body.mentionsLegales
+      }
+    })
+    res.json(settings)
+  } catch (error) { res.status(500).json({ error: 'Failed to update brand settings' }) }
+})
+
+// ============== AGENCY SCHEDULE PERIODS ==============
+router.get('/api/agencies/:agencyId/schedule-periods', async (req, res) => {
+  try {
+    const periods = await prisma.agencySchedulePeriod.findMany({
+      where: { agencyId: req.params.agencyId },
+      orderBy: { startDate: 'asc' }
+    })
+    res.json(periods)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch schedule periods' }) }
+})
+
+router.post('/api/agencies/:agencyId/schedule-periods', async (req, res) => {
+  try {
+    const period = await prisma.agencySchedulePeriod.create({
+      data: {
+        agencyId: req.params.agencyId,
+        name: req.body.name,
+        startDate: new Date(req.body.startDate),
+        endDate: new Date(req.body.endDate),
+        isDefault: req.body.isDefault || false,
+        mondayOpen: req.body.mondayOpen,
+        mondayClose: req.body.mondayClose,
+        mondayIsClosed: req.body.mondayIsClosed || false,
+        tuesdayOpen: req.body.tuesdayOpen,
+        tuesdayClose: req.body.tuesdayClose,
+        tuesdayIsClosed: req.body.tuesdayIsClosed || false,
+        wednesdayOpen: req.body.wednesdayOpen,
+        wednesdayClose: req.body.wednesdayClose,
+        wednesdayIsClosed: req.body.wednesdayIsClosed || false,
+        thursdayOpen: req.body.thursdayOpen,
+        thursdayClose: req.body.thursdayClose,
+        thursdayIsClosed: req.body.thursdayIsClosed || false,
+        fridayOpen: req.body.fridayOpen,
+        fridayClose: req.body.fridayClose,
+        fridayIsClosed: req.body.fridayIsClosed || false,
+        saturdayOpen: req.body.saturdayOpen,
+        saturdayClose: req.body.saturdayClose,
+        saturdayIsClosed: req.body.saturdayIsClosed || false,
+        sundayOpen: req.body.sundayOpen,
+        sundayClose: req.body.sundayClose,
+        sundayIsClosed: req.body.sundayIsClosed ?? true
+      }
+    })
+    res.json(period)
+  } catch (error) { console.error(error); res.status(500).json({ error: 'Failed to create schedule period' }) }
+})
+
+router.put('/api/schedule-periods/:id', async (req, res) => {
+  try {
+    const period = await prisma.agencySchedulePeriod.update({
+      where: { id: req.params.id },
+      data: {
+        name: req.body.name,
+        startDate: new Date(req.body.startDate),
+        endDate: new Date(req.body.endDate),
+        isDefault: req.body.isDefault,
+        mondayOpen: req.body.mondayOpen,
+        mondayClose: req.body.mondayClose,
+        mondayIsClosed: req.body.mondayIsClosed,
+        tuesdayOpen: req.body.tuesdayOpen,
+        tuesdayClose: req.body.tuesdayClose,
+        tuesdayIsClosed: req.body.tuesdayIsClosed,
+        wednesdayOpen: req.body.wednesdayOpen,
+        wednesdayClose: req.body.wednesdayClose,
+        wednesdayIsClosed: req.body.wednesdayIsClosed,
+        thursdayOpen: req.body.thursdayOpen,
+        thursdayClose: req.body.thursdayClose,
+        thursdayIsClosed: req.body.thursdayIsClosed,
+        fridayOpen: req.body.fridayOpen,
+        fridayClose: req.body.fridayClose,
+        fridayIsClosed: req.body.fridayIsClosed,
+        saturdayOpen: req.body.saturdayOpen,
+        saturdayClose: req.body.saturdayClose,
+        saturdayIsClosed: req.body.saturdayIsClosed,
+        sundayOpen: req.body.sundayOpen,
+        sundayClose: req.body.sundayClose,
+        sundayIsClosed: req.body.sundayIsClosed
+      }
+    })
+    res.json(period)
+  } catch (error) { res.status(500).json({ error: 'Failed to update schedule period' }) }
+})
+
+router.delete('/api/schedule-periods/:id', async (req, res) => {
+  try {
+    await prisma.agencySchedulePeriod.delete({ where: { id: req.params.id } })
+    res.json({ success: true })
+  } catch (error) { res.status(500).json({ error: 'Failed to delete schedule period' }) }
+})
+
+// ============== AGENCY CLOSURES ==============
+router.get('/api/agencies/:agencyId/closures', async (req, res) => {
+  try {
+    const closures = await prisma.agencyClosure.findMany({
+      where: { agencyId: req.params.agencyId },
+      orderBy: { startDate: 'asc' }
+    })
+    res.json(closures)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch closures' }) }
+})
+
+router.post('/api/agencies/:agencyId/closures', async (req, res) => {
+  try {
+    const closure = await prisma.agencyClosure.create({
+      data: {
+        agencyId: req.params.agencyId,
+        startDate: new Date(req.body.startDate),
+        endDate: new Date(req.body.endDate),
+        reason: req.body.reason
+      }
+    })
+    res.json(closure)
+  } catch (error) { res.status(500).json({ error: 'Failed to create closure' }) }
+})
+
+router.delete('/api/closures/:id', async (req, res) => {
+  try {
+    await prisma.agencyClosure.delete({ where: { id: req.params.id } })
+    res.json({ success: true })
+  } catch (error) { res.status(500).json({ error: 'Failed to delete closure' }) }
+})
+
+// Get agency schedule for a specific date (calendrier compilé, services/agencyCalendar)
+router.get('/api/agencies/:agencyId/schedule', async (req, res) => {
+  try {
+    const { date } = req.query
+    const targetDate = date ? new Date(date as string) : new Date()
+    if (isNaN(targetDate.getTime())) return res.status(400).json({ error: 'Invalid date' })
+    const calendar = await getAgencyCalendarCache(prisma).get(req.params.agencyId)
+    const day = calendar.day(targetDate.toISOString())
+    
+    if (!day) {
+      return res.json({ isClosed: false, schedule: null })
+    }
+    if (day.reason !== undefined) {
+      return res.json({ isClosed: true, reason: day.reason })
+    }
+    
+    res.json({
+      isClosed: day.isClosed,
+      openTime: day.openTime,
+      closeTime: day.closeTime,
+      periodName: day.periodName
+    })
+  } catch (error) { res.status(500).json({ error: 'Failed to get schedule' }) }
+})
+
+// Horaires jour par jour sur un mois (?month=AAAA-MM) ou une plage (?from=AAAA-MM-JJ&to=AAAA-MM-JJ, 366 jours max) :
+// le widget grise les jours fermés sans autre requête
+router.get('/api/agencies/:agencyId/calendar', async (req, res) => {
+  try {
+    const { month, from, to } = req.query as Record<string, string | undefined>
+    let first: number, last: number
+    if (month) {
+      if (!/^\d{4}-\d{2}$/.test(month)) return res.status(400).json({ error: 'month must be YYYY-MM' })
+      first = dayNumber(month + '-01')
+      const [year, m] = month.split('-').map(Number)
+      last = dayNumber(new Date(Date.UTC(year, m, 0)).toISOString())
+    } else {
+      first = dayNumber(from || new Date().toISOString())
+      last = to ? dayNumber(to) : first + 30
+    }
+    if (isNaN(first) || isNaN(last) || last < first) return res.status(400).json({ error: 'Invalid date range' })
+    if (last - first + 1 > MAX_CALENDAR_DAYS) return res.status(400).json({ error: `Range limited to ${MAX_CALENDAR_DAYS} days` })
+    const calendar = await getAgencyCalendarCache(prisma).get(req.params.agencyId)
+    res.setHeader('Cache-Control', 'public, max-age=60')
+    res.json({ agencyId: req.params.agencyId, from: formatDay(first), to: formatDay(last), days: calendar.range(formatDay(first), formatDay(last)) })
+  } catch (error) { res.status(500).json({ error: 'Failed to get calendar' }) }
+})
+
+console.log('Agency schedule routes loaded')
+
+// ============== CHECK-IN KEY POINTS ==============
+router.get('/api/checkin-keypoints', async (req, res) => {
+  try {
+    const { brand } = req.query
+    const where: any = { isActive: true }
+    if (brand) where.brand = brand
+    const keypoints = await prisma.checkinKeyPoint.findMany({ where, orderBy: { sortOrder: 'asc' } })
+    res.json(keypoints)
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+router.post('/api/checkin-keypoints', async (req, res) => {
+  try {
+    const kp = await prisma.checkinKeyPoint.create({
+      data: {
+        code: req.body.code,
+        title: req.body.title,
+        description: req.body.description,
+        imageUrl: req.body.imageUrl || null,
+        icon: req.body.icon || null,
+        sortOrder: req.body.sortOrder || 0,
+        brand: req.body.brand || 'VOLTRIDE'
+      }
+    })
+    res.json(kp)
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+router.put('/api/checkin-keypoints/:id', async (req, res) => {
+  try {
+    const kp = await prisma.checkinKeyPoint.update({
+      where: { id: req.params.id },
+      data: req.body
+    })
+    res.json(kp)
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+router.delete('/api/checkin-keypoints/:id', async (req, res) => {
+  try {
+    await prisma.checkinKeyPoint.update({ where: { id: req.params.id }, data: { isActive: false } })
+    res.json({ success: true })
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+// 6. Récupérer les settings widget
+router.get('/api/widget-settings/:brand', async (req, res) => {
+  try {
+    const brand = req.params.brand.toLowerCase()
+    await sendCatalog(req, res, 'widget-settings:' + brand, () => catalogWidgetSettings(brand))
+  } catch (error) {
+    console.error('Widget settings error:', error)
+    res.status(500).json({ error: 'Failed to fetch widget settings' })
+  }
+})
+
+export default router
@@ -0,0 +1,1435 @@
+import { Router } from 'express'
+import { KEYSET_ORDER_BY, decodeCursor, isPaginated, keysetWhere, parseLimit, toPage } from '../services/pagination'
+import { runPool } from '../services/pushDispatcher'
+import { contentHash, getPdfCache } from '../services/pdfCache'
+import { PdfQueueFullError, getPdfPool, pipePdf } from '../services/pdfPool'
+import { createZipStream } from '../services/zipStream'
+import { prisma } from '../db'
+import { getMailer } from '../services/mailer'
+import { OutboxPermanentError, enqueueOutbox, getOutboxWorker } from '../services/outbox'
+import { getStripeInstance } from '../services/stripeClients'
+import { BOOKING_OVERLAP_MESSAGE, isBookingOverlapError } from '../services/bookingOverlap'
+import { CONTRACT_LIST_SELECT } from './shared'
+
+// Contrats de location : check-in / check-out, PDF, prolongations, documents, commissions
+
+const router = Router()
+const pdfCache = getPdfCache()
+const pdfPool = getPdfPool()
+const mailer = getMailer()
+const outboxWorker = getOutboxWorker(prisma)
+
+// ============== BOOKING CHECK-OUT (Départ client) ==============
+router.post('/api/bookings/:id/check-out', async (req, res) => {
+  console.log('=== CHECK-OUT START ===')
+  console.log('Booking ID:', req.params.id)
+  console.log('Body keys:', Object.keys(req.body))
+  try {
+    const booking = await prisma.booking.findUnique({
+      where: { id: req.params.id },
+      include: { customer: true, agency: true, items: { include: { vehicle: true } } }
+    })
+    if (!booking) return res.status(404).json({ error: 'Booking not found' })
+    
+    const agency = booking.agency
+    const contractNumber = await generateContractNumber(agency.code)
+    
+    // Récupérer le véhicule de flotte
+    const fleetVehicle = await prisma.fleet.findUnique({
+      where: { id: req.body.fleetVehicleId },
+      include: { vehicle: true }
+    })
+    if (!fleetVehicle) return res.status(400).json({ error: 'Fleet vehicle not found' })
+    
+    // Calculer les jours
+    const startDate = new Date(booking.startDate)
+    const endDate = new Date(booking.endDate)
+    const totalDays = Math.max(1, Math.ceil((endDate.getTime() - startDate.getTime()) / (1000 * 60 * 60 * 24)))
+    
+    // Commission si agence partenaire/franchise
+    let commissionRate = null
+    let commissionAmount = null
+    let commissionType = null
+    if (agency.agencyType === 'PARTNER' || agency.agencyType === 'FRANCHISE') {
+      commissionRate = agency.commissionRate || 0
+      commissionAmount = Math.round(booking.totalPrice * commissionRate * 100) / 100
+      commissionType = agency.agencyType === 'PARTNER' ? 'REVERSAL' as const : 'DEDUCTION' as const
+    }
+    
+    // Vérifier si un contrat existe déjà pour cette réservation
+    const existingContract = await prisma.rentalContract.findFirst({
+      where: { bookingId: booking.id }
+    })
+    
+    console.log('Existing contract:', existingContract?.id || 'none')
+    console.log('Creating/updating contract with:', {
+      contractNumber,
+      bookingId: booking.id,
+      fleetVehicleId: req.body.fleetVehicleId,
+      totalDays,
+      depositAmount: fleetVehicle.vehicle?.deposit
+    })
+    
+    // Créer ou mettre à jour le contrat
+    const contract = existingContract 
+      ? await prisma.rentalContract.update({
+          where: { id: existingContract.id },
+          data: {
+        contractNumber,
+        bookingId: booking.id,
+        fleetVehicleId: req.body.fleetVehicleId,
+        agencyId: booking.agencyId,
+        customerId: booking.customerId,
+        originalStartDate: startDate,
+        originalEndDate: endDate,
+        currentStartDate: startDate,
+        currentEndDate: endDate,
+        actualStartDate: new Date(),
+        source: booking.source === 'WIDGET' ? 'ONLINE_WIDGET' : booking.source === 'WALK_IN' ? 'WALK_IN' : 'PHONE',
+        dailyRate: booking.totalPrice / totalDays,
+        totalDays,
+        subtotal: booking.totalPrice,
+        optionsTotal: 0,
+        discountAmount: req.body.discountAmount || 0,
+        discountReason: req.body.discountReason || null,
+        taxRate: 21,
+        taxAmount: Math.round(booking.totalPrice * 0.21 * 100) / 100,
+        totalAmount: booking.totalPrice,
+        depositAmount: fleetVehicle.vehicle?.deposit || 500,
+        depositMethod: req.body.depositMethod || 'CARD',
+        depositStatus: req.body.depositStatus || 'PENDING',
+        depositCapturedAt: req.body.depositStatus === 'CAPTURED' ? new Date() : null,
+        paymentMethod: req.body.paymentMethod || 'CARD',
+        paymentStatus: req.body.paymentStatus || 'PENDING',
+        paidAmount: 0,  // Le paiement est géré séparément
+        startMileage: req.body.startMileage,
+        startFuelLevel: req.body.startFuelLevel,
+        photoFront: req.body.photoFront,
+        photoLeft: req.body.photoLeft,
+        photoRight: req.body.photoRight,
+        photoRear: req.body.photoRear,
+        photoCounter: req.body.photoCounter,
+        damageSchema: req.body.damageSchema,
+        equipmentChecklist: req.body.equipmentChecklist,
+        customerIdCardUrl: req.body.customerIdCardUrl,
+        customerIdCardVersoUrl: req.body.idCardReversoUrl || undefined,
+        customerLicenseUrl: req.body.customerLicenseUrl,
+        customerSignature: req.body.customerSignature,
+        customerSignedAt: req.body.customerSignature ? new Date() : null,
+        termsAcceptedAt: req.body.termsAcceptedAt ? new Date(req.body.termsAcceptedAt) : null,
+        termsLanguage: req.body.termsLanguage,
+        status: 'ACTIVE',
+        commissionRate,
+        commissionAmount,
+        commissionType,
+        commissionStatus: commissionRate ? 'PENDING' as const : undefined
+      }
+    })
+      : await prisma.rentalContract.create({
+          data: {
+            contractNumber,
+            bookingId: booking.id,
+            fleetVehicleId: req.body.fleetVehicleId,
+            agencyId: booking.agencyId,
+            customerId: booking.customerId,
+            originalStartDate: startDate,
+            originalEndDate: endDate,
+            currentStartDate: startDate,
+            currentEndDate: endDate,
+            actualStartDate: new Date(),
+            source: booking.source === 'WIDGET' ? 'ONLINE_WIDGET' : booking.source === 'WALK_IN' ? 'WALK_IN' : 'PHONE',
+            dailyRate: booking.totalPrice / totalDays,
+            totalDays,
+            subtotal: booking.totalPrice,
+            optionsTotal: 0,
+            discountAmount: req.body.discountAmount || 0,
+            discountReason: req.body.discountReason || null,
+            taxRate: 21,
+            taxAmount: Math.round(booking.totalPrice * 0.21 * 100) / 100,
+            totalAmount: booking.totalPrice,
+            depositAmount: fleetVehicle.vehicle?.deposit || 500,
+            depositMethod: req.body.depositMethod || 'CARD',
+            depositStatus: req.body.depositStatus || 'PENDING',
+            depositCapturedAt: req.body.depositStatus === 'CAPTURED' ? new Date() : null,
+            paymentMethod: req.body.paymentMethod || 'CARD',
+            paymentStatus: req.body.paymentStatus || 'PENDING',
+            paidAmount: 0,
+            startMileage: req.body.startMileage,
+            startFuelLevel: req.body.startFuelLevel,
+            photoFront: req.body.photoFront,
+            photoLeft: req.body.photoLeft,
+            photoRight: req.body.photoRight,
+            photoRear: req.body.photoRear,
+            photoCounter: req.body.photoCounter,
+            damageSchema: req.body.damageSchema,
+            equipmentChecklist: req.body.equipmentChecklist,
+            customerIdCardUrl: req.body.customerIdCardUrl,
+        customerIdCardVersoUrl: req.body.idCardReversoUrl || undefined,
+            customerLicenseUrl: req.body.customerLicenseUrl,
+            customerSignature: req.body.customerSignature,
+            customerSignedAt: req.body.customerSignature ? new Date() : null,
+            termsAcceptedAt: req.body.termsAcceptedAt ? new Date(req.body.termsAcceptedAt) : null,
+            termsLanguage: req.body.termsLanguage,
+            status: 'ACTIVE',
+            commissionRate,
+            commissionAmount,
+            commissionType,
+            commissionStatus: commissionRate ? 'PENDING' as const : undefined
+          }
+        })
+    console.log('Contract created/updated:', contract.id)
+    
+    // Mettre à jour la réservation
+    await prisma.booking.update({
+      where: { id: booking.id },
+      data: {
+        status: 'CONFIRMED',
+        fleetVehicleId: req.body.fleetVehicleId,
+        assignmentType: 'MANUAL',
+        assignedAt: new Date()
+      }
+    })
+    console.log('Booking updated')
+    
+    // Mettre à jour le véhicule
+    await prisma.fleet.update({
+      where: { id: req.body.fleetVehicleId },
+      data: {
+        status: 'RENTED',
+        currentMileage: req.body.startMileage
+      }
+    })
+    console.log('Fleet updated')
+    
+    // Créer l'inspection de départ
+    await prisma.fleetInspection.create({
+      data: {
+        fleetId: req.body.fleetVehicleId,
+        contractId: contract.id,
+        type: 'CHECK_OUT',
+        mileage: req.body.startMileage,
+        fuelLevel: req.body.startFuelLevel,
+        condition: 'GOOD',
+        operatorId: req.body.operatorId || 'system',
+        customerSignature: req.body.customerSignature,
+        customerSignedAt: req.body.customerSignature ? new Date() : null
+      }
+    })
+    console.log('Inspection created')
+    console.log('=== CHECK-OUT SUCCESS ===')
+    
+    res.json(contract)
+  } catch (error: any) {
+    // Véhicule remis déjà réservé sur la période par une autre réservation : la réaffecter avant de relancer
+    if (isBookingOverlapError(error)) return res.status(409).json({ error: BOOKING_OVERLAP_MESSAGE })
+    console.error('=== CHECK-OUT ERROR ===')
+    console.error('Error name:', error?.name)
+    console.error('Error message:', error?.message)
+    console.error('Error code:', error?.code)
+    console.error('Error meta:', error?.meta)
+    console.error('Full error:', JSON.stringify(error, null, 2))
+    res.status(500).json({ 
+      error: 'Failed to process check-out', 
+      details: error?.message,
+      code: error?.code,
+      meta: error?.meta
+    })
+  }
+})
+
+// ============== CONTRACT DEDUCTIONS ==============
+
+router.post('/api/contracts/:contractId/deductions', async (req, res) => {
+  try {
+    const deduction = await prisma.contractDeduction.create({
+      data: {
+        contractId: req.params.contractId,
+        type: req.body.type || 'OTHER',
+        description: req.body.description,
+        quantity: req.body.quantity || 1,
+        unitPrice: req.body.unitPrice || 0,
+        totalPrice: req.body.totalPrice || 0,
+        sparePartId: req.body.sparePartId || null,
+        equipmentId: req.body.equipmentId || null,
+        photoUrls: req.body.photoUrls || null
+      }
+    })
+    res.json(deduction)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.get('/api/contracts/:contractId/deductions', async (req, res) => {
+  try {
+    const deductions = await prisma.contractDeduction.findMany({
+      where: { contractId: req.params.contractId },
+      include: { sparePart: true, equipment: true }
+    })
+    res.json(deductions)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Get contract by booking ID
+router.get('/api/contracts/booking/:bookingId', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.findFirst({
+      where: { bookingId: req.params.bookingId },
+      include: { deductions: true }
+    })
+    if (!contract) {
+      return res.status(404).json({ error: 'Contract not found' })
+    }
+    res.json(contract)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Update contract
+router.put('/api/contracts/:id', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.update({
+      where: { id: req.params.id },
+      data: {
+        status: req.body.status,
+        actualEndDate: req.body.checkoutAt ? new Date(req.body.checkoutAt) : undefined,
+        endMileage: req.body.endMileage,
+        endFuelLevel: req.body.endFuelLevel,
+        finalDepositRefund: req.body.depositRefunded,
+        totalDeductions: req.body.totalDeductions
+      }
+    })
+    res.json(contract)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Supprimer un contrat
+router.delete('/api/contracts/:id', async (req, res) => {
+  try {
+    const { id } = req.params
+    await prisma.fleetInspection.deleteMany({ where: { contractId: id } })
+    await prisma.contractDeduction.deleteMany({ where: { contractId: id } })
+    await prisma.contractExtension.deleteMany({ where: { contractId: id } })
+    const contract = await prisma.rentalContract.findUnique({ where: { id } })
+    if (contract?.fleetVehicleId) {
+      await prisma.fleet.update({ where: { id: contract.fleetVehicleId }, data: { status: 'AVAILABLE' } })
+    }
+    await prisma.rentalContract.delete({ where: { id } })
+    res.json({ success: true })
+  } catch (e: any) {
+    console.error(e)
+    res.status(500).json({ error: 'Failed to delete contract' })
+  }
+})
+
+
+// Extension de contrat (avenant)
+router.post('/api/contracts/:id/extend', async (req, res) => {
+  try {
+    const { id } = req.params
+    const { newEndDate, additionalAmount, reason } = req.body
+    
+    const contract = await prisma.rentalContract.findUnique({ where: { id } })
+    if (!contract) return res.status(404).json({ error: 'Contract not found' })
+    
+    const oldEndDate = contract.currentEndDate
+    const newEnd = new Date(newEndDate)
+    const additionalDays = Math.ceil((newEnd.getTime() - new Date(oldEndDate).getTime()) / (1000 * 60 * 60 * 24))
+    
+    // Mettre à jour le contrat directement (sans créer d'extension complexe)
+    const updatedContract = await prisma.rentalContract.update({
+      where: { id },
+      data: {
+        currentEndDate: newEnd,
+        totalDays: contract.totalDays + additionalDays,
+        totalAmount: Number(contract.totalAmount || 0) + Number(additionalAmount || 0),
+        customerNotes: (contract.customerNotes || '') + '\n[Extension ' + new Date().toLocaleDateString('fr-FR') + '] ' + (reason || 'Extension') + ' - +' + additionalDays + ' jours, +' + (additionalAmount || 0) + '€'
+      }
+    })
+    
+    res.json(updatedContract)
+  } catch (e: any) {
+    console.error(e)
+    res.status(500).json({ error: 'Failed to extend contract' })
+  }
+})
+// ============== PDF GENERATION ==============
+// Générer le PDF du contrat
+router.get('/api/contracts/:id/pdf', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.findUnique({
+      where: { id: req.params.id },
+      include: {
+        customer: true,
+        booking: true,
+        fleetVehicle: { include: { vehicle: { include: { category: true } }, documents: { where: { sendToCustomer: true } } } },
+        agency: true
+      }
+    })
+    if (!contract) return res.status(404).json({ error: 'Contract not found' })
+    
+    const brand = contract.fleetVehicle?.vehicle?.category?.brand || 'VOLTRIDE'
+    const brandSettings = await prisma.brandSettings.findUnique({ where: { brand } })
+    const clientLang = (contract as any).termsLanguage || (req.query.lang as string) || "fr"
+    
+    const filename = `contrat-${contract.contractNumber}.pdf`
+    const hash = contentHash(contract, brandSettings)
+    const cached = await pdfCache.lookup('contract', contract.id, hash, clientLang)
+    if (cached) {
+      res.setHeader('Content-Type', 'application/pdf')
+      res.setHeader('Content-Disposition', `inline; filename="${filename}"`)
+      return res.send(cached)
+    }
+    // Rendu dans le pool de threads, envoyé au fil de l'eau puis mis en cache
+    pipePdf(res, pdfPool.stream('contract', [contract, brandSettings, clientLang]), filename, 'inline',
+      pdf => pdfCache.store('contract', contract.id, hash, clientLang, pdf))
+  } catch (e: any) {
+    if (e instanceof PdfQueueFullError) return res.status(503).set('Retry-After', '5').json({ error: e.message })
+    console.error('PDF generation error:', e)
+    res.status(500).json({ error: 'Failed to generate PDF', details: e.message })
+  }
+})
+
+// Send contract by email : vérification immédiate, rendu du PDF et envoi par le worker outbox.
+// 202 { queued: true } : l'e-mail est en file, pas encore envoyé (échecs et retries dans l'outbox)
+router.post("/api/contracts/:id/send", async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.findUnique({ where: { id: req.params.id }, select: { id: true, customer: { select: { email: true } } } })
+    if (!contract) return res.status(404).json({ error: "Contract not found" })
+    const email = req.body.email || contract.customer?.email
+    if (!email) return res.status(400).json({ error: "No email provided" })
+    await enqueueOutbox(prisma, { topic: 'contract.email', payload: { contractId: contract.id, email } })
+    outboxWorker.wake()
+    res.status(202).json({ queued: true, email, message: "Contract email queued for " + email })
+  } catch (e: any) {
+    console.error("Send contract error:", e)
+    res.status(500).json({ error: "Failed to send contract", details: e.message })
+  }
+})
+
+async function sendContractEmail(contractId: string, email: string, idempotencyKey: string) {
+  const contract = await prisma.rentalContract.findUnique({
+    where: { id: contractId },
+    include: { customer: true, booking: true, fleetVehicle: { include: { vehicle: { include: { category: true } }, documents: { where: { sendToCustomer: true } } } }, agency: true }
+  })
+  if (!contract) throw new OutboxPermanentError("Contract not found")
+  const brand = contract.fleetVehicle?.vehicle?.category?.brand || "VOLTRIDE"
+  const brandSettings = await prisma.brandSettings.findUnique({ where: { brand } })
+  const clientLang = (contract as any).termsLanguage || "fr"
+  const pdfBuffer = await pdfCache.render('contract', contract.id, contentHash(contract, brandSettings), clientLang,
+    () => pdfPool.render('contract', [contract, brandSettings, clientLang]))
+  const vehicleName = contract.fleetVehicle?.vehicle?.name || "Vehículo"
+  const parsed = typeof vehicleName === "string" ? (() => { try { return JSON.parse(vehicleName) } catch { return { es: vehicleName } } })() : vehicleName
+  const vName = (parsed as any)?.es || "Vehículo"
+  await mailer.send({
+    from: "Voltride <no-reply@voltride.es>",
+    to: email,
+    subject: `Contrato de alquiler - ${contract.contractNumber}`,
+    html: `<div style="font-family:Arial,sans-serif;max-width:600px;margin:0 auto;padding:20px">
+      <div style="text-align:center;margin-bottom:20px"><img src="${brandSettings?.logoUrl || ""}" alt="Logo" style="height:50px"/></div>
+      <h2 style="color:#f59e0b">Contrato de Alquiler</h2>
+      <p>Estimado/a ${contract.customer?.firstName || ""} ${contract.customer?.lastName || ""},</p>
+      <p>Adjunto encontrará su contrato de alquiler para el vehículo <strong>${vName}</strong>.</p>
+      <p><strong>Número de contrato:</strong> ${contract.contractNumber}</p>
+      <p><strong>Fecha inicio:</strong> ${new Date(contract.currentStartDate).toLocaleDateString("es-ES")}</p>
+      <p><strong>Fecha fin:</strong> ${new Date(contract.currentEndDate).toLocaleDateString("es-ES")}</p>
+      <p>Gracias por confiar en nosotros.</p>
+      <p style="margin-top:30px;color:#666;font-size:12px">Voltride - Alquiler de vehículos eléctricos</p>
+    </div>`,
+    attachments: [{ filename: `contrato-${contract.contractNumber}.pdf`, content: pdfBuffer.toString("base64") }]
+  }, idempotencyKey)
+}
+
+
+// Générer le PDF de la facture
+router.get('/api/contracts/:id/invoice-pdf', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.findUnique({
+      where: { id: req.params.id },
+      include: {
+        customer: true,
+        fleetVehicle: { include: { vehicle: { include: { category: true } } } },
+        agency: true,
+        deductions: { include: { sparePart: true, equipment: true } }
+      }
+    })
+    if (!contract) return res.status(404).json({ error: 'Contract not found' })
+    
+    const brand = contract.fleetVehicle?.vehicle?.category?.brand || 'VOLTRIDE'
+    const brandSettings = await prisma.brandSettings.findUnique({ where: { brand } })
+    const lang = (req.query.lang as string) || 'fr'
+    
+    const filename = `facture-${contract.contractNumber}.pdf`
+    const hash = contentHash(contract, brandSettings)
+    const cached = await pdfCache.lookup('invoice', contract.id, hash, lang)
+    if (cached) {
+      res.setHeader('Content-Type', 'application/pdf')
+      res.setHeader('Content-Disposition', `inline; filename="${filename}"`)
+      return res.send(cached)
+    }
+    pipePdf(res, pdfPool.stream('invoice', [contract, brandSettings, lang]), filename, 'inline',
+      pdf => pdfCache.store('invoice', contract.id, hash, lang, pdf))
+  } catch (e: any) {
+    if (e instanceof PdfQueueFullError) return res.status(503).set('Retry-After', '5').json({ error: e.message })
+    console.error('Invoice PDF generation error:', e)
+    res.status(500).json({ error: 'Failed to generate invoice PDF', details: e.message })
+  }
+})
+
+// Export groupé des factures : rendues dans le pool (via le cache) et ajoutées au zip dès qu'elles sont prêtes
+const MAX_ZIP_INVOICES = 500
+router.post('/api/contracts/invoices-zip', async (req, res) => {
+  try {
+    const { contractIds, brand, from, to } = req.body
+    const lang = req.body.lang || 'fr'
+    const where: any = {}
+    if (Array.isArray(contractIds) && contractIds.length) where.id = { in: contractIds }
+    else if (from && to) where.createdAt = { gte: new Date(from), lte: new Date(to) }
+    else return res.status(400).json({ error: 'contractIds or from/to required' })
+    if (brand) where.fleetVehicle = { vehicle: { category: { brand } } }
+
+    const contracts = await prisma.rentalContract.findMany({
+      where,
+      include: {
+        customer: true,
+        fleetVehicle: { include: { vehicle: { include: { category: true } } } },
+        agency: true,
+        deductions: { include: { sparePart: true, equipment: true } }
+      },
+      orderBy: { createdAt: 'asc' },
+      take: MAX_ZIP_INVOICES + 1
+    })
+    if (contracts.length > MAX_ZIP_INVOICES) return res.status(400).json({ error: `Too many invoices (max ${MAX_ZIP_INVOICES})` })
+    const brandSettings = await prisma.brandSettings.findMany()
+    const settingsFor = (c: any) => brandSettings.find(b => b.brand === (c.fleetVehicle?.vehicle?.category?.brand || 'VOLTRIDE')) || null
+
+    const zip = createZipStream()
+    res.setHeader('Content-Type', 'application/zip')
+    res.setHeader('Content-Disposition', `attachment; filename="factures-${new Date().toISOString().split('T')[0]}.zip"`)
+    zip.stream.pipe(res)
+    // Client parti : le flux est fermé, les rendus en attente de drain s'arrêtent
+    res.on('close', () => zip.stream.destroy())
+
+    // Au plus 2 documents par thread en vol : le reste de la file du pool reste disponible aux autres routes
+    const failed: string[] = []
+    await runPool(contracts, pdfPool.stats().workers * 2, async contract => {
+      if (res.destroyed) return
+      try {
+        const settings = settingsFor(contract)
+        const pdf = await pdfCache.render('invoice', contract.id, contentHash(contract, settings), lang,
+          () => pdfPool.render('invoice', [contract, settings, lang]))
+        // Client lent : pas de nouveau rendu tant que l'archive n'a pas été lue
+        if (!zip.addFile(`facture-${contract.contractNumber}.pdf`, pdf)) await zip.drained()
+      } catch (e: any) {
+        console.error('Invoice zip error:', contract.contractNumber, e.message)
+        failed.push(contract.contractNumber)
+      }
+    })
+    if (res.destroyed) return
+    if (failed.length) zip.addFile('errors.txt', Buffer.from(failed.join('\n')))
+    zip.finish()
+  } catch (e: any) {
+    console.error('Invoices zip error:', e)
+    if (!res.headersSent) res.status(500).json({ error: 'Failed to export invoices' })
+    else res.destroy(e)
+  }
+})
+
+// Etat du cache PDF (taille, hits mémoire / disque, rendus) et du pool de threads
+router.get('/api/pdf-cache/stats', (req, res) => { res.json({ ...pdfCache.stats(), pool: pdfPool.stats() }) })
+
+console.log('PDF routes loaded')
+
+outboxWorker.register('contract.email', async ({ contractId, email }, { id }) => {
+  await sendContractEmail(contractId, email, id)
+  console.log('[OUTBOX EMAIL] Contract', contractId, '->', email)
+})
+
+// ============== DOCUMENTOS ALQUILER ==============
+router.get('/api/rental-documents', async (req, res) => {
+  try {
+    const { brand, page, limit, from, to, agencyId } = req.query
+    const take = parseInt(limit as string) || 20
+    const skip = ((parseInt(page as string) || 1) - 1) * take
+
+    const where: any = {
+      status: 'COMPLETED',
+      checkedOut: true
+    }
+    if (agencyId) where.agencyId = agencyId
+    if (from || to) {
+      where.startDate = {}
+      if (from) where.startDate.gte = new Date(from as string)
+      if (to) where.startDate.lte = new Date((to as string) + 'T23:59:59')
+    }
+    if (brand) {
+      where.items = { some: { vehicle: { category: { brand: brand } } } }
+    }
+
+    const [bookings, total] = await Promise.all([
+      prisma.booking.findMany({
+        where,
+        include: {
+          customer: true,
+          fleetVehicle: { include: { vehicle: { include: { category: true } } } },
+          items: { include: { vehicle: { include: { category: true } } } },
+          contract: {
+            include: {
+              inspections: { include: { photos: true } }
+            }
+          },
+        },
+        orderBy: { endDate: 'desc' },
+        take,
+        skip
+      }),
+      prisma.booking.count({ where })
+    ])
+
+    const docs = bookings.map((b: any) => {
+      const contract = b.contract
+      const checkOutInsp = contract?.inspections?.find((i: any) => i.type === 'CHECK_OUT')
+      const checkInInsp = contract?.inspections?.find((i: any) => i.type === 'CHECK_IN')
+      const vehicle = b.fleetVehicle || {}
+      const vehName = vehicle?.vehicle?.name
+      const vehNumber = vehicle?.vehicleNumber || 'N/A'
+      const startDate = b.startDate ? new Date(b.startDate).toISOString().substring(0, 10) : 'N/A'
+      const endDate = b.endDate ? new Date(b.endDate).toISOString().substring(0, 10) : 'N/A'
+
+      return {
+        id: b.id,
+        folderName: startDate + '_' + vehNumber,
+        customer: b.customer ? (b.customer.firstName + ' ' + b.customer.lastName) : 'N/A',
+        vehicleNumber: vehNumber,
+        vehicleName: vehName,
+        brand: b.items?.[0]?.vehicle?.category?.brand || 'VOLTRIDE',
+        startDate,
+        endDate,
+        status: b.status,
+        identity: {
+          idCardFront: b.idCardUrl || null,
+          idCardBack: b.idCardVersoUrl || null,
+          licenseFront: b.licenseUrl || null,
+          licenseBack: b.licenseVersoUrl || null
+        },
+        contract: {
+          id: contract?.id || null,
+          contractNumber: contract?.contractNumber || null,
+          pdfUrl: contract?.contractPdfUrl || null
+        },
+        checkInPhotos: {
+          front: b.photoFront || null,
+          left: b.photoLeft || null,
+          right: b.photoRight || null,
+          rear: b.photoRear || null,
+          counter: b.photoCounter || null
+        },
+        inspections: {
+          checkOut: checkOutInsp ? {
+            date: checkOutInsp.inspectedAt,
+            mileage: checkOutInsp.mileage,
+            photos: checkOutInsp.photos?.map((p: any) => ({ angle: p.angle, url: p.photoUrl })) || []
+          } : null,
+          checkIn: checkInInsp ? {
+            date: checkInInsp.inspectedAt,
+            mileage: checkInInsp.mileage,
+            photos: checkInInsp.photos?.map((p: any) => ({ angle: p.angle, url: p.photoUrl })) || []
+          } : null
+        },
+        totalAmount: contract?.totalAmount || b.totalAmount || 0
+      }
+    })
+
+    res.json({ docs, total, page: parseInt(page as string) || 1, totalPages: Math.ceil(total / take) })
+  } catch (e: any) {
+    console.error('Rental documents error:', e)
+    res.status(500).json({ error: e.message })
+  }
+})
+// Mêmes conventions que /api/bookings : brand, from/to (sur currentStartDate/currentEndDate), view=list, limit/cursor
+router.get('/api/contracts', async (req, res) => {
+  try {
+    const { agencyId, status, customerId, brand, from, to, view } = req.query
+    const where: any = {}
+    if (agencyId) where.agencyId = agencyId
+    if (status) where.status = status
+    if (customerId) where.customerId = customerId
+    if (brand) where.agency = { brand: (brand as string).toUpperCase() }
+    if (to) where.currentStartDate = { lte: new Date(to as string) }
+    if (from) where.currentEndDate = { gte: new Date(from as string) }
+    const projection: any = view === 'list'
+      ? { select: CONTRACT_LIST_SELECT }
+      : { include: { fleetVehicle: { include: { vehicle: true } }, agency: true, customer: true, booking: true } }
+
+    if (!isPaginated(req.query)) {
+      const contracts = await prisma.rentalContract.findMany({ where, ...projection, orderBy: KEYSET_ORDER_BY })
+      return res.json(contracts)
+    }
+
+    const cursor = decodeCursor(req.query.cursor as string)
+    if (req.query.cursor && !cursor) return res.status(400).json({ error: 'Invalid cursor' })
+    const limit = parseLimit(req.query.limit)
+    if (cursor) where.AND = [keysetWhere(cursor)]
+    const rows = await prisma.rentalContract.findMany({ where, ...projection, orderBy: KEYSET_ORDER_BY, take: limit + 1 })
+    res.json(toPage(rows as any[], limit))
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch contracts' }) }
+})
+
+router.get('/api/contracts/:id', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.findUnique({
+      where: { id: req.params.id },
+      include: {
+        fleetVehicle: { include: { vehicle: { include: { category: true, pricing: true } }, documents: { where: { sendToCustomer: true } } } },
+        agency: true,
+        customer: true,
+        booking: true,
+        inspections: { include: { photos: true } },
+        deductions: { include: { sparePart: true } },
+        contractOptions: { include: { rentalOption: true } },
+        extensions: true,
+        payments: true
+      }
+    })
+    if (!contract) return res.status(404).json({ error: 'Contract not found' })
+    res.json(contract)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch contract' }) }
+})
+
+// Generate contract number
+const generateContractNumber = async (agencyCode: string) => {
+  const year = new Date().getFullYear()
+  const prefix = `CTR-${agencyCode}-${year}-`
+  
+  const lastContract = await prisma.rentalContract.findFirst({
+    where: { contractNumber: { startsWith: prefix } },
+    orderBy: { contractNumber: 'desc' }
+  })
+  
+  let nextNumber = 1
+  if (lastContract) {
+    const lastNumber = parseInt(lastContract.contractNumber.replace(prefix, ''))
+    nextNumber = lastNumber + 1
+  }
+  
+  return prefix + String(nextNumber).padStart(5, '0')
+}
+
+router.post('/api/contracts', async (req, res) => {
+  try {
+    const agency = await prisma.agency.findUnique({ where: { id: req.body.agencyId } })
+    if (!agency) return res.status(400).json({ error: 'Agency not found' })
+    
+    const contractNumber = await generateContractNumber(agency.code)
+    
+    // Find or create customer
+    let customer = await prisma.customer.findFirst({ where: { email: req.body.customer.email } })
+    if (customer) {
+      customer = await prisma.customer.update({ where: { id: customer.id }, data: { firstName: req.body.customer.firstName, lastName: req.body.customer.lastName, phone: req.body.customer.phone, address: req.body.customer.address, postalCode: req.body.customer.postalCode, city: req.body.customer.city, country: req.body.customer.country || customer.country } })
+    }
+    if (!customer) {
+      customer = await prisma.customer.create({
+        data: {
+          firstName: req.body.customer.firstName,
+          lastName: req.body.customer.lastName,
+          email: req.body.customer.email,
+          phone: req.body.customer.phone,
+          address: req.body.customer.address,
+          postalCode: req.body.customer.postalCode,
+          city: req.body.customer.city,
+          country: req.body.customer.country || 'ES',
+          language: req.body.customer.language || 'es'
+        }
+      })
+    }
+    
+    // Calcul de la commission si agence partenaire ou franchise
+    let commissionRate = null
+    let commissionAmount = null
+    let commissionType = null
+    if (agency.agencyType === 'PARTNER' || agency.agencyType === 'FRANCHISE') {
+      commissionRate = agency.commissionRate || 0
+      // Calcul sur le prix HT (subtotal + options - discount)
+      const totalHT = (req.body.subtotal || 0) + (req.body.optionsTotal || 0) - (req.body.discountAmount || 0)
+      commissionAmount = Math.round(totalHT * commissionRate * 100) / 100
+      commissionType = agency.agencyType === 'PARTNER' ? 'REVERSAL' as const : 'DEDUCTION' as const
+    }
+    
+    const contract = await prisma.rentalContract.create({
+      data: {
+        contractNumber,
+        bookingId: req.body.bookingId,
+        fleetVehicleId: req.body.fleetVehicleId,
+        agencyId: req.body.agencyId,
+        customerId: customer.id,
+        originalStartDate: new Date(req.body.startDate),
+        originalEndDate: new Date(req.body.endDate),
+        currentStartDate: new Date(req.body.startDate),
+        currentEndDate: new Date(req.body.endDate),
+        source: req.body.source || 'WALK_IN',
+        dailyRate: req.body.dailyRate,
+        totalDays: req.body.totalDays,
+        subtotal: req.body.subtotal,
+        optionsTotal: req.body.optionsTotal || 0,
+        discountAmount: req.body.discountAmount || 0,
+        discountReason: req.body.discountReason,
+        taxRate: req.body.taxRate || 21,
+        taxAmount: req.body.taxAmount,
+        totalAmount: req.body.totalAmount,
+        depositAmount: req.body.depositAmount,
+        depositMethod: req.body.depositMethod,
+        status: 'DRAFT',
+        internalNotes: req.body.internalNotes,
+        customerNotes: req.body.customerNotes,
+        commissionRate: commissionRate,
+        commissionAmount: commissionAmount,
+        commissionType: commissionType,
+        commissionStatus: commissionRate ? 'PENDING' as const : undefined
+      },
+      include: { fleetVehicle: { include: { vehicle: true } }, agency: true, customer: true }
+    })
+    
+    // Update fleet status
+    await prisma.fleet.update({ where: { id: req.body.fleetVehicleId }, data: { status: 'RESERVED' } })
+    
+    // Link booking if exists
+    if (req.body.bookingId) {
+      await prisma.booking.update({ where: { id: req.body.bookingId }, data: { fleetVehicleId: req.body.fleetVehicleId, assignmentType: 'MANUAL', assignedAt: new Date() } })
+    }
+    
+    res.json(contract)
+  } catch (error) {
+    if (isBookingOverlapError(error)) return res.status(409).json({ error: BOOKING_OVERLAP_MESSAGE })
+    console.error(error); res.status(500).json({ error: 'Failed to create contract' })
+  }
+})
+
+
+router.put('/api/contracts/:id/status', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.update({
+      where: { id: req.params.id },
+      data: { status: req.body.status }
+    })
+    
+    // Update fleet status based on contract status
+    if (req.body.status === 'ACTIVE') {
+      await prisma.fleet.update({ where: { id: contract.fleetVehicleId }, data: { status: 'RENTED' } })
+    } else if (req.body.status === 'COMPLETED' || req.body.status === 'CANCELLED') {
+      await prisma.fleet.update({ where: { id: contract.fleetVehicleId }, data: { status: 'AVAILABLE' } })
+    }
+    
+    res.json(contract)
+  } catch (error) { res.status(500).json({ error: 'Failed to update contract status' }) }
+})
+
+// Sign contract
+router.post('/api/contracts/:id/sign', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.update({
+      where: { id: req.params.id },
+      data: {
+        customerSignature: req.body.customerSignature,
+        customerSignedAt: new Date(),
+        customerIpAddress: req.body.ipAddress,
+        customerDeviceInfo: req.body.deviceInfo,
+        operatorSignature: req.body.operatorSignature,
+        operatorSignedAt: req.body.operatorSignature ? new Date() : undefined,
+        operatorId: req.body.operatorId,
+        status: 'PENDING_SIGNATURE'
+      }
+    })
+    res.json(contract)
+  } catch (error) { res.status(500).json({ error: 'Failed to sign contract' }) }
+})
+
+// Check-out (start rental)
+router.post('/api/contracts/:id/check-out', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.findUnique({ where: { id: req.params.id }, include: { fleetVehicle: true } })
+    if (!contract) return res.status(404).json({ error: 'Contract not found' })
+    
+    // Create inspection
+    const inspection = await prisma.fleetInspection.create({
+      data: {
+        fleetId: contract.fleetVehicleId,
+        contractId: contract.id,
+        type: 'CHECK_OUT',
+        mileage: req.body.mileage,
+        condition: req.body.condition,
+        fuelLevel: req.body.fuelLevel,
+        operatorId: req.body.operatorId,
+        operatorNotes: req.body.notes,
+        customerSignature: req.body.customerSignature,
+        customerSignedAt: req.body.customerSignature ? new Date() : null
+      }
+    })
+    
+    // Update contract
+    await prisma.rentalContract.update({
+      where: { id: req.params.id },
+      data: { status: 'ACTIVE', actualStartDate: new Date(), startMileage: req.body.mileage }
+    })
+    
+    // Update fleet
+    await prisma.fleet.update({
+      where: { id: contract.fleetVehicleId },
+      data: { status: 'RENTED', currentMileage: req.body.mileage }
+    })
+    
+    res.json({ contract, inspection })
+  } catch (error) { console.error(error); res.status(500).json({ error: 'Failed to check-out' }) }
+})
+
+// Check-in (end rental)
+router.post('/api/contracts/:id/check-in', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.findUnique({ where: { id: req.params.id }, include: { fleetVehicle: true } })
+    if (!contract) return res.status(404).json({ error: 'Contract not found' })
+    
+    // Create inspection
+    const inspection = await prisma.fleetInspection.create({
+      data: {
+        fleetId: contract.fleetVehicleId,
+        contractId: contract.id,
+        type: 'CHECK_IN',
+        mileage: req.body.mileage,
+        condition: req.body.condition,
+        fuelLevel: req.body.fuelLevel,
+        operatorId: req.body.operatorId,
+        operatorNotes: req.body.notes,
+        customerSignature: req.body.customerSignature,
+        customerSignedAt: req.body.customerSignature ? new Date() : null
+      }
+    })
+    
+    const totalMileage = req.body.mileage - (contract.startMileage || 0)
+    
+    // Update contract
+    await prisma.rentalContract.update({
+      where: { id: req.params.id },
+      data: {
+        status: 'COMPLETED',
+        actualEndDate: new Date(),
+        endMileage: req.body.mileage,
+        totalMileage
+      }
+    })
+    
+    // Update fleet
+    const updatedFleet = await prisma.fleet.update({
+      where: { id: contract.fleetVehicleId },
+      data: {
+        status: 'AVAILABLE',
+        currentMileage: req.body.mileage,
+        totalRentals: { increment: 1 },
+        totalRentalDays: { increment: contract.totalDays }
+      }
+    })
+    
+
+    // ===== AUTO-CHECK MAINTENANCE =====
+    const maintenanceAlerts: string[] = []
+    if (updatedFleet.maintenanceIntervalKm && updatedFleet.nextMaintenanceMileage) {
+      if (req.body.mileage >= updatedFleet.nextMaintenanceMileage) {
+        maintenanceAlerts.push("KM dépassés: " + req.body.mileage + "/" + updatedFleet.nextMaintenanceMileage + " km")
+      }
+    }
+    if (updatedFleet.maintenanceIntervalDays && updatedFleet.nextMaintenanceDate) {
+      if (new Date() >= new Date(updatedFleet.nextMaintenanceDate)) {
+        maintenanceAlerts.push("Date maintenance dépassée")
+      }
+    }
+    if (maintenanceAlerts.length > 0) {
+      const existingScheduled = await prisma.maintenanceRecord.findFirst({
+        where: { fleetId: contract.fleetVehicleId, status: "SCHEDULED" }
+      })
+      if (!existingScheduled) {
+        await prisma.maintenanceRecord.create({
+          data: {
+            fleetId: contract.fleetVehicleId,
+            type: "SCHEDULED",
+            description: "Maintenance auto après retour: " + maintenanceAlerts.join(" | "),
+            mileage: req.body.mileage,
+            status: "SCHEDULED",
+            priority: "HIGH",
+            scheduledDate: new Date()
+          }
+        })
+        console.log("Auto-maintenance created for " + updatedFleet.vehicleNumber)
+      }
+    }
+    res.json({ contract, inspection, maintenanceAlerts })
+  } catch (error) { console.error(error); res.status(500).json({ error: 'Failed to check-in' }) }
+})
+
+
+// ============== BOOKING CHECK-OUT (Départ client) ==============
+// ============== CONTRACT DEDUCTIONS ==============
+
+
+router.put('/api/deductions/:id/customer-agree', async (req, res) => {
+  try {
+    const deduction = await prisma.contractDeduction.update({
+      where: { id: req.params.id },
+      data: { customerAgreed: true }
+    })
+    res.json(deduction)
+  } catch (error) { res.status(500).json({ error: 'Failed to update deduction' }) }
+})
+
+// ============== CONTRACT EXTENSIONS ==============
+router.get('/api/contracts/:contractId/extensions', async (req, res) => {
+  try {
+    const extensions = await prisma.contractExtension.findMany({
+      where: { contractId: req.params.contractId },
+      orderBy: { createdAt: 'desc' }
+    })
+    res.json(extensions)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch extensions' }) }
+})
+
+// Generate extension number
+const generateExtensionNumber = async (contractNumber: string) => {
+  const prefix = `EXT-${contractNumber}-`
+  const lastExtension = await prisma.contractExtension.findFirst({
+    where: { extensionNumber: { startsWith: prefix } },
+    orderBy: { extensionNumber: 'desc' }
+  })
+  
+  let nextNumber = 1
+  if (lastExtension) {
+    const lastNumber = parseInt(lastExtension.extensionNumber.replace(prefix, ''))
+    nextNumber = lastNumber + 1
+  }
+  
+  return prefix + String(nextNumber).padStart(2, '0')
+}
+
+// Check availability for extension
+router.post('/api/contracts/:contractId/extensions/check-availability', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.findUnique({
+      where: { id: req.params.contractId },
+      include: { fleetVehicle: { include: { vehicle: true } }, agency: true }
+    })
+    if (!contract) return res.status(404).json({ error: 'Contract not found' })
+    
+    const requestedEndDate = new Date(req.body.requestedEndDate)
+    
+    // Check if current vehicle is available
+    const conflictingBooking = await prisma.booking.findFirst({
+      where: {
+        fleetVehicleId: contract.fleetVehicleId,
+        status: { in: ['CONFIRMED', 'PENDING'] },
+        startDate: { lt: requestedEndDate },
+        endDate: { gt: contract.currentEndDate },
+        id: { not: contract.bookingId || undefined }
+      }
+    })
+    
+    if (!conflictingBooking) {
+      return res.json({
+        available: true,
+        status: 'AVAILABLE',
+        currentVehicleAvailable: true,
+        solutionType: 'SAME_VEHICLE'
+      })
+    }
+    
+    // Find alternative vehicles
+    const alternativeVehicles = await prisma.fleet.findMany({
+      where: {
+        vehicleId: contract.fleetVehicle.vehicleId,
+        agencyId: contract.agencyId,
+        id: { not: contract.fleetVehicleId },
+        status: 'AVAILABLE',
+        isActive: true
+      },
+      include: { vehicle: true }
+    })
+    
+    if (alternativeVehicles.length > 0) {
+      return res.json({
+        available: true,
+        status: 'AVAILABLE_WITH_CHANGE',
+        currentVehicleAvailable: false,
+        conflictingBooking,
+        solutionType: 'ALTERNATIVE_VEHICLE',
+        alternativeVehicles
+      })
+    }
+    
+    return res.json({
+      available: false,
+      status: 'UNAVAILABLE',
+      currentVehicleAvailable: false,
+      conflictingBooking,
+      reason: 'No vehicles available for the requested period'
+    })
+  } catch (error) { res.status(500).json({ error: 'Failed to check availability' }) }
+})
+
+// Create extension request
+router.post('/api/contracts/:contractId/extensions', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.findUnique({
+      where: { id: req.params.contractId },
+      include: { fleetVehicle: { include: { vehicle: { include: { category: true, pricing: true } } } }, agency: true }
+    })
+    if (!contract) return res.status(404).json({ error: 'Contract not found' })
+    
+    const extensionNumber = await generateExtensionNumber(contract.contractNumber)
+    const requestedEndDate = new Date(req.body.requestedEndDate)
+    const additionalDays = Math.ceil((requestedEndDate.getTime() - contract.currentEndDate.getTime()) / (1000 * 60 * 60 * 24))
+    
+    const subtotal = Number(contract.dailyRate) * additionalDays
+    const taxAmount = subtotal * (Number(contract.taxRate) / 100)
+    const totalAmount = subtotal + taxAmount
+    
+    const extension = await prisma.contractExtension.create({
+      data: {
+        extensionNumber,
+        contractId: req.params.contractId,
+        previousEndDate: contract.currentEndDate,
+        requestedEndDate,
+        additionalDays,
+        requestSource: req.body.requestSource || 'OPERATOR_PHONE',
+        requestedBy: req.body.requestedBy,
+        availabilityStatus: req.body.availabilityStatus || 'PENDING_CHECK',
+        currentVehicleAvailable: req.body.currentVehicleAvailable || false,
+        solutionType: req.body.solutionType,
+        alternativeVehicleId: req.body.alternativeVehicleId,
+        dailyRate: contract.dailyRate,
+        subtotal,
+        taxRate: contract.taxRate,
+        taxAmount,
+        totalAmount,
+        status: 'PENDING_PAYMENT'
+      }
+    })
+    
+    res.json(extension)
+  } catch (error) { console.error(error); res.status(500).json({ error: 'Failed to create extension' }) }
+})
+
+// Create Stripe payment link for extension
+router.post('/api/extensions/:id/create-payment-link', async (req, res) => {
+  try {
+    const extension = await prisma.contractExtension.findUnique({
+      where: { id: req.params.id },
+      include: { contract: { include: { customer: true, fleetVehicle: { include: { vehicle: { include: { category: true, pricing: true } } } }, agency: true } } }
+    })
+    if (!extension) return res.status(404).json({ error: 'Extension not found' })
+    
+    const brand = extension.contract.fleetVehicle.vehicle.category.brand
+    const stripe = getStripeInstance(brand)
+    
+    const session = await stripe.checkout.sessions.create({
+      payment_method_types: ['card'],
+      customer_email: extension.contract.customer.email,
+      line_items: [{
+        price_data: {
+          currency: 'eur',
+          product_data: {
+            name: `Prolongation ${extension.additionalDays} jour(s)`,
+            description: `Contrat ${extension.contract.contractNumber} - ${extension.contract.fleetVehicle.vehicleNumber}`
+          },
+          unit_amount: Math.round(Number(extension.totalAmount) * 100)
+        },
+        quantity: 1
+      }],
+      mode: 'payment',
+      success_url: `${req.body.successUrl}?extensionId=${extension.id}`,
+      cancel_url: req.body.cancelUrl,
+      metadata: {
+        extensionId: extension.id,
+        contractId: extension.contractId,
+        type: 'CONTRACT_EXTENSION'
+      }
+    })
+    
+    await prisma.contractExtension.update({
+      where: { id: req.params.id },
+      data: {
+        stripeSessionId: session.id,
+        stripePaymentLinkUrl: session.url,
+        status: 'PAYMENT_LINK_SENT'
+      }
+    })
+    
+    // Create payment link record
+    await prisma.stripePaymentLink.create({
+      data: {
+        referenceType: 'CONTRACT_EXTENSION',
+        referenceId: extension.id,
+        stripePaymentLinkId: session.id,
+        stripePaymentLinkUrl: session.url || '',
+        amount: extension.totalAmount,
+        expiresAt: new Date(Date.now() + 24 * 60 * 60 * 1000),
+        createdBy: req.body.operatorId,
+        sentToEmail: extension.contract.customer.email
+      }
+    })
+    
+    res.json({ sessionId: session.id, url: session.url })
+  } catch (error) { console.error(error); res.status(500).json({ error: 'Failed to create payment link' }) }
+})
+
+// Approve extension (after payment)
+router.post('/api/extensions/:id/approve', async (req, res) => {
+  try {
+    const extension = await prisma.contractExtension.findUnique({
+      where: { id: req.params.id },
+      include: { contract: true }
+    })
+    if (!extension) return res.status(404).json({ error: 'Extension not found' })
+    
+    // Update extension
+    await prisma.contractExtension.update({
+      where: { id: req.params.id },
+      data: {
+        status: 'APPROVED',
+        approvedEndDate: extension.requestedEndDate,
+        paymentStatus: 'PAID',
+        paidAt: new Date(),
+        paidAmount: extension.totalAmount
+      }
+    })
+    
+    // Update contract
+    await prisma.rentalContract.update({
+      where: { id: extension.contractId },
+      data: {
+        currentEndDate: extension.requestedEndDate,
+        totalDays: { increment: extension.additionalDays },
+        totalAmount: { increment: Number(extension.totalAmount) }
+      }
+    })
+    
+    res.json({ success: true })
+  } catch (error) { res.status(500).json({ error: 'Failed to approve extension' }) }
+})
+
+// ============== EXTENSION SETTINGS ==============
+router.get('/api/extension-settings', async (req, res) => {
+  try {
+    const { agencyId } = req.query
+    const settings = await prisma.extensionSettings.findFirst({
+      where: agencyId ? { agencyId: agencyId as string } : { agencyId: null }
+    })
+    res.json(settings)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch extension settings' }) }
+})
+
+router.post('/api/extension-settings', async (req, res) => {
+  try {
+    const settings = await prisma.extensionSettings.upsert({
+      where: { agencyId: req.body.agencyId || 'global' },
+      update: req.body,
+      create: req.body
+    })
+    res.json(settings)
+  } catch (error) { res.status(500).json({ error: 'Failed to save extension settings' }) }
+})
+
+// ============== COMMISSION REPORT ==============
+// Route pour générer et envoyer le rapport de commissions
+router.post('/api/commissions/report', async (req, res) => {
+  try {
+    const { agencyId, startDate, endDate, sendEmail } = req.body
+    
+    // Récupérer l'agence
+    const agency = await prisma.agency.findUnique({ where: { id: agencyId } })
+    if (!agency) return res.status(404).json({ error: 'Agency not found' })
+    if (agency.agencyType === 'OWN') return res.status(400).json({ error: 'Commission report only for PARTNER or FRANCHISE agencies' })
+    
+    // Récupérer les contrats avec commission pour cette agence et période
+    const contracts = await prisma.rentalContract.findMany({
+      where: {
+        agencyId,
+        commissionAmount: { not: null },
+        currentStartDate: { gte: new Date(startDate) },
+        currentEndDate: { lte: new Date(endDate) },
+        status: { in: ['ACTIVE', 'COMPLETED'] }
+      },
+      include: {
+        fleetVehicle: { include: { vehicle: true } },
+        customer: true,
+        deductions: { include: { sparePart: true, equipment: true } }
+      },
+      orderBy: { currentStartDate: 'asc' }
+    })
+    
+    // Calculer les totaux
+    const totalHT = contracts.reduce((sum, c) => sum + (Number(c.subtotal || 0) + Number(c.optionsTotal || 0) - Number(c.discountAmount || 0)), 0)
+    const totalDeductions = contracts.reduce((sum, c) => sum + (c as any).deductions.reduce((s: number, d: any) => s + Number(d.totalPrice || 0), 0), 0)
+    const totalCommission = contracts.reduce((sum, c) => sum + (Number(c.commissionAmount) || 0), 0)
+    
+    const report = {
+      agency: {
+        name: agency.name,
+        code: agency.code,
+        agencyType: agency.agencyType,
+        commissionRate: agency.commissionRate
+      },
+      period: { startDate, endDate },
+      contracts: contracts.map(c => ({
+        contractNumber: c.contractNumber,
+        vehicleNumber: c.fleetVehicle?.vehicleNumber,
+        vehicleName: c.fleetVehicle?.vehicle?.name,
+        customer: `${c.customer?.firstName} ${c.customer?.lastName}`,
+        startDate: c.currentStartDate,
+        endDate: c.currentEndDate,
+        totalHT: Number(c.subtotal || 0) + Number(c.optionsTotal || 0) - Number(c.discountAmount || 0),
+        deductions: (c as any).deductions.map((d: any) => ({
+          type: d.type,
+          description: d.description,
+          quantity: d.quantity,
+          unitPrice: Number(d.unitPrice),
+          totalPrice: Number(d.totalPrice),
+          partName: d.sparePart?.name || d.equipment?.name || null
+        })),
+        deductionsTotal: (c as any).deductions.reduce((s: number, d: any) => s + Number(d.totalPrice || 0), 0),
+        commissionRate: c.commissionRate,
+        commissionAmount: c.commissionAmount
+      })),
+      totals: {
+        contractsCount: contracts.length,
+        totalHT: Math.round(totalHT * 100) / 100,
+        totalDeductions: Math.round(totalDeductions * 100) / 100,
+        totalCommission: Math.round(totalCommission * 100) / 100
+      }
+    }
+    
+    // Envoyer par email si demandé
+    if (sendEmail && agency.email) {
+      // TODO: Implémenter l'envoi d'email avec le rapport
+      // Pour l'instant on retourne juste le rapport
+    }
+    
+    res.json(report)
+  } catch (error) {
+    console.error('Commission report error:', error)
+    res.status(500).json({ error: 'Failed to generate commission report' })
+  }
+})
+
+// Route pour obtenir les commissions en attente
+router.get('/api/commissions/pending', async (req, res) => {
+  try {
+    const { agencyId } = req.query
+    
+    const where: any = {
+      commissionAmount: { not: null },
+      commissionStatus: 'PENDING'
+    }
+    if (agencyId) where.agencyId = agencyId
+    
+    const contracts = await prisma.rentalContract.findMany({
+      where,
+      include: {
+        agency: true,
+        fleetVehicle: { include: { vehicle: true } },
+        customer: true
+      },
+      orderBy: { currentStartDate: 'desc' }
+    })
+    
+    res.json(contracts)
+  } catch (error) {
+    res.status(500).json({ error: 'Failed to fetch pending commissions' })
+  }
+})
+
+// Route pour marquer une commission comme payée
+router.put('/api/commissions/:contractId/paid', async (req, res) => {
+  try {
+    const contract = await prisma.rentalContract.update({
+      where: { id: req.params.contractId },
+      data: { commissionStatus: 'PAID' }
+    })
+    res.json(contract)
+  } catch (error) {
+    res.status(500).json({ error: 'Failed to update commission status' })
+  }
+})
+
+
+// ============== CANCEL CHECK-IN ==============
+router.post('/api/bookings/:id/cancel-checkin', async (req, res) => {
+  try {
+    const { id } = req.params
+    const { reason, switchToMaintenance, maintenanceNote } = req.body
+    
+    const booking = await prisma.booking.findUnique({
+      where: { id },
+      include: { fleetVehicle: true }
+    })
+    
+    if (!booking) return res.status(404).json({ error: 'Booking not found' })
+    if (!booking.checkedIn) return res.status(400).json({ error: 'Booking is not checked in' })
+    if (booking.checkedOut) return res.status(400).json({ error: 'Booking is already checked out' })
+    
+    // 1. Cancel the booking
+    await prisma.booking.update({
+      where: { id },
+      data: {
+        status: 'CANCELLED',
+        checkedOut: true,
+        checkedOutAt: new Date(),
+        depositCaptureReason: reason || 'Check-in cancelled'
+      }
+    })
+    
+    // 2. Update vehicle status
+    if (booking.fleetVehicleId) {
+      await prisma.fleet.update({
+        where: { id: booking.fleetVehicleId },
+        data: {
+          status: switchToMaintenance ? 'MAINTENANCE' : 'AVAILABLE',
+          ...(switchToMaintenance && maintenanceNote ? { maintenanceNotes: maintenanceNote } : {})
+        }
+      })
+      // Auto-créer tâche maintenance si passage en maintenance
+      if (switchToMaintenance) {
+        await prisma.maintenanceRecord.create({
+          data: {
+            fleetId: booking.fleetVehicleId,
+            type: 'REPAIR',
+            description: 'Annulation check-in: ' + (maintenanceNote || reason || 'Problème signalé'),
+            mileage: booking.fleetVehicle?.currentMileage || 0,
+            status: 'SCHEDULED',
+            priority: 'HIGH',
+            scheduledDate: new Date()
+          }
+        })
+        console.log('Auto-maintenance created from cancel-checkin for fleet', booking.fleetVehicleId)
+      }
+    }
+    
+    // 3. Cancel the contract if exists
+    const contract = await prisma.rentalContract.findFirst({ where: { bookingId: id } })
+    if (contract) {
+      await prisma.rentalContract.update({
+        where: { id: contract.id },
+        data: {
+          status: 'CANCELLED',
+          paymentStatus: 'REFUNDED'
+        }
+      })
+    }
+    
+    res.json({ success: true, message: 'Check-in cancelled', switchedToMaintenance: switchToMaintenance || false })
+  } catch (e: any) {
+    console.error('Cancel check-in error:', e)
+    res.status(500).json({ error: 'Failed to cancel check-in', details: e.message })
+  }
+})
+
+export default router
@@ -1,21 +1,34 @@
 import { Router } from 'express'
 import express from 'express'
-import { PrismaClient } from '@prisma/client'
-import { Resend } from 'resend'
 import crypto from 'crypto'
-import { v2 as cloudinary } from "cloudinary"
-import { generateExtensionPDF } from "../pdfGenerator"
+import { getPdfPool } from '../services/pdfPool'
+import { getQueryMetrics } from '../services/queryMetrics'
+import { getResendClient } from '../services/mailer'
+import { lazyModule } from '../services/startup'
+import { prisma } from '../db'
+import { extensionDailyRate, getQuoteEngine } from '../services/quoteEngine'
+import { getNotificationInbox } from '../services/notificationInbox'
+import { BOOKING_OVERLAP_MESSAGE, isBookingOverlapError } from '../services/bookingOverlap'
+import { getCustomerBookingSummaries, registerCustomerBookingRefresh, sendCustomerBookings } from '../services/customerBookings'
+import { getOutboxWorker } from '../services/outbox'
 
 const router = Router()
 router.use(express.json())
-const prisma = new PrismaClient()
-
-cloudinary.config({
-  cloud_name: process.env.CLOUDINARY_CLOUD_NAME,
-  api_key: process.env.CLOUDINARY_API_KEY,
-  api_secret: process.env.CLOUDINARY_API_SECRET
+router.use(getQueryMetrics().bindQueryContext)
+
+// SDK Cloudinary chargé et configuré au premier envoi de PDF
+const loadCloudinary = lazyModule('cloudinary', () => {
+  const { v2: cloudinary } = require('cloudinary') as typeof import('cloudinary')
+  cloudinary.config({
+    cloud_name: process.env.CLOUDINARY_CLOUD_NAME,
+    api_key: process.env.CLOUDINARY_API_KEY,
+    api_secret: process.env.CLOUDINARY_API_SECRET
+  })
+  return cloudinary
 })
-const resend = new Resend(process.env.RESEND_API_KEY)
+const notificationInbox = getNotificationInbox(prisma)
+// Résumés "mes réservations" réécrits par le worker outbox, une fois l'écriture validée
+registerCustomerBookingRefresh(getOutboxWorker(prisma), getCustomerBookingSummaries(prisma))
 
 // Stockage temporaire des codes (en prod → Redis)
 const verificationCodes: Map<string, { code: string; expiresAt: Date; customerId: string }> = new Map()
@@ -54,7 +67,7 @@ router.post('/login', async (req, res) => {
       en: `Your verification code is: <strong>${code}</strong><br>This code expires in 10 minutes.`
     }
 
-    await resend.emails.send({
+    await getResendClient().emails.send({
       from: 'Voltride <noreply@voltride.es>',
       to: email,
       subject: subjects[lang] || subjects.es,
@@ -116,81 +129,13 @@ router.post('/verify-code', async (req, res) => {
 
 // ============== BOOKINGS ==============
 
-// 3. Liste des réservations du client
+// 3. Liste des réservations du client : résumés déjà formatés (services/customerBookings), ETag par version
 router.get('/bookings', async (req, res) => {
   try {
     const { customerId } = req.query
     if (!customerId) return res.status(400).json({ error: 'customerId required' })
 
-    const bookings = await prisma.booking.findMany({
-      where: { customerId: customerId as string },
-      include: {
-        agency: true,
-        fleetVehicle: { include: { vehicle: true } },
-        items: { include: { vehicle: true } },
-        options: { include: { option: true } },
-        contract: {
-          include: {
-            extensions: { orderBy: { createdAt: 'desc' } }
-          }
-        }
-      },
-      orderBy: { startDate: 'desc' }
-    })
-
-    const formatted = bookings.map(b => ({
-      id: b.id,
-      reference: b.reference,
-      startDate: b.startDate.toISOString().split('T')[0],
-      endDate: b.endDate.toISOString().split('T')[0],
-      startTime: b.startTime,
-      endTime: b.endTime,
-      totalPrice: b.totalPrice,
-      paidAmount: b.paidAmount,
-      depositAmount: b.depositAmount,
-      status: b.status,
-      checkedIn: b.checkedIn,
-      checkedOut: b.checkedOut,
-      language: b.language,
-      source: b.source,
-      paymentMethod: b.paymentMethod,
-      agency: {
-        id: b.agency.id,
-        name: b.agency.name,
-        brand: b.agency.brand
-      },
-      fleetVehicle: b.fleetVehicle ? {
-        id: b.fleetVehicle.id,
-        vehicleNumber: b.fleetVehicle.vehicleNumber,
-        vehicle: {
-          name: b.fleetVehicle.vehicle?.name
-        }
-      } : null,
-      options: b.options.map(o => ({
-        option: { name: o.option?.name },
-        quantity: o.quantity,
-        unitPrice: o.unitPrice,
-        totalPrice: o.totalPrice
-      })),
-      contract: b.contract ? {
-        id: b.contract.id,
-        contractNumber: b.contract.contractNumber,
-        status: b.contract.status,
-        currentEndDate: b.contract.currentEndDate.toISOString().split('T')[0],
-        extensions: b.contract.extensions.map(ext => ({
-          id: ext.id,
-          extensionNumber: ext.extensionNumber,
-          previousEndDate: ext.previousEndDate.toISOString().split('T')[0],
-          requestedEndDate: ext.requestedEndDate.toISOString().split('T')[0],
-          additionalDays: ext.additionalDays,
-          totalAmount: Number(ext.totalAmount),
-          paymentStatus: ext.paymentStatus,
-          status: ext.status
-        }))
-      } : null
-    }))
-
-    res.json(formatted)
+    await sendCustomerBookings(req, res, customerId as string)
   } catch (error: any) {
     console.error('[PORTAL] Bookings error:', error)
     res.status(500).json({ error: 'Failed to fetch bookings' })
@@ -200,18 +145,27 @@ router.get('/bookings', async (req, res) => {
 // 4. Détail d'une réservation
 router.get('/bookings/:id', async (req, res) => {
   try {
+    // Uniquement les champs affichés (ni lignes de véhicules, ni options du contrat, ni fiches complètes)
     const booking = await prisma.booking.findUnique({
       where: { id: req.params.id },
-      include: {
-        agency: true,
-        customer: true,
-        fleetVehicle: { include: { vehicle: true } },
-        items: { include: { vehicle: true } },
-        options: { include: { option: true } },
+      select: {
+        id: true, reference: true, startDate: true, endDate: true, startTime: true, endTime: true,
+        totalPrice: true, paidAmount: true, depositAmount: true, status: true, checkedIn: true, checkedOut: true, language: true,
+        agency: { select: { id: true, name: true, brand: true } },
+        customer: { select: { id: true, firstName: true, lastName: true, email: true } },
+        fleetVehicle: { select: { id: true, vehicleNumber: true, vehicle: { select: { name: true } } } },
+        options: { select: { quantity: true, unitPrice: true, totalPrice: true, option: { select: { name: true } } } },
         contract: {
-          include: {
-            extensions: { orderBy: { createdAt: 'desc' } },
-            contractOptions: true
+          select: {
+            id: true, contractNumber: true, status: true, dailyRate: true, currentStartDate: true, currentEndDate: true,
+            totalAmount: true, contractPdfUrl: true,
+            extensions: {
+              orderBy: { createdAt: 'desc' },
+              select: {
+                id: true, extensionNumber: true, previousEndDate: true, requestedEndDate: true, additionalDays: true,
+                totalAmount: true, paymentStatus: true, status: true
+              }
+            }
           }
         }
       }
@@ -335,7 +289,7 @@ router.put('/bookings/:id/modify', async (req, res) => {
     }
 
     try {
-      await resend.emails.send({
+      await getResendClient().emails.send({
         from: 'Voltride <reservations@voltride.es>',
         to: booking.customer.email,
         subject: `${subjects[lang]} - ${booking.reference}`,
@@ -356,12 +310,10 @@ router.put('/bookings/:id/modify', async (req, res) => {
 
     // Notifier les admins
     try {
-      await prisma.notification.create({
-        data: {
-          title: `Reserva modificada - ${booking.reference}`,
-          body: `${booking.customer.firstName} ${booking.customer.lastName} ha modificado su reserva. Nuevas fechas: ${startDate} → ${endDate}`,
-          data: { bookingId: booking.id, type: 'BOOKING_MODIFIED' }
-        }
+      await notificationInbox.create({
+        title: `Reserva modificada - ${booking.reference}`,
+        body: `${booking.customer.firstName} ${booking.customer.lastName} ha modificado su reserva. Nuevas fechas: ${startDate} → ${endDate}`,
+        data: { bookingId: booking.id, type: 'BOOKING_MODIFIED' }
       })
     } catch (notifError) {
       console.error('[PORTAL] Notification error (non-blocking):', notifError)
@@ -376,6 +328,7 @@ router.put('/bookings/:id/modify', async (req, res) => {
       }
     })
   } catch (error: any) {
+    if (isBookingOverlapError(error)) return res.status(409).json({ error: BOOKING_OVERLAP_MESSAGE })
     console.error('[PORTAL] Modify error:', error)
     res.status(500).json({ error: 'Failed to modify booking' })
   }
@@ -427,7 +380,7 @@ router.put('/bookings/:id/cancel', async (req, res) => {
     }
 
     try {
-      await resend.emails.send({
+      await getResendClient().emails.send({
         from: 'Voltride <reservations@voltride.es>',
         to: booking.customer.email,
         subject: `${subjects[lang]} - ${booking.reference}`,
@@ -445,12 +398,10 @@ router.put('/bookings/:id/cancel', async (req, res) => {
 
     // Notifier les admins
     try {
-      await prisma.notification.create({
-        data: {
-          title: `Reserva cancelada - ${booking.reference}`,
-          body: `${booking.customer.firstName} ${booking.customer.lastName} ha cancelado su reserva. ${refundable ? 'Reembolso pendiente.' : 'Sin reembolso (< 48h).'}`,
-          data: { bookingId: booking.id, type: 'BOOKING_CANCELLED' }
-        }
+      await notificationInbox.create({
+        title: `Reserva cancelada - ${booking.reference}`,
+        body: `${booking.customer.firstName} ${booking.customer.lastName} ha cancelado su reserva. ${refundable ? 'Reembolso pendiente.' : 'Sin reembolso (< 48h).'}`,
+        data: { bookingId: booking.id, type: 'BOOKING_CANCELLED' }
       })
     } catch (notifError) {
       console.error('[PORTAL] Notification error (non-blocking):', notifError)
@@ -504,9 +455,10 @@ router.post('/bookings/:id/extend/check', async (req, res) => {
     })
 
     const isAvailable = conflictingBookings.length === 0
-    // Calculer le prix (dailyRate est TTC)
-    const dailyRate = booking.contract ? Number(booking.contract.dailyRate) : booking.totalPrice / Math.ceil((booking.endDate.getTime() - booking.startDate.getTime()) / (1000 * 60 * 60 * 24))
+    // Calculer le prix (dailyRate est TTC) : grille du modèle via le moteur de devis, sinon tarif du contrat / de la réservation
     const additionalDays = Math.ceil((requestedEnd.getTime() - currentEndDate.getTime()) / (1000 * 60 * 60 * 24))
+    const quotedRate = await extensionDailyRate(getQuoteEngine(prisma), booking.fleetVehicle?.vehicleId, booking.startDate, currentEndDate, additionalDays)
+    const dailyRate = quotedRate || (booking.contract ? Number(booking.contract.dailyRate) : booking.totalPrice / Math.ceil((booking.endDate.getTime() - booking.startDate.getTime()) / (1000 * 60 * 60 * 24)))
     const totalAmount = Math.round(additionalDays * dailyRate * 100) / 100
     const taxRate = 21
     const taxAmount = Math.round(totalAmount * taxRate / (100 + taxRate) * 100) / 100
@@ -570,7 +522,8 @@ router.post('/bookings/:id/extend/confirm', async (req, res) => {
         return res.status(400).json({ error: "AGENCY_LIMIT_EXCEEDED", maxDays: 2, usedDays: totalAgencyDays, requestedDays: additionalDays })
       }
     }
-    const dailyRate = Number(booking.contract.dailyRate)
+    const quotedRate = await extensionDailyRate(getQuoteEngine(prisma), booking.fleetVehicle?.vehicleId, booking.startDate, currentEndDate, additionalDays)
+    const dailyRate = quotedRate || Number(booking.contract.dailyRate)
     const totalAmount = Math.round(additionalDays * dailyRate * 100) / 100
     const taxRate = Number(booking.contract.taxRate) || 21
     const taxAmount = Math.round(totalAmount * taxRate / (100 + taxRate) * 100) / 100
@@ -580,29 +533,53 @@ router.post('/bookings/:id/extend/confirm', async (req, res) => {
     const extCount = await prisma.contractExtension.count({ where: { contractId: booking.contract.id } })
     const extensionNumber = `${booking.contract.contractNumber}-EXT${extCount + 1}`
 
-    // Créer l'extension
-    const extension = await prisma.contractExtension.create({
-      data: {
-        extensionNumber,
-        contractId: booking.contract.id,
-        previousEndDate: currentEndDate,
-        requestedEndDate: requestedEnd,
-        approvedEndDate: requestedEnd,
-        additionalDays,
-        requestSource: 'CUSTOMER_SELF_SERVICE',
-        availabilityStatus: 'AVAILABLE',
-        availabilityCheckedAt: new Date(),
-        currentVehicleAvailable: true,
-        solutionType: 'SAME_VEHICLE',
-        dailyRate,
-        subtotal,
-        taxRate,
-        taxAmount,
-        totalAmount,
-        paymentStatus: paymentMethod === 'stripe' ? 'PENDING' : 'PENDING',
-        status: paymentMethod === 'stripe' ? 'PENDING_PAYMENT' : 'APPROVED',
-        notes: paymentMethod === 'agency' ? 'Pago en agencia al devolver' : null
-      }
+    const contract = booking.contract
+
+    // Réservation, extension et contrat dans une seule transaction : si le véhicule est pris par ailleurs
+    // sur la prolongation (contrainte d'exclusion, 409) ou si une écriture échoue, rien n'est prolongé ni facturé
+    const extension = await prisma.$transaction(async tx => {
+      await tx.booking.update({
+        where: { id: booking.id },
+        data: {
+          endDate: requestedEnd,
+          endTime: newEndTime || booking.endTime,
+          totalPrice: { increment: totalAmount }
+        }
+      })
+
+      const created = await tx.contractExtension.create({
+        data: {
+          extensionNumber,
+          contractId: contract.id,
+          previousEndDate: currentEndDate,
+          requestedEndDate: requestedEnd,
+          approvedEndDate: requestedEnd,
+          additionalDays,
+          requestSource: 'CUSTOMER_SELF_SERVICE',
+          availabilityStatus: 'AVAILABLE',
+          availabilityCheckedAt: new Date(),
+          currentVehicleAvailable: true,
+          solutionType: 'SAME_VEHICLE',
+          dailyRate,
+          subtotal,
+          taxRate,
+          taxAmount,
+          totalAmount,
+          paymentStatus: paymentMethod === 'stripe' ? 'PENDING' : 'PENDING',
+          status: paymentMethod === 'stripe' ? 'PENDING_PAYMENT' : 'APPROVED',
+          notes: paymentMethod === 'agency' ? 'Pago en agencia al devolver' : null
+        }
+      })
+
+      await tx.rentalContract.update({
+        where: { id: contract.id },
+        data: {
+          currentEndDate: requestedEnd,
+          totalDays: Math.ceil((requestedEnd.getTime() - contract.currentStartDate.getTime()) / (1000 * 60 * 60 * 24)),
+          totalAmount: { increment: totalAmount }
+        }
+      })
+      return created
     })
 
     // Générer le PDF avenant et uploader sur Cloudinary
@@ -612,10 +589,10 @@ router.post('/bookings/:id/extend/confirm', async (req, res) => {
       const brand = booking.agency?.brand || "VOLTRIDE"
       const brandSettings = await prisma.brandSettings.findUnique({ where: { brand } })
       const lang = booking.language || "es"
-      const pdfBuffer = await generateExtensionPDF(extension, booking, brandSettings, "es")
+      const pdfBuffer = await getPdfPool().render("extension", [extension, booking, brandSettings, "es"])
       extensionPdfBuffer = pdfBuffer
       const uploadResult = await new Promise<any>((resolve, reject) => {
-        const stream = cloudinary.uploader.upload_stream(
+        const stream = loadCloudinary().uploader.upload_stream(
           { resource_type: "raw", folder: "contracts/extensions", public_id: extension.extensionNumber, format: "pdf", access_mode: "public" },
           (error: any, result: any) => { if (error) reject(error); else resolve(result); }
         )
@@ -630,24 +607,6 @@ router.post('/bookings/:id/extend/confirm', async (req, res) => {
     } catch (pdfError) {
       console.error("[PORTAL] PDF generation error (non-blocking):", pdfError)
     }
-    // Mettre à jour le contrat et la réservation
-    await prisma.rentalContract.update({
-      where: { id: booking.contract.id },
-      data: {
-        currentEndDate: requestedEnd,
-        totalDays: Math.ceil((requestedEnd.getTime() - booking.contract.currentStartDate.getTime()) / (1000 * 60 * 60 * 24)),
-        totalAmount: { increment: totalAmount }
-      }
-    })
-
-    await prisma.booking.update({
-      where: { id: booking.id },
-      data: {
-        endDate: requestedEnd,
-        endTime: newEndTime || booking.endTime,
-        totalPrice: { increment: totalAmount }
-      }
-    })
 
     // Envoyer email au client
     const lang = booking.language || 'es'
@@ -673,7 +632,7 @@ router.post('/bookings/:id/extend/confirm', async (req, res) => {
     try {
       const formatDateEmail = (d: Date) => d.toLocaleDateString(lang === 'en' ? 'en-GB' : lang === 'es' ? 'es-ES' : 'fr-FR')
 
-      await resend.emails.send({
+      await getResendClient().emails.send({
         from: 'Voltride <reservations@voltride.es>',
         to: booking.customer.email,
         subject: `${subjects[lang]} - ${booking.reference}`,
@@ -700,17 +659,15 @@ router.post('/bookings/:id/extend/confirm', async (req, res) => {
     // Notifier les admins/opérateurs
     try {
       const paymentNote = paymentMethod === 'agency' ? '⚠️ PAGO PENDIENTE EN AGENCIA' : 'Pagado por Stripe'
-      await prisma.notification.create({
+      await notificationInbox.create({
+        title: `Prolongación - ${booking.reference}`,
+        body: `${booking.customer.firstName} ${booking.customer.lastName} ha prolongado su reserva hasta ${newEndDate}. +${additionalDays} día(s) = ${totalAmount}€. ${paymentNote}`,
         data: {
-          title: `Prolongación - ${booking.reference}`,
-          body: `${booking.customer.firstName} ${booking.customer.lastName} ha prolongado su reserva hasta ${newEndDate}. +${additionalDays} día(s) = ${totalAmount}€. ${paymentNote}`,
-          data: {
-            bookingId: booking.id,
-            extensionId: extension.id,
-            type: 'BOOKING_EXTENDED',
-            paymentMethod,
-            amount: totalAmount
-          }
+          bookingId: booking.id,
+          extensionId: extension.id,
+          type: 'BOOKING_EXTENDED',
+          paymentMethod,
+          amount: totalAmount
         }
       })
     } catch (notifError) {
@@ -729,6 +686,7 @@ router.post('/bookings/:id/extend/confirm', async (req, res) => {
       }
     })
   } catch (error: any) {
+    if (isBookingOverlapError(error)) return res.status(409).json({ error: BOOKING_OVERLAP_MESSAGE })
     console.error('[PORTAL] Extend confirm error:', error)
     res.status(500).json({ error: 'Failed to extend booking' })
   }
@@ -857,17 +815,15 @@ router.post('/profile/:customerId/delete-request', async (req, res) => {
 
     // Notifier les admins
     try {
-      await prisma.notification.create({
+      await notificationInbox.create({
+        title: `Demande suppression données - ${customer.firstName} ${customer.lastName}`,
+        body: isImmediate
+          ? `Le client ${customer.email} demande la suppression de ses données. Aucune location récente, suppression possible immédiatement.`
+          : `Le client ${customer.email} demande la suppression de ses données. Dernière location le ${lastBooking!.endDate.toISOString().split('T')[0]}. Données conservées jusqu'au ${deletionDate.toISOString().split('T')[0]} (6 mois obligation légale).`,
         data: {
-          title: `Demande suppression données - ${customer.firstName} ${customer.lastName}`,
-          body: isImmediate
-            ? `Le client ${customer.email} demande la suppression de ses données. Aucune location récente, suppression possible immédiatement.`
-            : `Le client ${customer.email} demande la suppression de ses données. Dernière location le ${lastBooking!.endDate.toISOString().split('T')[0]}. Données conservées jusqu'au ${deletionDate.toISOString().split('T')[0]} (6 mois obligation légale).`,
-          data: {
-            customerId: customer.id,
-            type: 'DATA_DELETION_REQUEST',
-            deletionDate: deletionDate.toISOString()
-          }
+          customerId: customer.id,
+          type: 'DATA_DELETION_REQUEST',
+          deletionDate: deletionDate.toISOString()
         }
       })
     } catch (notifError) {
@@ -894,7 +850,7 @@ router.post('/profile/:customerId/delete-request', async (req, res) => {
     }
 
     try {
-      await resend.emails.send({
+      await getResendClient().emails.send({
         from: 'Voltride <noreply@voltride.es>',
         to: customer.email,
         subject: subjects[lang] || subjects.es,
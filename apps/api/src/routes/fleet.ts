@@ -0,0 +1,1235 @@
+import { Router } from 'express'
+import { PdfQueueFullError, getPdfPool, pipePdf } from '../services/pdfPool'
+import { prisma } from '../db'
+import { BLOCKING_BOOKING_STATUSES } from '../services/availabilityIndex'
+import { bookingOverlapEnforced, findBookingOverlaps } from '../services/bookingOverlap'
+import { FLEET_LIST_INCLUDE, loadQRCode } from './shared'
+
+// Flotte : véhicules, entretien, dommages, documents techniques, pièces détachées, QR codes
+
+const router = Router()
+const pdfPool = getPdfPool()
+
+// ============== FLEET EQUIPMENT ==============
+
+router.get('/api/fleet/:fleetId/equipment', async (req, res) => {
+  try {
+    const equipment = await prisma.fleetEquipment.findMany({
+      where: { fleetId: req.params.fleetId, isActive: true },
+      orderBy: { name: 'asc' }
+    })
+    res.json(equipment)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.post('/api/fleet/:fleetId/equipment', async (req, res) => {
+  try {
+    const equipment = await prisma.fleetEquipment.create({
+      data: {
+        fleetId: req.params.fleetId,
+        name: req.body.name,
+        description: req.body.description,
+        quantity: req.body.quantity || 1,
+        price: req.body.price || 0,
+        condition: req.body.condition || 'GOOD',
+        isIncluded: req.body.isIncluded ?? true
+      }
+    })
+    res.json(equipment)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.put('/api/fleet/equipment/:id', async (req, res) => {
+  try {
+    const equipment = await prisma.fleetEquipment.update({
+      where: { id: req.params.id },
+      data: req.body
+    })
+    res.json(equipment)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.delete('/api/fleet/equipment/:id', async (req, res) => {
+  try {
+    await prisma.fleetEquipment.update({
+      where: { id: req.params.id },
+      data: { isActive: false }
+    })
+    res.json({ success: true })
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// ============== FLEET CONTRACT FIELDS ==============
+
+router.get('/api/fleet/:fleetId/contract-fields', async (req, res) => {
+  try {
+    const fields = await prisma.fleetContractField.findMany({
+      where: { fleetId: req.params.fleetId },
+      orderBy: { displayOrder: 'asc' }
+    })
+    res.json(fields)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.post('/api/fleet/:fleetId/contract-fields', async (req, res) => {
+  try {
+    const field = await prisma.fleetContractField.upsert({
+      where: { 
+        fleetId_fieldName: { 
+          fleetId: req.params.fleetId, 
+          fieldName: req.body.fieldName 
+        } 
+      },
+      update: {
+        displayOrder: req.body.displayOrder,
+        showInContract: req.body.showInContract
+      },
+      create: {
+        fleetId: req.params.fleetId,
+        fieldName: req.body.fieldName,
+        displayOrder: req.body.displayOrder || 0,
+        showInContract: req.body.showInContract ?? true
+      }
+    })
+    res.json(field)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.put('/api/fleet/:fleetId/contract-fields/batch', async (req, res) => {
+  try {
+    const fields = req.body.fields || []
+    for (const field of fields) {
+      await prisma.fleetContractField.upsert({
+        where: { 
+          fleetId_fieldName: { 
+            fleetId: req.params.fleetId, 
+            fieldName: field.fieldName 
+          } 
+        },
+        update: {
+          displayOrder: field.displayOrder,
+          showInContract: field.showInContract
+        },
+        create: {
+          fleetId: req.params.fleetId,
+          fieldName: field.fieldName,
+          displayOrder: field.displayOrder || 0,
+          showInContract: field.showInContract ?? true
+        }
+      })
+    }
+    res.json({ success: true })
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// ============== FLEET DOCUMENTS ==============
+
+router.get('/api/fleet/:fleetId/documents', async (req, res) => {
+  try {
+    const documents = await prisma.fleetDocument.findMany({
+      where: { fleetId: req.params.fleetId },
+      orderBy: { createdAt: 'desc' }
+    })
+    res.json(documents)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.post('/api/fleet/:fleetId/documents', async (req, res) => {
+  try {
+    const document = await prisma.fleetDocument.create({
+      data: {
+        fleetId: req.params.fleetId,
+        type: req.body.type,
+        name: req.body.name,
+        fileUrl: req.body.fileUrl,
+        fileType: req.body.fileType || 'image',
+        issueDate: req.body.issueDate ? new Date(req.body.issueDate) : null,
+        expiryDate: req.body.expiryDate ? new Date(req.body.expiryDate) : null,
+        sendToCustomer: req.body.sendToCustomer || false,
+        description: req.body.description
+      }
+    })
+    res.json(document)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.put('/api/fleet/documents/:id', async (req, res) => {
+  try {
+    const document = await prisma.fleetDocument.update({
+      where: { id: req.params.id },
+      data: req.body
+    })
+    res.json(document)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.delete('/api/fleet/documents/:id', async (req, res) => {
+  try {
+    await prisma.fleetDocument.delete({
+      where: { id: req.params.id }
+    })
+    res.json({ success: true })
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// ============== FLEET SPARE PARTS ==============
+
+router.get('/api/fleet/:fleetId/spare-parts', async (req, res) => {
+  try {
+    const parts = await prisma.fleetSparePart.findMany({
+      where: { fleetId: req.params.fleetId, isActive: true },
+      orderBy: { name: 'asc' }
+    })
+    res.json(parts)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.post('/api/fleet/:fleetId/spare-parts', async (req, res) => {
+  try {
+    const part = await prisma.fleetSparePart.create({
+      data: {
+        fleetId: req.params.fleetId,
+        name: req.body.name,
+        partNumber: req.body.partNumber,
+        category: req.body.category || 'OTHER',
+        location: req.body.location || 'OTHER',
+        price: req.body.price || 0,
+        laborCost: req.body.laborCost || 0,
+        totalCost: (parseFloat(req.body.price) || 0) + (parseFloat(req.body.laborCost) || 0),
+        supplierName: req.body.supplierName,
+        supplierRef: req.body.supplierRef
+      }
+    })
+    res.json(part)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.put('/api/fleet/spare-parts/:id', async (req, res) => {
+  try {
+    const data = { ...req.body }
+    if (data.price !== undefined || data.laborCost !== undefined) {
+      const current = await prisma.fleetSparePart.findUnique({ where: { id: req.params.id } })
+      data.totalCost = (parseFloat(data.price?.toString() || '0') || parseFloat(current?.price?.toString() || '0') || 0) + 
+                       (parseFloat(data.laborCost?.toString() || '0') || parseFloat(current?.laborCost?.toString() || '0') || 0)
+    }
+    const part = await prisma.fleetSparePart.update({
+      where: { id: req.params.id },
+      data
+    })
+    res.json(part)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.delete('/api/fleet/spare-parts/:id', async (req, res) => {
+  try {
+    await prisma.fleetSparePart.update({
+      where: { id: req.params.id },
+      data: { isActive: false }
+    })
+    res.json({ success: true })
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// ============== FLEET MAINTENANCE ==============
+
+router.get('/api/fleet/:fleetId/maintenance', async (req, res) => {
+  try {
+    const records = await prisma.maintenanceRecord.findMany({
+      where: { fleetId: req.params.fleetId },
+      orderBy: { scheduledDate: 'desc' }
+    })
+    res.json(records)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.post('/api/fleet/:fleetId/maintenance', async (req, res) => {
+  try {
+    const record = await prisma.maintenanceRecord.create({
+      data: {
+        fleetId: req.params.fleetId,
+        type: req.body.type || 'OTHER',
+        status: req.body.status || 'COMPLETED',
+        scheduledDate: req.body.scheduledDate ? new Date(req.body.scheduledDate) : new Date(),
+        completedAt: req.body.completedDate ? new Date(req.body.completedDate) : null,
+        description: req.body.description,
+        mileage: req.body.mileageAtService || 0,
+        totalCost: req.body.cost || 0,
+        laborCost: req.body.laborCost || 0,
+        partsCost: req.body.partsCost || 0,
+        performedBy: req.body.providerName,
+        invoiceNumber: req.body.invoiceNumber,
+        notes: req.body.notes,
+        priority: req.body.priority || 'NORMAL',
+      }
+    })
+    res.json(record)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.delete('/api/fleet/maintenance/:id', async (req, res) => {
+  try {
+    await prisma.maintenanceRecord.delete({
+      where: { id: req.params.id }
+    })
+    res.json({ success: true })
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Update fleet with new fields
+router.put('/api/fleet/:id', async (req, res) => {
+  try {
+    // Trouver l'agence par son code pour mettre a jour agencyId
+    let agencyId = undefined
+    if (req.body.locationCode) {
+      const agency = await prisma.agency.findFirst({ where: { code: req.body.locationCode } })
+      if (agency) agencyId = agency.id
+    }
+    const fleet = await prisma.fleet.update({
+      where: { id: req.params.id },
+      data: {
+        vehicleNumber: req.body.vehicleNumber,
+        licensePlate: req.body.licensePlate,
+        locationCode: req.body.locationCode,
+        agencyId: agencyId,
+        chassisNumber: req.body.chassisNumber,
+        brand: req.body.brand,
+        model: req.body.model,
+        engineSize: req.body.engineSize,
+        year: req.body.year,
+        color: req.body.color,
+        status: req.body.status,
+        currentMileage: req.body.currentMileage,
+        itvDate: req.body.itvDate ? new Date(req.body.itvDate) : undefined,
+        itvExpiryDate: req.body.itvExpiryDate ? new Date(req.body.itvExpiryDate) : undefined,
+        insuranceExpiryDate: req.body.insuranceExpiryDate ? new Date(req.body.insuranceExpiryDate) : undefined,
+        insuranceCompany: req.body.insuranceCompany,
+        insurancePolicyNumber: req.body.insurancePolicyNumber,
+        maintenanceIntervalKm: req.body.maintenanceIntervalKm,
+        maintenanceIntervalDays: req.body.maintenanceIntervalDays,
+        maintenanceIntervalType: req.body.maintenanceIntervalType,
+        nextMaintenanceMileage: req.body.nextMaintenanceMileage,
+        nextMaintenanceDate: req.body.nextMaintenanceDate ? new Date(req.body.nextMaintenanceDate) : undefined,
+        lastMaintenanceDate: req.body.lastMaintenanceDate ? new Date(req.body.lastMaintenanceDate) : undefined,
+        lastMaintenanceMileage: req.body.lastMaintenanceMileage,
+        notes: req.body.notes,
+        maintenanceNotes: req.body.maintenanceNotes !== undefined ? req.body.maintenanceNotes : undefined,
+        vehicleId: req.body.vehicleId,
+      },
+      include: {
+        vehicle: true,
+        agency: true,
+        documents: true,
+        equipment: { where: { isActive: true } },
+        spareParts: { where: { isActive: true } }
+      }
+    })
+    res.json(fleet)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+
+
+// Create new fleet vehicle
+router.post('/api/fleet', async (req, res) => {
+  try {
+    const fleet = await prisma.fleet.create({
+      data: {
+        vehicleNumber: req.body.vehicleNumber,
+        licensePlate: req.body.licensePlate || null,
+        locationCode: req.body.locationCode || null,
+        chassisNumber: req.body.chassisNumber,
+        brand: req.body.brand || null,
+        model: req.body.model || null,
+        engineSize: req.body.engineSize || null,
+        year: req.body.year || null,
+        color: req.body.color || null,
+        currentMileage: req.body.currentMileage || 0,
+        vehicleId: req.body.vehicleId,
+        agencyId: req.body.agencyId,
+        status: 'AVAILABLE'
+      },
+      include: {
+        vehicle: { include: { category: true } },
+        agency: true
+      }
+    })
+    res.json(fleet)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// Delete fleet vehicle
+router.delete('/api/fleet/:id', async (req, res) => {
+  try {
+    await prisma.fleet.delete({
+      where: { id: req.params.id }
+    })
+    res.json({ success: true })
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+router.get('/api/fleet', async (req, res) => {
+  try {
+    const { agencyId, status, vehicleId } = req.query
+    const where: any = { isActive: true }
+    if (agencyId) where.agencyId = agencyId
+    if (status) where.status = status
+    if (vehicleId) where.vehicleId = vehicleId
+    
+    const fleet = await prisma.fleet.findMany({
+      where,
+      include: FLEET_LIST_INCLUDE,
+      orderBy: { vehicleNumber: 'asc' }
+    })
+    res.json(fleet)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch fleet' }) }
+})
+
+
+// Get available fleet vehicles (MUST BE BEFORE /:id route!)
+router.get('/api/fleet/available', async (req, res) => {
+  try {
+    const { agencyId, vehicleId, startDate, endDate } = req.query
+    const where: any = { isActive: true, status: { in: ['AVAILABLE', 'RESERVED'] } }
+    if (agencyId) where.agencyId = agencyId
+    if (vehicleId) where.vehicleId = vehicleId
+    
+    const fleetVehicles = await prisma.fleet.findMany({
+      where,
+      include: { vehicle: { include: { category: true, pricing: true } }, agency: true }
+    })
+    
+    if (!startDate || !endDate) return res.json(fleetVehicles)
+    
+    const start = new Date(startDate as string)
+    const end = new Date(endDate as string)
+    
+    const conflictingBookings = await prisma.booking.findMany({
+      where: {
+        fleetVehicleId: { in: fleetVehicles.map(f => f.id) },
+        status: { in: BLOCKING_BOOKING_STATUSES },
+        startDate: { lte: end },
+        endDate: { gte: start }
+      },
+      select: { fleetVehicleId: true }
+    })
+    
+    const conflictingIds = new Set(conflictingBookings.map(b => b.fleetVehicleId))
+    res.json(fleetVehicles.filter(f => !conflictingIds.has(f.id)))
+  } catch (e: any) {
+    console.error(e)
+    res.status(500).json({ error: 'Failed to get available vehicles' })
+  }
+})
+
+// Contrainte anti double réservation (services/bookingOverlap) : active ou non, et chevauchements déjà en base
+// qui empêchent sa création au démarrage (à réaffecter ou annuler, puis redémarrer une instance)
+router.get('/api/fleet/overlaps', async (req, res) => {
+  try {
+    const [enforced, overlaps] = await Promise.all([bookingOverlapEnforced(prisma), findBookingOverlaps(prisma)])
+    res.json({ enforced, overlaps })
+  } catch (e: any) {
+    console.error(e)
+    res.status(500).json({ error: 'Failed to check booking overlaps' })
+  }
+})
+
+// Get single fleet with all relations (après les routes statiques /api/fleet/available, /api/fleet/overlaps)
+router.get('/api/fleet/:id', async (req, res) => {
+  try {
+    const fleet = await prisma.fleet.findUnique({
+      where: { id: req.params.id },
+      include: {
+        vehicle: { include: { category: true } },
+        agency: true,
+        documents: true,
+        equipment: { where: { isActive: true } },
+        spareParts: { where: { isActive: true } },
+        contractFields: { orderBy: { displayOrder: 'asc' } },
+        maintenanceRecords: { orderBy: { scheduledDate: 'desc' }, take: 10 }
+      }
+    })
+    res.json(fleet)
+  } catch (e: any) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+
+router.put('/api/fleet/:id/status', async (req, res) => {
+  try {
+    const fleetVehicle = await prisma.fleet.update({ where: { id: req.params.id }, data: { status: req.body.status } })
+    res.json(fleetVehicle)
+  } catch (error) { res.status(500).json({ error: 'Failed to update fleet status' }) }
+})
+
+
+// ============== FLEET DOCUMENTS ==============
+
+
+
+// ============== FLEET DAMAGES ==============
+router.get('/api/fleet/:fleetId/damages', async (req, res) => {
+  try {
+    const { resolved } = req.query
+    const where: any = { fleetId: req.params.fleetId }
+    if (resolved !== undefined) where.isResolved = resolved === 'true'
+    const damages = await prisma.fleetDamage.findMany({ where, orderBy: { reportedAt: 'desc' } })
+    res.json(damages)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch damages' }) }
+})
+
+router.post('/api/fleet/:fleetId/damages', async (req, res) => {
+  try {
+    const damage = await prisma.fleetDamage.create({
+      data: {
+        fleetId: req.params.fleetId,
+        description: req.body.description,
+        location: req.body.location,
+        locationDetail: req.body.locationDetail,
+        severity: req.body.severity || 'MINOR',
+        photoUrl: req.body.photoUrl,
+        photoThumbnail: req.body.photoThumbnail,
+        reportedBy: req.body.reportedBy,
+        inspectionId: req.body.inspectionId,
+        contractId: req.body.contractId
+      }
+    })
+    res.json(damage)
+  } catch (error) { res.status(500).json({ error: 'Failed to create damage report' }) }
+})
+
+router.put('/api/fleet/damages/:id/resolve', async (req, res) => {
+  try {
+    const damage = await prisma.fleetDamage.update({
+      where: { id: req.params.id },
+      data: { isResolved: true, resolvedAt: new Date(), resolvedBy: req.body.resolvedBy, resolutionNote: req.body.resolutionNote }
+    })
+    res.json(damage)
+  } catch (error) { res.status(500).json({ error: 'Failed to resolve damage' }) }
+})
+
+// ============== FLEET INSPECTIONS ==============
+router.get('/api/fleet/:fleetId/inspections', async (req, res) => {
+  try {
+    const inspections = await prisma.fleetInspection.findMany({
+      where: { fleetId: req.params.fleetId, isDeleted: false },
+      include: { photos: true, damages: true, contract: true },
+      orderBy: { inspectedAt: 'desc' }
+    })
+    res.json(inspections)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch inspections' }) }
+})
+
+router.get('/api/inspections/:id', async (req, res) => {
+  try {
+    const inspection = await prisma.fleetInspection.findUnique({
+      where: { id: req.params.id },
+      include: { photos: true, damages: true, fleet: { include: { vehicle: true } }, contract: true }
+    })
+    if (!inspection) return res.status(404).json({ error: 'Inspection not found' })
+    res.json(inspection)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch inspection' }) }
+})
+
+router.post('/api/fleet/:fleetId/inspections', async (req, res) => {
+  try {
+    const inspection = await prisma.fleetInspection.create({
+      data: {
+        fleetId: req.params.fleetId,
+        contractId: req.body.contractId,
+        type: req.body.type,
+        mileage: req.body.mileage,
+        condition: req.body.condition,
+        fuelLevel: req.body.fuelLevel,
+        operatorId: req.body.operatorId,
+        operatorNotes: req.body.operatorNotes,
+        customerSignature: req.body.customerSignature,
+        customerSignedAt: req.body.customerSignature ? new Date() : null,
+        customerIpAddress: req.body.customerIpAddress,
+        customerDeviceInfo: req.body.customerDeviceInfo
+      },
+      include: { photos: true }
+    })
+    
+    // Update fleet mileage
+    await prisma.fleet.update({ where: { id: req.params.fleetId }, data: { currentMileage: req.body.mileage, lastMileageUpdate: new Date() } })
+    
+    // Create mileage log
+    const fleet = await prisma.fleet.findUnique({ where: { id: req.params.fleetId } })
+    if (fleet) {
+      await prisma.mileageLog.create({
+        data: {
+          fleetId: req.params.fleetId,
+          previousMileage: fleet.currentMileage,
+          newMileage: req.body.mileage,
+          difference: req.body.mileage - fleet.currentMileage,
+          source: req.body.type === 'CHECK_OUT' ? 'CHECK_OUT' : req.body.type === 'CHECK_IN' ? 'CHECK_IN' : 'MANUAL',
+          referenceId: inspection.id,
+          recordedBy: req.body.operatorId
+        }
+      })
+    }
+    
+    res.json(inspection)
+  } catch (error) { console.error(error); res.status(500).json({ error: 'Failed to create inspection' }) }
+})
+
+router.post('/api/inspections/:id/photos', async (req, res) => {
+  try {
+    const photo = await prisma.inspectionPhoto.create({
+      data: {
+        inspectionId: req.params.id,
+        angle: req.body.angle,
+        photoUrl: req.body.photoUrl,
+        photoThumbnail: req.body.photoThumbnail
+      }
+    })
+    res.json(photo)
+  } catch (error) { res.status(500).json({ error: 'Failed to add inspection photo' }) }
+})
+
+router.post('/api/inspections/:id/sign', async (req, res) => {
+  try {
+    const inspection = await prisma.fleetInspection.update({
+      where: { id: req.params.id },
+      data: {
+        customerSignature: req.body.signature,
+        customerSignedAt: new Date(),
+        customerIpAddress: req.body.ipAddress,
+        customerDeviceInfo: req.body.deviceInfo
+      }
+    })
+    res.json(inspection)
+  } catch (error) { res.status(500).json({ error: 'Failed to sign inspection' }) }
+})
+
+// ============== MAINTENANCE RECORDS ==============
+
+router.get('/api/maintenance', async (req, res) => {
+  try {
+    const { status, priority, agencyId } = req.query
+    const where: any = {}
+    if (status) where.status = status
+    if (priority) where.priority = priority
+    if (agencyId) where.fleet = { agencyId }
+    
+    const records = await prisma.maintenanceRecord.findMany({
+      where,
+      include: { fleet: { include: { vehicle: { include: { category: true } }, agency: true } } },
+      orderBy: [{ priority: 'desc' }, { scheduledDate: 'asc' }]
+    })
+    res.json(records)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch maintenance records' }) }
+})
+
+
+router.put('/api/maintenance/:id', async (req, res) => {
+  try {
+    const record = await prisma.maintenanceRecord.update({
+      where: { id: req.params.id },
+      data: {
+        type: req.body.type,
+        description: req.body.description,
+        mileage: req.body.mileage,
+        laborCost: req.body.laborCost,
+        partsCost: req.body.partsCost,
+        totalCost: req.body.totalCost,
+        performedBy: req.body.performedBy,
+        invoiceNumber: req.body.invoiceNumber,
+        invoiceUrl: req.body.invoiceUrl,
+        scheduledDate: req.body.scheduledDate ? new Date(req.body.scheduledDate) : undefined,
+        startedAt: req.body.startedAt ? new Date(req.body.startedAt) : undefined,
+        completedAt: req.body.completedAt ? new Date(req.body.completedAt) : undefined,
+        status: req.body.status,
+        priority: req.body.priority,
+        partsReplaced: req.body.partsReplaced,
+        technicianNotes: req.body.technicianNotes,
+        notes: req.body.notes,
+      },
+      include: { fleet: true }
+    })
+    
+    // Update fleet status based on maintenance status
+    if (req.body.status === 'IN_PROGRESS') {
+      await prisma.fleet.update({ where: { id: record.fleetId }, data: { status: 'MAINTENANCE' } })
+    } else if (req.body.status === 'COMPLETED') {
+      // Récupérer les intervalles du véhicule
+      const fleet = await prisma.fleet.findUnique({ where: { id: record.fleetId } })
+      const nextKm = fleet?.maintenanceIntervalKm ? record.mileage + fleet.maintenanceIntervalKm : undefined
+      const nextDate = fleet?.maintenanceIntervalDays
+        ? new Date(Date.now() + fleet.maintenanceIntervalDays * 24 * 60 * 60 * 1000)
+        : undefined
+
+      await prisma.fleet.update({
+        where: { id: record.fleetId },
+        data: {
+          status: 'AVAILABLE',
+          lastMaintenanceDate: new Date(),
+          lastMaintenanceMileage: record.mileage,
+          nextMaintenanceMileage: nextKm,
+          nextMaintenanceDate: nextDate
+        }
+      })
+      console.log('Maintenance COMPLETED for', fleet?.vehicleNumber, '- Next km:', nextKm, '- Next date:', nextDate)
+    }
+    
+    res.json(record)
+  } catch (error) { res.status(500).json({ error: 'Failed to update maintenance record' }) }
+})
+
+
+// ============== FLEET - PROCHAINES RÉSERVATIONS ==============
+router.get("/api/fleet/:id/upcoming-bookings", async (req, res) => {
+  try {
+    const bookings = await prisma.booking.findMany({
+      where: {
+        fleetVehicleId: req.params.id,
+        status: { in: ["CONFIRMED", "CHECKED_IN"] },
+        startDate: { gte: new Date() }
+      },
+      orderBy: { startDate: "asc" },
+      take: 5,
+      select: { id: true, startDate: true, endDate: true, status: true, customer: { select: { firstName: true, lastName: true } } }
+    })
+    res.json(bookings)
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+// ============== MAINTENANCE PDF ==============
+router.get('/api/fleet/:id/maintenance-pdf', async (req, res) => {
+  try {
+    const fleet = await prisma.fleet.findUnique({
+      where: { id: req.params.id },
+      include: {
+        vehicle: { include: { category: true } },
+        agency: true,
+        maintenanceRecords: { orderBy: { createdAt: 'desc' } }
+      }
+    })
+    if (!fleet) return res.status(404).json({ error: 'Vehicle not found' })
+
+    pipePdf(res, pdfPool.stream('maintenance', [fleet]), 'mantenimiento-' + fleet.vehicleNumber + '.pdf', 'attachment')
+  } catch (e: any) {
+    if (e instanceof PdfQueueFullError) return res.status(503).set('Retry-After', '5').json({ error: e.message })
+    console.error('Maintenance PDF error:', e)
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// ============== SPARE PARTS ==============
+
+
+router.put('/api/spare-parts/:id', async (req, res) => {
+  try {
+    const part = await prisma.fleetSparePart.update({
+      where: { id: req.params.id },
+      data: {
+        name: req.body.name,
+        partNumber: req.body.partNumber,
+        category: req.body.category,
+        location: req.body.location,
+        price: req.body.price,
+        laborCost: req.body.laborCost,
+        totalCost: req.body.price + (req.body.laborCost || 0),
+        quantityInStock: req.body.quantityInStock,
+        minimumStock: req.body.minimumStock,
+        supplierName: req.body.supplierName,
+        supplierRef: req.body.supplierRef,
+        isActive: req.body.isActive
+      }
+    })
+    res.json(part)
+  } catch (error) { res.status(500).json({ error: 'Failed to update spare part' }) }
+})
+
+// ============== SPARE PART TEMPLATES ==============
+router.get('/api/vehicles/:vehicleId/spare-part-templates', async (req, res) => {
+  try {
+    const templates = await prisma.vehicleSparePartTemplate.findMany({ where: { vehicleId: req.params.vehicleId, isActive: true }, orderBy: { name: 'asc' } })
+    res.json(templates)
+  } catch (error) { res.status(500).json({ error: 'Failed to fetch spare part templates' }) }
+})
+
+router.post('/api/vehicles/:vehicleId/spare-part-templates', async (req, res) => {
+  try {
+    const template = await prisma.vehicleSparePartTemplate.create({
+      data: {
+        vehicleId: req.params.vehicleId,
+        name: req.body.name,
+        partNumber: req.body.partNumber,
+        category: req.body.category,
+        location: req.body.location,
+        defaultPrice: req.body.defaultPrice,
+        defaultLaborCost: req.body.defaultLaborCost
+      }
+    })
+    res.json(template)
+  } catch (error) { res.status(500).json({ error: 'Failed to create spare part template' }) }
+})
+
+// Copy templates to fleet vehicle
+router.post('/api/fleet/:fleetId/copy-spare-parts-from-templates', async (req, res) => {
+  try {
+    const fleet = await prisma.fleet.findUnique({ where: { id: req.params.fleetId }, include: { vehicle: true } })
+    if (!fleet) return res.status(404).json({ error: 'Fleet vehicle not found' })
+    
+    const templates = await prisma.vehicleSparePartTemplate.findMany({ where: { vehicleId: fleet.vehicleId, isActive: true } })
+    
+    const parts = await Promise.all(templates.map(t => 
+      prisma.fleetSparePart.create({
+        data: {
+          fleetId: req.params.fleetId,
+          name: t.name,
+          partNumber: t.partNumber,
+          category: t.category,
+          location: t.location,
+          price: t.defaultPrice,
+          laborCost: t.defaultLaborCost || 0,
+          totalCost: Number(t.defaultPrice) + Number(t.defaultLaborCost || 0)
+        }
+      })
+    ))
+    
+    res.json(parts)
+  } catch (error) { res.status(500).json({ error: 'Failed to copy spare parts from templates' }) }
+})
+
+router.post('/api/fleet/:id/generate-qr', async (req, res) => {
+  try {
+    const fleet = await prisma.fleet.findUnique({
+      where: { id: req.params.id },
+      include: { vehicle: { include: { category: true } }, agency: true }
+    })
+    if (!fleet) return res.status(404).json({ error: 'Vehicle not found' })
+    
+    const brand = (fleet.vehicle as any)?.category?.brand || 'VOLTRIDE'
+    const operatorUrl = brand === 'VOLTRIDE' ? 'https://operator-production-188c.up.railway.app' : 'https://motor-rent-operator-production.up.railway.app'
+    const qrUrl = operatorUrl + '?vehicle=' + fleet.id
+    const qrDataUrl = await loadQRCode().toDataURL(qrUrl, { width: 400, margin: 1 })
+    
+    // Upload to Cloudinary
+    const crypto = require('crypto')
+    const timestamp = Math.round(Date.now() / 1000)
+    const folder = 'qrcodes/vehicles'
+    const publicId = 'qr-' + fleet.vehicleNumber
+    const apiSecret = process.env.CLOUDINARY_API_SECRET || ''
+    const signStr = 'folder=' + folder + '&public_id=' + publicId + '&timestamp=' + timestamp + apiSecret
+    const signature = crypto.createHash('sha1').update(signStr).digest('hex')
+    
+    const formData = new URLSearchParams()
+    formData.append('file', qrDataUrl)
+    formData.append('folder', folder)
+    formData.append('public_id', publicId)
+    formData.append('timestamp', String(timestamp))
+    formData.append('api_key', process.env.CLOUDINARY_API_KEY || '485395684484158')
+    formData.append('signature', signature)
+    
+    const cloudRes = await fetch('https://api.cloudinary.com/v1_1/dis5pcnfr/image/upload', { method: 'POST', body: formData })
+    const cloudData: any = await cloudRes.json()
+    
+    if (!cloudData.secure_url) return res.status(500).json({ error: 'Cloudinary upload failed', details: cloudData })
+    
+    await prisma.fleet.update({
+      where: { id: req.params.id },
+      data: { qrCodeUrl: cloudData.secure_url }
+    })
+    
+    res.json({ success: true, qrCodeUrl: cloudData.secure_url, vehicleNumber: fleet.vehicleNumber })
+  } catch (e: any) {
+    console.error('Generate QR error:', e)
+    res.status(500).json({ error: 'Failed to generate QR', details: e.message })
+  }
+})
+
+// Generate QR codes for all vehicles of an agency
+router.post('/api/fleet/generate-qr-all/:agencyId', async (req, res) => {
+  try {
+    const vehicles = await prisma.fleet.findMany({
+      where: { agencyId: req.params.agencyId, isActive: true },
+      include: { vehicle: { include: { category: true } } },
+      orderBy: { vehicleNumber: 'asc' }
+    })
+    
+    const results: any[] = []
+    for (const fleet of vehicles) {
+      const brand = (fleet.vehicle as any)?.category?.brand || 'VOLTRIDE'
+      const operatorUrl = brand === 'VOLTRIDE' ? 'https://operator-production-188c.up.railway.app' : 'https://motor-rent-operator-production.up.railway.app'
+      const qrUrl = operatorUrl + '?vehicle=' + fleet.id
+      const qrDataUrl = await loadQRCode().toDataURL(qrUrl, { width: 400, margin: 1 })
+      
+      const crypto = require('crypto')
+      const timestamp = Math.round(Date.now() / 1000)
+      const folder = 'qrcodes/vehicles'
+      const publicId = 'qr-' + fleet.vehicleNumber
+      const apiSecret = process.env.CLOUDINARY_API_SECRET || ''
+      const signStr = 'folder=' + folder + '&public_id=' + publicId + '&timestamp=' + timestamp + apiSecret
+      const signature = crypto.createHash('sha1').update(signStr).digest('hex')
+      
+      const formData = new URLSearchParams()
+      formData.append('file', qrDataUrl)
+      formData.append('folder', folder)
+      formData.append('public_id', publicId)
+      formData.append('timestamp', String(timestamp))
+      formData.append('api_key', process.env.CLOUDINARY_API_KEY || '485395684484158')
+      formData.append('signature', signature)
+      
+      const cloudRes = await fetch('https://api.cloudinary.com/v1_1/dis5pcnfr/image/upload', { method: 'POST', body: formData })
+      const cloudData: any = await cloudRes.json()
+      
+      if (cloudData.secure_url) {
+        await prisma.fleet.update({ where: { id: fleet.id }, data: { qrCodeUrl: cloudData.secure_url } })
+        results.push({ vehicleNumber: fleet.vehicleNumber, qrCodeUrl: cloudData.secure_url })
+      }
+    }
+    
+    res.json({ success: true, count: results.length, vehicles: results })
+  } catch (e: any) {
+    console.error('Generate all QR error:', e)
+    res.status(500).json({ error: 'Failed to generate QR codes', details: e.message })
+  }
+})
+
+
+
+// ============== STOCK CENTRAL ==============
+router.get('/api/stock', async (req, res) => {
+  try {
+    const { category, vehicleType, search } = req.query
+    const where: any = { isActive: true }
+    if (category) where.category = category
+    if (vehicleType) where.vehicleType = vehicleType
+    if (search) where.OR = [
+      { name: { contains: search as string, mode: 'insensitive' } },
+      { sku: { contains: search as string, mode: 'insensitive' } },
+      { barcode: { contains: search as string, mode: 'insensitive' } }
+    ]
+    const parts = await prisma.inventoryPart.findMany({
+      where,
+      include: { _count: { select: { movements: true } } },
+      orderBy: { name: 'asc' }
+    })
+    res.json(parts)
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+router.post('/api/stock', async (req, res) => {
+  try {
+    const part = await prisma.inventoryPart.create({
+      data: {
+        name: req.body.name,
+        sku: req.body.sku || null,
+        barcode: req.body.barcode || null,
+        category: req.body.category || 'GENERAL',
+        vehicleType: req.body.vehicleType || 'ALL',
+        imageUrl: req.body.imageUrl || null,
+        price: req.body.price || 0,
+        laborCost: req.body.laborCost || null,
+        quantityInStock: req.body.quantityInStock || 0,
+        minimumStock: req.body.minimumStock || 1,
+        supplierName: req.body.supplierName || null,
+        supplierRef: req.body.supplierRef || null,
+        supplierContact: req.body.supplierContact || null,
+        location: req.body.location || null,
+        compatibleFleetIds: req.body.compatibleFleetIds || null
+      }
+    })
+    res.json(part)
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+router.put('/api/stock/:id', async (req, res) => {
+  try {
+    const part = await prisma.inventoryPart.update({
+      where: { id: req.params.id },
+      data: req.body
+    })
+    res.json(part)
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+router.delete('/api/stock/:id', async (req, res) => {
+  try {
+    await prisma.inventoryPart.update({ where: { id: req.params.id }, data: { isActive: false } })
+    res.json({ success: true })
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+// Stock movements
+router.get('/api/stock/:id/movements', async (req, res) => {
+  try {
+    const movements = await prisma.stockMovement.findMany({
+      where: { partId: req.params.id },
+      include: { fleetVehicle: true },
+      orderBy: { createdAt: 'desc' }
+    })
+    res.json(movements)
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+router.post('/api/stock/:id/movement', async (req, res) => {
+  try {
+    const { type, quantity, fleetVehicleId, note, cost, createdBy } = req.body
+    const movement = await prisma.stockMovement.create({
+      data: {
+        partId: req.params.id,
+        type,
+        quantity,
+        fleetVehicleId: fleetVehicleId || null,
+        note: note || null,
+        cost: cost || null,
+        createdBy: createdBy || null
+      }
+    })
+    // Update stock quantity
+    const delta = type === 'IN' || type === 'RETURN' ? quantity : -quantity
+    await prisma.inventoryPart.update({
+      where: { id: req.params.id },
+      data: { quantityInStock: { increment: delta } }
+    })
+    const updated = await prisma.inventoryPart.findUnique({ where: { id: req.params.id } })
+    res.json({ movement, currentStock: updated?.quantityInStock })
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+// Low stock alert
+router.get('/api/stock/alerts/low-stock', async (req, res) => {
+  try {
+    const parts = await prisma.inventoryPart.findMany({
+      where: {
+        isActive: true,
+        quantityInStock: { lte: prisma.inventoryPart.fields.minimumStock }
+      }
+    })
+    // Fallback: filter manually since Prisma doesn't support field comparison easily
+    const allParts = await prisma.inventoryPart.findMany({ where: { isActive: true } })
+    const lowStock = allParts.filter(p => p.quantityInStock <= p.minimumStock)
+    res.json(lowStock)
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+
+// ============== DOCS TECHNIQUES ==============
+router.get('/api/technical-docs', async (req, res) => {
+  try {
+    const { category } = req.query
+    const where: any = {}
+    if (category) where.vehicleCategory = category
+    const docs = await prisma.technicalDoc.findMany({ where, orderBy: { createdAt: 'desc' } })
+    res.json(docs)
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+router.post('/api/technical-docs', async (req, res) => {
+  try {
+    const doc = await prisma.technicalDoc.create({
+      data: {
+        title: req.body.title,
+        vehicleCategory: req.body.vehicleCategory,
+        docType: req.body.docType || 'OTHER',
+        fileUrl: req.body.fileUrl,
+        fileType: req.body.fileType || null,
+        description: req.body.description || null
+      }
+    })
+    res.json(doc)
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+router.delete('/api/technical-docs/:id', async (req, res) => {
+  try {
+    await prisma.technicalDoc.delete({ where: { id: req.params.id } })
+    res.json({ success: true })
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+
+// ============== QR CODE - ACTIVE BOOKING BY VEHICLE ==============
+router.get('/api/fleet/:id/active-booking', async (req, res) => {
+  try {
+    const booking = await prisma.booking.findFirst({
+      where: {
+        fleetVehicleId: req.params.id,
+        checkedIn: true,
+        checkedOut: false,
+        status: { in: ['CHECKED_IN', 'CONFIRMED'] }
+      },
+      include: {
+        customer: true,
+        fleetVehicle: { include: { vehicle: true } },
+        agency: true
+      },
+      orderBy: { checkedInAt: 'desc' }
+    })
+    if (!booking) return res.status(404).json({ error: 'No active booking for this vehicle' })
+    res.json(booking)
+  } catch (e: any) {
+    console.error('Active booking error:', e)
+    res.status(500).json({ error: 'Failed to find active booking' })
+  }
+})
+
+// ============== QR CODE INTELLIGENT ==============
+router.get("/api/qr-scan/:fleetId", async (req, res) => {
+  try {
+    const fleet = await prisma.fleet.findUnique({
+      where: { id: req.params.fleetId },
+      include: {
+        vehicle: { include: { category: true } },
+        agency: true,
+        maintenanceRecords: { orderBy: { createdAt: "desc" }, take: 10 }
+      }
+    })
+    if (!fleet) return res.status(404).json({ error: "Vehicle not found" })
+
+    // 1. Vérifier si en location
+    const activeBooking = await prisma.booking.findFirst({
+      where: {
+        fleetVehicleId: fleet.id,
+        checkedIn: true,
+        checkedOut: false,
+        status: { in: ["CHECKED_IN", "CONFIRMED"] }
+      },
+      include: { customer: true, agency: true },
+      orderBy: { checkedInAt: "desc" }
+    })
+
+    if (activeBooking) {
+      return res.json({
+        action: "checkout",
+        booking: activeBooking,
+        fleet: { id: fleet.id, vehicleNumber: fleet.vehicleNumber, status: fleet.status }
+      })
+    }
+
+    // 2. Pas en location -> maintenance
+    // Vérifier alertes maintenance
+    const alerts: string[] = []
+    const now = new Date()
+
+    // Alerte km
+    if (fleet.maintenanceIntervalKm && fleet.nextMaintenanceMileage) {
+      if (fleet.currentMileage >= fleet.nextMaintenanceMileage) {
+        alerts.push("KM dépassés: " + fleet.currentMileage + "/" + fleet.nextMaintenanceMileage + " km")
+      }
+    }
+
+    // Alerte jours
+    if (fleet.maintenanceIntervalDays && fleet.nextMaintenanceDate) {
+      if (now >= new Date(fleet.nextMaintenanceDate)) {
+        alerts.push("Date maintenance dépassée: " + new Date(fleet.nextMaintenanceDate).toLocaleDateString())
+      }
+    }
+
+    // Alerte ITV
+    if (fleet.itvExpiryDate && now >= new Date(fleet.itvExpiryDate)) {
+      alerts.push("ITV expirée: " + new Date(fleet.itvExpiryDate).toLocaleDateString())
+    }
+
+    // Alerte assurance
+    if (fleet.insuranceExpiryDate && now >= new Date(fleet.insuranceExpiryDate)) {
+      alerts.push("Assurance expirée: " + new Date(fleet.insuranceExpiryDate).toLocaleDateString())
+    }
+
+    // Auto-créer note maintenance si km ou jours dépassés
+    if (alerts.length > 0) {
+      const existingScheduled = await prisma.maintenanceRecord.findFirst({
+        where: { fleetId: fleet.id, status: "SCHEDULED" }
+      })
+      if (!existingScheduled) {
+        await prisma.maintenanceRecord.create({
+          data: {
+            fleetId: fleet.id,
+            type: "SCHEDULED",
+            description: "Maintenance planifiée (auto): " + alerts.join(" | "),
+            mileage: fleet.currentMileage,
+            status: "SCHEDULED",
+            priority: "HIGH",
+            scheduledDate: now
+          }
+        })
+      }
+    }
+
+    return res.json({
+      action: "maintenance",
+      fleet,
+      alerts,
+      maintenanceRecords: fleet.maintenanceRecords
+    })
+  } catch (e: any) {
+    console.error("QR scan error:", e)
+    res.status(500).json({ error: "QR scan failed", details: e.message })
+  }
+})
+
+
+// Generate QR codes for all fleet vehicles of an agency (for printing labels)
+router.get('/api/fleet/qr-labels/:agencyId', async (req, res) => {
+  try {
+    const vehicles = await prisma.fleet.findMany({
+      where: { agencyId: req.params.agencyId, status: { not: 'OUT_OF_SERVICE' } },
+      include: { vehicle: { include: { category: true } } },
+      orderBy: { vehicleNumber: 'asc' }
+    })
+    const brand = vehicles[0]?.vehicle?.category?.brand || 'VOLTRIDE'
+    const operatorUrl = brand === 'VOLTRIDE' ? 'https://operator-production-188c.up.railway.app' : 'https://motor-rent-operator-production.up.railway.app'
+    
+    const labels = await Promise.all(vehicles.map(async (v: any) => {
+      const qrUrl = operatorUrl + '?vehicle=' + v.id
+      const qrDataUrl = await loadQRCode().toDataURL(qrUrl, { width: 300, margin: 1 })
+      return {
+        vehicleNumber: v.vehicleNumber,
+        vehicleName: v.vehicle?.name,
+        qrDataUrl,
+        qrUrl
+      }
+    }))
+    res.json(labels)
+  } catch (e: any) {
+    console.error('QR labels error:', e)
+    res.status(500).json({ error: 'Failed to generate QR labels' })
+  }
+})
+
+export default router
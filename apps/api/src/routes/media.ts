@@ -0,0 +1,114 @@
+import express, { Router } from 'express'
+import { prisma } from '../db'
+import { MEDIA_HASH, MEDIA_TYPES, MediaTooLargeError, getMediaStore, ingestStream } from '../services/mediaStore'
+import { MultipartError, parseMultipart } from '../services/multipart'
+import { MEDIA_MAX_BYTES, migrateInlineMedia, saveMedia } from '../services/media'
+
+// Médias : envoi multipart, lecture des fichiers stockés, migration des images base64
+
+const router = Router()
+
+// ============== MEDIA ==============
+// Envoi multipart (champ(s) fichier) : chaque fichier est écrit sur disque au fil de la réception, haché,
+// puis rangé dans le stockage média. Réponse : { files: [{ field, hash, url, thumbnailUrl, contentType, size }] }
+router.post('/api/media', async (req, res) => {
+  try {
+    const files: any[] = []
+    await parseMultipart(req, async file => {
+      const ingested = await ingestStream(file.stream, MEDIA_MAX_BYTES)
+      files.push({ field: file.field, filename: file.filename, ...(await saveMedia(prisma, ingested)) })
+    })
+    if (!files.length) return res.status(400).json({ error: 'No file provided' })
+    res.json({ files })
+  } catch (error: any) {
+    if (error instanceof MediaTooLargeError) return res.status(413).json({ error: error.message })
+    if (error instanceof MultipartError) return res.status(error.status).json({ error: error.message })
+    console.error('Media upload error:', error)
+    res.status(500).json({ error: 'Failed to upload media' })
+  }
+})
+
+// Contenu adressé par empreinte : jamais modifié, cache navigateur / CDN immuable.
+// Public et sur l'origine de l'API : seuls les types reconnus sont servis tels quels (les anciennes lignes peuvent
+// porter le type annoncé par le client), jamais réinterprétés par le navigateur ; hors images, téléchargement.
+async function sendMedia(req: express.Request, res: express.Response, hash: string) {
+  const blob = await prisma.mediaBlob.findUnique({ where: { hash } })
+  const stream = blob && await getMediaStore().open(hash)
+  if (!blob || !stream) return res.status(404).json({ error: 'Media not found' })
+  res.setHeader('ETag', '"' + hash + '"')
+  res.setHeader('Cache-Control', 'public, max-age=31536000, immutable')
+  if (req.headers['if-none-match'] === '"' + hash + '"') {
+    stream.destroy()
+    return res.status(304).end()
+  }
+  const contentType = MEDIA_TYPES.includes(blob.contentType) ? blob.contentType : 'application/octet-stream'
+  res.setHeader('Content-Type', contentType)
+  res.setHeader('X-Content-Type-Options', 'nosniff')
+  if (!contentType.startsWith('image/')) res.setHeader('Content-Disposition', `attachment; filename="${hash}"`)
+  res.setHeader('Content-Length', String(blob.size))
+  stream.on('error', e => { console.error('Media stream error:', e); res.destroy(e) })
+  stream.pipe(res)
+}
+
+router.get('/api/media/:hash', async (req, res) => {
+  try {
+    if (!MEDIA_HASH.test(req.params.hash)) return res.status(400).json({ error: 'Invalid media hash' })
+    await sendMedia(req, res, req.params.hash)
+  } catch (error) {
+    console.error('Media read error:', error)
+    res.status(500).json({ error: 'Failed to read media' })
+  }
+})
+
+// Vignette si elle est prête, sinon l'original
+router.get('/api/media/:hash/thumb', async (req, res) => {
+  try {
+    if (!MEDIA_HASH.test(req.params.hash)) return res.status(400).json({ error: 'Invalid media hash' })
+    const blob = await prisma.mediaBlob.findUnique({ where: { hash: req.params.hash }, select: { thumbnailHash: true, thumbnailStatus: true } })
+    await sendMedia(req, res, blob?.thumbnailStatus === 'READY' && blob.thumbnailHash ? blob.thumbnailHash : req.params.hash)
+  } catch (error) {
+    console.error('Media thumbnail error:', error)
+    res.status(500).json({ error: 'Failed to read media' })
+  }
+})
+
+// Sortie des images base64 déjà en base, par lots (?dryRun=true pour le volume seul, ?limit= lignes par appel)
+router.post('/api/media/migrate-inline', async (req, res) => {
+  try {
+    const report = await migrateInlineMedia(prisma, {
+      dryRun: req.query.dryRun === 'true',
+      maxRows: parseInt(req.query.limit as string) || undefined
+    })
+    res.json(report)
+  } catch (error) {
+    console.error('Media migration error:', error)
+    res.status(500).json({ error: 'Failed to migrate inline media' })
+  }
+})
+
+// ============== UPLOAD IMAGE (Cloudinary signed) ==============
+router.post("/api/upload-image", async (req, res) => {
+  try {
+    const { file, folder = "uploads" } = req.body
+    if (!file) return res.status(400).json({ error: "No file provided" })
+    const crypto = require("crypto")
+    const timestamp = Math.round(Date.now() / 1000)
+    const publicId = folder.replace(/\//g, "-") + "-" + timestamp
+    const apiSecret = process.env.CLOUDINARY_API_SECRET || ""
+    const signStr = "folder=" + folder + "\&public_id=" + publicId + "\&timestamp=" + timestamp + apiSecret
+    const signature = crypto.createHash("sha1").update(signStr).digest("hex")
+    const formData = new URLSearchParams()
+    formData.append("file", file)
+    formData.append("folder", folder)
+    formData.append("public_id", publicId)
+    formData.append("timestamp", String(timestamp))
+    formData.append("api_key", process.env.CLOUDINARY_API_KEY || "485395684484158")
+    formData.append("signature", signature)
+    const cloudRes = await fetch("https://api.cloudinary.com/v1_1/dis5pcnfr/image/upload", { method: "POST", body: formData })
+    const cloudData: any = await cloudRes.json()
+    if (!cloudData.secure_url) return res.status(500).json({ error: "Upload failed", details: cloudData })
+    res.json({ secure_url: cloudData.secure_url, public_id: cloudData.public_id })
+  } catch (e: any) { res.status(500).json({ error: e.message }) }
+})
+
+export default router
@@ -0,0 +1,264 @@
+import { Router } from 'express'
+import { decodeCursor, isPaginated, parseLimit } from '../services/pagination'
+import { createPushDispatcher } from '../services/pushDispatcher'
+import { runNotificationCheck } from '../services/notificationScheduler'
+import { withClusterLock } from '../services/clusterLock'
+import { getNotificationInbox } from '../services/notificationInbox'
+import { prisma } from '../db'
+import { MailMessage, getMailer } from '../services/mailer'
+import { getOutboxWorker } from '../services/outbox'
+
+// Notifications : push, e-mails via l'outbox, planification, historique et réglages
+
+const router = Router()
+const mailer = getMailer()
+const outboxWorker = getOutboxWorker(prisma)
+const notificationInbox = getNotificationInbox(prisma)
+
+// ============== PUSH NOTIFICATIONS ==============
+const pushDispatcher = createPushDispatcher(prisma)
+
+router.get('/api/push/vapid-public-key', (req, res) => { res.json({ publicKey: process.env.VAPID_PUBLIC_KEY }) })
+
+router.post('/api/push/subscribe', async (req, res) => {
+  try {
+    const { subscription, userId } = req.body
+    const existing = await prisma.pushSubscription.findUnique({ where: { endpoint: subscription.endpoint } })
+    const result = existing
+      ? await prisma.pushSubscription.update({ where: { endpoint: subscription.endpoint }, data: { p256dh: subscription.keys.p256dh, auth: subscription.keys.auth, userId, userAgent: req.headers['user-agent'] } })
+      : await prisma.pushSubscription.create({ data: { endpoint: subscription.endpoint, p256dh: subscription.keys.p256dh, auth: subscription.keys.auth, userId, userAgent: req.headers['user-agent'] } })
+    res.json({ success: true, subscription: result })
+  } catch (error) { console.error('Push subscribe error:', error); res.status(500).json({ error: 'Failed to subscribe' }) }
+})
+
+router.post('/api/push/unsubscribe', async (req, res) => {
+  try {
+    const { endpoint } = req.body
+    await prisma.pushSubscription.delete({ where: { endpoint } }).catch(() => {})
+    res.json({ success: true })
+  } catch (error) { res.status(500).json({ error: 'Failed to unsubscribe' }) }
+})
+
+router.post('/api/push/send', async (req, res) => {
+  try {
+    const { userId, title, body, data } = req.body
+    if (!title || !body) return res.status(400).json({ error: 'Title et body requis' })
+    
+    // Historique + envoi à l'utilisateur (ou à tous les abonnements)
+    const { total, success, failed } = await pushDispatcher.dispatch(userId ? [userId] : null, { title, body, icon: '/icon-192.png', data }, [userId || null])
+    res.json({ total, success, failed })
+  } catch (error) { console.error('Push send error:', error); res.status(500).json({ error: 'Failed to send' }) }
+})
+
+router.post('/api/push/test', async (req, res) => {
+  try {
+    const { endpoint } = req.body
+    const sub = await prisma.pushSubscription.findUnique({ where: { endpoint } })
+    if (!sub) return res.status(404).json({ error: "Not found" })
+    const result = await pushDispatcher.sendToSubscriptions([sub], { title: "Test OK!", body: "Les notifications fonctionnent", icon: "/icon-192.png" })
+    if (!result.success) return res.status(500).json({ error: 'Failed to send test' })
+    res.json({ success: true })
+  } catch (error) { console.error('Push test error:', error); res.status(500).json({ error: 'Failed to send test' }) }
+})
+
+console.log('Push notification routes loaded')
+
+// ============== NOTIFICATION HELPER ==============
+async function sendNotificationByType(type: string, title: string, body: string, data?: any) {
+  try {
+    // Récupérer les paramètres de notification pour ce type
+    const setting = await prisma.notificationSetting.findUnique({ where: { notificationType: type } })
+    if (!setting) return { sent: 0 }
+    
+    // Déterminer les rôles à notifier
+    const rolesToNotify: string[] = []
+    if (setting.roleAdmin) rolesToNotify.push('ADMIN')
+    if (setting.roleManager) rolesToNotify.push('MANAGER')
+    if (setting.roleOperator) rolesToNotify.push('OPERATOR')
+    
+    if (rolesToNotify.length === 0) return { sent: 0 }
+    
+    // Récupérer les utilisateurs de ces rôles
+    const users = await prisma.user.findMany({
+      where: { role: { in: rolesToNotify as any }, isActive: true },
+      select: { id: true }
+    })
+    
+    // Historique pour chaque utilisateur + push sur tous leurs abonnements, en un envoi groupé
+    const userIds = users.map(u => u.id)
+    const result = await pushDispatcher.dispatch(userIds, { title, body, icon: '/icon-192.png', data }, userIds)
+    return { sent: result.success, users: users.length }
+  } catch (e) { console.error('sendNotificationByType error:', e); return { sent: 0, error: e } }
+}
+
+
+
+
+
+outboxWorker.register('email', async (message: MailMessage, { id }) => {
+  const result = await mailer.send(message, id)
+  console.log('[OUTBOX EMAIL]', message.subject, '->', message.to, result.id)
+})
+
+outboxWorker.register('push', async ({ type, title, body, data }) => {
+  const result: any = await sendNotificationByType(type, title, body, data)
+  if (result.error) throw result.error
+})
+
+// Files en attente, messages en échec définitif (DEAD) et compteurs du worker
+router.get('/api/outbox/stats', async (req, res) => {
+  try {
+    res.json(await outboxWorker.stats())
+  } catch (error) {
+    console.error('Outbox stats error:', error)
+    res.status(500).json({ error: 'Failed to get outbox stats' })
+  }
+})
+
+// Relance manuelle des messages DEAD (après correction d'une adresse, d'une clé API...)
+router.post('/api/outbox/retry-dead', async (req, res) => {
+  try {
+    const { count } = await prisma.outboxMessage.updateMany({
+      where: { status: 'DEAD', ...(req.body?.topic ? { topic: req.body.topic } : {}) },
+      data: { status: 'PENDING', attempts: 0, availableAt: new Date() }
+    })
+    outboxWorker.wake()
+    res.json({ success: true, count })
+  } catch (error) {
+    console.error('Outbox retry error:', error)
+    res.status(500).json({ error: 'Failed to retry outbox messages' })
+  }
+})
+
+// ============== CRON NOTIFICATIONS (à appeler toutes les 5-10 min) ==============
+// Événements dus calculés en une requête ; le registre NotificationLedger évite les doublons entre exécutions.
+// Un seul réplica exécute le passage (verrou de cluster) : les autres répondent 409 sans rien envoyer.
+router.get('/api/cron/check-notifications', async (req, res) => {
+  try {
+    const locked = await withClusterLock(prisma, 'cron:check-notifications', () => runNotificationCheck(prisma, sendNotificationByType))
+    if (!locked.acquired) return res.status(409).json({ error: 'Notification check already running' })
+    const run = locked.result
+    console.log(`[CRON] check-notifications: ${run.checked} bookings, ${run.due} due, ${run.skipped} already sent, ${run.timings.totalMs} ms`)
+    res.json({ success: true, ...run })
+  } catch (error) { 
+    console.error('Cron notifications error:', error)
+    res.status(500).json({ error: 'Failed to check notifications' }) 
+  }
+})
+
+// ============== NOTIFICATIONS HISTORY ==============
+// Écritures par la boîte de réception (services/notificationInbox) : compteurs de non lues tenus à jour dans la
+// même transaction, renvoyés dans `counts` ({ clé: non lues }, clé '*' = toutes) et diffusés en SSE ("unread").
+// Sans cursor ni limit : les 50 plus récentes (ancien format) ; sinon { items, nextCursor }.
+router.get('/api/notifications', async (req, res) => {
+  try {
+    const userId = req.query.userId as string | undefined
+    if (!isPaginated(req.query)) {
+      const { items } = await notificationInbox.list({ userId, cursor: null, limit: 50 })
+      return res.json(items)
+    }
+    const cursor = decodeCursor(req.query.cursor as string)
+    if (req.query.cursor && !cursor) return res.status(400).json({ error: 'Invalid cursor' })
+    res.json(await notificationInbox.list({ userId, cursor, limit: parseLimit(req.query.limit) }))
+  } catch (error) { res.status(500).json({ error: 'Failed to get notifications' }) }
+})
+
+router.get('/api/notifications/unread-count', async (req, res) => {
+  try {
+    const count = await notificationInbox.unreadCount(req.query.userId as string | undefined)
+    res.json({ count })
+  } catch (error) { res.status(500).json({ error: 'Failed to count' }) }
+})
+
+router.put('/api/notifications/:id/read', async (req, res) => {
+  try {
+    const notification = await prisma.notification.findUnique({ where: { id: req.params.id } })
+    if (!notification) return res.status(404).json({ error: 'Notification not found' })
+    const { counts } = await notificationInbox.markRead(notification.id)
+    res.json({ ...notification, isRead: true, counts: counts || {} })
+  } catch (error) { res.status(500).json({ error: 'Failed to mark as read' }) }
+})
+
+router.put('/api/notifications/read-all', async (req, res) => {
+  try {
+    const { changed, counts } = await notificationInbox.markAllRead(req.body.userId)
+    res.json({ success: true, updated: changed, counts: counts || {} })
+  } catch (error) { res.status(500).json({ error: 'Failed to mark all as read' }) }
+})
+
+router.delete('/api/notifications/:id', async (req, res) => {
+  try {
+    const { changed, counts } = await notificationInbox.remove(req.params.id)
+    if (!changed) return res.status(404).json({ error: 'Notification not found' })
+    res.json({ success: true, counts: counts || {} })
+  } catch (error) { res.status(500).json({ error: 'Failed to delete' }) }
+})
+
+// Compteurs recalculés depuis l'historique (après une écriture hors boîte de réception)
+router.post('/api/notifications/rebuild-counters', async (req, res) => {
+  try {
+    res.json({ counts: await notificationInbox.rebuildCounters() })
+  } catch (error) { res.status(500).json({ error: 'Failed to rebuild counters' }) }
+})
+
+// Rétention manuelle (le job tourne aussi toutes les heures) : { archived, purged }
+router.post('/api/notifications/archive', async (req, res) => {
+  try {
+    res.json(await notificationInbox.archive())
+  } catch (error) { res.status(500).json({ error: 'Failed to archive notifications' }) }
+})
+
+
+
+
+// ============== NOTIFICATION SETTINGS ==============
+// GET - Récupérer tous les paramètres de notifications
+router.get('/api/notification-settings', async (req, res) => {
+  try {
+    const settings = await prisma.notificationSetting.findMany()
+    res.json(settings)
+  } catch (error) {
+    console.error('Error fetching notification settings:', error)
+    res.status(500).json({ error: 'Failed to fetch notification settings' })
+  }
+})
+
+// POST - Initialiser ou mettre à jour les paramètres
+router.post('/api/notification-settings', async (req, res) => {
+  try {
+    const { notificationType, roleAdmin, roleManager, roleOperator } = req.body
+    const setting = await prisma.notificationSetting.upsert({
+      where: { notificationType },
+      update: { roleAdmin, roleManager, roleOperator },
+      create: { notificationType, roleAdmin, roleManager, roleOperator }
+    })
+    res.json(setting)
+  } catch (error) {
+    console.error('Error saving notification setting:', error)
+    res.status(500).json({ error: 'Failed to save notification setting' })
+  }
+})
+
+// POST - Sauvegarder tous les paramètres en une fois
+router.post('/api/notification-settings/bulk', async (req, res) => {
+  try {
+    const { settings } = req.body // Array of { notificationType, roleAdmin, roleManager, roleOperator }
+    const results = await Promise.all(
+      settings.map((s: any) => 
+        prisma.notificationSetting.upsert({
+          where: { notificationType: s.notificationType },
+          update: { roleAdmin: s.roleAdmin, roleManager: s.roleManager, roleOperator: s.roleOperator },
+          create: { notificationType: s.notificationType, roleAdmin: s.roleAdmin, roleManager: s.roleManager, roleOperator: s.roleOperator }
+        })
+      )
+    )
+    res.json({ success: true, count: results.length })
+  } catch (error) {
+    console.error('Error saving notification settings:', error)
+    res.status(500).json({ error: 'Failed to save notification settings' })
+  }
+})
+
+console.log('Notification settings routes loaded')
+
+export default router
@@ -0,0 +1,591 @@
+import express, { Router } from 'express'
+import { DEPOSIT_CANDIDATE_WHERE, depositWindow, runDepositAuthorization, stripeGateway } from '../services/depositAuthorization'
+import { prisma } from '../db'
+import { getOutboxWorker } from '../services/outbox'
+import { acceptStripeEvent } from '../services/stripeWebhook'
+import { getStripeInstance, getWebhookStripe } from '../services/stripeClients'
+import { withClusterLock } from '../services/clusterLock'
+
+// Paiements Stripe : checkout, webhook, cautions, factures et dépenses
+
+const router = Router()
+const outboxWorker = getOutboxWorker(prisma)
+
+// ============== STRIPE CHECKOUT ==============
+router.post('/api/create-checkout-session', async (req, res) => {
+  try {
+    const { brand, bookingId, amount, customerEmail, successUrl, cancelUrl, locale } = req.body
+    const stripe = getStripeInstance(brand)
+    
+    // Mapper la langue pour Stripe (fr, es, en)
+    const stripeLocale = locale === 'es' ? 'es' : locale === 'en' ? 'en' : 'fr'
+    
+    const session = await stripe.checkout.sessions.create({
+      payment_method_types: ['card'],
+      customer_email: customerEmail,
+      locale: stripeLocale,
+      line_items: [{
+        price_data: {
+          currency: 'eur',
+          product_data: {
+            name: brand === 'MOTOR-RENT' 
+              ? (stripeLocale === 'es' ? 'Reserva Motor-Rent' : stripeLocale === 'en' ? 'Motor-Rent Booking' : 'Réservation Motor-Rent')
+              : (stripeLocale === 'es' ? 'Reserva Voltride' : stripeLocale === 'en' ? 'Voltride Booking' : 'Réservation Voltride'),
+            description: stripeLocale === 'es' ? `Anticipo reserva #${bookingId}` : stripeLocale === 'en' ? `Booking deposit #${bookingId}` : `Acompte réservation #${bookingId}`,
+          },
+          unit_amount: Math.round(amount * 100),
+        },
+        quantity: 1,
+      }],
+      mode: 'payment',
+      success_url: successUrl,
+      cancel_url: cancelUrl,
+      metadata: {
+        bookingId: bookingId,
+        brand: brand
+      }
+    })
+    
+    res.json({ sessionId: session.id, url: session.url })
+  } catch (error) {
+    console.error('Stripe error:', error)
+    res.status(500).json({ error: 'Failed to create checkout session' })
+  }
+})
+
+// ============== STRIPE WEBHOOK ==============
+// Réponse rapide à Stripe : événement enregistré + réservation confirmée + messages outbox dans une transaction,
+// les emails partent ensuite depuis le worker outbox (voir OUTBOX plus bas)
+router.post('/api/stripe-webhook', express.raw({ type: 'application/json' }), async (req, res) => {
+  let event
+  try {
+    const sig = req.headers['stripe-signature']
+    const webhookSecret = process.env.STRIPE_WEBHOOK_SECRET_VOLTRIDE
+    if (sig && webhookSecret) {
+      const stripe = getWebhookStripe() as any
+      event = stripe.webhooks.constructEvent(req.body, sig, webhookSecret)
+    } else {
+      event = JSON.parse(req.body.toString())
+      console.warn('⚠️ Webhook sans vérification de signature!')
+    }
+    if (!event?.id || !event?.type) throw new Error('Invalid event')
+  } catch (error) {
+    console.error('Webhook error:', error)
+    return res.status(400).json({ error: 'Webhook error' })
+  }
+
+  try {
+    const result = await acceptStripeEvent(prisma, event)
+    if (result.queued) outboxWorker.wake()
+    if (result.error) console.warn('[WEBHOOK]', event.type, event.id, result.error)
+    res.json({ received: true, duplicate: result.duplicate })
+  } catch (error) {
+    // Rien n'a été enregistré : Stripe réessaiera
+    console.error('Webhook processing error:', error)
+    res.status(500).json({ error: 'Webhook processing failed' })
+  }
+})
+
+// ============== DEPOSIT/CAUTION SYSTEM ==============
+
+// 1. Créer un SetupIntent pour enregistrer la carte du client (sans débiter)
+router.post('/api/create-setup-intent', async (req, res) => {
+  try {
+    const { brand, customerId, customerEmail, customerName, bookingId, depositAmount } = req.body
+    const stripe = getStripeInstance(brand)
+    
+    // Créer ou récupérer le customer Stripe
+    let stripeCustomerId = null
+    const existingCustomers = await stripe.customers.list({ email: customerEmail, limit: 1 })
+    
+    if (existingCustomers.data.length > 0) {
+      stripeCustomerId = existingCustomers.data[0].id
+    } else {
+      const customer = await stripe.customers.create({
+        email: customerEmail,
+        name: customerName,
+        metadata: { customerId, brand }
+      })
+      stripeCustomerId = customer.id
+    }
+    
+    // Créer le SetupIntent
+    const setupIntent = await stripe.setupIntents.create({
+      customer: stripeCustomerId,
+      payment_method_types: ['card'],
+      metadata: {
+        bookingId,
+        depositAmount: depositAmount.toString(),
+        brand,
+        type: 'deposit'
+      }
+    })
+    
+    res.json({
+      clientSecret: setupIntent.client_secret,
+      stripeCustomerId
+    })
+  } catch (error) {
+    console.error('SetupIntent error:', error)
+    res.status(500).json({ error: 'Failed to create setup intent' })
+  }
+})
+
+// 2. Pré-autoriser la caution (appeler J-1 ou manuellement)
+router.post('/api/authorize-deposit', async (req, res) => {
+  try {
+    const { bookingId, brand } = req.body
+    const stripe = getStripeInstance(brand)
+    
+    const booking = await prisma.booking.findUnique({
+      where: { id: bookingId },
+      include: { customer: true }
+    })
+    
+    if (!booking) {
+      return res.status(404).json({ error: 'Booking not found' })
+    }
+    
+    if (!booking.stripeCustomerId || !booking.stripePaymentMethodId) {
+      return res.status(400).json({ error: 'No payment method registered for this booking' })
+    }
+    
+    // Créer une pré-autorisation (capture: false)
+    const paymentIntent = await stripe.paymentIntents.create({
+      amount: Math.round(booking.depositAmount * 100), // en centimes
+      currency: 'eur',
+      customer: booking.stripeCustomerId,
+      payment_method: booking.stripePaymentMethodId,
+      capture_method: 'manual', // NE PAS capturer automatiquement
+      confirm: true,
+      off_session: true,
+      metadata: {
+        bookingId,
+        type: 'deposit_hold',
+        brand
+      }
+    })
+    
+    // Sauvegarder le paymentIntent ID
+    await prisma.booking.update({
+      where: { id: bookingId },
+      data: {
+        depositPaymentIntentId: paymentIntent.id,
+        depositStatus: 'AUTHORIZED'
+      }
+    })
+    
+    res.json({
+      success: true,
+      paymentIntentId: paymentIntent.id,
+      status: paymentIntent.status
+    })
+  } catch (error: any) {
+    console.error('Authorize deposit error:', error)
+    res.status(500).json({ error: error.message || 'Failed to authorize deposit' })
+  }
+})
+
+// 3. Libérer la caution (check-out sans problème)
+router.post('/api/release-deposit', async (req, res) => {
+  try {
+    const { bookingId, brand } = req.body
+    const stripe = getStripeInstance(brand)
+    
+    const booking = await prisma.booking.findUnique({ where: { id: bookingId } })
+    
+    if (!booking?.depositPaymentIntentId) {
+      return res.status(400).json({ error: 'No deposit authorization found' })
+    }
+    
+    // Annuler la pré-autorisation (libérer les fonds)
+    await stripe.paymentIntents.cancel(booking.depositPaymentIntentId)
+    
+    await prisma.booking.update({
+      where: { id: bookingId },
+      data: { depositStatus: 'RELEASED' }
+    })
+    
+    res.json({ success: true, message: 'Deposit released' })
+  } catch (error: any) {
+    console.error('Release deposit error:', error)
+    res.status(500).json({ error: error.message || 'Failed to release deposit' })
+  }
+})
+
+// 4. Capturer la caution (partiellement ou totalement si dommages)
+router.post('/api/capture-deposit', async (req, res) => {
+  try {
+    const { bookingId, brand, amount, reason } = req.body
+    const stripe = getStripeInstance(brand)
+    
+    const booking = await prisma.booking.findUnique({ where: { id: bookingId } })
+    
+    if (!booking?.depositPaymentIntentId) {
+      return res.status(400).json({ error: 'No deposit authorization found' })
+    }
+    
+    // Capturer le montant spécifié (ou total si non spécifié)
+    const captureAmount = amount ? Math.round(amount * 100) : undefined
+    
+    await stripe.paymentIntents.capture(booking.depositPaymentIntentId, {
+      amount_to_capture: captureAmount
+    })
+    
+    await prisma.booking.update({
+      where: { id: bookingId },
+      data: {
+        depositStatus: 'CAPTURED',
+        depositCapturedAmount: amount || booking.depositAmount,
+        depositCaptureReason: reason
+      }
+    })
+    
+    res.json({ success: true, capturedAmount: amount || booking.depositAmount })
+  } catch (error: any) {
+    console.error('Capture deposit error:', error)
+    res.status(500).json({ error: error.message || 'Failed to capture deposit' })
+  }
+})
+
+// 5. Sauvegarder le payment method après SetupIntent
+router.post('/api/save-payment-method', async (req, res) => {
+  try {
+    const { bookingId, stripeCustomerId, paymentMethodId } = req.body
+    
+    await prisma.booking.update({
+      where: { id: bookingId },
+      data: {
+        stripeCustomerId,
+        stripePaymentMethodId: paymentMethodId,
+        depositStatus: 'CARD_SAVED'
+      }
+    })
+    
+    res.json({ success: true })
+  } catch (error) {
+    console.error('Save payment method error:', error)
+    res.status(500).json({ error: 'Failed to save payment method' })
+  }
+})
+
+// 7. CRON - Pré-autoriser les cautions J-1
+// Pool par marque + point de reprise : si le passage est interrompu (budget de temps), le suivant reprend la suite
+router.post('/api/cron/authorize-deposits', async (req, res) => {
+  try {
+    // Vérifier le secret (optionnel mais recommandé pour sécuriser)
+    const cronSecret = req.headers['x-cron-secret']
+    if (process.env.CRON_SECRET && cronSecret !== process.env.CRON_SECRET) {
+      return res.status(401).json({ error: 'Unauthorized' })
+    }
+
+    // Verrou de cluster en plus du bail DepositAuthorizationRun : les réplicas qui reçoivent le même déclenchement
+    // ne lisent même pas le point de reprise
+    const locked = await withClusterLock(prisma, 'cron:authorize-deposits', () => runDepositAuthorization(prisma, stripeGateway(getStripeInstance)))
+    if (!locked.acquired) {
+      return res.status(409).json({ error: 'Deposit authorization already running', date: depositWindow().date })
+    }
+    const run = locked.result
+    if ('locked' in run) {
+      return res.status(409).json({ error: 'Deposit authorization already running', date: run.date })
+    }
+    console.log(`[CRON] authorize-deposits ${run.date}: ${run.status}, ${run.processed} processed in ${run.durationMs} ms, ${run.remaining} remaining`)
+    res.json({ success: true, ...run })
+
+  } catch (error: any) {
+    console.error('[CRON] authorize-deposits error:', error)
+    res.status(500).json({ error: error.message || 'Failed to process deposits' })
+  }
+})
+
+// Résumé du dernier passage pour une date (par défaut demain)
+router.get('/api/cron/authorize-deposits/status', async (req, res) => {
+  try {
+    const date = (req.query.date as string) || depositWindow().date
+    const run = await prisma.depositAuthorizationRun.findUnique({
+      where: { date },
+      include: { items: { where: { status: { in: ['FAILED', 'ERROR'] } }, orderBy: { updatedAt: 'desc' } } }
+    })
+    if (!run) return res.status(404).json({ error: 'No run for this date' })
+    res.json(run)
+  } catch (error: any) {
+    res.status(500).json({ error: error.message })
+  }
+})
+
+// GET version pour tester manuellement
+router.get('/api/cron/authorize-deposits/preview', async (req, res) => {
+  try {
+    const window = depositWindow()
+
+    const bookings = await prisma.booking.findMany({
+      where: DEPOSIT_CANDIDATE_WHERE(window.start, window.end),
+      select: {
+        reference: true, startDate: true,
+        customer: { select: { firstName: true, lastName: true } },
+        items: { select: { quantity: true, vehicle: { select: { deposit: true } } } }
+      }
+    })
+
+    const preview = bookings.map(b => ({
+      reference: b.reference,
+      customer: `${b.customer?.firstName} ${b.customer?.lastName}`,
+      startDate: b.startDate,
+      depositAmount: b.items.reduce((sum, item) => sum + (item.vehicle?.deposit || 0) * item.quantity, 0)
+    }))
+
+    res.json({
+      date: window.date,
+      count: bookings.length,
+      bookings: preview
+    })
+  } catch (error: any) {
+    res.status(500).json({ error: error.message })
+  }
+})
+console.log('Deposit/Caution routes loaded')
+
+// ============== INVOICE ROUTES ==============
+
+// GET /api/invoices - List invoices
+router.get('/api/invoices', async (req, res) => {
+  try {
+    const { brand, status } = req.query
+    const where: any = {}
+    if (brand) where.brand = brand
+    if (status) where.status = status
+    const invoices = await prisma.invoice.findMany({
+      where,
+      orderBy: { date: 'desc' }
+    })
+    // Enrich with customer/booking/agency data
+    const enriched = await Promise.all(invoices.map(async (inv) => {
+      const [customer, booking, agency] = await Promise.all([
+        prisma.customer.findUnique({ where: { id: inv.customerId } }),
+        prisma.booking.findUnique({ where: { id: inv.bookingId }, include: { items: { include: { vehicle: true } }, fleetVehicle: { include: { vehicle: true } } } }),
+        prisma.agency.findUnique({ where: { id: inv.agencyId } })
+      ])
+      const agencyName = agency?.name || ''
+      const parsedName = typeof agencyName === 'string' ? (() => { try { return JSON.parse(agencyName) } catch { return { es: agencyName } } })() : agencyName
+      return {
+        ...inv,
+        customerName: customer ? customer.firstName + ' ' + customer.lastName : 'N/A',
+        customerEmail: customer?.email || '',
+        bookingRef: booking?.reference || '',
+        agencyName: (parsedName as any)?.es || (parsedName as any)?.en || JSON.stringify(parsedName),
+        vehicleName: booking?.fleetVehicle?.vehicle?.name ? ((typeof booking.fleetVehicle.vehicle.name === 'string' ? (() => { try { return JSON.parse(booking.fleetVehicle.vehicle.name) } catch { return { es: booking.fleetVehicle.vehicle.name } } })() : booking.fleetVehicle.vehicle.name) as any)?.es || '' : ''
+      }
+    }))
+    res.json(enriched)
+  } catch (error: any) {
+    res.status(500).json({ error: error.message })
+  }
+})
+
+// POST /api/invoices - Create invoice from booking
+router.post('/api/invoices', async (req, res) => {
+  try {
+    const { bookingId } = req.body
+    if (!bookingId) return res.status(400).json({ error: 'bookingId required' })
+    const booking = await prisma.booking.findUnique({
+      where: { id: bookingId },
+      include: { items: { include: { vehicle: true } }, options: { include: { option: true } }, customer: true, agency: true, fleetVehicle: { include: { vehicle: true } } }
+    })
+    if (!booking) return res.status(404).json({ error: 'Booking not found' })
+    // Check if invoice already exists
+    const existing = await prisma.invoice.findFirst({ where: { bookingId } })
+    if (existing) return res.status(400).json({ error: 'Invoice already exists', invoice: existing })
+    // Generate invoice number: VR-YYYY-XXXXX
+    const year = new Date().getFullYear()
+    const count = await prisma.invoice.count({ where: { brand: booking.agency?.brand || 'VOLTRIDE' } })
+    const invoiceNumber = 'VR-' + year + '-' + String(count + 1).padStart(5, '0')
+    const totalTTC = booking.totalPrice
+    const taxRate = 21
+    const subtotal = Math.round(totalTTC / 1.21 * 100) / 100
+    const taxAmount = Math.round((totalTTC - subtotal) * 100) / 100
+    const paidAmount = booking.paidAmount || 0
+    const items = booking.items.map(item => {
+      const vName = item.vehicle?.name
+      const parsed = typeof vName === 'string' ? (() => { try { return JSON.parse(vName) } catch { return { es: vName } } })() : vName
+      return {
+        description: (parsed as any)?.es || (parsed as any)?.en || 'Vehicle',
+        quantity: item.quantity,
+        unitPrice: item.unitPrice,
+        total: item.totalPrice
+      }
+    })
+    const options = booking.options.map(opt => {
+      const oName = opt.option?.name
+      const parsed = typeof oName === 'string' ? (() => { try { return JSON.parse(oName) } catch { return { es: oName } } })() : oName
+      return {
+        description: (parsed as any)?.es || (parsed as any)?.en || 'Option',
+        quantity: opt.quantity,
+        unitPrice: opt.unitPrice,
+        total: opt.totalPrice
+      }
+    })
+    const invoice = await prisma.invoice.create({
+      data: {
+        invoiceNumber,
+        bookingId,
+        customerId: booking.customerId,
+        agencyId: booking.agencyId,
+        brand: booking.agency?.brand || 'VOLTRIDE',
+        subtotal,
+        taxRate,
+        taxAmount,
+        totalTTC,
+        paidAmount,
+        remainingAmount: Math.max(0, totalTTC - paidAmount),
+        items,
+        options,
+        status: 'DRAFT'
+      }
+    })
+    res.status(201).json(invoice)
+  } catch (error: any) {
+    res.status(500).json({ error: error.message })
+  }
+})
+
+// PUT /api/invoices/:id - Update invoice
+router.put('/api/invoices/:id', async (req, res) => {
+  try {
+    const { status, paidAmount, notes, deductions, depositRefunded } = req.body
+    const data: any = {}
+    if (status) data.status = status
+    if (paidAmount !== undefined) {
+      data.paidAmount = paidAmount
+      const inv = await prisma.invoice.findUnique({ where: { id: req.params.id } })
+      if (inv) data.remainingAmount = Math.max(0, inv.totalTTC - paidAmount)
+    }
+    if (notes !== undefined) data.notes = notes
+    if (deductions !== undefined) data.deductions = deductions
+    if (depositRefunded !== undefined) data.depositRefunded = depositRefunded
+    const invoice = await prisma.invoice.update({ where: { id: req.params.id }, data })
+    res.json(invoice)
+  } catch (error: any) {
+    res.status(500).json({ error: error.message })
+  }
+})
+
+// POST /api/invoices/:id/send - Send invoice by email
+router.post('/api/invoices/:id/send', async (req, res) => {
+  try {
+    const invoice = await prisma.invoice.findUnique({ where: { id: req.params.id } })
+    if (!invoice) return res.status(404).json({ error: 'Invoice not found' })
+    const customer = await prisma.customer.findUnique({ where: { id: invoice.customerId } })
+    if (!customer?.email) return res.status(400).json({ error: 'Customer has no email' })
+    // Update status to SENT
+    await prisma.invoice.update({ where: { id: req.params.id }, data: { status: 'SENT' } })
+    // TODO: Send actual email with PDF
+    res.json({ success: true, message: 'Invoice marked as sent to ' + customer.email })
+  } catch (error: any) {
+    res.status(500).json({ error: error.message })
+  }
+})
+
+// POST /api/invoices/generate-from-checkout - Auto-generate after checkout
+router.post('/api/invoices/generate-from-checkout', async (req, res) => {
+  try {
+    const { bookingId } = req.body
+    if (!bookingId) return res.status(400).json({ error: 'bookingId required' })
+    // Check if already exists
+    const existing = await prisma.invoice.findFirst({ where: { bookingId } })
+    if (existing) return res.json(existing)
+    // Trigger creation via the POST /api/invoices logic
+    const booking = await prisma.booking.findUnique({
+      where: { id: bookingId },
+      include: { items: { include: { vehicle: true } }, options: { include: { option: true } }, customer: true, agency: true, fleetVehicle: { include: { vehicle: true } } }
+    })
+    if (!booking) return res.status(404).json({ error: 'Booking not found' })
+    const year = new Date().getFullYear()
+    const count = await prisma.invoice.count({ where: { brand: booking.agency?.brand || 'VOLTRIDE' } })
+    const invoiceNumber = 'VR-' + year + '-' + String(count + 1).padStart(5, '0')
+    const totalTTC = booking.totalPrice
+    const taxRate = 21
+    const subtotal = Math.round(totalTTC / 1.21 * 100) / 100
+    const taxAmount = Math.round((totalTTC - subtotal) * 100) / 100
+    const paidAmount = booking.paidAmount || 0
+    const items = booking.items.map(item => {
+      const vName = item.vehicle?.name
+      const parsed = typeof vName === 'string' ? (() => { try { return JSON.parse(vName) } catch { return { es: vName } } })() : vName
+      return { description: (parsed as any)?.es || 'Vehicle', quantity: item.quantity, unitPrice: item.unitPrice, total: item.totalPrice }
+    })
+    const options = booking.options.map(opt => {
+      const oName = opt.option?.name
+      const parsed = typeof oName === 'string' ? (() => { try { return JSON.parse(oName) } catch { return { es: oName } } })() : oName
+      return { description: (parsed as any)?.es || 'Option', quantity: opt.quantity, unitPrice: opt.unitPrice, total: opt.totalPrice }
+    })
+    const invoice = await prisma.invoice.create({
+      data: { invoiceNumber, bookingId, customerId: booking.customerId, agencyId: booking.agencyId, brand: booking.agency?.brand || 'VOLTRIDE', subtotal, taxRate, taxAmount, totalTTC, paidAmount, remainingAmount: Math.max(0, totalTTC - paidAmount), items, options, status: 'DRAFT' }
+    })
+    res.status(201).json(invoice)
+  } catch (error: any) {
+    res.status(500).json({ error: error.message })
+  }
+})
+
+console.log('Invoice routes loaded')
+
+// ============== EXPENSE ROUTES ==============
+
+// GET /api/expenses
+router.get('/api/expenses', async (req, res) => {
+  try {
+    const { brand, category } = req.query
+    const where: any = {}
+    if (brand) where.brand = brand
+    if (category) where.category = category
+    const expenses = await prisma.expense.findMany({ where, orderBy: { date: 'desc' } })
+    res.json(expenses)
+  } catch (error: any) {
+    res.status(500).json({ error: error.message })
+  }
+})
+
+// POST /api/expenses
+router.post('/api/expenses', async (req, res) => {
+  try {
+    const { date, supplier, description, category, brand, subtotal, taxRate, taxAmount, totalTTC, paidAmount, status, documentUrl, notes } = req.body
+    if (!supplier || !description) return res.status(400).json({ error: 'supplier and description required' })
+    const year = new Date().getFullYear()
+    const count = await prisma.expense.count({ where: { brand: brand || 'VOLTRIDE' } })
+    const expenseNumber = 'EX-' + year + '-' + String(count + 1).padStart(5, '0')
+    const expense = await prisma.expense.create({
+      data: {
+        expenseNumber, date: date ? new Date(date) : new Date(), supplier, description, category: category || 'Otros',
+        brand: brand || 'VOLTRIDE', subtotal: subtotal || 0, taxRate: taxRate || 21, taxAmount: taxAmount || 0,
+        totalTTC: totalTTC || 0, paidAmount: paidAmount || 0, status: status || 'PENDING', documentUrl, notes
+      }
+    })
+    res.status(201).json(expense)
+  } catch (error: any) {
+    res.status(500).json({ error: error.message })
+  }
+})
+
+// PUT /api/expenses/:id
+router.put('/api/expenses/:id', async (req, res) => {
+  try {
+    const expense = await prisma.expense.update({ where: { id: req.params.id }, data: req.body })
+    res.json(expense)
+  } catch (error: any) {
+    res.status(500).json({ error: error.message })
+  }
+})
+
+// DELETE /api/expenses/:id
+router.delete('/api/expenses/:id', async (req, res) => {
+  try {
+    await prisma.expense.delete({ where: { id: req.params.id } })
+    res.json({ success: true })
+  } catch (error: any) {
+    res.status(500).json({ error: error.message })
+  }
+})
+
+console.log('Expense routes loaded')
+// force deploy
+
+export default router
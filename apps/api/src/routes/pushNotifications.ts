@@ -1,9 +1,8 @@
 import { Router, Request, Response } from 'express';
-import { PrismaClient } from '@prisma/client';
+import { prisma } from '../db';
 import { pushNotificationService } from '../services/pushNotificationService';
 
 const router = Router();
-const prisma = new PrismaClient();
 
 router.get('/vapid-public-key', (req: Request, res: Response) => {
   res.json({ publicKey: process.env.VAPID_PUBLIC_KEY });
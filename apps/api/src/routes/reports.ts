@@ -0,0 +1,116 @@
+import { Router } from 'express'
+import { prisma } from '../db'
+import { dayNumber, formatDay } from '../services/agencyCalendar'
+import { MAX_REPORT_DAYS, REPORT_DIMENSIONS, REPORT_INTERVALS, ReportDimension, ReportFilter, ReportInterval, ReportRow, getReportRollups } from '../services/reportRollups'
+
+// Reporting direction : taux d'utilisation, chiffre d'affaires, déductions et kilométrage par agence / modèle,
+// lus dans les agrégats quotidiens (services/reportRollups) au lieu de télécharger réservations et contrats.
+// Paramètres communs : from, to (AAAA-MM-JJ, 30 derniers jours par défaut, MAX_REPORT_DAYS au plus),
+// interval = day | week | month | year | total, groupBy = agency,vehicle, agencyId, vehicleId
+
+const router = Router()
+const rollups = getReportRollups(prisma)
+
+const round = (value: number) => Math.round(value * 100) / 100
+const ratio = (value: number, total: number) => total ? Math.round(value / total * 10000) / 10000 : null
+
+type ReportQuery = { filter?: ReportFilter; error?: string }
+
+const parseReportQuery = (query: Record<string, string | undefined>): ReportQuery => {
+  const today = Math.floor(Date.now() / 86400000)
+  const dayPattern = /^\d{4}-\d{2}-\d{2}$/
+  if ((query.from && !dayPattern.test(query.from)) || (query.to && !dayPattern.test(query.to))) return { error: 'from and to must be YYYY-MM-DD' }
+  const last = query.to ? dayNumber(query.to) : today
+  const first = query.from ? dayNumber(query.from) : last - 29
+  if (isNaN(first) || isNaN(last) || last < first) return { error: 'Invalid date range' }
+  if (last - first + 1 > MAX_REPORT_DAYS) return { error: `Range limited to ${MAX_REPORT_DAYS} days` }
+  const interval = (query.interval || 'day') as ReportInterval
+  if (!REPORT_INTERVALS.includes(interval)) return { error: `interval must be one of ${REPORT_INTERVALS.join(', ')}` }
+  const groupBy = (query.groupBy || '').split(',').map(g => g.trim()).filter(Boolean) as ReportDimension[]
+  if (groupBy.some(g => !REPORT_DIMENSIONS.includes(g))) return { error: `groupBy must be a list of ${REPORT_DIMENSIONS.join(', ')}` }
+  return { filter: { from: formatDay(first), to: formatDay(last), interval, groupBy, agencyId: query.agencyId || undefined, vehicleId: query.vehicleId || undefined } }
+}
+
+// Colonnes d'identification communes à tous les rapports
+const keyColumns = (row: ReportRow) => ({
+  period: row.period,
+  ...(row.agencyId !== undefined ? { agencyId: row.agencyId, agencyCode: row.agencyCode } : {}),
+  ...(row.vehicleId !== undefined ? { vehicleId: row.vehicleId, vehicleSku: row.vehicleSku, vehicleName: row.vehicleName } : {})
+})
+
+const REPORTS: Record<string, (row: ReportRow) => Record<string, unknown>> = {
+  utilization: row => ({
+    ...keyColumns(row),
+    unitDays: row.unitDays,
+    rentedDays: row.rentedDays,
+    availableDays: Math.max(0, row.unitDays - row.rentedDays),
+    contractsStarted: row.contractsStarted,
+    utilization: ratio(row.rentedDays, row.unitDays)
+  }),
+  revenue: row => {
+    const netRevenue = round(row.rentalRevenue + row.extensionRevenue - row.refunds)
+    return {
+      ...keyColumns(row),
+      rentalRevenue: round(row.rentalRevenue),
+      extensionRevenue: round(row.extensionRevenue),
+      refunds: round(row.refunds),
+      netRevenue,
+      deductions: round(row.deductions),
+      rentedDays: row.rentedDays,
+      revenuePerRentedDay: row.rentedDays ? round(netRevenue / row.rentedDays) : null,
+      revenuePerUnitDay: row.unitDays ? round(netRevenue / row.unitDays) : null
+    }
+  },
+  mileage: row => ({
+    ...keyColumns(row),
+    mileage: row.mileage,
+    rentedDays: row.rentedDays,
+    mileagePerRentedDay: row.rentedDays ? round(row.mileage / row.rentedDays) : null
+  }),
+  summary: row => ({
+    ...REPORTS.utilization(row),
+    ...REPORTS.revenue(row),
+    ...REPORTS.mileage(row)
+  })
+}
+
+router.get('/api/reports/status', async (req, res) => {
+  try {
+    res.json(await rollups.stats())
+  } catch (e: any) {
+    console.error(e)
+    res.status(500).json({ error: 'Failed to get report status' })
+  }
+})
+
+router.get('/api/reports/:report', async (req, res) => {
+  const project = REPORTS[req.params.report]
+  if (!project) return res.status(404).json({ error: 'Unknown report' })
+  try {
+    const { filter, error } = parseReportQuery(req.query as Record<string, string | undefined>)
+    if (!filter) return res.status(400).json({ error })
+    const rows = await rollups.query(filter)
+    res.setHeader('Cache-Control', 'private, max-age=60')
+    res.json({ ...filter, rows: rows.map(project) })
+  } catch (e: any) {
+    console.error(e)
+    res.status(500).json({ error: 'Failed to build report' })
+  }
+})
+
+// Reconstruction d'une plage (reprise de données, correction manuelle) : un seul réplica à la fois, comme la réconciliation
+router.post('/api/reports/rebuild', async (req, res) => {
+  try {
+    const { filter, error } = parseReportQuery({ from: req.body?.from, to: req.body?.to })
+    if (!filter) return res.status(400).json({ error })
+    const result = await rollups.rebuildExclusive(dayNumber(filter.from), dayNumber(filter.to))
+    if (!result) return res.status(409).json({ error: 'Report rollups already being rebuilt' })
+    console.log(`[REPORTS] Rebuilt ${result.from} -> ${result.to}: ${result.rows} rows in ${result.durationMs} ms`)
+    res.json({ success: true, ...result })
+  } catch (e: any) {
+    console.error(e)
+    res.status(500).json({ error: 'Failed to rebuild reports' })
+  }
+})
+
+export default router
@@ -0,0 +1,39 @@
+import { lazyModule } from '../services/startup'
+
+// Projections Prisma et chargements différés partagés par plusieurs modules de routes
+
+// Générateur de QR codes chargé à la première étiquette
+export const loadQRCode = lazyModule('qrcode', () => require('qrcode') as typeof import('qrcode'))
+
+// ============== BOOKINGS ==============
+export const BOOKING_FULL_INCLUDE = { agency: true, customer: true, items: { include: { vehicle: true } }, options: { include: { option: true } }, fleetVehicle: { include: { vehicle: true } } }
+
+// Projection "planning" : ce qu'affichent le planning et la liste, sans photos / pièces d'identité / signature
+export const BOOKING_PLANNING_SELECT = {
+  id: true, reference: true, agencyId: true, customerId: true, startDate: true, endDate: true, startTime: true, endTime: true,
+  totalPrice: true, depositAmount: true, paidAmount: true, paymentMethod: true, status: true, language: true, source: true,
+  fleetVehicleId: true, assignmentType: true, assignedAt: true, checkedIn: true, checkedInAt: true, checkedOut: true, checkedOutAt: true,
+  depositStatus: true, createdAt: true, updatedAt: true,
+  agency: { select: { id: true, code: true, name: true, brand: true } },
+  customer: { select: { id: true, firstName: true, lastName: true, email: true, phone: true, address: true, postalCode: true, city: true, country: true, language: true } },
+  items: { include: { vehicle: true } },
+  options: { include: { option: true } },
+  fleetVehicle: { select: { id: true, vehicleNumber: true, licensePlate: true, locationCode: true, status: true, vehicle: true } }
+}
+
+// ============== FLEET ==============
+export const FLEET_LIST_INCLUDE = { vehicle: { include: { category: true, pricing: true } }, agency: true, documents: true, damages: { where: { isResolved: false } }, maintenanceRecords: { where: { status: 'SCHEDULED' as const }, orderBy: { createdAt: 'desc' as const } } }
+
+// ============== RENTAL CONTRACTS ==============
+// Projection "list" : colonnes de la liste des contrats, sans photos / signatures / checklists
+export const CONTRACT_LIST_SELECT = {
+  id: true, contractNumber: true, bookingId: true, fleetVehicleId: true, agencyId: true, customerId: true,
+  originalStartDate: true, originalEndDate: true, currentStartDate: true, currentEndDate: true, actualStartDate: true, actualEndDate: true,
+  source: true, dailyRate: true, totalDays: true, subtotal: true, optionsTotal: true, discountAmount: true, taxAmount: true, totalAmount: true,
+  depositAmount: true, depositStatus: true, totalDeductions: true, paymentStatus: true, paidAmount: true, paymentMethod: true,
+  startMileage: true, endMileage: true, status: true, commissionStatus: true, createdAt: true, updatedAt: true,
+  fleetVehicle: { select: { id: true, vehicleNumber: true, licensePlate: true, vehicle: { select: { id: true, sku: true, name: true, imageUrl: true } } } },
+  agency: { select: { id: true, code: true, name: true, brand: true } },
+  customer: { select: { id: true, firstName: true, lastName: true, email: true, phone: true, language: true } },
+  booking: { select: { id: true, reference: true, startTime: true, endTime: true } }
+}
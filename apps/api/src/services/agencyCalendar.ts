@@ -0,0 +1,161 @@
+import { Prisma, PrismaClient } from '@prisma/client';
+
+// Calendrier d'ouverture compilé par agence (périodes horaires + fermetures exceptionnelles) :
+// - une lecture des périodes et des fermetures par agence, aplaties en un tableau indexé par jour (UTC) :
+//   chaque jour pointe vers une entrée partagée (période x jour de semaine, ou fermeture)
+// - hors de l'étendue des périodes datées et des fermetures : période par défaut selon le jour de semaine
+// - même règle que l'ancienne route /schedule : fermeture d'abord, puis période datée couvrant le jour
+//   (les périodes spécifiques avant la période par défaut), puis période par défaut
+// - calendrier gardé en mémoire, recompilé après une écriture sur AgencySchedulePeriod / AgencyClosure
+//   (middleware Prisma) ou après CALENDAR_CACHE_TTL_MS (autres instances)
+
+export interface CalendarDay {
+  date: string; // AAAA-MM-JJ
+  isClosed: boolean;
+  openTime?: string | null;
+  closeTime?: string | null;
+  periodName?: string;
+  reason?: string; // fermeture exceptionnelle
+}
+
+type DayEntry = Omit<CalendarDay, 'date'>;
+
+type PeriodRow = { name: string; startDate: Date; endDate: Date; isDefault: boolean } & Record<string, any>;
+type ClosureRow = { startDate: Date; endDate: Date; reason: string };
+
+const DAY_MS = 86400000;
+const DAY_NAMES = ['sunday', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday'];
+export const MAX_CALENDAR_DAYS = 366;
+
+// Jours couverts par [start, end] au sens de l'ancienne requête (startDate <= jour <= endDate, jour à minuit UTC)
+const firstDay = (date: Date) => Math.ceil(date.getTime() / DAY_MS);
+const lastDay = (date: Date) => Math.floor(date.getTime() / DAY_MS);
+
+export const dayNumber = (date: string) => Math.floor(Date.parse(date.slice(0, 10) + 'T00:00:00Z') / DAY_MS);
+export const formatDay = (day: number) => new Date(day * DAY_MS).toISOString().slice(0, 10);
+const weekday = (day: number) => ((day % 7) + 11) % 7; // 0 = dimanche ; le jour 0 (1970-01-01) est un jeudi
+
+const periodEntries = (period: PeriodRow): DayEntry[] => DAY_NAMES.map(name => ({
+  isClosed: period[`${name}IsClosed`],
+  openTime: period[`${name}Open`],
+  closeTime: period[`${name}Close`],
+  periodName: period.name
+}));
+
+export class CompiledCalendar {
+  private origin = 0;
+  private slots: Int32Array = new Int32Array(0); // -1 : période par défaut, sinon indice dans entries
+  private entries: DayEntry[] = [];
+  private fallback: DayEntry[] | null;
+
+  constructor(periods: PeriodRow[], closures: ClosureRow[], readonly compiledAt = Date.now()) {
+    const defaultPeriod = periods.find(p => p.isDefault);
+    this.fallback = defaultPeriod ? periodEntries(defaultPeriod) : null;
+    const ranges = [...periods, ...closures].map(r => [firstDay(r.startDate), lastDay(r.endDate)]).filter(([a, b]) => a <= b);
+    if (!ranges.length) return;
+    this.origin = Math.min(...ranges.map(r => r[0]));
+    this.slots = new Int32Array(Math.max(...ranges.map(r => r[1])) - this.origin + 1).fill(-1);
+
+    // Priorité croissante : période par défaut datée, périodes spécifiques, fermetures (écrasent les précédentes)
+    const ordered = [...periods].sort((a, b) => Number(b.isDefault) - Number(a.isDefault) || b.startDate.getTime() - a.startDate.getTime());
+    for (const period of ordered) {
+      const base = this.entries.length;
+      this.entries.push(...periodEntries(period));
+      for (let day = firstDay(period.startDate); day <= lastDay(period.endDate); day++) this.slots[day - this.origin] = base + weekday(day);
+    }
+    for (const closure of closures) {
+      const index = this.entries.push({ isClosed: true, reason: closure.reason }) - 1;
+      for (let day = firstDay(closure.startDate); day <= lastDay(closure.endDate); day++) this.slots[day - this.origin] = index;
+    }
+  }
+
+  private entry(day: number): DayEntry | null {
+    const offset = day - this.origin;
+    const slot = offset >= 0 && offset < this.slots.length ? this.slots[offset] : -1;
+    if (slot >= 0) return this.entries[slot];
+    return this.fallback ? this.fallback[weekday(day)] : null;
+  }
+
+  // null : aucune période applicable (horaires par défaut du widget)
+  day(date: string): CalendarDay | null {
+    const entry = this.entry(dayNumber(date));
+    return entry ? { date: date.slice(0, 10), ...entry } : null;
+  }
+
+  range(from: string, to: string): CalendarDay[] {
+    const days: CalendarDay[] = [];
+    for (let day = dayNumber(from), end = dayNumber(to); day <= end; day++) {
+      days.push({ date: formatDay(day), ...(this.entry(day) || { isClosed: false }) });
+    }
+    return days;
+  }
+}
+
+export class AgencyCalendarCache {
+  private calendars = new Map<string, Promise<CompiledCalendar>>();
+  private generations = new Map<string, number>();
+  private epoch = 0; // invalidation de toutes les agences
+  private counters = { hits: 0, compiles: 0, invalidations: 0 };
+
+  constructor(private prisma: PrismaClient, private ttlMs: number) {}
+
+  async get(agencyId: string): Promise<CompiledCalendar> {
+    const cached = this.calendars.get(agencyId);
+    if (cached) {
+      const calendar = await cached;
+      if (Date.now() - calendar.compiledAt < this.ttlMs) {
+        this.counters.hits++;
+        return calendar;
+      }
+      if (this.calendars.get(agencyId) === cached) this.calendars.delete(agencyId);
+      return this.get(agencyId);
+    }
+    this.counters.compiles++;
+    const stamp = () => `${this.epoch}:${this.generations.get(agencyId) || 0}`;
+    const generation = stamp();
+    const compiling = Promise.all([
+      this.prisma.agencySchedulePeriod.findMany({ where: { agencyId } }),
+      this.prisma.agencyClosure.findMany({ where: { agencyId } })
+    ]).then(([periods, closures]) => new CompiledCalendar(periods as any, closures));
+    this.calendars.set(agencyId, compiling);
+    // Échec ou invalidation pendant la lecture : rien de gardé
+    compiling.then(
+      () => { if (stamp() !== generation && this.calendars.get(agencyId) === compiling) this.calendars.delete(agencyId); },
+      () => { if (this.calendars.get(agencyId) === compiling) this.calendars.delete(agencyId); }
+    );
+    return compiling;
+  }
+
+  invalidate(agencyId?: string) {
+    this.counters.invalidations++;
+    if (!agencyId) {
+      this.epoch++;
+      this.calendars.clear();
+      return;
+    }
+    this.calendars.delete(agencyId);
+    this.generations.set(agencyId, (this.generations.get(agencyId) || 0) + 1);
+  }
+
+  stats() {
+    return { agencies: this.calendars.size, ...this.counters };
+  }
+}
+
+export function trackCalendarInvalidation(client: PrismaClient, cache: AgencyCalendarCache) {
+  client.$use(async (params: Prisma.MiddlewareParams, next) => {
+    const result = await next(params);
+    if ((params.model === 'AgencySchedulePeriod' || params.model === 'AgencyClosure') && !params.action.startsWith('find') && params.action !== 'count') {
+      // create / update / delete renvoient la ligne : seule son agence est recompilée
+      cache.invalidate(typeof result?.agencyId === 'string' ? result.agencyId : undefined);
+    }
+    return result;
+  });
+}
+
+let sharedCache: AgencyCalendarCache | null = null;
+
+export function getAgencyCalendarCache(prisma: PrismaClient) {
+  if (!sharedCache) sharedCache = new AgencyCalendarCache(prisma, parseInt(process.env.CALENDAR_CACHE_TTL_MS || '60000', 10));
+  return sharedCache;
+}
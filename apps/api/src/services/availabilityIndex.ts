@@ -0,0 +1,376 @@
+import { PrismaClient, Prisma } from '@prisma/client';
+import { AsyncLocalStorage } from 'async_hooks';
+
+// Index en mémoire des périodes réservées par véhicule Fleet, par agence.
+// Remplace le scan fleet × toutes les réservations de /api/fleet-availability.
+// - écriture pendant le chargement d'une agence : chargement jeté et relancé (horloge des écritures par agence),
+//   sinon le résultat lu avant l'écriture l'effacerait
+// - écritures faites dans client.$transaction : appliquées à l'index après le commit, oubliées au rollback
+
+// Statuts qui bloquent un véhicule (mêmes règles que l'ancien endpoint)
+export const BLOCKING_BOOKING_STATUSES = ['CONFIRMED', 'PENDING', 'ACTIVE'];
+// Statuts Fleet proposés au widget (RESERVED peut être dispo pour d'autres dates)
+export const BOOKABLE_FLEET_STATUSES = ['AVAILABLE', 'RESERVED'];
+
+// Au-delà de ce délai une agence est rechargée depuis la base (écritures faites par un autre process)
+const AGENCY_TTL_MS = parseInt(process.env.AVAILABILITY_INDEX_TTL_MS || '300000', 10);
+// Chargements successifs périmés par des écritures : le dernier est gardé mais rechargé à la lecture suivante
+const MAX_LOAD_ATTEMPTS = 3;
+
+// Fin effective d'une période [start, end) en ms : une réservation startDate = endDate occupe [start, start + 1 ms),
+// comme dans la contrainte d'exclusion (services/bookingOverlap). Même règle pour l'index et l'assignation.
+export const periodEnd = (start: number, end: number) => Math.max(end, start + 1);
+
+export interface IndexedUnit {
+  fleetId: string;
+  vehicleId: string;
+}
+
+export interface DateRange {
+  start: Date;
+  end: Date;
+}
+
+export interface IndexedBooking {
+  id: string;
+  agencyId?: string | null;
+  fleetVehicleId: string | null;
+  startDate: Date;
+  endDate: Date;
+  status: string;
+}
+
+// Périodes d'un véhicule Fleet, triées par début.
+// maxEnd[i] = plus grande fin parmi periods[0..i] : permet de tester un chevauchement
+// en une recherche dichotomique, même si des périodes se recouvrent entre elles.
+class UnitTimeline {
+  starts: number[] = [];
+  ends: number[] = [];
+  ids: string[] = [];
+  maxEnd: number[] = [];
+
+  insert(id: string, start: number, end: number) {
+    const i = upperBound(this.starts, start);
+    this.starts.splice(i, 0, start);
+    this.ends.splice(i, 0, end);
+    this.ids.splice(i, 0, id);
+    this.rebuildFrom(i);
+  }
+
+  remove(id: string) {
+    const i = this.ids.indexOf(id);
+    if (i === -1) return;
+    this.starts.splice(i, 1);
+    this.ends.splice(i, 1);
+    this.ids.splice(i, 1);
+    this.maxEnd.length = this.ids.length;
+    this.rebuildFrom(i);
+  }
+
+  // Conflit si une période [s, e) vérifie s < end && e > start
+  overlaps(start: number, end: number) {
+    const i = lowerBound(this.starts, end) - 1;
+    return i >= 0 && this.maxEnd[i] > start;
+  }
+
+  private rebuildFrom(i: number) {
+    for (let k = i; k < this.ends.length; k++) {
+      const prev = k > 0 ? this.maxEnd[k - 1] : -Infinity;
+      this.maxEnd[k] = Math.max(prev, this.ends[k]);
+    }
+  }
+}
+
+interface AgencyEntry {
+  units: IndexedUnit[];
+  loadedAt: number;
+}
+
+// Premier index tel que arr[i] >= value
+export function lowerBound(arr: number[], value: number) {
+  let lo = 0, hi = arr.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >>> 1;
+    if (arr[mid] < value) lo = mid + 1; else hi = mid;
+  }
+  return lo;
+}
+
+// Premier index tel que arr[i] > value
+export function upperBound(arr: number[], value: number) {
+  let lo = 0, hi = arr.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >>> 1;
+    if (arr[mid] <= value) lo = mid + 1; else hi = mid;
+  }
+  return lo;
+}
+
+export class AvailabilityIndex {
+  private agencies = new Map<string, AgencyEntry>();
+  private loading = new Map<string, Promise<AgencyEntry>>();
+  private timelines = new Map<string, UnitTimeline>();
+  private fleetAgency = new Map<string, string>();
+  private bookingFleet = new Map<string, string>();
+  // Horloge des écritures : dernière écriture par agence, dernière invalidation complète
+  private writeClock = 0;
+  private agencyWrites = new Map<string, number>();
+  private resetAt = 0;
+
+  constructor(private prisma?: PrismaClient) {}
+
+  // Charge (ou recharge) une agence : une requête pour les véhicules, une pour leurs réservations actives
+  async load(agencyId: string): Promise<AgencyEntry> {
+    if (!this.prisma) throw new Error('AvailabilityIndex: no Prisma client');
+    const pending = this.loading.get(agencyId);
+    if (pending) return pending;
+    const prisma = this.prisma;
+    const promise = (async () => {
+      for (let attempt = 1; ; attempt++) {
+        const clock = this.writeClock;
+        const fleets = await prisma.fleet.findMany({
+          where: { agencyId, status: { in: BOOKABLE_FLEET_STATUSES as any } },
+          select: { id: true, vehicleId: true }
+        });
+        const bookings = await prisma.booking.findMany({
+          where: { fleetVehicleId: { in: fleets.map(f => f.id) }, status: { in: BLOCKING_BOOKING_STATUSES } },
+          select: { id: true, fleetVehicleId: true, startDate: true, endDate: true, status: true }
+        });
+        const stale = this.writtenSince(agencyId, clock);
+        if (stale && attempt < MAX_LOAD_ATTEMPTS) continue;
+        return this.replaceAgency(agencyId, fleets.map(f => ({ fleetId: f.id, vehicleId: f.vehicleId })), bookings, stale);
+      }
+    })();
+    this.loading.set(agencyId, promise);
+    try { return await promise; } finally { this.loading.delete(agencyId); }
+  }
+
+  replaceAgency(agencyId: string, units: IndexedUnit[], bookings: IndexedBooking[], stale = false): AgencyEntry {
+    this.dropAgency(agencyId);
+    for (const unit of units) {
+      this.fleetAgency.set(unit.fleetId, agencyId);
+      this.timelines.set(unit.fleetId, new UnitTimeline());
+    }
+    const entry = { units, loadedAt: stale ? 0 : Date.now() };
+    this.agencies.set(agencyId, entry);
+    for (const booking of bookings) this.applyBooking(booking);
+    return entry;
+  }
+
+  invalidateAgency(agencyId: string) {
+    this.touch(agencyId);
+    this.dropAgency(agencyId);
+  }
+
+  invalidateAll() {
+    this.resetAt = ++this.writeClock;
+    this.agencies.clear();
+    this.timelines.clear();
+    this.fleetAgency.clear();
+    this.bookingFleet.clear();
+  }
+
+  // Ajoute, déplace ou retire une réservation selon son état courant
+  applyBooking(booking: IndexedBooking) {
+    this.removeBooking(booking.id);
+    if (!booking.fleetVehicleId || !BLOCKING_BOOKING_STATUSES.includes(booking.status)) return;
+    const timeline = this.timelines.get(booking.fleetVehicleId);
+    if (!timeline) return;
+    const start = new Date(booking.startDate).getTime();
+    timeline.insert(booking.id, start, periodEnd(start, new Date(booking.endDate).getTime()));
+    this.bookingFleet.set(booking.id, booking.fleetVehicleId);
+  }
+
+  removeBooking(bookingId: string) {
+    const fleetId = this.bookingFleet.get(bookingId);
+    if (!fleetId) return;
+    this.timelines.get(fleetId)?.remove(bookingId);
+    this.bookingFleet.delete(bookingId);
+  }
+
+  // Écriture validée d'une réservation : agences de l'ancien et du nouveau véhicule marquées écrites, puis mise à jour
+  onBookingWritten(booking: IndexedBooking, deleted = false) {
+    const previousFleet = this.bookingFleet.get(booking.id);
+    this.touch(booking.agencyId);
+    this.touch(previousFleet && this.fleetAgency.get(previousFleet));
+    this.touch(booking.fleetVehicleId && this.fleetAgency.get(booking.fleetVehicleId));
+    if (deleted) this.removeBooking(booking.id);
+    else this.applyBooking(booking);
+  }
+
+  // Une modification d'un véhicule Fleet (statut, agence, modèle) invalide son agence actuelle et l'ancienne
+  onFleetChanged(fleetId?: string, agencyId?: string) {
+    const previous = fleetId ? this.fleetAgency.get(fleetId) : undefined;
+    if (previous) this.invalidateAgency(previous);
+    if (agencyId) this.invalidateAgency(agencyId);
+    if (!fleetId && !agencyId) this.invalidateAll();
+  }
+
+  async getAgency(agencyId: string) {
+    const entry = this.agencies.get(agencyId);
+    if (entry && Date.now() - entry.loadedAt < AGENCY_TTL_MS) return entry;
+    return this.load(agencyId);
+  }
+
+  // Nombre de véhicules Fleet libres par modèle (vehicleId) sur [start, end)
+  countAvailable(units: IndexedUnit[], start?: Date | null, end?: Date | null) {
+    const availabilityMap: Record<string, number> = {};
+    const s = start ? start.getTime() : null;
+    const e = end && s !== null ? periodEnd(s, end.getTime()) : null;
+    for (const unit of units) {
+      if (s !== null && e !== null && this.timelines.get(unit.fleetId)?.overlaps(s, e)) continue;
+      availabilityMap[unit.vehicleId] = (availabilityMap[unit.vehicleId] || 0) + 1;
+    }
+    return availabilityMap;
+  }
+
+  // Comptage pour plusieurs périodes en un seul passage sur les réservations.
+  // Les bornes des périodes découpent l'axe du temps en segments élémentaires ; chaque réservation
+  // marque les segments qu'elle touche (tableau de différences), puis une somme préfixe des segments
+  // occupés indique pour chaque période si le véhicule est libre, sans rescanner ses réservations.
+  countAvailableBatch(units: IndexedUnit[], ranges: DateRange[]) {
+    const results: Record<string, number>[] = ranges.map(() => ({}));
+    if (ranges.length === 0) return results;
+    const spans = ranges.map(r => [r.start.getTime(), periodEnd(r.start.getTime(), r.end.getTime())]);
+    const coords = Array.from(new Set(spans.flat())).sort((a, b) => a - b);
+    const bounds = spans.map(([s, e]) => [lowerBound(coords, s), lowerBound(coords, e)]);
+    const windowStart = coords[0];
+    const windowEnd = coords[coords.length - 1];
+    const diff = new Int32Array(coords.length);
+    const busyPrefix = new Int32Array(coords.length);
+
+    for (const unit of units) {
+      const timeline = this.timelines.get(unit.fleetId);
+      let hasBooking = false;
+      if (timeline) {
+        diff.fill(0);
+        // Toutes les réservations avant `first` finissent avant la fenêtre (maxEnd est croissant)
+        const first = upperBound(timeline.maxEnd, windowStart);
+        const last = lowerBound(timeline.starts, windowEnd);
+        for (let j = first; j < last; j++) {
+          if (timeline.ends[j] <= windowStart) continue;
+          const a = Math.max(0, upperBound(coords, timeline.starts[j]) - 1);
+          const b = Math.min(coords.length - 1, lowerBound(coords, timeline.ends[j]));
+          if (a < b) { diff[a]++; diff[b]--; hasBooking = true; }
+        }
+      }
+      if (hasBooking) {
+        let running = 0;
+        busyPrefix[0] = 0;
+        for (let k = 0; k < coords.length - 1; k++) {
+          running += diff[k];
+          busyPrefix[k + 1] = busyPrefix[k] + (running > 0 ? 1 : 0);
+        }
+      }
+      for (let r = 0; r < ranges.length; r++) {
+        if (hasBooking && busyPrefix[bounds[r][1]] - busyPrefix[bounds[r][0]] > 0) continue;
+        results[r][unit.vehicleId] = (results[r][unit.vehicleId] || 0) + 1;
+      }
+    }
+    return results;
+  }
+
+  async availability(agencyId: string, start?: Date | null, end?: Date | null) {
+    const entry = await this.getAgency(agencyId);
+    return this.countAvailable(entry.units, start, end);
+  }
+
+  async availabilityBatch(agencyId: string, ranges: DateRange[]) {
+    const entry = await this.getAgency(agencyId);
+    return this.countAvailableBatch(entry.units, ranges);
+  }
+
+  isUnitFree(fleetId: string, start: Date, end: Date) {
+    const timeline = this.timelines.get(fleetId);
+    return !timeline || !timeline.overlaps(start.getTime(), periodEnd(start.getTime(), end.getTime()));
+  }
+
+  private touch(agencyId?: string | null) {
+    if (agencyId) this.agencyWrites.set(agencyId, ++this.writeClock);
+  }
+
+  // Écriture sur l'agence (ou invalidation complète) depuis `clock` : chargement commencé avant, périmé
+  private writtenSince(agencyId: string, clock: number) {
+    return Math.max(this.resetAt, this.agencyWrites.get(agencyId) ?? 0) > clock;
+  }
+
+  private dropAgency(agencyId: string) {
+    const entry = this.agencies.get(agencyId);
+    if (!entry) return;
+    for (const unit of entry.units) {
+      const timeline = this.timelines.get(unit.fleetId);
+      timeline?.ids.forEach(id => this.bookingFleet.delete(id));
+      this.timelines.delete(unit.fleetId);
+      this.fleetAgency.delete(unit.fleetId);
+    }
+    this.agencies.delete(agencyId);
+  }
+}
+
+// Un créneau d'un jour (UTC, comme les dates 'YYYY-MM-DD' envoyées par le widget) pour chaque jour du mois
+export function monthDayRanges(month: string): DateRange[] | null {
+  const match = /^(\d{4})-(\d{2})$/.exec(month);
+  if (!match) return null;
+  const year = parseInt(match[1], 10);
+  const monthIndex = parseInt(match[2], 10) - 1;
+  if (monthIndex < 0 || monthIndex > 11) return null;
+  const days = new Date(Date.UTC(year, monthIndex + 1, 0)).getUTCDate();
+  return Array.from({ length: days }, (_, d) => ({
+    start: new Date(Date.UTC(year, monthIndex, d + 1)),
+    end: new Date(Date.UTC(year, monthIndex, d + 2))
+  }));
+}
+
+const BOOKING_WRITE_ACTIONS = ['create', 'update', 'upsert', 'delete'];
+const BULK_WRITE_ACTIONS = ['createMany', 'updateMany', 'deleteMany'];
+
+// Mises à jour de l'index en attente du commit de la transaction en cours (client.$transaction)
+const transactionWrites = new AsyncLocalStorage<(() => void)[]>();
+
+// Middleware Prisma : tient l'index à jour à chaque écriture Booking / Fleet faite par ce client.
+// client.$transaction est enveloppé : les écritures de la transaction (interactive ou en lot) sont gardées dans
+// son contexte et appliquées une fois qu'elle a réussi ; rien n'est appliqué si elle échoue (rollback).
+export function trackAvailabilityWrites(client: PrismaClient, index: AvailabilityIndex) {
+  const transaction = client.$transaction.bind(client) as (...args: any[]) => Promise<any>;
+  client.$transaction = (async (...args: any[]) => {
+    const pending: (() => void)[] = [];
+    const result = await transactionWrites.run(pending, () => transaction(...args));
+    pending.forEach(update => update());
+    return result;
+  }) as PrismaClient['$transaction'];
+
+  client.$use(async (params: Prisma.MiddlewareParams, next) => {
+    const result = await next(params);
+    if (params.model !== 'Booking' && params.model !== 'Fleet') return result;
+    const update = () => {
+      try {
+        if (BULK_WRITE_ACTIONS.includes(params.action)) {
+          index.invalidateAll();
+        } else if (BOOKING_WRITE_ACTIONS.includes(params.action) && result) {
+          if (params.model === 'Booking') {
+            if (params.action === 'delete') index.onBookingWritten(result, true);
+            else if ('status' in result && 'fleetVehicleId' in result && 'startDate' in result && 'endDate' in result) index.onBookingWritten(result);
+            else index.invalidateAll(); // résultat projeté via select : on ne sait pas où placer la réservation
+          } else {
+            index.onFleetChanged(result.id, result.agencyId);
+          }
+        }
+      } catch (error) {
+        console.error('Availability index update error:', error);
+        index.invalidateAll();
+      }
+    };
+    const pending = params.runInTransaction ? transactionWrites.getStore() : undefined;
+    if (pending) pending.push(update);
+    else if (params.runInTransaction) index.invalidateAll(); // transaction ouverte hors de client.$transaction
+    else update();
+    return result;
+  });
+}
+
+let sharedIndex: AvailabilityIndex | null = null;
+
+export function getAvailabilityIndex(client: PrismaClient) {
+  if (!sharedIndex) sharedIndex = new AvailabilityIndex(client);
+  return sharedIndex;
+}
@@ -0,0 +1,73 @@
+import { Prisma, PrismaClient } from '@prisma/client';
+import { BLOCKING_BOOKING_STATUSES } from './availabilityIndex';
+import { withClusterLock } from './clusterLock';
+
+// Pas de double réservation d'un véhicule Fleet, garanti par Postgres et non plus par lecture-puis-écriture :
+// contrainte d'exclusion GiST (extension btree_gist) sur fleetVehicleId × période, pour les statuts bloquants.
+// Période = [startDate, endDate), le découpage de FleetTimeline / availabilityIndex (retour et départ le même jour
+// sur un véhicule) ; une location d'un jour (startDate = endDate) occupe [startDate, startDate + 1 ms),
+// règle reprise côté application par periodEnd (availabilityIndex, fleetAssignment).
+// Les contrôles applicatifs (assignFleetUnit, /api/fleet/available, extend/check) restent des pré-vérifications :
+// entre deux réplicas, c'est la contrainte qui tranche et l'écriture perdante reçoit une erreur 23P01.
+// DEFERRABLE : la réoptimisation peut échanger deux réservations dans une transaction (SET CONSTRAINTS ALL DEFERRED).
+// Prisma ne décrit pas les contraintes d'exclusion : créée au démarrage par ensureBookingOverlapConstraint.
+
+export const BOOKING_OVERLAP_CONSTRAINT = 'Booking_fleetVehicleId_period_excl';
+export const BOOKING_OVERLAP_MESSAGE = 'Vehicle already booked for this period';
+
+const BLOCKING = Prisma.raw(BLOCKING_BOOKING_STATUSES.map(status => `'${status}'`).join(', '));
+const period = (alias: string) => Prisma.raw(
+  `tsrange(${alias}"startDate", GREATEST(${alias}"endDate", ${alias}"startDate" + interval '1 millisecond'), '[)')`
+);
+
+export interface BookingOverlap {
+  fleetVehicleId: string;
+  bookingId: string;
+  reference: string;
+  otherBookingId: string;
+  otherReference: string;
+}
+
+// Erreur Postgres 23P01 : levée par une écriture Prisma (message) ou une requête brute (meta.code)
+export function isBookingOverlapError(error: unknown) {
+  const e = error as { meta?: { code?: string }; message?: unknown } | null;
+  if (!e) return false;
+  if (e.meta?.code === '23P01') return true;
+  return typeof e.message === 'string' && (e.message.includes(BOOKING_OVERLAP_CONSTRAINT) || e.message.includes('23P01'));
+}
+
+// Chevauchements déjà en base : empêchent la création de la contrainte tant qu'ils ne sont pas corrigés
+export function findBookingOverlaps(prisma: PrismaClient, limit = 100) {
+  return prisma.$queryRaw<BookingOverlap[]>`
+    SELECT a."fleetVehicleId", a."id" AS "bookingId", a."reference", b."id" AS "otherBookingId", b."reference" AS "otherReference"
+    FROM "Booking" a
+    JOIN "Booking" b ON b."fleetVehicleId" = a."fleetVehicleId" AND b."id" > a."id"
+      AND b."status" IN (${BLOCKING}) AND ${period('b.')} && ${period('a.')}
+    WHERE a."fleetVehicleId" IS NOT NULL AND a."status" IN (${BLOCKING})
+    ORDER BY a."fleetVehicleId", a."startDate"
+    LIMIT ${limit}`;
+}
+
+export async function bookingOverlapEnforced(prisma: PrismaClient) {
+  const [{ enforced }] = await prisma.$queryRaw<{ enforced: boolean }[]>`
+    SELECT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = ${BOOKING_OVERLAP_CONSTRAINT}) AS "enforced"`;
+  return enforced;
+}
+
+// Au démarrage : un seul réplica crée la contrainte (verrou de cluster), les autres passent.
+// La création verrouille Booking le temps de construire l'index GiST (une fois, au premier déploiement).
+export async function ensureBookingOverlapConstraint(prisma: PrismaClient) {
+  const run = await withClusterLock(prisma, 'booking-overlap-constraint', async () => {
+    if (await bookingOverlapEnforced(prisma)) return { created: false, overlaps: [] as BookingOverlap[] };
+    const overlaps = await findBookingOverlaps(prisma);
+    if (overlaps.length) return { created: false, overlaps };
+    await prisma.$executeRaw`CREATE EXTENSION IF NOT EXISTS btree_gist`;
+    await prisma.$executeRaw`
+      ALTER TABLE "Booking" ADD CONSTRAINT ${Prisma.raw(`"${BOOKING_OVERLAP_CONSTRAINT}"`)}
+      EXCLUDE USING gist ("fleetVehicleId" WITH =, ${period('')} WITH &&)
+      WHERE ("fleetVehicleId" IS NOT NULL AND "status" IN (${BLOCKING}))
+      DEFERRABLE INITIALLY IMMEDIATE`;
+    return { created: true, overlaps: [] as BookingOverlap[] };
+  });
+  return run.acquired ? run.result : null;
+}
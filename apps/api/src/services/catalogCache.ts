@@ -0,0 +1,98 @@
+import { PrismaClient, Prisma } from '@prisma/client';
+import { createHash } from 'crypto';
+import { Request, Response } from 'express';
+
+// Cache des lectures du catalogue (agences, catégories, véhicules + tarifs, options, réglages widget) :
+// - réponses sérialisées une fois et gardées telles quelles (Buffer JSON) avec leur ETag fort (sha1 du contenu)
+// - lectures concurrentes d'une même clé mutualisées ; une écriture sur un modèle du catalogue vide tout
+//   (middleware Prisma : les routes POST/PUT/DELETE existantes invalident sans modification)
+// - durée de vie CATALOG_CACHE_TTL_MS (60 s par défaut) : borne le décalage quand une autre instance a écrit
+// - If-None-Match -> 304 sans corps ; le navigateur / CDN revalide à chaque fois (no-cache) sauf pour
+//   le bootstrap du widget, partageable CATALOG_MAX_AGE secondes
+
+export const CATALOG_MODELS = ['Agency', 'Category', 'Vehicle', 'VehicleCharacteristic', 'Pricing', 'Inventory', 'Option', 'OptionCategory'];
+
+export interface CatalogEntry {
+  body: Buffer;
+  etag: string;
+  createdAt: number;
+}
+
+export class CatalogCache {
+  private entries = new Map<string, CatalogEntry>();
+  private pending = new Map<string, Promise<CatalogEntry>>();
+  private generation = 0;
+  private counters = { hits: 0, misses: 0, notModified: 0, invalidations: 0 };
+
+  constructor(private ttlMs: number) {}
+
+  async get(key: string, load: () => Promise<unknown>): Promise<CatalogEntry> {
+    const cached = this.entries.get(key);
+    if (cached && Date.now() - cached.createdAt < this.ttlMs) {
+      this.counters.hits++;
+      return cached;
+    }
+    let pending = this.pending.get(key);
+    if (!pending) {
+      this.counters.misses++;
+      const generation = this.generation;
+      pending = load().then(data => {
+        const body = Buffer.from(JSON.stringify(data));
+        const entry = { body, etag: `"${createHash('sha1').update(body).digest('hex').slice(0, 27)}"`, createdAt: Date.now() };
+        // Invalidation pendant la lecture : résultat servi mais pas gardé (il peut précéder l'écriture)
+        if (generation === this.generation) this.entries.set(key, entry);
+        return entry;
+      }).finally(() => this.pending.delete(key));
+      this.pending.set(key, pending);
+    }
+    return pending;
+  }
+
+  clear() {
+    this.generation++;
+    this.counters.invalidations++;
+    this.entries.clear();
+    this.pending.clear();
+  }
+
+  countNotModified() {
+    this.counters.notModified++;
+  }
+
+  stats() {
+    return { entries: this.entries.size, bytes: [...this.entries.values()].reduce((sum, e) => sum + e.body.length, 0), ...this.counters };
+  }
+}
+
+// Réponse depuis le cache : 304 si le client a déjà cette version
+export async function sendCatalog(req: Request, res: Response, key: string, load: () => Promise<unknown>, maxAge = 0) {
+  const cache = getCatalogCache();
+  const entry = await cache.get(key, load);
+  res.setHeader('ETag', entry.etag);
+  res.setHeader('Cache-Control', maxAge > 0 ? `public, max-age=${maxAge}, stale-while-revalidate=${maxAge * 5}` : 'public, no-cache');
+  const ifNoneMatch = req.headers['if-none-match'];
+  if (ifNoneMatch && ifNoneMatch.split(',').some(tag => tag.trim().replace(/^W\//, '') === entry.etag)) {
+    cache.countNotModified();
+    return res.status(304).end();
+  }
+  res.setHeader('Content-Type', 'application/json; charset=utf-8');
+  res.end(entry.body);
+}
+
+export function trackCatalogInvalidation(client: PrismaClient, cache: CatalogCache) {
+  client.$use(async (params: Prisma.MiddlewareParams, next) => {
+    const result = await next(params);
+    if (!params.model || params.action.startsWith('find') || params.action === 'count' || params.action === 'aggregate' || params.action === 'groupBy') return result;
+    if (CATALOG_MODELS.includes(params.model)) cache.clear();
+    // Réglages du widget (clés widget-<marque>) : les autres réglages ne touchent pas le catalogue
+    else if (params.model === 'AppSettings' && (params.action.endsWith('Many') || String(result?.key || '').startsWith('widget-'))) cache.clear();
+    return result;
+  });
+}
+
+let sharedCache: CatalogCache | null = null;
+
+export function getCatalogCache() {
+  if (!sharedCache) sharedCache = new CatalogCache(parseInt(process.env.CATALOG_CACHE_TTL_MS || '60000', 10));
+  return sharedCache;
+}
@@ -0,0 +1,151 @@
+import { PrismaClient, Prisma } from '@prisma/client';
+import { Response } from 'express';
+
+// Flux de changements pour la synchronisation incrémentale de l'app opérateur.
+// - journal en mémoire des écritures (dont les suppressions, invisibles via updatedAt)
+// - diffusion Server-Sent Events aux onglets connectés, filtrée selon le périmètre de chacun (services/operatorAuth)
+// Le journal ne couvre que ce process : /api/sync complète avec updatedAt en base,
+// et demande un rechargement complet si `since` est antérieur au journal.
+
+export type ChangeEntity = 'booking' | 'contract' | 'fleet' | 'notification';
+
+export interface ChangeEntry {
+  entity: ChangeEntity;
+  id: string;
+  op: 'upsert' | 'delete' | 'reset';
+  at: number;
+  // Agence de la ligne (Booking / RentalContract / Fleet) ; absente pour les modèles enfants et les écritures en masse
+  agencyId?: string;
+  // Destinataire d'une notification (absent : notification pour tous)
+  userId?: string;
+}
+
+// Abonné SSE : utilisateur authentifié et agences visibles (null : toutes)
+export interface ChangeSubscriber {
+  userId: string;
+  agencyIds: string[] | null;
+}
+
+interface Client {
+  userId: string;
+  agencies: Set<string> | null;
+}
+
+const MAX_ENTRIES = 5000;
+const HEARTBEAT_MS = 25000;
+
+// Modèles suivis -> entité publiée. Les modèles enfants d'un véhicule Fleet le marquent comme modifié.
+const MODEL_ENTITIES: Record<string, ChangeEntity> = {
+  Booking: 'booking',
+  RentalContract: 'contract',
+  Fleet: 'fleet',
+  Notification: 'notification'
+};
+const FLEET_CHILD_MODELS = ['FleetDamage', 'FleetDocument', 'MaintenanceRecord'];
+
+const SINGLE_WRITE_ACTIONS = ['create', 'update', 'upsert', 'delete'];
+const BULK_WRITE_ACTIONS = ['createMany', 'updateMany', 'deleteMany'];
+
+export class ChangeFeed {
+  private entries: ChangeEntry[] = [];
+  private clients = new Map<Response, Client>();
+  // Tout ce qui est antérieur à cette date n'est plus (ou pas) dans le journal
+  private horizon = Date.now();
+
+  publish(entity: ChangeEntity, id: string, op: ChangeEntry['op'], owner: Pick<ChangeEntry, 'agencyId' | 'userId'> = {}) {
+    const entry: ChangeEntry = { entity, id, op, at: Date.now(), ...owner };
+    this.entries.push(entry);
+    if (this.entries.length > MAX_ENTRIES) {
+      const dropped = this.entries.splice(0, this.entries.length - MAX_ENTRIES);
+      this.horizon = dropped[dropped.length - 1].at;
+    }
+    this.broadcast(entry);
+  }
+
+  // Changements depuis `since`, ou null si le journal ne remonte pas assez loin (ou si un reset a eu lieu)
+  since(since: number): ChangeEntry[] | null {
+    if (since < this.horizon) return null;
+    const changes = this.entries.filter(e => e.at >= since);
+    if (changes.some(e => e.op === 'reset')) return null;
+    return changes;
+  }
+
+  // Connexion SSE : l'appelant a déjà authentifié la requête. "ready" porte l'heure du serveur,
+  // point de départ du premier /api/sync (pas d'horloge client)
+  subscribe(res: Response, subscriber: ChangeSubscriber) {
+    res.writeHead(200, {
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache',
+      Connection: 'keep-alive',
+      'X-Accel-Buffering': 'no'
+    });
+    res.write(`event: ready\ndata: ${JSON.stringify({ serverTime: Date.now() })}\n\n`);
+    this.clients.set(res, {
+      userId: subscriber.userId,
+      agencies: subscriber.agencyIds ? new Set(subscriber.agencyIds) : null
+    });
+    const heartbeat = setInterval(() => res.write(': ping\n\n'), HEARTBEAT_MS);
+    res.on('close', () => {
+      clearInterval(heartbeat);
+      this.clients.delete(res);
+    });
+  }
+
+  // Événement SSE "unread" hors journal : chaque abonné ne reçoit que le compteur global ('*') et le sien
+  signalUnread(counts: Record<string, number>) {
+    for (const [res, client] of this.clients) {
+      const visible: Record<string, number> = {};
+      for (const key of ['*', client.userId]) if (key in counts) visible[key] = counts[key];
+      if (Object.keys(visible).length) res.write(`event: unread\ndata: ${JSON.stringify(visible)}\n\n`);
+    }
+  }
+
+  get clientCount() {
+    return this.clients.size;
+  }
+
+  // Notifications d'un autre utilisateur et lignes d'agences hors périmètre : rien n'est envoyé.
+  // Agence inconnue (modèle enfant, écriture en masse) : signal sans identifiant pour les abonnés restreints.
+  private broadcast(entry: ChangeEntry) {
+    const { entity, id, op, at } = entry;
+    const full = `event: change\ndata: ${JSON.stringify({ entity, id, op, at })}\n\n`;
+    const anonymous = `event: change\ndata: ${JSON.stringify({ entity, id: '', op, at })}\n\n`;
+    for (const [res, client] of this.clients) {
+      if (entry.userId && entry.userId !== client.userId) continue;
+      if (!client.agencies) res.write(full);
+      else if (!entry.agencyId) res.write(anonymous);
+      else if (client.agencies.has(entry.agencyId)) res.write(full);
+    }
+  }
+}
+
+// Middleware Prisma : publie chaque écriture sur les modèles suivis
+export function trackChanges(client: PrismaClient, feed: ChangeFeed) {
+  client.$use(async (params: Prisma.MiddlewareParams, next) => {
+    const result = await next(params);
+    const model = params.model || '';
+    const entity = MODEL_ENTITIES[model];
+    if (!entity && !FLEET_CHILD_MODELS.includes(model)) return result;
+    try {
+      if (BULK_WRITE_ACTIONS.includes(params.action)) {
+        // Lignes inconnues (ex. suppression en cascade) : les clients rechargent tout
+        if (entity === 'notification') feed.publish('notification', '', 'upsert');
+        else feed.publish(entity || 'fleet', '', 'reset');
+      } else if (SINGLE_WRITE_ACTIONS.includes(params.action) && result) {
+        const owner = { agencyId: result.agencyId || undefined, userId: entity === 'notification' ? result.userId || undefined : undefined };
+        if (entity) feed.publish(entity, result.id, params.action === 'delete' ? 'delete' : 'upsert', owner);
+        else if (result.fleetId) feed.publish('fleet', result.fleetId, 'upsert');
+      }
+    } catch (error) {
+      console.error('Change feed error:', error);
+    }
+    return result;
+  });
+}
+
+let sharedFeed: ChangeFeed | null = null;
+
+export function getChangeFeed() {
+  if (!sharedFeed) sharedFeed = new ChangeFeed();
+  return sharedFeed;
+}
@@ -0,0 +1,37 @@
+import { Prisma, PrismaClient } from '@prisma/client';
+
+// Élection d'un leader par tâche entre les réplicas de l'API (crons, mises en place au démarrage).
+// Verrou consultatif Postgres pris dans une transaction (pg_try_advisory_xact_lock) : relâché au commit,
+// ou par Postgres si l'instance meurt en cours de route (la connexion se ferme). Pas de bail à faire expirer.
+// La transaction ne sert qu'à tenir le verrou sur une connexion du pool ; la tâche écrit avec le client normal.
+// Une instance qui ne l'obtient pas n'attend pas : la tâche tourne déjà ailleurs.
+
+// Premier argument de pg_try_advisory_xact_lock(int, int) : isole les verrous de l'API d'autres usages de la base
+const LOCK_NAMESPACE = 4711;
+// Au-delà, Prisma annule la transaction et le verrou est relâché (la tâche, elle, continue)
+const DEFAULT_MAX_DURATION_MS = 10 * 60 * 1000;
+
+// expired : la tâche a dépassé maxDurationMs. Son résultat est rendu, mais le verrou a été relâché
+// avant la fin : une autre instance a pu lancer la même tâche entre-temps.
+export type ClusterLockRun<T> = { acquired: true; result: T; expired?: true } | { acquired: false };
+
+export async function withClusterLock<T>(prisma: PrismaClient, name: string, task: () => Promise<T>, maxDurationMs = DEFAULT_MAX_DURATION_MS): Promise<ClusterLockRun<T>> {
+  const finished: { result?: T; done: boolean } = { done: false };
+  try {
+    return await prisma.$transaction(async tx => {
+      const [{ acquired }] = await tx.$queryRaw<{ acquired: boolean }[]>`
+        SELECT pg_try_advisory_xact_lock(${LOCK_NAMESPACE}::int, hashtext(${name})) AS "acquired"`;
+      if (!acquired) return { acquired: false as const };
+      finished.result = await task();
+      finished.done = true;
+      return { acquired: true as const, result: finished.result };
+    }, { maxWait: 10000, timeout: maxDurationMs });
+  } catch (error) {
+    // Transaction expirée pendant la tâche (P2028 au commit) : le travail est fait, seul le verrou est perdu
+    if (finished.done && error instanceof Prisma.PrismaClientKnownRequestError && error.code === 'P2028') {
+      console.warn(`Cluster lock "${name}" expired after ${maxDurationMs} ms: task finished without holding the lock`);
+      return { acquired: true, result: finished.result as T, expired: true };
+    }
+    throw error;
+  }
+}
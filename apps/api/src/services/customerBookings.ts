@@ -0,0 +1,347 @@
+import { Prisma, PrismaClient } from '@prisma/client';
+import { Request, Response } from 'express';
+import { withClusterLock } from './clusterLock';
+import { OutboxWorker } from './outbox';
+
+// Liste "mes réservations" du portail client servie depuis un modèle de lecture par client :
+// - CustomerBookingSummary : l'élément de liste déjà formaté (agence, véhicule, options, contrat, extensions) par
+//   réservation ; la liste = une lecture d'index (customerId, startDate) agrégée en un seul JSON par Postgres,
+//   au lieu de la réservation + 8 relations chargées pour chaque réservation du client
+// - CustomerBookingVersion : version de la liste, incrémentée à chaque résumé réécrit ; la réponse sérialisée est
+//   gardée en mémoire sous cette version (lecture par clé primaire pour la valider) et sert d'ETag (304)
+// - résumés réécrits hors requête par le worker outbox : chaque instruction sur Booking, BookingOption,
+//   RentalContract, ContractExtension ajoute un message CUSTOMER_BOOKINGS_TOPIC dans sa propre transaction
+//   (triggers Postgres, ensureCustomerBookingTriggers) ; visible après le commit seulement, annulé avec un rollback
+// - nom d'agence, de véhicule, d'option ou numéro d'unité modifiés : listes des clients concernés marquées stale
+//   dans la même transaction (trigger), reconstruites à la lecture
+// - liste d'un client construite à sa première lecture (pas de migration des données existantes)
+
+export const CUSTOMER_BOOKINGS_TOPIC = 'customer-bookings.refresh';
+const REFRESH_BATCH = 200;
+
+const day = (date: Date) => date.toISOString().split('T')[0];
+
+// Ce que la liste affiche, rien de plus
+const SUMMARY_SELECT = {
+  id: true, reference: true, customerId: true, startDate: true, endDate: true, startTime: true, endTime: true,
+  totalPrice: true, paidAmount: true, depositAmount: true, status: true, checkedIn: true, checkedOut: true,
+  language: true, source: true, paymentMethod: true, updatedAt: true,
+  agency: { select: { id: true, name: true, brand: true } },
+  fleetVehicle: { select: { id: true, vehicleNumber: true, vehicle: { select: { name: true } } } },
+  options: { select: { quantity: true, unitPrice: true, totalPrice: true, option: { select: { name: true } } } },
+  contract: {
+    select: {
+      id: true, contractNumber: true, status: true, currentEndDate: true, updatedAt: true,
+      extensions: {
+        orderBy: { createdAt: 'desc' },
+        select: {
+          id: true, extensionNumber: true, previousEndDate: true, requestedEndDate: true, additionalDays: true,
+          totalAmount: true, paymentStatus: true, status: true, updatedAt: true
+        }
+      }
+    }
+  }
+} satisfies Prisma.BookingSelect;
+
+type SummarySource = Prisma.BookingGetPayload<{ select: typeof SUMMARY_SELECT }>;
+
+// Élément de GET /api/customer-portal/bookings (format inchangé)
+export function formatBookingSummary(b: SummarySource) {
+  return {
+    id: b.id,
+    reference: b.reference,
+    startDate: day(b.startDate),
+    endDate: day(b.endDate),
+    startTime: b.startTime,
+    endTime: b.endTime,
+    totalPrice: b.totalPrice,
+    paidAmount: b.paidAmount,
+    depositAmount: b.depositAmount,
+    status: b.status,
+    checkedIn: b.checkedIn,
+    checkedOut: b.checkedOut,
+    language: b.language,
+    source: b.source,
+    paymentMethod: b.paymentMethod,
+    agency: { id: b.agency.id, name: b.agency.name, brand: b.agency.brand },
+    fleetVehicle: b.fleetVehicle ? {
+      id: b.fleetVehicle.id,
+      vehicleNumber: b.fleetVehicle.vehicleNumber,
+      vehicle: { name: b.fleetVehicle.vehicle?.name }
+    } : null,
+    options: b.options.map(o => ({
+      option: { name: o.option?.name },
+      quantity: o.quantity,
+      unitPrice: o.unitPrice,
+      totalPrice: o.totalPrice
+    })),
+    contract: b.contract ? {
+      id: b.contract.id,
+      contractNumber: b.contract.contractNumber,
+      status: b.contract.status,
+      currentEndDate: day(b.contract.currentEndDate),
+      extensions: b.contract.extensions.map(ext => ({
+        id: ext.id,
+        extensionNumber: ext.extensionNumber,
+        previousEndDate: day(ext.previousEndDate),
+        requestedEndDate: day(ext.requestedEndDate),
+        additionalDays: ext.additionalDays,
+        totalAmount: Number(ext.totalAmount),
+        paymentStatus: ext.paymentStatus,
+        status: ext.status
+      }))
+    } : null
+  };
+}
+
+const sourceUpdatedAt = (b: SummarySource) => new Date(Math.max(
+  b.updatedAt.getTime(),
+  b.contract?.updatedAt.getTime() ?? 0,
+  ...(b.contract?.extensions.map(ext => ext.updatedAt.getTime()) ?? [])
+));
+
+interface CachedList {
+  version: number;
+  body: Buffer;
+  etag: string;
+}
+
+export class CustomerBookingSummaries {
+  private cache = new Map<string, CachedList>();
+  private counters = { hits: 0, reads: 0, builds: 0, refreshed: 0, notModified: 0 };
+
+  constructor(private prisma: PrismaClient, private maxEntries: number) {}
+
+  // Réécrit les résumés des réservations (supprimées : résumé retiré) et incrémente la version de leurs clients
+  async refresh(bookingIds: string[], contractIds: string[] = []) {
+    if (contractIds.length) {
+      const contracts = await this.prisma.rentalContract.findMany({ where: { id: { in: contractIds } }, select: { bookingId: true } });
+      bookingIds = [...bookingIds, ...contracts.map(c => c.bookingId).filter((id): id is string => !!id)];
+    }
+    const ids = [...new Set(bookingIds)];
+    for (let i = 0; i < ids.length; i += REFRESH_BATCH) await this.write(ids.slice(i, i + REFRESH_BATCH));
+    this.counters.refreshed += ids.length;
+  }
+
+  private async write(ids: string[]) {
+    const bookings = await this.prisma.booking.findMany({ where: { id: { in: ids } }, select: SUMMARY_SELECT });
+    // Réservation supprimée entre la lecture et l'écriture : jointure sur Booking, pas de résumé orphelin.
+    // Un résumé plus ancien (construction concurrente) n'écrase pas celui d'une écriture plus récente.
+    await this.prisma.$executeRaw`
+      WITH previous AS (
+        SELECT "customerId" FROM "CustomerBookingSummary" WHERE "bookingId" = ANY(${ids})
+      ), removed AS (
+        DELETE FROM "CustomerBookingSummary" s
+        WHERE s."bookingId" = ANY(${ids}) AND NOT EXISTS (SELECT 1 FROM "Booking" b WHERE b."id" = s."bookingId")
+        RETURNING s."customerId"
+      ), upserted AS (
+        INSERT INTO "CustomerBookingSummary" ("bookingId", "customerId", "startDate", "summary", "sourceUpdatedAt")
+        SELECT s.* FROM unnest(
+          ${bookings.map(b => b.id)}::text[], ${bookings.map(b => b.customerId)}::text[],
+          ${bookings.map(b => b.startDate.toISOString())}::text[]::timestamp(3)[],
+          ${bookings.map(b => JSON.stringify(formatBookingSummary(b)))}::text[]::json[],
+          ${bookings.map(b => sourceUpdatedAt(b).toISOString())}::text[]::timestamp(3)[]
+        ) AS s("bookingId", "customerId", "startDate", "summary", "sourceUpdatedAt")
+        JOIN "Booking" b ON b."id" = s."bookingId"
+        ON CONFLICT ("bookingId") DO UPDATE SET
+          "customerId" = EXCLUDED."customerId", "startDate" = EXCLUDED."startDate",
+          "summary" = EXCLUDED."summary", "sourceUpdatedAt" = EXCLUDED."sourceUpdatedAt"
+        WHERE "CustomerBookingSummary"."sourceUpdatedAt" <= EXCLUDED."sourceUpdatedAt"
+        RETURNING "customerId"
+      )
+      UPDATE "CustomerBookingVersion" v SET "version" = v."version" + 1, "updatedAt" = (now() AT TIME ZONE 'UTC')
+      FROM (SELECT "customerId" FROM previous UNION SELECT "customerId" FROM removed UNION SELECT "customerId" FROM upserted) t
+      WHERE v."customerId" = t."customerId"`;
+  }
+
+  // Liste d'un client à reconstruire à la prochaine lecture
+  async markStale(customerId: string) {
+    await this.prisma.$executeRaw`
+      INSERT INTO "CustomerBookingVersion" ("customerId", "version", "stale", "updatedAt")
+      VALUES (${customerId}, 1, true, (now() AT TIME ZONE 'UTC'))
+      ON CONFLICT ("customerId") DO UPDATE SET "version" = "CustomerBookingVersion"."version" + 1, "stale" = true, "updatedAt" = EXCLUDED."updatedAt"`;
+    this.cache.delete(customerId);
+  }
+
+  // Construction complète de la liste d'un client ; une écriture concurrente la laisse stale (reconstruite au prochain appel)
+  private async build(customerId: string) {
+    this.counters.builds++;
+    const [{ version }] = await this.prisma.$queryRaw<{ version: number }[]>`
+      INSERT INTO "CustomerBookingVersion" ("customerId", "version", "stale", "updatedAt")
+      VALUES (${customerId}, 1, true, (now() AT TIME ZONE 'UTC'))
+      ON CONFLICT ("customerId") DO UPDATE SET "updatedAt" = EXCLUDED."updatedAt"
+      RETURNING "version"`;
+    const bookings = await this.prisma.booking.findMany({ where: { customerId }, select: { id: true } });
+    await this.prisma.$executeRaw`
+      DELETE FROM "CustomerBookingSummary" WHERE "customerId" = ${customerId} AND NOT ("bookingId" = ANY(${bookings.map(b => b.id)}))`;
+    for (let i = 0; i < bookings.length; i += REFRESH_BATCH) await this.write(bookings.slice(i, i + REFRESH_BATCH).map(b => b.id));
+    // Les réécritures ci-dessus ont incrémenté la version : on compare à ce qu'elles ont pu produire au plus
+    await this.prisma.$executeRaw`
+      UPDATE "CustomerBookingVersion" SET "version" = "version" + 1, "stale" = false, "updatedAt" = (now() AT TIME ZONE 'UTC')
+      WHERE "customerId" = ${customerId} AND "version" <= ${version} + ${Math.ceil(bookings.length / REFRESH_BATCH)}`;
+  }
+
+  async get(customerId: string): Promise<CachedList> {
+    for (let attempt = 0; ; attempt++) {
+      const [state] = await this.prisma.$queryRaw<{ version: number; stale: boolean }[]>`
+        SELECT "version", "stale" FROM "CustomerBookingVersion" WHERE "customerId" = ${customerId}`;
+      if (!state || (state.stale && attempt < 2)) {
+        await this.build(customerId);
+        continue;
+      }
+      const cached = this.cache.get(customerId);
+      if (cached && cached.version === state.version) {
+        this.counters.hits++;
+        // Récemment utilisé : en fin de Map (éviction par l'ancienneté d'usage)
+        this.cache.delete(customerId);
+        this.cache.set(customerId, cached);
+        return cached;
+      }
+      this.counters.reads++;
+      // Version et liste lues dans le même instantané
+      const [list] = await this.prisma.$queryRaw<{ version: number; body: string }[]>`
+        SELECT v."version", (
+          SELECT COALESCE(json_agg(s."summary" ORDER BY s."startDate" DESC, s."bookingId"), '[]')::text
+          FROM "CustomerBookingSummary" s WHERE s."customerId" = ${customerId}
+        ) AS "body"
+        FROM "CustomerBookingVersion" v WHERE v."customerId" = ${customerId}`;
+      if (!list) continue;
+      const entry = { version: list.version, body: Buffer.from(list.body), etag: `"cb-${list.version}"` };
+      this.cache.delete(customerId);
+      this.cache.set(customerId, entry);
+      if (this.cache.size > this.maxEntries) this.cache.delete(this.cache.keys().next().value as string);
+      return entry;
+    }
+  }
+
+  countNotModified() {
+    this.counters.notModified++;
+  }
+
+  stats() {
+    return { customers: this.cache.size, bytes: [...this.cache.values()].reduce((sum, e) => sum + e.body.length, 0), ...this.counters };
+  }
+}
+
+// Réponse de GET /api/customer-portal/bookings : 304 si le client a déjà cette version
+export async function sendCustomerBookings(req: Request, res: Response, customerId: string) {
+  const summaries = getCustomerBookingSummaries();
+  const entry = await summaries.get(customerId);
+  res.setHeader('ETag', entry.etag);
+  res.setHeader('Cache-Control', 'private, no-cache');
+  const ifNoneMatch = req.headers['if-none-match'];
+  if (ifNoneMatch && ifNoneMatch.split(',').some(tag => tag.trim().replace(/^W\//, '') === entry.etag)) {
+    summaries.countNotModified();
+    return res.status(304).end();
+  }
+  res.setHeader('Content-Type', 'application/json; charset=utf-8');
+  res.end(entry.body);
+}
+
+// Tables dont une écriture change des résumés : colonne qui désigne la réservation ou le contrat, clé du message
+const SUMMARY_SOURCES = [
+  { table: 'Booking', column: 'id', key: 'bookingIds' },
+  { table: 'BookingOption', column: 'bookingId', key: 'bookingIds' },
+  { table: 'RentalContract', column: 'bookingId', key: 'bookingIds' },
+  { table: 'ContractExtension', column: 'contractId', key: 'contractIds' }
+];
+
+// Champs du catalogue recopiés dans les résumés, et clients dont une réservation les affiche (ligne modifiée : OLD)
+const CATALOG_SOURCES = [
+  { table: 'Agency', columns: ['name', 'brand'], customers: `SELECT "customerId" FROM "Booking" WHERE "agencyId" = OLD."id"` },
+  {
+    table: 'Vehicle', columns: ['name'],
+    customers: `SELECT b."customerId" FROM "Booking" b JOIN "Fleet" f ON f."id" = b."fleetVehicleId" WHERE f."vehicleId" = OLD."id"`
+  },
+  {
+    table: 'Option', columns: ['name'],
+    customers: `SELECT b."customerId" FROM "BookingOption" o JOIN "Booking" b ON b."id" = o."bookingId" WHERE o."optionId" = OLD."id"`
+  },
+  { table: 'Fleet', columns: ['vehicleNumber', 'vehicleId'], customers: `SELECT "customerId" FROM "Booking" WHERE "fleetVehicleId" = OLD."id"` }
+];
+
+// Triggers par instruction (tables de transition) : un message outbox par INSERT / UPDATE / DELETE, quel que soit
+// le nombre de lignes ; UPDATE : anciennes et nouvelles clés (réservation d'une option ou d'un contrat changée)
+const ENQUEUE_FUNCTION = Prisma.raw(`
+  CREATE OR REPLACE FUNCTION "customer_bookings_enqueue"() RETURNS trigger LANGUAGE plpgsql AS $$
+  DECLARE ids text[];
+  BEGIN
+    IF TG_OP = 'UPDATE' THEN
+      EXECUTE format('SELECT array_agg(DISTINCT k) FROM (SELECT %1$I AS k FROM changed UNION SELECT %1$I FROM previous) t WHERE k IS NOT NULL', TG_ARGV[0]) INTO ids;
+    ELSE
+      EXECUTE format('SELECT array_agg(DISTINCT %1$I) FROM changed WHERE %1$I IS NOT NULL', TG_ARGV[0]) INTO ids;
+    END IF;
+    IF ids IS NOT NULL THEN
+      INSERT INTO "OutboxMessage" ("id", "topic", "payload", "availableAt", "createdAt")
+      VALUES (gen_random_uuid()::text, '${CUSTOMER_BOOKINGS_TOPIC}', jsonb_build_object(TG_ARGV[1], ids), now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC');
+    END IF;
+    RETURN NULL;
+  END $$`);
+
+const catalogFunction = (table: string, customers: string) => Prisma.raw(`
+  CREATE OR REPLACE FUNCTION "customer_bookings_stale_${table.toLowerCase()}"() RETURNS trigger LANGUAGE plpgsql AS $$
+  BEGIN
+    UPDATE "CustomerBookingVersion" SET "version" = "version" + 1, "stale" = true, "updatedAt" = (now() AT TIME ZONE 'UTC')
+    WHERE "customerId" IN (${customers});
+    RETURN NULL;
+  END $$`);
+
+const SUMMARY_TRIGGERS = [
+  ...SUMMARY_SOURCES.flatMap(({ table, column, key }) => [
+    ['INSERT', 'NEW TABLE AS changed'], ['UPDATE', 'NEW TABLE AS changed OLD TABLE AS previous'], ['DELETE', 'OLD TABLE AS changed']
+  ].map(([event, tables]) => ({
+    name: `${table}_customer_bookings_${event.toLowerCase()}`,
+    sql: `CREATE TRIGGER "${table}_customer_bookings_${event.toLowerCase()}" AFTER ${event} ON "${table}" REFERENCING ${tables}
+      FOR EACH STATEMENT EXECUTE FUNCTION "customer_bookings_enqueue"('${column}', '${key}')`
+  }))),
+  ...CATALOG_SOURCES.map(({ table, columns }) => ({
+    name: `${table}_customer_bookings_stale`,
+    sql: `CREATE TRIGGER "${table}_customer_bookings_stale" AFTER UPDATE OF ${columns.map(c => `"${c}"`).join(', ')} ON "${table}"
+      FOR EACH ROW WHEN (${columns.map(c => `OLD."${c}" IS DISTINCT FROM NEW."${c}"`).join(' OR ')})
+      EXECUTE FUNCTION "customer_bookings_stale_${table.toLowerCase()}"()`
+  }))
+];
+
+// Au démarrage, un seul réplica : fonctions remplacées (mises à jour au déploiement), triggers créés s'ils manquent.
+// Prisma (db push) ne décrit pas les triggers, comme la contrainte d'exclusion de services/bookingOverlap.
+export async function ensureCustomerBookingTriggers(prisma: PrismaClient) {
+  const run = await withClusterLock(prisma, 'customer-bookings-triggers', async () => {
+    await prisma.$executeRaw`${ENQUEUE_FUNCTION}`;
+    for (const { table, customers } of CATALOG_SOURCES) await prisma.$executeRaw`${catalogFunction(table, customers)}`;
+    const existing = await prisma.$queryRaw<{ tgname: string }[]>`
+      SELECT tgname FROM pg_trigger WHERE tgname = ANY(${SUMMARY_TRIGGERS.map(t => t.name)})`;
+    const missing = SUMMARY_TRIGGERS.filter(t => !existing.some(e => e.tgname === t.name));
+    for (const trigger of missing) await prisma.$executeRaw`${Prisma.raw(trigger.sql)}`;
+    return missing.length;
+  });
+  return run.acquired ? run.result : null;
+}
+
+// Message outbox : résumés relus une fois la transaction validée (réservations supprimées : résumé retiré)
+export function registerCustomerBookingRefresh(worker: OutboxWorker, summaries: CustomerBookingSummaries) {
+  worker.register(CUSTOMER_BOOKINGS_TOPIC, ({ bookingIds = [], contractIds = [] }) => summaries.refresh(bookingIds, contractIds));
+}
+
+// Middleware Prisma : écriture suivie hors transaction (déjà validée), le worker traite le message sans attendre
+// le prochain intervalle ; dans une transaction, le message est pris au passage suivant, après le commit
+export function trackCustomerBookings(client: PrismaClient, worker: OutboxWorker) {
+  const tables = new Set(SUMMARY_SOURCES.map(s => s.table));
+  client.$use(async (params: Prisma.MiddlewareParams, next) => {
+    const result = await next(params);
+    if (params.model && tables.has(params.model) && !params.runInTransaction && !params.action.startsWith('find') &&
+        !['count', 'aggregate', 'groupBy'].includes(params.action)) {
+      worker.wake();
+    }
+    return result;
+  });
+}
+
+let sharedSummaries: CustomerBookingSummaries | null = null;
+
+export function getCustomerBookingSummaries(prisma?: PrismaClient) {
+  if (!sharedSummaries) {
+    if (!prisma) throw new Error('Customer booking summaries not initialised');
+    sharedSummaries = new CustomerBookingSummaries(prisma, parseInt(process.env.CUSTOMER_BOOKINGS_CACHE_SIZE || '2000', 10));
+  }
+  return sharedSummaries;
+}
@@ -0,0 +1,132 @@
+import { PrismaClient, Prisma } from '@prisma/client';
+
+// Recherche client indexée (operator : NewBookingModal, onglet clients).
+// Customer.searchText = prénom + nom + email sans accents ni majuscules, Customer.phoneDigits = chiffres du téléphone ;
+// les deux colonnes ont un index GIN pg_trgm (schema.prisma) qui sert les LIKE '%…%' et la similarité de mots.
+// Colonnes tenues à jour par le middleware trackCustomerSearch, lignes existantes remplies par backfillCustomerSearch.
+
+export const SEARCH_LIMIT = 10;
+const MIN_QUERY_LENGTH = 2;
+const MIN_PHONE_DIGITS = 3;
+const PHONE_QUERY = /^[\d\s+().-]+$/;
+
+export function normalizeText(value: string | null | undefined) {
+  return (value || '')
+    .normalize('NFD')
+    .replace(/[\u0300-\u036f]/g, '')
+    .toLowerCase()
+    .replace(/\s+/g, ' ')
+    .trim();
+}
+
+// "+34 612-34-56-78" -> "34612345678" ; le préfixe international 00 est retiré pour matcher la forme "+"
+export function normalizePhone(value: string | null | undefined) {
+  return (value || '').replace(/\D/g, '').replace(/^00/, '');
+}
+
+export function customerSearchFields(customer: { firstName?: string | null; lastName?: string | null; email?: string | null; phone?: string | null }) {
+  return {
+    searchText: normalizeText([customer.firstName, customer.lastName, customer.email].filter(Boolean).join(' ')),
+    phoneDigits: normalizePhone(customer.phone)
+  };
+}
+
+const SEARCH_SOURCE_FIELDS = ['firstName', 'lastName', 'email', 'phone'];
+
+// Middleware Prisma : calcule searchText / phoneDigits à chaque écriture d'un client
+export function trackCustomerSearch(client: PrismaClient) {
+  client.$use(async (params: Prisma.MiddlewareParams, next) => {
+    if (params.model !== 'Customer') return next(params);
+    if (params.action === 'create' && params.args?.data) {
+      params.args.data = { ...params.args.data, ...customerSearchFields(params.args.data) };
+      return next(params);
+    }
+    const result = await next(params);
+    const data = params.action === 'upsert' ? { ...params.args?.create, ...params.args?.update } : params.args?.data;
+    const touched = data && SEARCH_SOURCE_FIELDS.some(field => field in data);
+    if ((params.action === 'update' || params.action === 'upsert') && touched && result?.id) {
+      // Mise à jour partielle : on recalcule depuis la ligne complète renvoyée
+      const fields = customerSearchFields(result);
+      if (fields.searchText !== result.searchText || fields.phoneDigits !== result.phoneDigits) {
+        await client.customer.update({ where: { id: result.id }, data: fields });
+        Object.assign(result, fields);
+      }
+    }
+    return result;
+  });
+}
+
+// Remplit les colonnes de recherche des clients créés avant l'index (ou par createMany / updateMany)
+export async function backfillCustomerSearch(prisma: PrismaClient, batchSize = 1000) {
+  let cursor: string | undefined;
+  let updated = 0;
+  for (;;) {
+    const batch = await prisma.customer.findMany({
+      where: { searchText: '', ...(cursor ? { id: { gt: cursor } } : {}) },
+      select: { id: true, firstName: true, lastName: true, email: true, phone: true },
+      orderBy: { id: 'asc' },
+      take: batchSize
+    });
+    if (!batch.length) break;
+    const changes = batch
+      .map(c => ({ id: c.id, ...customerSearchFields(c) }))
+      .filter(c => c.searchText || c.phoneDigits);
+    if (changes.length) {
+      await prisma.$transaction(changes.map(({ id, ...data }) => prisma.customer.update({ where: { id }, data })));
+    }
+    updated += changes.length;
+    cursor = batch[batch.length - 1].id;
+  }
+  return updated;
+}
+
+export interface CustomerSearchOptions {
+  limit?: number;
+  fuzzy?: boolean;
+}
+
+const escapeLike = (term: string) => term.replace(/[\\%_]/g, '\\$&');
+
+// Terme de moins de 3 caractères : début de mot uniquement (un trigramme complet est nécessaire pour '%jo%')
+const termCondition = (term: string) => term.length < 3
+  ? Prisma.sql`("searchText" LIKE ${escapeLike(term) + '%'} OR "searchText" LIKE ${'% ' + escapeLike(term) + '%'})`
+  : Prisma.sql`"searchText" LIKE ${'%' + escapeLike(term) + '%'}`;
+
+const stripSearchColumns = (rows: any[]) =>
+  rows.map(({ searchText, phoneDigits, searchScore, ...customer }) => ({ ...customer, score: Number(searchScore) }));
+
+// Classement : requête en début de fiche (prénom) > début d'un mot > contenue, téléphone en bonus, puis récence.
+// S'il manque des résultats, complément par similarité de mots (fautes de frappe) via l'opérateur <% de pg_trgm.
+export async function searchCustomers(prisma: PrismaClient, query: string, options: CustomerSearchOptions = {}) {
+  const limit = Math.min(options.limit ?? SEARCH_LIMIT, 50);
+  const text = normalizeText(query);
+  if (text.length < MIN_QUERY_LENGTH) return [];
+  // Téléphone seulement si la saisie y ressemble ("user123" reste une recherche texte)
+  const digits = PHONE_QUERY.test(query) ? normalizePhone(query) : '';
+  const phone = digits.length >= MIN_PHONE_DIGITS ? digits : '';
+
+  // Tous les mots doivent apparaître, dans n'importe quel ordre
+  const allTerms = Prisma.join(text.split(' ').map(termCondition), ' AND ');
+  const phoneMatch = phone ? Prisma.sql`OR "phoneDigits" LIKE ${'%' + phone + '%'}` : Prisma.empty;
+  const phoneScore = phone ? Prisma.sql`+ CASE WHEN "phoneDigits" LIKE ${'%' + phone + '%'} THEN 3 ELSE 0 END` : Prisma.empty;
+
+  const exact = await prisma.$queryRaw<any[]>`
+    SELECT *,
+      CASE WHEN "searchText" LIKE ${escapeLike(text) + '%'} THEN 2
+           WHEN "searchText" LIKE ${'% ' + escapeLike(text) + '%'} THEN 1
+           ELSE 0 END ${phoneScore} AS "searchScore"
+    FROM "Customer"
+    WHERE (${allTerms}) ${phoneMatch}
+    ORDER BY "searchScore" DESC, "updatedAt" DESC
+    LIMIT ${limit}`;
+  if (exact.length >= limit || options.fuzzy === false || text.length < 4) return stripSearchColumns(exact);
+
+  const found = exact.length ? Prisma.sql`AND id NOT IN (${Prisma.join(exact.map(c => c.id))})` : Prisma.empty;
+  const fuzzy = await prisma.$queryRaw<any[]>`
+    SELECT *, word_similarity(${text}, "searchText") - 1 AS "searchScore"
+    FROM "Customer"
+    WHERE ${text} <% "searchText" ${found}
+    ORDER BY "searchScore" DESC, "updatedAt" DESC
+    LIMIT ${limit - exact.length}`;
+  return stripSearchColumns([...exact, ...fuzzy]);
+}
@@ -0,0 +1,271 @@
+import { PrismaClient } from '@prisma/client';
+import type Stripe from 'stripe';
+import { performance } from 'perf_hooks';
+import { runPool } from './pushDispatcher';
+
+// Pré-autorisation des cautions J-1 (cron authorize-deposits) :
+// - un pool de workers borné par marque (chaque marque a son compte Stripe et ses propres limites)
+// - clé d'idempotence par réservation et montant : rejouer un appel interrompu renvoie le même PaymentIntent
+// - point de reprise en base (DepositAuthorizationItem) : un nouveau passage ne traite que le reste
+// - budget de temps : le cron répond avant le timeout HTTP et le passage suivant reprend la suite
+
+export interface DepositCandidate {
+  bookingId: string;
+  reference: string;
+  brand: string;
+  amount: number;
+  stripeCustomerId: string;
+  paymentMethodId: string;
+}
+
+export interface AuthorizeParams {
+  amountCents: number;
+  customer: string;
+  paymentMethod: string;
+  metadata: Record<string, string>;
+}
+
+// Seul point de contact avec Stripe : remplaçable par createStubGateway pour les benchmarks
+export interface DepositGateway {
+  authorize(brand: string, params: AuthorizeParams, idempotencyKey: string): Promise<{ id: string; status: string }>;
+}
+
+export type DepositStatus = 'AUTHORIZED' | 'SKIPPED' | 'FAILED' | 'ERROR';
+
+export interface DepositOutcome {
+  bookingId: string;
+  reference: string;
+  brand: string;
+  status: DepositStatus;
+  amount?: number;
+  paymentIntentId?: string;
+  error?: string;
+}
+
+export interface DepositBatchOptions {
+  concurrency?: number;
+  retries?: number;
+  baseDelayMs?: number;
+  deadline?: number; // timestamp (ms) après lequel plus aucune réservation n'est démarrée
+  onResult?: (outcome: DepositOutcome) => Promise<void>;
+}
+
+// Erreurs définitives : carte refusée, paramètres refusés par Stripe
+const FINAL_ERROR_TYPES = ['StripeCardError', 'StripeInvalidRequestError'];
+const TRANSIENT_ERROR_TYPES = ['StripeRateLimitError', 'StripeAPIError', 'StripeConnectionError'];
+
+const isTransient = (error: any) =>
+  TRANSIENT_ERROR_TYPES.includes(error?.type) || error?.statusCode === 429 || error?.statusCode >= 500;
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
+
+export const depositIdempotencyKey = (candidate: DepositCandidate) =>
+  `deposit-hold-${candidate.bookingId}-${Math.round(candidate.amount * 100)}`;
+
+export function stripeGateway(getStripe: (brand: string) => Stripe): DepositGateway {
+  return {
+    async authorize(brand, params, idempotencyKey) {
+      const paymentIntent = await getStripe(brand).paymentIntents.create({
+        amount: params.amountCents,
+        currency: 'eur',
+        customer: params.customer,
+        payment_method: params.paymentMethod,
+        capture_method: 'manual',
+        confirm: true,
+        off_session: true,
+        metadata: params.metadata
+      }, { idempotencyKey });
+      return { id: paymentIntent.id, status: paymentIntent.status };
+    }
+  };
+}
+
+// Stripe simulé : latence, refus de carte et erreurs temporaires paramétrables, idempotence respectée
+export function createStubGateway(options: { latencyMs?: number; declineRate?: number; transientRate?: number } = {}) {
+  const latencyMs = options.latencyMs ?? 150;
+  const issued = new Map<string, string>();
+  const calls = { total: 0, created: 0 };
+  const gateway: DepositGateway = {
+    async authorize(brand, params, idempotencyKey) {
+      calls.total++;
+      await sleep(latencyMs * (0.5 + Math.random()));
+      const existing = issued.get(idempotencyKey);
+      if (existing) return { id: existing, status: 'requires_capture' };
+      if (Math.random() < (options.transientRate ?? 0)) throw Object.assign(new Error('Rate limited'), { type: 'StripeRateLimitError', statusCode: 429 });
+      if (Math.random() < (options.declineRate ?? 0)) throw Object.assign(new Error('Your card was declined.'), { type: 'StripeCardError', statusCode: 402 });
+      const id = `pi_stub_${issued.size + 1}`;
+      issued.set(idempotencyKey, id);
+      calls.created++;
+      return { id, status: 'requires_capture' };
+    }
+  };
+  return { gateway, calls };
+}
+
+// Traite les candidats marque par marque en parallèle ; renvoie ceux non démarrés avant la deadline
+export async function processDeposits(candidates: DepositCandidate[], gateway: DepositGateway, options: DepositBatchOptions = {}) {
+  const concurrency = options.concurrency ?? parseInt(process.env.DEPOSIT_CONCURRENCY || '4', 10);
+  const retries = options.retries ?? 2;
+  const baseDelayMs = options.baseDelayMs ?? 500;
+  const outcomes: DepositOutcome[] = [];
+  const remaining: DepositCandidate[] = [];
+
+  const authorize = async (candidate: DepositCandidate): Promise<DepositOutcome> => {
+    const base = { bookingId: candidate.bookingId, reference: candidate.reference, brand: candidate.brand, amount: candidate.amount };
+    if (candidate.amount <= 0) return { ...base, status: 'SKIPPED', error: 'No deposit amount' };
+    const params: AuthorizeParams = {
+      amountCents: Math.round(candidate.amount * 100),
+      customer: candidate.stripeCustomerId,
+      paymentMethod: candidate.paymentMethodId,
+      metadata: { bookingId: candidate.bookingId, bookingRef: candidate.reference, type: 'deposit_hold', brand: candidate.brand }
+    };
+    for (let attempt = 0; ; attempt++) {
+      try {
+        const paymentIntent = await gateway.authorize(candidate.brand, params, depositIdempotencyKey(candidate));
+        return { ...base, status: 'AUTHORIZED', paymentIntentId: paymentIntent.id };
+      } catch (error: any) {
+        if (isTransient(error) && attempt < retries) {
+          await sleep(baseDelayMs * 2 ** attempt * (0.5 + Math.random()));
+          continue;
+        }
+        return { ...base, status: FINAL_ERROR_TYPES.includes(error?.type) ? 'FAILED' : 'ERROR', error: error?.message || String(error) };
+      }
+    }
+  };
+
+  const byBrand = new Map<string, DepositCandidate[]>();
+  for (const candidate of candidates) {
+    if (!byBrand.has(candidate.brand)) byBrand.set(candidate.brand, []);
+    byBrand.get(candidate.brand)!.push(candidate);
+  }
+
+  await Promise.all([...byBrand.values()].map(items => runPool(items, concurrency, async candidate => {
+    if (options.deadline && Date.now() > options.deadline) { remaining.push(candidate); return; }
+    const outcome = await authorize(candidate);
+    outcomes.push(outcome);
+    if (options.onResult) await options.onResult(outcome);
+  })));
+
+  return { outcomes, remaining };
+}
+
+// Fenêtre des départs de demain (minuit local du serveur), comme l'ancien cron
+export function depositWindow(now = new Date()) {
+  const tomorrow = new Date(now);
+  tomorrow.setDate(tomorrow.getDate() + 1);
+  tomorrow.setHours(0, 0, 0, 0);
+  const dayAfterTomorrow = new Date(tomorrow);
+  dayAfterTomorrow.setDate(dayAfterTomorrow.getDate() + 1);
+  return { start: tomorrow, end: dayAfterTomorrow, date: tomorrow.toISOString().split('T')[0] };
+}
+
+export const DEPOSIT_CANDIDATE_WHERE = (start: Date, end: Date) => ({
+  startDate: { gte: start, lt: end },
+  depositStatus: 'CARD_SAVED',
+  stripeCustomerId: { not: null },
+  stripePaymentMethodId: { not: null }
+});
+
+const DONE_STATUSES = ['AUTHORIZED', 'SKIPPED', 'FAILED'];
+
+export async function runDepositAuthorization(prisma: PrismaClient, gateway: DepositGateway, options: { now?: Date; maxDurationMs?: number; concurrency?: number } = {}) {
+  const t0 = performance.now();
+  const window = depositWindow(options.now);
+  const maxDurationMs = options.maxDurationMs ?? parseInt(process.env.DEPOSIT_MAX_DURATION_MS || '20000', 10);
+
+  // Verrou : un seul passage à la fois pour une date donnée (expire si le process meurt en route)
+  const run = await prisma.depositAuthorizationRun.upsert({ where: { date: window.date }, create: { date: window.date }, update: {} });
+  const now = new Date();
+  const lock = await prisma.depositAuthorizationRun.updateMany({
+    where: { id: run.id, OR: [{ lockedUntil: null }, { lockedUntil: { lt: now } }] },
+    data: { status: 'RUNNING', lockedUntil: new Date(now.getTime() + maxDurationMs + 60000), attempts: { increment: 1 } }
+  });
+  if (lock.count === 0) return { date: window.date, locked: true as const };
+
+  try {
+    const done = await prisma.depositAuthorizationItem.findMany({
+      where: { runId: run.id, status: { in: DONE_STATUSES } },
+      select: { bookingId: true }
+    });
+    const doneIds = new Set(done.map(item => item.bookingId));
+
+    // Montant de caution calculé dans la même requête (plus de findUnique par réservation)
+    const bookings = await prisma.booking.findMany({
+      where: DEPOSIT_CANDIDATE_WHERE(window.start, window.end),
+      select: {
+        id: true, reference: true, stripeCustomerId: true, stripePaymentMethodId: true,
+        agency: { select: { brand: true } },
+        items: { select: { quantity: true, vehicle: { select: { deposit: true } } } }
+      }
+    });
+    const candidates: DepositCandidate[] = bookings
+      .filter(b => !doneIds.has(b.id))
+      .map(b => ({
+        bookingId: b.id,
+        reference: b.reference,
+        brand: b.agency?.brand || 'VOLTRIDE',
+        amount: b.items.reduce((sum, item) => sum + (item.vehicle?.deposit || 0) * item.quantity, 0),
+        stripeCustomerId: b.stripeCustomerId!,
+        paymentMethodId: b.stripePaymentMethodId!
+      }));
+    console.log(`[CRON] authorize-deposits ${window.date}: ${candidates.length} to process, ${doneIds.size} already done`);
+
+    const saveItem = (outcome: DepositOutcome) => {
+      const data = { status: outcome.status, amount: outcome.amount, paymentIntentId: outcome.paymentIntentId || null, error: outcome.error || null };
+      return prisma.depositAuthorizationItem.upsert({
+        where: { runId_bookingId: { runId: run.id, bookingId: outcome.bookingId } },
+        create: { runId: run.id, bookingId: outcome.bookingId, reference: outcome.reference, brand: outcome.brand, ...data },
+        update: { ...data, attempts: { increment: 1 } }
+      });
+    };
+
+    const { outcomes, remaining } = await processDeposits(candidates, gateway, {
+      concurrency: options.concurrency,
+      deadline: Date.now() + maxDurationMs,
+      onResult: async outcome => {
+        if (outcome.status === 'AUTHORIZED') {
+          await prisma.$transaction([
+            prisma.booking.update({ where: { id: outcome.bookingId }, data: { depositPaymentIntentId: outcome.paymentIntentId, depositStatus: 'AUTHORIZED' } }),
+            saveItem(outcome)
+          ]);
+          console.log(`[CRON] Booking ${outcome.reference}: Authorized ${outcome.amount}€`);
+        } else {
+          await saveItem(outcome);
+          if (outcome.status !== 'SKIPPED') console.error(`[CRON] Booking ${outcome.reference}: ${outcome.status} - ${outcome.error}`);
+        }
+      }
+    });
+
+    const totals = await prisma.depositAuthorizationItem.groupBy({ by: ['status'], where: { runId: run.id }, _count: { _all: true } });
+    const byStatus: Record<string, number> = {};
+    totals.forEach(t => { byStatus[t.status] = t._count._all; });
+    const pass = { AUTHORIZED: 0, SKIPPED: 0, FAILED: 0, ERROR: 0 };
+    outcomes.forEach(o => { pass[o.status]++; });
+    const durationMs = Math.round(performance.now() - t0);
+    const complete = remaining.length === 0 && !byStatus.ERROR;
+    const summary = {
+      date: window.date,
+      status: complete ? 'COMPLETED' : 'PARTIAL',
+      candidates: candidates.length,
+      processed: outcomes.length,
+      remaining: remaining.length,
+      pass,
+      totals: byStatus,
+      durationMs,
+      perSecond: durationMs ? Math.round(outcomes.length / durationMs * 10000) / 10 : 0
+    };
+
+    await prisma.depositAuthorizationRun.update({
+      where: { id: run.id },
+      data: { status: summary.status, summary, lockedUntil: null, finishedAt: complete ? new Date() : null }
+    });
+
+    return {
+      ...summary,
+      results: outcomes.map(o => ({ reference: o.reference, status: o.status.toLowerCase(), amount: o.amount, error: o.error }))
+    };
+  } catch (error) {
+    await prisma.depositAuthorizationRun.update({ where: { id: run.id }, data: { status: 'PARTIAL', lockedUntil: null } });
+    throw error;
+  }
+}
@@ -0,0 +1,353 @@
+import { PrismaClient } from '@prisma/client';
+import { BLOCKING_BOOKING_STATUSES, BOOKABLE_FLEET_STATUSES, lowerBound, periodEnd } from './availabilityIndex';
+import { isBookingOverlapError } from './bookingOverlap';
+
+// Affectation des réservations aux véhicules Fleet d'une agence / d'un modèle.
+// Chaque véhicule a une frise triée de ses réservations ; le coût d'un placement est l'écart avec la
+// réservation précédente + l'écart avec la suivante (plafonnés à GAP_HORIZON), calculé en O(log n).
+// On place la réservation là où elle bouche le mieux un trou : les véhicules libres restent libres
+// pour les longues locations (même intention que l'ancien score "suite de location").
+
+const DAY = 24 * 60 * 60 * 1000;
+// Nouvelles tentatives quand un autre réplica a pris le véhicule choisi entre la lecture et l'écriture
+const CLAIM_ATTEMPTS = 3;
+// Au-delà de cet écart, un trou compte comme "ouvert" (véhicule libre de ce côté)
+const GAP_HORIZON = 14 * DAY;
+// Réoptimisation : garder le véhicule actuel si son coût n'est pas pire que celui-ci (évite de tout déplacer)
+const STAY_BONUS = 1 * DAY;
+// Véhicules replanifiables : un véhicule loué revient et garde ses réservations futures
+const PLANNING_FLEET_STATUSES = [...BOOKABLE_FLEET_STATUSES, 'RENTED'];
+
+export interface TimelineBooking {
+  id: string;
+  start: number;
+  end: number;
+}
+
+export class FleetTimeline {
+  starts: number[] = [];
+  ends: number[] = [];
+  ids: string[] = [];
+  // maxEnd[i] = plus grande fin parmi [0..i] (tolère des périodes qui se chevauchent en base)
+  maxEnd: number[] = [];
+
+  constructor(public fleetId: string, bookings: TimelineBooking[] = []) {
+    const sorted = [...bookings].sort((a, b) => a.start - b.start);
+    for (const b of sorted) {
+      const end = periodEnd(b.start, b.end);
+      this.starts.push(b.start);
+      this.ends.push(end);
+      this.ids.push(b.id);
+      this.maxEnd.push(Math.max(this.maxEnd[this.maxEnd.length - 1] ?? -Infinity, end));
+    }
+  }
+
+  get size() {
+    return this.ids.length;
+  }
+
+  // Coût du placement de [start, end), ou null si conflit (start = end : un instant, voir periodEnd)
+  gapCost(start: number, end: number): number | null {
+    end = periodEnd(start, end);
+    const i = lowerBound(this.starts, end) - 1;
+    if (i >= 0 && this.maxEnd[i] > start) return null;
+    const before = i >= 0 ? start - this.maxEnd[i] : GAP_HORIZON;
+    const after = i + 1 < this.starts.length ? this.starts[i + 1] - end : GAP_HORIZON;
+    return Math.min(before, GAP_HORIZON) + Math.min(after, GAP_HORIZON);
+  }
+
+  insert(booking: TimelineBooking) {
+    const i = lowerBound(this.starts, booking.start);
+    this.starts.splice(i, 0, booking.start);
+    this.ends.splice(i, 0, periodEnd(booking.start, booking.end));
+    this.ids.splice(i, 0, booking.id);
+    this.maxEnd.splice(i, 0, 0);
+    for (let k = i; k < this.ids.length; k++) {
+      this.maxEnd[k] = Math.max(k > 0 ? this.maxEnd[k - 1] : -Infinity, this.ends[k]);
+    }
+  }
+}
+
+// Meilleur véhicule pour [start, end) : coût minimal, puis véhicule le plus chargé, puis id (déterministe)
+export function pickTimeline(timelines: FleetTimeline[], start: number, end: number, preferredFleetId?: string | null) {
+  let best: { timeline: FleetTimeline; cost: number } | null = null;
+  for (const timeline of timelines) {
+    let cost = timeline.gapCost(start, end);
+    if (cost === null) continue;
+    if (timeline.fleetId === preferredFleetId) cost -= STAY_BONUS;
+    if (!best || cost < best.cost
+      || (cost === best.cost && (timeline.size > best.timeline.size
+        || (timeline.size === best.timeline.size && timeline.fleetId < best.timeline.fleetId)))) {
+      best = { timeline, cost };
+    }
+  }
+  return best;
+}
+
+const describeCost = (cost: number) => cost >= 2 * GAP_HORIZON
+  ? 'véhicule libre'
+  : `écart ${Math.round(cost / DAY * 10) / 10} j`;
+
+// Affectation d'une nouvelle réservation : seules les réservations proches de la période comptent pour le coût
+export async function assignFleetUnit(prisma: PrismaClient, bookingId: string, vehicleId: string, agencyId: string, startDate: Date, endDate: Date, excludeFleetIds: string[] = []) {
+  const units = await prisma.fleet.findMany({
+    where: { vehicleId, agencyId, status: { in: BOOKABLE_FLEET_STATUSES as any }, ...(excludeFleetIds.length ? { id: { notIn: excludeFleetIds } } : {}) },
+    select: { id: true }
+  });
+  if (units.length === 0) return { fleetId: null, reason: 'Aucun véhicule disponible dans la flotte' };
+
+  const bookings = await prisma.booking.findMany({
+    where: {
+      fleetVehicleId: { in: units.map(u => u.id) },
+      status: { in: BLOCKING_BOOKING_STATUSES },
+      id: { not: bookingId },
+      startDate: { lt: new Date(endDate.getTime() + GAP_HORIZON) },
+      endDate: { gt: new Date(startDate.getTime() - GAP_HORIZON) }
+    },
+    select: { id: true, fleetVehicleId: true, startDate: true, endDate: true }
+  });
+  const byUnit = new Map<string, TimelineBooking[]>(units.map(u => [u.id, []]));
+  for (const b of bookings) byUnit.get(b.fleetVehicleId!)?.push({ id: b.id, start: b.startDate.getTime(), end: b.endDate.getTime() });
+  const timelines = [...byUnit].map(([fleetId, list]) => new FleetTimeline(fleetId, list));
+
+  const best = pickTimeline(timelines, startDate.getTime(), endDate.getTime());
+  if (!best) return { fleetId: null, reason: 'Tous les véhicules sont occupés pour cette période' };
+  return { fleetId: best.timeline.fleetId, reason: `Assigné automatiquement (${describeCost(best.cost)})` };
+}
+
+// Choix + écriture de l'affectation. La contrainte d'exclusion (services/bookingOverlap) refuse l'écriture si un
+// autre réplica a affecté le même véhicule sur la période entre-temps : on relit alors la frise et on recommence,
+// sans le véhicule refusé (la relecture voit la réservation concurrente, désormais validée).
+export async function claimFleetUnit(prisma: PrismaClient, bookingId: string, vehicleId: string, agencyId: string, startDate: Date, endDate: Date) {
+  const rejected: string[] = [];
+  for (let attempt = 1; attempt <= CLAIM_ATTEMPTS; attempt++) {
+    const pick = await assignFleetUnit(prisma, bookingId, vehicleId, agencyId, startDate, endDate, rejected);
+    if (!pick.fleetId) return { ...pick, attempts: attempt, conflicts: rejected.length };
+    try {
+      await prisma.booking.update({
+        where: { id: bookingId },
+        data: { fleetVehicleId: pick.fleetId, assignmentType: 'AUTOMATIC', assignedAt: new Date() }
+      });
+      return { ...pick, attempts: attempt, conflicts: rejected.length };
+    } catch (error) {
+      if (!isBookingOverlapError(error)) throw error;
+      rejected.push(pick.fleetId);
+    }
+  }
+  return { fleetId: null, reason: 'Conflits d\'affectation répétés avec d\'autres réservations', attempts: CLAIM_ATTEMPTS, conflicts: rejected.length };
+}
+
+export interface PlanBooking {
+  id: string;
+  reference: string;
+  vehicleId: string;
+  fleetVehicleId: string | null;
+  start: number;
+  end: number;
+  movable: boolean;
+}
+
+export interface PlanMove {
+  bookingId: string;
+  reference: string;
+  fromFleetId: string | null;
+  toFleetId: string;
+}
+
+export interface PlanBookingRow {
+  id: string;
+  reference: string;
+  fleetVehicleId: string | null;
+  startDate: Date;
+  endDate: Date;
+  status: string;
+  checkedIn: boolean;
+  assignmentType: string | null;
+}
+
+// Réservation vue par le planificateur. Commencée (check-in, ACTIVE ou début passé) : épinglée à son véhicule,
+// quel que soit son statut. Sinon déplaçable, sauf assignation manuelle sur un véhicule toujours replanifiable.
+export function toPlanBooking(row: PlanBookingRow, vehicleId: string, now: Date, planningUnitIds: Set<string>): PlanBooking {
+  const started = row.checkedIn || row.status === 'ACTIVE' || row.startDate < now;
+  const onPlanningUnit = !!row.fleetVehicleId && planningUnitIds.has(row.fleetVehicleId);
+  return {
+    id: row.id, reference: row.reference, vehicleId,
+    fleetVehicleId: started || onPlanningUnit ? row.fleetVehicleId : null,
+    start: row.startDate.getTime(), end: row.endDate.getTime(),
+    movable: !started && (!onPlanningUnit || row.assignmentType !== 'MANUAL')
+  };
+}
+
+// Replanifie les réservations déplaçables sur les véhicules d'un modèle.
+// Les réservations fixes (commencées, assignation manuelle) restent en place, y compris sur un véhicule hors du
+// plan (en maintenance pendant une location en cours) ; les autres sont placées par ordre de début
+// (les plus longues d'abord à début égal), chacune dans le trou qui lui va le mieux.
+export function planAssignments(unitIds: string[], bookings: PlanBooking[]) {
+  const fixed = new Map<string, TimelineBooking[]>(unitIds.map(id => [id, []]));
+  const movable: PlanBooking[] = [];
+  for (const b of bookings) {
+    if (b.movable || !b.fleetVehicleId) movable.push(b);
+    else if (fixed.has(b.fleetVehicleId)) fixed.get(b.fleetVehicleId)!.push({ id: b.id, start: b.start, end: b.end });
+  }
+  const timelines = [...fixed].map(([fleetId, list]) => new FleetTimeline(fleetId, list));
+  movable.sort((a, b) => a.start - b.start || (b.end - b.start) - (a.end - a.start));
+
+  const moves: PlanMove[] = [];
+  const unplaced: PlanBooking[] = [];
+  for (const b of movable) {
+    const best = pickTimeline(timelines, b.start, b.end, b.fleetVehicleId);
+    if (!best) { unplaced.push(b); continue; }
+    best.timeline.insert({ id: b.id, start: b.start, end: b.end });
+    if (best.timeline.fleetId !== b.fleetVehicleId) {
+      moves.push({ bookingId: b.id, reference: b.reference, fromFleetId: b.fleetVehicleId, toFleetId: best.timeline.fleetId });
+    }
+  }
+  return { moves, unplaced, timelines };
+}
+
+// Fin la plus tardive des réservations déplaçables qui dépassent `windowEnd` (null : aucune ne dépasse)
+export function movableHorizon(bookings: PlanBooking[], windowEnd: number) {
+  let horizon: number | null = null;
+  for (const b of bookings) {
+    if (b.movable && b.end > windowEnd) horizon = Math.max(horizon ?? 0, periodEnd(b.start, b.end));
+  }
+  return horizon;
+}
+
+// Somme des trous (plafonnés) entre réservations consécutives de chaque véhicule : mesure de fragmentation
+export function fragmentation(timelines: FleetTimeline[], from: number, to: number) {
+  let total = 0;
+  for (const t of timelines) {
+    let cursor = from;
+    for (let i = 0; i < t.size; i++) {
+      if (t.ends[i] <= from || t.starts[i] >= to) continue;
+      const gap = t.starts[i] - cursor;
+      if (gap > 0 && cursor > from) total += Math.min(gap, GAP_HORIZON);
+      cursor = Math.max(cursor, t.ends[i]);
+    }
+  }
+  return total / DAY;
+}
+
+export interface ReoptimizeOptions {
+  days?: number;
+  vehicleId?: string;
+  apply?: boolean;
+  performedBy?: string;
+  now?: Date;
+}
+
+// Mode batch : replanifie les N prochains jours d'une agence (ex. un véhicule part en maintenance)
+export async function reoptimizeAgency(prisma: PrismaClient, agencyId: string, options: ReoptimizeOptions = {}) {
+  const now = options.now ?? new Date();
+  const days = Math.min(Math.max(options.days ?? 14, 1), 90);
+  const windowEnd = new Date(now.getTime() + days * DAY);
+
+  const units = await prisma.fleet.findMany({
+    where: { agencyId, ...(options.vehicleId ? { vehicleId: options.vehicleId } : {}) },
+    select: { id: true, vehicleId: true, status: true }
+  });
+  const usable = units.filter(u => PLANNING_FLEET_STATUSES.includes(u.status as string));
+  const unitVehicle = new Map(units.map(u => [u.id, u.vehicleId]));
+  const usableIds = new Set(usable.map(u => u.id));
+
+  // Réservations qui touchent la fenêtre (ou la précèdent de peu, pour les trous en bordure)
+  const rows = await prisma.booking.findMany({
+    where: {
+      agencyId,
+      status: { in: BLOCKING_BOOKING_STATUSES },
+      startDate: { lt: windowEnd },
+      endDate: { gt: new Date(now.getTime() - GAP_HORIZON) }
+    },
+    select: {
+      id: true, reference: true, fleetVehicleId: true, startDate: true, endDate: true, status: true, checkedIn: true, assignmentType: true,
+      items: { select: { vehicleId: true }, take: 1 }
+    }
+  });
+
+  const byModel = new Map<string, PlanBooking[]>();
+  const addBooking = (vehicleId: string, booking: PlanBooking) => {
+    if (!byModel.has(vehicleId)) byModel.set(vehicleId, []);
+    byModel.get(vehicleId)!.push(booking);
+  };
+  for (const r of rows) {
+    const vehicleId = (r.fleetVehicleId && unitVehicle.get(r.fleetVehicleId)) || r.items[0]?.vehicleId;
+    if (!vehicleId || (options.vehicleId && vehicleId !== options.vehicleId)) continue;
+    addBooking(vehicleId, toPlanBooking(r, vehicleId, now, usableIds));
+  }
+
+  // Réservations déplaçables qui débordent de la fenêtre : celles qui commencent après windowEnd sur ces véhicules
+  // ne sont pas replanifiées mais bloquent le placement (sinon conflit au commit, toute la réoptimisation annulée)
+  const horizon = movableHorizon([...byModel.values()].flat(), windowEnd.getTime());
+  if (horizon !== null) {
+    const blockers = await prisma.booking.findMany({
+      where: {
+        fleetVehicleId: { in: usable.map(u => u.id) },
+        status: { in: BLOCKING_BOOKING_STATUSES },
+        startDate: { gte: windowEnd, lt: new Date(horizon) }
+      },
+      select: { id: true, reference: true, fleetVehicleId: true, startDate: true, endDate: true }
+    });
+    for (const b of blockers) {
+      const vehicleId = unitVehicle.get(b.fleetVehicleId!)!;
+      if (options.vehicleId && vehicleId !== options.vehicleId) continue;
+      addBooking(vehicleId, {
+        id: b.id, reference: b.reference, vehicleId, fleetVehicleId: b.fleetVehicleId,
+        start: b.startDate.getTime(), end: b.endDate.getTime(), movable: false
+      });
+    }
+  }
+
+  const moves: (PlanMove & { vehicleId: string })[] = [];
+  const unplaced: { bookingId: string; reference: string; vehicleId: string }[] = [];
+  const fragmentationDays = { before: 0, after: 0 };
+  const originalFleet = new Map(rows.map(r => [r.id, r.fleetVehicleId]));
+
+  for (const [vehicleId, bookings] of byModel) {
+    const unitIds = usable.filter(u => u.vehicleId === vehicleId).map(u => u.id);
+    const current = unitIds.map(id => new FleetTimeline(id, bookings.filter(b => b.fleetVehicleId === id)));
+    fragmentationDays.before += fragmentation(current, now.getTime(), windowEnd.getTime());
+    const plan = planAssignments(unitIds, bookings);
+    fragmentationDays.after += fragmentation(plan.timelines, now.getTime(), windowEnd.getTime());
+    plan.moves.forEach(m => moves.push({ ...m, fromFleetId: originalFleet.get(m.bookingId) ?? null, vehicleId }));
+    plan.unplaced.forEach(b => unplaced.push({ bookingId: b.id, reference: b.reference, vehicleId }));
+  }
+
+  if (options.apply && moves.length) {
+    const performedBy = options.performedBy || 'SYSTEM';
+    // Contrainte d'exclusion vérifiée au commit : un échange de véhicules entre deux réservations est permis
+    await prisma.$transaction([prisma.$executeRaw`SET CONSTRAINTS ALL DEFERRED`, ...moves.flatMap(m => {
+      const writes: any[] = [prisma.booking.update({
+        where: { id: m.bookingId },
+        data: { fleetVehicleId: m.toFleetId, assignmentType: 'AUTOMATIC', assignedAt: new Date() }
+      })];
+      if (m.fromFleetId) {
+        writes.push(prisma.reservationReallocation.create({
+          data: {
+            bookingId: m.bookingId,
+            originalVehicleId: m.fromFleetId,
+            newVehicleId: m.toFleetId,
+            reason: usableIds.has(m.fromFleetId) ? 'OPERATIONAL' : 'MAINTENANCE_REQUIRED',
+            performedBy,
+            notes: 'Réoptimisation automatique de la flotte'
+          }
+        }));
+      }
+      return writes;
+    })]);
+  }
+
+  return {
+    agencyId,
+    from: now,
+    to: windowEnd,
+    applied: !!options.apply,
+    bookings: rows.length,
+    moves,
+    unplaced,
+    fragmentationDays: {
+      before: Math.round(fragmentationDays.before * 10) / 10,
+      after: Math.round(fragmentationDays.after * 10) / 10
+    }
+  };
+}
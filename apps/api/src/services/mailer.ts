@@ -0,0 +1,89 @@
+import type { Resend } from 'resend';
+import { lazyModule } from './startup';
+
+// Envoi des emails transactionnels : Resend en production, remplaçable par createStubMailer pour les benchmarks
+// (MAILER=stub : aucun email réel, latence simulée MAILER_STUB_LATENCY_MS).
+
+export interface MailAttachment {
+  filename: string;
+  content: string; // base64
+}
+
+export interface MailMessage {
+  from: string;
+  to: string | string[];
+  subject: string;
+  html: string;
+  attachments?: MailAttachment[];
+}
+
+export interface Mailer {
+  send(message: MailMessage, idempotencyKey?: string): Promise<{ id: string | null }>;
+}
+
+// Erreur renvoyée par le fournisseur ; permanent = inutile de réessayer (adresse ou contenu refusés)
+export class MailError extends Error {
+  constructor(message: string, public permanent = false) {
+    super(message);
+  }
+}
+
+// Codes d'erreur Resend temporaires : quota, limite de débit, panne côté Resend
+const TRANSIENT_RESEND_ERRORS = ['rate_limit_exceeded', 'daily_quota_exceeded', 'concurrent_idempotent_requests', 'application_error', 'internal_server_error'];
+
+export function resendMailer(resend: Resend): Mailer {
+  return {
+    async send(message, idempotencyKey) {
+      // Resend ne lève pas d'exception : l'erreur est dans la réponse
+      const { data, error } = await resend.emails.send(message, idempotencyKey ? { idempotencyKey } : undefined);
+      if (error) throw new MailError(error.message, !TRANSIENT_RESEND_ERRORS.includes(error.name));
+      return { id: data?.id ?? null };
+    }
+  };
+}
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Resend simulé : latence et erreurs temporaires paramétrables, idempotence respectée
+export function createStubMailer(options: { latencyMs?: number; failureRate?: number } = {}) {
+  const latencyMs = options.latencyMs ?? 200;
+  const delivered = new Map<string, MailMessage>();
+  const calls = { total: 0, sent: 0, failed: 0 };
+  const mailer: Mailer = {
+    async send(message, idempotencyKey) {
+      calls.total++;
+      await sleep(latencyMs * (0.5 + Math.random()));
+      if (Math.random() < (options.failureRate ?? 0)) {
+        calls.failed++;
+        throw new MailError('Rate limit exceeded');
+      }
+      const key = idempotencyKey || `stub-${calls.total}`;
+      if (!delivered.has(key)) {
+        delivered.set(key, message);
+        calls.sent++;
+      }
+      return { id: key };
+    }
+  };
+  return { mailer, calls, delivered };
+}
+
+let sharedMailer: Mailer | null = null;
+let sharedResend: Resend | null = null;
+
+const loadResend = lazyModule('resend', () => require('resend') as typeof import('resend'));
+
+// Client Resend partagé, créé au premier envoi (le SDK n'est pas chargé au démarrage)
+export function getResendClient() {
+  if (!sharedResend) sharedResend = new (loadResend().Resend)(process.env.RESEND_API_KEY);
+  return sharedResend;
+}
+
+export function getMailer() {
+  if (!sharedMailer) {
+    sharedMailer = process.env.MAILER === 'stub'
+      ? createStubMailer({ latencyMs: parseInt(process.env.MAILER_STUB_LATENCY_MS || '200', 10) }).mailer
+      : { send: (message, idempotencyKey) => resendMailer(getResendClient()).send(message, idempotencyKey) };
+  }
+  return sharedMailer;
+}
@@ -0,0 +1,198 @@
+import { PrismaClient, Prisma } from '@prisma/client';
+import { IngestedFile, decodeDataUrl, getMediaStore, ingestBuffer, readMedia } from './mediaStore';
+
+// Médias côté base : table MediaBlob (type, taille, vignette), URLs /api/media/<hash> enregistrées dans les lignes,
+// conversion des images base64 encore envoyées dans le JSON (anciens clients, tablette) et migration de l'existant.
+
+// Colonnes qui reçoivent des photos / signatures
+export const MEDIA_FIELDS: Record<string, string[]> = {
+  Booking: ['signatureUrl', 'photoFront', 'photoLeft', 'photoRight', 'photoRear', 'photoCounter', 'idCardUrl', 'idCardVersoUrl', 'licenseUrl', 'licenseVersoUrl'],
+  RentalContract: ['customerSignature', 'operatorSignature', 'photoFront', 'photoLeft', 'photoRight', 'photoRear', 'photoCounter', 'customerIdCardUrl', 'customerIdCardVersoUrl', 'customerLicenseUrl'],
+  TabletSession: ['signature'],
+  FleetInspection: ['customerSignature'],
+  InspectionPhoto: ['photoUrl', 'photoThumbnail'],
+  Customer: ['idDocumentUrl', 'licenseDocumentUrl']
+};
+
+export const MEDIA_MAX_BYTES = parseInt(process.env.MEDIA_MAX_MB || '15', 10) * 1024 * 1024;
+const THUMBNAIL_SIZE = 320;
+
+// Origine publique des URLs : MEDIA_PUBLIC_URL (à définir dès que les applications sont servies depuis une autre
+// origine que l'API), sinon chemins relatifs /api/media/<hash>. Jamais déduite des en-têtes Host / X-Forwarded-Host
+// d'une requête : n'importe quel client les choisit, et l'URL est enregistrée en base.
+export const mediaOrigin = (process.env.MEDIA_PUBLIC_URL || '').replace(/\/$/, '');
+
+export const mediaUrl = (hash: string) => `${mediaOrigin}/api/media/${hash}`;
+export const thumbnailUrl = (hash: string) => `${mediaOrigin}/api/media/${hash}/thumb`;
+
+// Enregistre le fichier reçu (déjà haché) dans le stockage et la table, puis programme sa vignette
+export async function saveMedia(prisma: PrismaClient, file: IngestedFile) {
+  await getMediaStore().putFile(file.hash, file.file, file.contentType);
+  const blob = await prisma.mediaBlob.upsert({
+    where: { hash: file.hash },
+    create: { hash: file.hash, contentType: file.contentType, size: file.size, thumbnailStatus: file.contentType.startsWith('image/') ? 'PENDING' : 'SKIPPED' },
+    update: {}
+  });
+  if (blob.thumbnailStatus === 'PENDING') getThumbnailQueue(prisma).enqueue(blob.hash);
+  return { hash: blob.hash, url: mediaUrl(blob.hash), thumbnailUrl: thumbnailUrl(blob.hash), contentType: blob.contentType, size: blob.size };
+}
+
+export async function storeDataUrl(prisma: PrismaClient, value: string) {
+  const decoded = decodeDataUrl(value);
+  if (!decoded) return null;
+  const file = await ingestBuffer(decoded.buffer);
+  return (await saveMedia(prisma, file)).url;
+}
+
+const isDataUrl = (value: unknown): value is string => typeof value === 'string' && value.startsWith('data:');
+
+async function offloadData(prisma: PrismaClient, data: any, fields: string[]) {
+  if (!data || typeof data !== 'object') return;
+  for (const row of Array.isArray(data) ? data : [data]) {
+    for (const field of fields) {
+      const value = row[field]?.set ?? row[field];
+      if (isDataUrl(value)) row[field] = await storeDataUrl(prisma, value) ?? value;
+    }
+  }
+}
+
+// Middleware Prisma : une image base64 écrite dans une colonne média part dans le stockage, la ligne garde l'URL
+export function trackInlineMedia(client: PrismaClient) {
+  client.$use(async (params: Prisma.MiddlewareParams, next) => {
+    const fields = params.model && MEDIA_FIELDS[params.model];
+    if (fields && params.args) {
+      if (['create', 'update', 'updateMany', 'createMany'].includes(params.action)) await offloadData(client, params.args.data, fields);
+      if (params.action === 'upsert') {
+        await offloadData(client, params.args.create, fields);
+        await offloadData(client, params.args.update, fields);
+      }
+    }
+    return next(params);
+  });
+}
+
+// Migration des images base64 déjà en base, par lots : relançable, ne reprend que les lignes encore en data:
+export async function migrateInlineMedia(prisma: PrismaClient, options: { batchSize?: number; dryRun?: boolean; maxRows?: number } = {}) {
+  const batchSize = options.batchSize ?? 50;
+  const maxRows = options.maxRows ?? 1000;
+  const report: Record<string, { rows: number; bytes: number; invalid: number }> = {};
+  let processed = 0;
+  for (const [model, fields] of Object.entries(MEDIA_FIELDS)) {
+    const delegate = (prisma as any)[model[0].toLowerCase() + model.slice(1)];
+    for (const field of fields) {
+      const key = `${model}.${field}`;
+      report[key] = { rows: 0, bytes: 0, invalid: 0 };
+      let cursor: string | undefined;
+      while (processed < maxRows) {
+        const rows: any[] = await delegate.findMany({
+          where: { [field]: { startsWith: 'data:' }, ...(cursor ? { id: { gt: cursor } } : {}) },
+          select: { id: true, [field]: true },
+          orderBy: { id: 'asc' },
+          take: Math.min(batchSize, maxRows - processed)
+        });
+        if (!rows.length) break;
+        for (const row of rows) {
+          report[key].rows++;
+          report[key].bytes += row[field].length;
+          if (options.dryRun) continue;
+          const url = await storeDataUrl(prisma, row[field]);
+          // Donnée illisible (pas en base64) : laissée telle quelle, le curseur passe à la suite
+          if (url) await delegate.update({ where: { id: row.id }, data: { [field]: url } });
+          else report[key].invalid++;
+        }
+        processed += rows.length;
+        cursor = rows[rows.length - 1].id;
+      }
+    }
+  }
+  for (const key of Object.keys(report)) if (!report[key].rows) delete report[key];
+  return { dryRun: !!options.dryRun, processed, complete: processed < maxRows, fields: report };
+}
+
+// Vignettes générées en arrière-plan (jamais pendant la requête d'envoi), une à la fois.
+// Nécessite le module optionnel sharp ; sans lui, les vignettes sont marquées SKIPPED et /thumb sert l'original.
+let sharpModule: any;
+function loadSharp() {
+  if (sharpModule === undefined) {
+    try {
+      sharpModule = require('sharp');
+    } catch {
+      sharpModule = null;
+      console.warn('sharp non installé : vignettes désactivées');
+    }
+  }
+  return sharpModule;
+}
+
+export class ThumbnailQueue {
+  private queue: string[] = [];
+  private queued = new Set<string>();
+  private running = false;
+
+  constructor(private prisma: PrismaClient) {}
+
+  enqueue(hash: string) {
+    if (this.queued.has(hash)) return;
+    this.queued.add(hash);
+    this.queue.push(hash);
+    if (!this.running) setImmediate(() => this.drain());
+  }
+
+  // Reprise des vignettes en attente (redémarrage pendant le traitement)
+  async resume() {
+    const pending = await this.prisma.mediaBlob.findMany({ where: { thumbnailStatus: 'PENDING' }, select: { hash: true }, take: 1000 });
+    pending.forEach(p => this.enqueue(p.hash));
+    return pending.length;
+  }
+
+  stats() {
+    return { queued: this.queue.length, running: this.running };
+  }
+
+  private async drain() {
+    if (this.running) return;
+    this.running = true;
+    while (this.queue.length) {
+      const hash = this.queue.shift()!;
+      try {
+        await this.generate(hash);
+      } catch (e) {
+        console.error('Thumbnail error:', hash, e);
+        await this.prisma.mediaBlob.update({ where: { hash }, data: { thumbnailStatus: 'FAILED' } }).catch(() => {});
+      }
+      this.queued.delete(hash);
+    }
+    this.running = false;
+  }
+
+  private async generate(hash: string) {
+    const sharp = loadSharp();
+    if (!sharp) {
+      await this.prisma.mediaBlob.update({ where: { hash }, data: { thumbnailStatus: 'SKIPPED' } });
+      return;
+    }
+    const original = await readMedia(hash);
+    if (!original) throw new Error('Blob not found');
+    const thumbnail: Buffer = await sharp(original).rotate().resize(THUMBNAIL_SIZE, THUMBNAIL_SIZE, { fit: 'inside', withoutEnlargement: true }).jpeg({ quality: 70 }).toBuffer();
+    const file = await ingestBuffer(thumbnail);
+    await getMediaStore().putFile(file.hash, file.file, file.contentType);
+    await this.prisma.mediaBlob.upsert({
+      where: { hash: file.hash },
+      create: { hash: file.hash, contentType: file.contentType, size: file.size, thumbnailStatus: 'SKIPPED' },
+      update: {}
+    });
+    await this.prisma.mediaBlob.update({ where: { hash }, data: { thumbnailHash: file.hash, thumbnailStatus: 'READY' } });
+    // Les photos d'inspection ont leur propre colonne de vignette
+    await this.prisma.inspectionPhoto.updateMany({
+      where: { photoUrl: { endsWith: `/api/media/${hash}` }, photoThumbnail: null },
+      data: { photoThumbnail: thumbnailUrl(hash) }
+    });
+  }
+}
+
+let sharedQueue: ThumbnailQueue | null = null;
+
+export function getThumbnailQueue(prisma: PrismaClient) {
+  if (!sharedQueue) sharedQueue = new ThumbnailQueue(prisma);
+  return sharedQueue;
+}
@@ -0,0 +1,219 @@
+import crypto from 'crypto';
+import fs from 'fs';
+import os from 'os';
+import path from 'path';
+import { Readable, Transform } from 'stream';
+import { pipeline } from 'stream/promises';
+
+// Stockage des médias (photos, signatures, documents) par empreinte SHA-256 : un même fichier n'est stocké qu'une fois
+// et son URL /api/media/<hash> ne change jamais (cache navigateur immuable).
+// MEDIA_STORE=local (défaut, dossier MEDIA_DIR) ou s3 (S3_ENDPOINT, S3_BUCKET, S3_REGION, S3_ACCESS_KEY_ID, S3_SECRET_ACCESS_KEY ;
+// tout stockage compatible S3 : AWS, R2, MinIO...). Sans dépendance Prisma : utilisé aussi par les threads PDF.
+
+export const MEDIA_HASH = /^[a-f0-9]{64}$/;
+const MEDIA_URL = /\/api\/media\/([a-f0-9]{64})(?:\/thumb)?(?:[?#].*)?$/;
+
+export class MediaTooLargeError extends Error {
+  constructor(public maxBytes: number) {
+    super(`File exceeds ${Math.round(maxBytes / 1024 / 1024)} MB`);
+  }
+}
+
+export interface MediaStore {
+  has(hash: string): Promise<boolean>;
+  // Déplace (ou copie) le fichier temporaire vers le stockage
+  putFile(hash: string, file: string, contentType: string): Promise<void>;
+  open(hash: string): Promise<Readable | null>;
+}
+
+const shard = (hash: string) => path.join(hash.slice(0, 2), hash.slice(2, 4), hash);
+
+export class LocalMediaStore implements MediaStore {
+  constructor(private dir: string) {}
+
+  async has(hash: string) {
+    return fs.promises.access(path.join(this.dir, shard(hash))).then(() => true, () => false);
+  }
+
+  async putFile(hash: string, file: string) {
+    const target = path.join(this.dir, shard(hash));
+    if (await this.has(hash)) return fs.promises.rm(file, { force: true });
+    await fs.promises.mkdir(path.dirname(target), { recursive: true });
+    try {
+      await fs.promises.rename(file, target);
+    } catch (e: any) {
+      // Dossier temporaire sur un autre volume : copie puis renommage atomique
+      if (e.code !== 'EXDEV') throw e;
+      const partial = target + '.' + process.pid + '.tmp';
+      await fs.promises.copyFile(file, partial);
+      await fs.promises.rename(partial, target);
+      await fs.promises.rm(file, { force: true });
+    }
+  }
+
+  async open(hash: string) {
+    if (!MEDIA_HASH.test(hash) || !(await this.has(hash))) return null;
+    return fs.createReadStream(path.join(this.dir, shard(hash)));
+  }
+}
+
+interface S3Config {
+  endpoint: string;
+  bucket: string;
+  region: string;
+  accessKeyId: string;
+  secretAccessKey: string;
+}
+
+const EMPTY_SHA256 = crypto.createHash('sha256').update('').digest('hex');
+const hmac = (key: crypto.BinaryLike, value: string) => crypto.createHmac('sha256', key).update(value).digest();
+
+// Requêtes S3 signées (AWS Signature V4), URLs "path-style" : <endpoint>/<bucket>/<clé>
+export class S3MediaStore implements MediaStore {
+  constructor(private config: S3Config) {}
+
+  private async request(method: 'GET' | 'HEAD' | 'PUT', hash: string, body?: Buffer, contentType?: string) {
+    const url = new URL(`${this.config.endpoint.replace(/\/$/, '')}/${this.config.bucket}/media/${shard(hash).split(path.sep).join('/')}`);
+    const amzDate = new Date().toISOString().replace(/[-:]/g, '').replace(/\.\d{3}/, '');
+    const day = amzDate.slice(0, 8);
+    // Le contenu est adressé par son SHA-256 : c'est aussi l'empreinte de charge utile signée
+    const payloadHash = method === 'PUT' ? hash : EMPTY_SHA256;
+    const headers: Record<string, string> = { host: url.host, 'x-amz-content-sha256': payloadHash, 'x-amz-date': amzDate };
+    if (contentType) headers['content-type'] = contentType;
+    const names = Object.keys(headers).sort();
+    const canonical = [method, url.pathname, '', names.map(n => `${n}:${headers[n]}\n`).join(''), names.join(';'), payloadHash].join('\n');
+    const scope = `${day}/${this.config.region}/s3/aws4_request`;
+    const toSign = ['AWS4-HMAC-SHA256', amzDate, scope, crypto.createHash('sha256').update(canonical).digest('hex')].join('\n');
+    let key: Buffer = hmac('AWS4' + this.config.secretAccessKey, day);
+    for (const part of [this.config.region, 's3', 'aws4_request']) key = hmac(key, part);
+    const signature = crypto.createHmac('sha256', key).update(toSign).digest('hex');
+    const { host, ...sent } = headers;
+    return fetch(url, {
+      method,
+      body,
+      headers: {
+        ...sent,
+        authorization: `AWS4-HMAC-SHA256 Credential=${this.config.accessKeyId}/${scope}, SignedHeaders=${names.join(';')}, Signature=${signature}`
+      }
+    });
+  }
+
+  async has(hash: string) {
+    const res = await this.request('HEAD', hash);
+    if (res.status === 404) return false;
+    if (!res.ok) throw new Error(`S3 HEAD failed: ${res.status}`);
+    return true;
+  }
+
+  async putFile(hash: string, file: string, contentType: string) {
+    if (!(await this.has(hash))) {
+      const res = await this.request('PUT', hash, await fs.promises.readFile(file), contentType);
+      if (!res.ok) throw new Error(`S3 PUT failed: ${res.status} ${await res.text()}`);
+    }
+    await fs.promises.rm(file, { force: true });
+  }
+
+  async open(hash: string) {
+    if (!MEDIA_HASH.test(hash)) return null;
+    const res = await this.request('GET', hash);
+    if (res.status === 404) return null;
+    if (!res.ok || !res.body) throw new Error(`S3 GET failed: ${res.status}`);
+    return Readable.fromWeb(res.body as any);
+  }
+}
+
+export interface IngestedFile {
+  hash: string;
+  size: number;
+  contentType: string;
+  file: string;
+}
+
+const SIGNATURES: [number[], string][] = [
+  [[0xff, 0xd8, 0xff], 'image/jpeg'],
+  [[0x89, 0x50, 0x4e, 0x47], 'image/png'],
+  [[0x47, 0x49, 0x46, 0x38], 'image/gif'],
+  [[0x25, 0x50, 0x44, 0x46], 'application/pdf']
+];
+
+// Types servis tels quels par /api/media : images et PDF reconnus à leur signature
+export const MEDIA_TYPES = ['image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/heic', 'application/pdf'];
+
+// Type réel d'après les premiers octets. Le type annoncé par le client n'est jamais repris : un text/html ou un
+// SVG envoyé comme "photo" serait servi sans authentification depuis l'origine de l'API (XSS stocké).
+export function sniffContentType(head: Buffer) {
+  for (const [bytes, type] of SIGNATURES) if (bytes.every((b, i) => head[i] === b)) return type;
+  if (head.toString('latin1', 0, 4) === 'RIFF' && head.toString('latin1', 8, 12) === 'WEBP') return 'image/webp';
+  const ftyp = head.toString('latin1', 4, 12);
+  if (ftyp === 'ftypheic' || ftyp === 'ftypheix' || ftyp === 'ftypmif1') return 'image/heic';
+  return 'application/octet-stream';
+}
+
+// Écrit le flux dans un fichier temporaire en calculant l'empreinte au passage : rien n'est gardé en mémoire
+export async function ingestStream(source: Readable, maxBytes: number): Promise<IngestedFile> {
+  const file = path.join(os.tmpdir(), 'media-' + crypto.randomBytes(8).toString('hex'));
+  const hash = crypto.createHash('sha256');
+  let size = 0;
+  let head = Buffer.alloc(0);
+  const meter = new Transform({
+    transform(chunk: Buffer, _encoding, callback) {
+      size += chunk.length;
+      if (size > maxBytes) return callback(new MediaTooLargeError(maxBytes));
+      if (head.length < 16) head = Buffer.concat([head, chunk.subarray(0, 16 - head.length)]);
+      hash.update(chunk);
+      callback(null, chunk);
+    }
+  });
+  try {
+    await pipeline(source, meter, fs.createWriteStream(file));
+  } catch (e) {
+    await fs.promises.rm(file, { force: true });
+    // Vider le reste du flux (ex. partie multipart) pour ne pas bloquer la requête
+    source.resume();
+    throw e;
+  }
+  return { hash: hash.digest('hex'), size, contentType: sniffContentType(head), file };
+}
+
+export async function ingestBuffer(buffer: Buffer) {
+  return ingestStream(Readable.from([buffer]), Infinity);
+}
+
+// "data:image/png;base64,...." -> contenu binaire et type
+export function decodeDataUrl(value: string) {
+  const match = /^data:([\w.+-]+\/[\w.+-]+)?(?:;[\w-]+=[^;,]*)*;base64,/.exec(value);
+  if (!match) return null;
+  return { contentType: match[1] || 'application/octet-stream', buffer: Buffer.from(value.slice(match[0].length), 'base64') };
+}
+
+export function mediaHashFromUrl(url: string | null | undefined) {
+  return url ? MEDIA_URL.exec(url)?.[1] ?? null : null;
+}
+
+export async function readStream(stream: Readable) {
+  const chunks: Buffer[] = [];
+  for await (const chunk of stream) chunks.push(chunk as Buffer);
+  return Buffer.concat(chunks);
+}
+
+export async function readMedia(hash: string) {
+  const stream = await getMediaStore().open(hash);
+  return stream ? readStream(stream) : null;
+}
+
+let sharedStore: MediaStore | null = null;
+
+export function getMediaStore() {
+  if (!sharedStore) {
+    sharedStore = process.env.MEDIA_STORE === 's3'
+      ? new S3MediaStore({
+        endpoint: process.env.S3_ENDPOINT || 'https://s3.amazonaws.com',
+        bucket: process.env.S3_BUCKET || '',
+        region: process.env.S3_REGION || 'us-east-1',
+        accessKeyId: process.env.S3_ACCESS_KEY_ID || '',
+        secretAccessKey: process.env.S3_SECRET_ACCESS_KEY || ''
+      })
+      : new LocalMediaStore(process.env.MEDIA_DIR || path.join(process.cwd(), 'media'));
+  }
+  return sharedStore;
+}
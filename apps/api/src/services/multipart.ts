@@ -0,0 +1,156 @@
+import { PassThrough, Readable } from 'stream';
+
+// Lecture multipart/form-data au fil de l'eau : chaque fichier est exposé comme un flux pendant la réception,
+// rien n'est chargé en entier en mémoire (contrairement au JSON base64 de 50 Mo).
+// Champs texte limités à 64 Ko, en-têtes de partie à 16 Ko.
+
+export class MultipartError extends Error {
+  constructor(message: string, public status = 400) {
+    super(message);
+  }
+}
+
+export interface MultipartFile {
+  field: string;
+  filename: string;
+  contentType: string;
+  stream: Readable;
+}
+
+export interface MultipartLimits {
+  files?: number;
+  fieldBytes?: number;
+}
+
+const HEADER_END = Buffer.from('\r\n\r\n');
+const MAX_HEADER_BYTES = 16 * 1024;
+
+export function multipartBoundary(contentType: string | undefined) {
+  const match = /^multipart\/form-data;.*boundary=(?:"([^"]+)"|([^;\s]+))/i.exec(contentType || '');
+  return match ? match[1] || match[2] : null;
+}
+
+function parsePartHeaders(raw: string) {
+  const headers: Record<string, string> = {};
+  for (const line of raw.split('\r\n')) {
+    const i = line.indexOf(':');
+    if (i > 0) headers[line.slice(0, i).trim().toLowerCase()] = line.slice(i + 1).trim();
+  }
+  const disposition = headers['content-disposition'] || '';
+  const param = (name: string) => new RegExp(`;\\s*${name}="([^"]*)"`, 'i').exec(disposition)?.[1];
+  return { name: param('name'), filename: param('filename'), contentType: headers['content-type'] || 'application/octet-stream' };
+}
+
+// onFile consomme le flux du fichier ; la promesse se résout avec les champs texte une fois tous les fichiers traités
+export function parseMultipart(req: Readable & { headers: Record<string, any> }, onFile: (file: MultipartFile) => Promise<void>, limits: MultipartLimits = {}) {
+  const boundary = multipartBoundary(req.headers['content-type']);
+  if (!boundary) return Promise.reject(new MultipartError('Expected multipart/form-data'));
+  const maxFiles = limits.files ?? 10;
+  const maxFieldBytes = limits.fieldBytes ?? 64 * 1024;
+  const delimiter = Buffer.from('\r\n--' + boundary);
+
+  return new Promise<Record<string, string>>((resolve, reject) => {
+    const fields: Record<string, string> = {};
+    const pending: Promise<void>[] = [];
+    // Le premier délimiteur n'est pas précédé de CRLF : on l'ajoute pour un seul motif de recherche
+    let buffer = Buffer.from('\r\n');
+    let state: 'preamble' | 'headers' | 'body' | 'done' = 'preamble';
+    let fileCount = 0;
+    let part: { stream?: PassThrough; field?: string; chunks: Buffer[]; size: number } | null = null;
+    let failed = false;
+
+    const fail = (error: Error) => {
+      if (failed) return;
+      failed = true;
+      part?.stream?.destroy(error);
+      req.resume();
+      reject(error);
+    };
+
+    const emit = (data: Buffer) => {
+      if (!part || !data.length) return;
+      if (part.stream) {
+        // Contre-pression : on suspend la lecture de la requête tant que le fichier n'a pas absorbé le morceau
+        if (!part.stream.write(data)) {
+          req.pause();
+          part.stream.once('drain', () => req.resume());
+        }
+      } else {
+        part.size += data.length;
+        if (part.size > maxFieldBytes) throw new MultipartError('Field too large', 413);
+        part.chunks.push(data);
+      }
+    };
+
+    const endPart = () => {
+      if (!part) return;
+      if (part.stream) part.stream.end();
+      else if (part.field) fields[part.field] = Buffer.concat(part.chunks).toString('utf8');
+      part = null;
+    };
+
+    const consume = () => {
+      for (;;) {
+        if (state === 'done') return;
+        if (state === 'headers') {
+          const end = buffer.indexOf(HEADER_END);
+          if (end < 0) {
+            if (buffer.length > MAX_HEADER_BYTES) throw new MultipartError('Part headers too large');
+            return;
+          }
+          const headers = parsePartHeaders(buffer.toString('utf8', 0, end));
+          buffer = buffer.subarray(end + HEADER_END.length);
+          state = 'body';
+          if (headers.filename !== undefined) {
+            if (++fileCount > maxFiles) throw new MultipartError('Too many files', 413);
+            const stream = new PassThrough();
+            part = { stream, chunks: [], size: 0 };
+            const done = onFile({ field: headers.name || 'file', filename: headers.filename, contentType: headers.contentType, stream });
+            // Une erreur de traitement d'un fichier arrête la lecture sans attendre la fin de la requête
+            done.catch(fail);
+            pending.push(done);
+          } else {
+            part = { field: headers.name, chunks: [], size: 0 };
+          }
+          continue;
+        }
+        const index = buffer.indexOf(delimiter);
+        if (index < 0) {
+          // Garder de quoi reconnaître un délimiteur coupé entre deux morceaux
+          const keep = Math.min(buffer.length, delimiter.length - 1);
+          if (state === 'body') emit(buffer.subarray(0, buffer.length - keep));
+          buffer = buffer.subarray(buffer.length - keep);
+          return;
+        }
+        if (state === 'body') emit(buffer.subarray(0, index));
+        buffer = buffer.subarray(index);
+        if (buffer.length < delimiter.length + 2) return;
+        const suffix = buffer.toString('latin1', delimiter.length, delimiter.length + 2);
+        endPart();
+        if (suffix === '--') {
+          state = 'done';
+          return;
+        }
+        if (suffix !== '\r\n') throw new MultipartError('Malformed multipart body');
+        buffer = buffer.subarray(delimiter.length + 2);
+        state = 'headers';
+      }
+    };
+
+    req.on('data', (chunk: Buffer) => {
+      if (failed) return;
+      buffer = buffer.length ? Buffer.concat([buffer, chunk]) : chunk;
+      try {
+        consume();
+      } catch (e: any) {
+        fail(e);
+      }
+    });
+    req.on('error', fail);
+    req.on('end', () => {
+      if (failed) return;
+      if (state !== 'done') return fail(new MultipartError('Unexpected end of multipart body'));
+      Promise.all(pending).then(() => resolve(fields), fail);
+    });
+  });
+}
@@ -0,0 +1,253 @@
+import { Prisma, PrismaClient } from '@prisma/client';
+import { ChangeFeed, getChangeFeed } from './changeFeed';
+import { KEYSET_ORDER_BY, decodeCursor, keysetWhere, toPage } from './pagination';
+
+// Boîte de réception des notifications (table Notification) :
+// - compteurs de non lues par utilisateur (NotificationCounter, clé '*' pour toutes les notifications), modifiés
+//   dans la même transaction que les notifications : le badge est une lecture par clé primaire, quel que soit
+//   le volume de l'historique, au lieu d'un COUNT(*) à chaque affichage
+// - nouveaux compteurs diffusés en SSE (événement "unread") et renvoyés par /api/sync : plus de scrutation
+// - liste paginée par curseur sur (userId, createdAt, id)
+// - rétention : les notifications lues au-delà de NOTIFICATION_RETENTION_DAYS (et toutes au-delà de
+//   NOTIFICATION_UNREAD_RETENTION_DAYS) passent par lots dans NotificationArchive
+// Toute écriture sur Notification doit passer par ce service, sinon les compteurs dérivent (rebuildCounters les recalcule).
+
+export const ALL_KEY = '*';
+
+export interface NotificationInput {
+  userId?: string | null;
+  title: string;
+  body: string;
+  icon?: string | null;
+  data?: Prisma.InputJsonValue;
+}
+
+export interface InboxOptions {
+  retentionDays?: number;
+  unreadRetentionDays?: number;
+  archiveDays?: number;
+  batchSize?: number;
+  intervalMs?: number;
+}
+
+// Compteurs modifiés par une écriture (clé -> non lues), tels que diffusés aux clients
+export type UnreadCounts = Record<string, number>;
+
+interface WriteResult {
+  changed: number;
+  counts: UnreadCounts | null;
+}
+
+// Incréments (clé, n) agrégés par clé puis appliqués dans l'ordre des clés : deux écritures concurrentes
+// verrouillent les compteurs dans le même ordre (pas d'interblocage sur '*')
+const applyDeltas = (deltas: Prisma.Sql) => Prisma.sql`
+  INSERT INTO "NotificationCounter" ("key", "unread", "updatedAt")
+  SELECT "key", sum("n")::int, (now() AT TIME ZONE 'UTC') FROM (${deltas}) d
+  GROUP BY "key" HAVING sum("n") <> 0 ORDER BY "key"
+  ON CONFLICT ("key") DO UPDATE
+  SET "unread" = GREATEST(0, "NotificationCounter"."unread" + EXCLUDED."unread"), "updatedAt" = EXCLUDED."updatedAt"
+  RETURNING "key", "unread"`;
+
+// Lignes non lues sorties de la boîte par la CTE `rows` : -1 pour leur utilisateur et pour '*'
+const unreadRemoved = (rows: string) => Prisma.sql`
+  SELECT "userId" AS "key", -1 AS "n" FROM ${Prisma.raw(rows)} WHERE NOT "wasRead" AND "userId" IS NOT NULL
+  UNION ALL SELECT ${ALL_KEY}, -1 FROM ${Prisma.raw(rows)} WHERE NOT "wasRead"`;
+
+// Résultat commun des écritures : nombre de lignes touchées et compteurs modifiés
+const WRITE_RESULT = Prisma.sql`
+  SELECT (SELECT count(*) FROM changed)::int AS "changed",
+         (SELECT json_object_agg("key", "unread") FROM counted) AS "counts"`;
+
+export class NotificationInbox {
+  private timer: NodeJS.Timeout | null = null;
+  private running = false;
+  readonly retentionDays: number;
+  readonly unreadRetentionDays: number;
+  readonly archiveDays: number;
+  private batchSize: number;
+  private intervalMs: number;
+
+  constructor(private prisma: PrismaClient, private feed: ChangeFeed = getChangeFeed(), options: InboxOptions = {}) {
+    this.retentionDays = options.retentionDays ?? parseInt(process.env.NOTIFICATION_RETENTION_DAYS || '30', 10);
+    this.unreadRetentionDays = Math.max(this.retentionDays, options.unreadRetentionDays ?? parseInt(process.env.NOTIFICATION_UNREAD_RETENTION_DAYS || '90', 10));
+    // 0 : archive conservée indéfiniment
+    this.archiveDays = options.archiveDays ?? parseInt(process.env.NOTIFICATION_ARCHIVE_DAYS || '0', 10);
+    this.batchSize = options.batchSize ?? 1000;
+    this.intervalMs = options.intervalMs ?? 60 * 60 * 1000;
+  }
+
+  async create(notifications: NotificationInput | NotificationInput[]) {
+    const list = Array.isArray(notifications) ? notifications : [notifications];
+    if (!list.length) return { count: 0, counts: {} as UnreadCounts };
+    const deltas = new Map<string, number>([[ALL_KEY, list.length]]);
+    list.forEach(n => { if (n.userId) deltas.set(n.userId, (deltas.get(n.userId) || 0) + 1); });
+    const values = Prisma.join([...deltas].map(([key, n]) => Prisma.sql`(${key}::text, ${n}::int)`));
+    const [{ count }, counted] = await this.prisma.$transaction([
+      this.prisma.notification.createMany({
+        data: list.map(n => ({ userId: n.userId ?? null, title: n.title, body: n.body, icon: n.icon ?? null, data: n.data ?? {} }))
+      }),
+      this.prisma.$queryRaw<{ key: string; unread: number }[]>(applyDeltas(Prisma.sql`SELECT * FROM (VALUES ${values}) v("key", "n")`))
+    ]);
+    const counts = Object.fromEntries(counted.map(c => [c.key, c.unread]));
+    this.emitCounts(counts);
+    return { count, counts };
+  }
+
+  async markRead(id: string) {
+    const result = await this.write(Prisma.sql`
+      WITH changed AS (
+        UPDATE "Notification" SET "isRead" = true WHERE "id" = ${id} AND NOT "isRead"
+        RETURNING "userId", false AS "wasRead"
+      ), counted AS (${applyDeltas(unreadRemoved('changed'))})
+      ${WRITE_RESULT}`);
+    if (result.changed) this.feed.publish('notification', id, 'upsert');
+    return result;
+  }
+
+  // userId absent : toutes les notifications
+  async markAllRead(userId?: string | null) {
+    const result = await this.write(Prisma.sql`
+      WITH changed AS (
+        UPDATE "Notification" SET "isRead" = true
+        WHERE NOT "isRead" ${userId ? Prisma.sql`AND "userId" = ${userId}` : Prisma.empty}
+        RETURNING "userId", false AS "wasRead"
+      ), counted AS (${applyDeltas(unreadRemoved('changed'))})
+      ${WRITE_RESULT}`);
+    if (result.changed) this.feed.publish('notification', '', 'upsert');
+    return result;
+  }
+
+  async remove(id: string) {
+    const result = await this.write(Prisma.sql`
+      WITH changed AS (
+        DELETE FROM "Notification" WHERE "id" = ${id}
+        RETURNING "userId", "isRead" AS "wasRead"
+      ), counted AS (${applyDeltas(unreadRemoved('changed'))})
+      ${WRITE_RESULT}`);
+    if (result.changed) this.feed.publish('notification', id, 'delete');
+    return result;
+  }
+
+  async unreadCount(userId?: string | null) {
+    const counter = await this.prisma.notificationCounter.findUnique({ where: { key: userId || ALL_KEY }, select: { unread: true } });
+    return Math.max(0, counter?.unread ?? 0);
+  }
+
+  // Page (createdAt DESC, id DESC) après `cursor` (decodeCursor), servie par l'index (userId, createdAt, id)
+  async list({ userId, cursor, limit }: { userId?: string | null; cursor: ReturnType<typeof decodeCursor>; limit: number }) {
+    const rows = await this.prisma.notification.findMany({
+      where: { ...(userId ? { userId } : {}), ...keysetWhere(cursor) },
+      orderBy: KEYSET_ORDER_BY,
+      take: limit + 1
+    });
+    return toPage(rows, limit);
+  }
+
+  // Recalcul complet (démarrage sans compteurs, dérive après une écriture hors service).
+  // Le verrou bloque les écritures de compteurs pendant le recalcul : une notification créée en parallèle
+  // n'est pas encore visible (transaction en cours) et appliquera son incrément après, sur la valeur recalculée.
+  async rebuildCounters() {
+    const [, , counted] = await this.prisma.$transaction([
+      this.prisma.$executeRaw`LOCK TABLE "NotificationCounter" IN SHARE ROW EXCLUSIVE MODE`,
+      this.prisma.$executeRaw`UPDATE "NotificationCounter" SET "unread" = 0, "updatedAt" = (now() AT TIME ZONE 'UTC') WHERE "unread" <> 0`,
+      this.prisma.$queryRaw<{ key: string; unread: number }[]>`
+        INSERT INTO "NotificationCounter" ("key", "unread", "updatedAt")
+        SELECT "key", "unread", (now() AT TIME ZONE 'UTC') FROM (
+          SELECT "userId" AS "key", count(*)::int AS "unread" FROM "Notification" WHERE NOT "isRead" AND "userId" IS NOT NULL GROUP BY "userId"
+          UNION ALL SELECT ${ALL_KEY}, count(*)::int FROM "Notification" WHERE NOT "isRead"
+        ) c ORDER BY "key"
+        ON CONFLICT ("key") DO UPDATE SET "unread" = EXCLUDED."unread", "updatedAt" = EXCLUDED."updatedAt"
+        RETURNING "key", "unread"`
+    ]);
+    const counts = Object.fromEntries(counted.map(c => [c.key, c.unread]));
+    this.emitCounts(counts);
+    return counts;
+  }
+
+  // Compteurs absents (première mise en service) : recalcul à partir de l'historique
+  async ensureCounters() {
+    const existing = await this.prisma.notificationCounter.findUnique({ where: { key: ALL_KEY }, select: { key: true } });
+    return existing ? null : this.rebuildCounters();
+  }
+
+  // Un lot de rétention : suppression + copie dans l'archive + compteurs, en une instruction.
+  // SKIP LOCKED : plusieurs instances peuvent archiver en même temps sans se bloquer.
+  async archiveBatch() {
+    const result = await this.write(Prisma.sql`
+      WITH changed AS (
+        DELETE FROM "Notification" WHERE "id" IN (
+          SELECT "id" FROM "Notification"
+          WHERE "createdAt" < (now() AT TIME ZONE 'UTC') - make_interval(days => ${this.retentionDays}::int)
+            AND ("isRead" OR "createdAt" < (now() AT TIME ZONE 'UTC') - make_interval(days => ${this.unreadRetentionDays}::int))
+          ORDER BY "createdAt", "id"
+          LIMIT ${this.batchSize}
+          FOR UPDATE SKIP LOCKED
+        )
+        RETURNING "id", "userId", "title", "body", "icon", "data", "isRead", "isRead" AS "wasRead", "createdAt"
+      ), archived AS (
+        INSERT INTO "NotificationArchive" ("id", "userId", "title", "body", "icon", "data", "isRead", "createdAt", "archivedAt")
+        SELECT "id", "userId", "title", "body", "icon", "data", "isRead", "createdAt", (now() AT TIME ZONE 'UTC') FROM changed
+        ON CONFLICT ("id") DO NOTHING
+      ), counted AS (${applyDeltas(unreadRemoved('changed'))})
+      ${WRITE_RESULT}`);
+    if (result.changed) this.feed.publish('notification', '', 'upsert');
+    return result.changed;
+  }
+
+  // Lots jusqu'à épuisement, puis purge de l'archive (NOTIFICATION_ARCHIVE_DAYS)
+  async archive() {
+    let archived = 0;
+    for (;;) {
+      const count = await this.archiveBatch();
+      archived += count;
+      if (count < this.batchSize) break;
+    }
+    let purged = 0;
+    if (this.archiveDays > 0) {
+      purged = await this.prisma.$executeRaw`
+        DELETE FROM "NotificationArchive"
+        WHERE "archivedAt" < (now() AT TIME ZONE 'UTC') - make_interval(days => ${this.archiveDays}::int)`;
+    }
+    return { archived, purged };
+  }
+
+  start() {
+    if (this.running) return;
+    this.running = true;
+    const tick = async () => {
+      try {
+        const counts = await this.ensureCounters();
+        if (counts) console.log(`[INBOX] Counters rebuilt: ${counts[ALL_KEY] ?? 0} unread`);
+        const { archived, purged } = await this.archive();
+        if (archived || purged) console.log(`[INBOX] ${archived} notification(s) archived, ${purged} purged`);
+      } catch (error) {
+        console.error('[INBOX] Retention error:', error);
+      }
+      if (this.running) this.timer = setTimeout(tick, this.intervalMs);
+    };
+    this.timer = setTimeout(tick, 0);
+  }
+
+  stop() {
+    this.running = false;
+    if (this.timer) clearTimeout(this.timer);
+    this.timer = null;
+  }
+
+  private async write(statement: Prisma.Sql): Promise<WriteResult> {
+    const [row] = await this.prisma.$queryRaw<WriteResult[]>(statement);
+    if (row.counts) this.emitCounts(row.counts);
+    return { changed: row.changed, counts: row.counts };
+  }
+
+  private emitCounts(counts: UnreadCounts) {
+    if (Object.keys(counts).length) this.feed.signalUnread(counts);
+  }
+}
+
+let sharedInbox: NotificationInbox | null = null;
+
+export function getNotificationInbox(prisma: PrismaClient) {
+  if (!sharedInbox) sharedInbox = new NotificationInbox(prisma);
+  return sharedInbox;
+}
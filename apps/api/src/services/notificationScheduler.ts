@@ -0,0 +1,144 @@
+import { PrismaClient, Prisma } from '@prisma/client';
+import { performance } from 'perf_hooks';
+
+// Étape "notifications" du cron : calcule les événements dus (check-in / check-out imminent, retard)
+// à partir d'une seule requête sur les réservations du jour, puis n'envoie que ceux absents du registre
+// NotificationLedger. La clé du registre est réservée avant l'envoi : deux exécutions simultanées
+// ne notifient pas deux fois le même événement.
+
+export type NotifyFn = (type: string, title: string, body: string, data?: any) => Promise<unknown>;
+
+export interface DueEvent {
+  key: string;
+  type: 'checkin_imminent' | 'checkout_imminent' | 'late_return';
+  bookingId: string;
+  title: string;
+  body: string;
+  data: Record<string, any>;
+}
+
+export interface SchedulerBooking {
+  id: string;
+  reference: string;
+  startDate: Date;
+  endDate: Date;
+  startTime: string;
+  endTime: string;
+  checkedIn: boolean;
+  checkedOut: boolean;
+  customer: { firstName: string; lastName: string } | null;
+}
+
+const IMMINENT_MINUTES = 30;
+const LATE_INTERVAL_MINUTES = 15;
+const LEDGER_RETENTION_DAYS = 7;
+
+const toMinutes = (time: string) => {
+  const [hour, minute] = time.split(':').map(Number);
+  return hour * 60 + (minute || 0);
+};
+
+// Événements dus à l'instant `now` (heures locales du serveur, comme startTime / endTime)
+export function computeDueEvents(bookings: SchedulerBooking[], now: Date): DueEvent[] {
+  const today = now.toISOString().split('T')[0];
+  const nowMinutes = now.getHours() * 60 + now.getMinutes();
+  const events: DueEvent[] = [];
+
+  for (const booking of bookings) {
+    const name = `${booking.customer?.firstName} ${booking.customer?.lastName}`;
+    const data = { bookingId: booking.id, reference: booking.reference };
+
+    if (!booking.checkedIn && booking.startDate.toISOString().split('T')[0] === today) {
+      const diff = toMinutes(booking.startTime) - nowMinutes;
+      if (diff > 0 && diff <= IMMINENT_MINUTES) {
+        events.push({
+          key: `checkin_imminent:${booking.id}:${today}`, type: 'checkin_imminent', bookingId: booking.id,
+          title: '⏰ Check-in inminente', body: `${name} llega en ${diff} min (${booking.startTime})`, data
+        });
+      }
+    }
+
+    if (booking.checkedIn && !booking.checkedOut && booking.endDate.toISOString().split('T')[0] === today) {
+      const diff = toMinutes(booking.endTime) - nowMinutes;
+      if (diff > 0 && diff <= IMMINENT_MINUTES) {
+        events.push({
+          key: `checkout_imminent:${booking.id}:${today}`, type: 'checkout_imminent', bookingId: booking.id,
+          title: '⏰ Check-out inminente', body: `${name} debe devolver en ${diff} min (${booking.endTime})`, data
+        });
+      } else if (diff < 0) {
+        // Un rappel par tranche de 15 min de retard
+        const lateMinutes = -diff;
+        const slot = Math.floor(lateMinutes / LATE_INTERVAL_MINUTES);
+        events.push({
+          key: `late_return:${booking.id}:${today}:${slot}`, type: 'late_return', bookingId: booking.id,
+          title: '⚠️ Retraso en devolución', body: `${name} tiene ${lateMinutes} min de retraso`, data: { ...data, lateMinutes }
+        });
+      }
+    }
+  }
+  return events;
+}
+
+export async function runNotificationCheck(prisma: PrismaClient, notify: NotifyFn, now = new Date()) {
+  const t0 = performance.now();
+  const today = now.toISOString().split('T')[0];
+  const dayStart = new Date(today);
+  const dayEnd = new Date(today + 'T23:59:59');
+
+  // Uniquement les réservations qui peuvent produire un événement aujourd'hui
+  const bookings = await prisma.booking.findMany({
+    where: {
+      status: { in: ['CONFIRMED', 'CHECKED_IN'] },
+      OR: [
+        { checkedIn: false, startDate: { gte: dayStart, lt: dayEnd } },
+        { checkedIn: true, checkedOut: false, endDate: { gte: dayStart, lt: dayEnd } }
+      ]
+    },
+    select: {
+      id: true, reference: true, startDate: true, endDate: true, startTime: true, endTime: true,
+      checkedIn: true, checkedOut: true, customer: { select: { firstName: true, lastName: true } }
+    }
+  });
+  const tQuery = performance.now();
+
+  const due = computeDueEvents(bookings, now);
+  const alreadySent = due.length
+    ? new Set((await prisma.notificationLedger.findMany({ where: { eventKey: { in: due.map(e => e.key) } }, select: { eventKey: true } })).map(l => l.eventKey))
+    : new Set<string>();
+  const tLedger = performance.now();
+
+  const results = { checkinImminent: 0, checkoutImminent: 0, lateReturn: 0 };
+  const counterFor: Record<DueEvent['type'], keyof typeof results> = {
+    checkin_imminent: 'checkinImminent', checkout_imminent: 'checkoutImminent', late_return: 'lateReturn'
+  };
+  let skipped = alreadySent.size;
+
+  for (const event of due) {
+    if (alreadySent.has(event.key)) continue;
+    try {
+      // Réservation de la clé : échoue (P2002) si une autre exécution l'a prise entre-temps
+      await prisma.notificationLedger.create({ data: { eventKey: event.key, type: event.type, bookingId: event.bookingId } });
+    } catch (error) {
+      if (error instanceof Prisma.PrismaClientKnownRequestError && error.code === 'P2002') { skipped++; continue; }
+      throw error;
+    }
+    await notify(event.type, event.title, event.body, event.data);
+    results[counterFor[event.type]]++;
+  }
+  const tSend = performance.now();
+
+  await prisma.notificationLedger.deleteMany({ where: { createdAt: { lt: new Date(now.getTime() - LEDGER_RETENTION_DAYS * 86400000) } } });
+
+  return {
+    checked: bookings.length,
+    due: due.length,
+    skipped,
+    notifications: results,
+    timings: {
+      queryMs: Math.round(tQuery - t0),
+      ledgerMs: Math.round(tLedger - tQuery),
+      sendMs: Math.round(tSend - tLedger),
+      totalMs: Math.round(performance.now() - t0)
+    }
+  };
+}
@@ -0,0 +1,49 @@
+import { PrismaClient, UserRole } from '@prisma/client';
+import { Request } from 'express';
+import jwt from 'jsonwebtoken';
+
+// Authentification des utilisateurs de l'app opérateur (jeton émis par POST /api/auth/login)
+// et périmètre de données qui en découle pour le flux SSE et /api/sync.
+
+export const JWT_SECRET = process.env.JWT_SECRET || 'voltride-secret-key-2024';
+
+export interface OperatorScope {
+  userId: string;
+  role: UserRole;
+  // null : toutes les agences (ADMIN, ou utilisateur sans marque restreinte)
+  agencyIds: string[] | null;
+}
+
+// Jeton en en-tête Authorization: Bearer, ou ?token= pour EventSource qui ne peut pas envoyer d'en-têtes
+export function requestToken(req: Request): string | null {
+  const header = req.headers.authorization;
+  if (header?.startsWith('Bearer ')) return header.slice(7);
+  return typeof req.query.token === 'string' && req.query.token ? req.query.token : null;
+}
+
+// Utilisateur actif du jeton et ses agences : COLLABORATOR / FRANCHISEE limités à leurs agences,
+// les autres rôles (hors ADMIN) aux agences de leurs marques. null si jeton absent, invalide ou utilisateur inactif.
+export async function authenticateOperator(prisma: PrismaClient, req: Request): Promise<OperatorScope | null> {
+  const token = requestToken(req);
+  if (!token) return null;
+  let decoded: any;
+  try {
+    decoded = jwt.verify(token, JWT_SECRET);
+  } catch {
+    return null;
+  }
+  const user = await prisma.user.findUnique({
+    where: { id: decoded.userId },
+    select: { id: true, role: true, brands: true, agencyIds: true, isActive: true }
+  });
+  if (!user || !user.isActive) return null;
+
+  let agencyIds: string[] | null = null;
+  if (user.role === 'COLLABORATOR' || user.role === 'FRANCHISEE') {
+    agencyIds = user.agencyIds;
+  } else if (user.role !== 'ADMIN' && user.brands.length) {
+    const agencies = await prisma.agency.findMany({ where: { brand: { in: user.brands } }, select: { id: true } });
+    agencyIds = agencies.map(a => a.id);
+  }
+  return { userId: user.id, role: user.role, agencyIds };
+}
@@ -0,0 +1,233 @@
+import { Prisma, PrismaClient } from '@prisma/client';
+import { runPool } from './pushDispatcher';
+
+// Outbox transactionnelle (table OutboxMessage) pour les effets de bord : emails, push, PDF joints.
+// - les messages sont écrits dans la même transaction que la modification qui les déclenche : rien n'est perdu
+//   si le process s'arrête, et la requête HTTP n'attend plus Resend
+// - le worker réserve des lots avec FOR UPDATE SKIP LOCKED (plusieurs instances API sans double traitement),
+//   les traite en parallèle borné et réessaie avec backoff ; au-delà de maxAttempts, le message passe en DEAD
+// - réservation avec bail (lockedUntil) : un message pris par une instance arrêtée est repris à l'expiration
+// - livraison au moins une fois : les handlers passent l'id du message comme clé d'idempotence au fournisseur
+
+export interface OutboxMessageInput {
+  topic: string;
+  payload: Prisma.InputJsonValue;
+  dedupeKey?: string; // un seul message par clé, même si l'événement est rejoué
+  delayMs?: number;
+}
+
+export interface ClaimedMessage {
+  id: string;
+  topic: string;
+  payload: any;
+  attempts: number;
+}
+
+export type OutboxHandler = (payload: any, message: ClaimedMessage) => Promise<void>;
+
+export interface OutboxWorkerOptions {
+  batchSize?: number;
+  concurrency?: number;
+  maxAttempts?: number;
+  baseDelayMs?: number;
+  leaseMs?: number;
+  pollMs?: number;
+  retentionDays?: number;
+  topics?: string[]; // worker dédié à certains topics (par défaut : tous)
+}
+
+// Erreur définitive : le message passe directement en DEAD
+export class OutboxPermanentError extends Error {}
+
+type OutboxClient = PrismaClient | Prisma.TransactionClient;
+
+const MAX_RETRY_DELAY_MS = 60 * 60 * 1000;
+const PURGE_INTERVAL_MS = 60 * 60 * 1000;
+
+export function enqueueOutbox(client: OutboxClient, messages: OutboxMessageInput | OutboxMessageInput[]) {
+  const list = Array.isArray(messages) ? messages : [messages];
+  const now = Date.now();
+  return client.outboxMessage.createMany({
+    data: list.map(m => ({ topic: m.topic, payload: m.payload, dedupeKey: m.dedupeKey ?? null, availableAt: new Date(now + (m.delayMs ?? 0)) })),
+    skipDuplicates: true
+  });
+}
+
+export class OutboxWorker {
+  private handlers = new Map<string, OutboxHandler>();
+  private running = false;
+  private loop: Promise<void> | null = null;
+  private wakeUp: (() => void) | null = null;
+  private woken = false;
+  private lastPurge = 0;
+  private counters = { batches: 0, claimed: 0, sent: 0, retried: 0, dead: 0 };
+  readonly batchSize: number;
+  readonly concurrency: number;
+  private maxAttempts: number;
+  private baseDelayMs: number;
+  private leaseMs: number;
+  private pollMs: number;
+  private retentionDays: number;
+  private topics: string[] | null;
+
+  constructor(private prisma: PrismaClient, options: OutboxWorkerOptions = {}) {
+    this.batchSize = options.batchSize ?? parseInt(process.env.OUTBOX_BATCH_SIZE || '20', 10);
+    this.concurrency = options.concurrency ?? parseInt(process.env.OUTBOX_CONCURRENCY || '4', 10);
+    this.maxAttempts = options.maxAttempts ?? parseInt(process.env.OUTBOX_MAX_ATTEMPTS || '8', 10);
+    this.baseDelayMs = options.baseDelayMs ?? 5000;
+    this.leaseMs = options.leaseMs ?? 5 * 60 * 1000;
+    this.pollMs = options.pollMs ?? 1000;
+    this.retentionDays = options.retentionDays ?? 7;
+    this.topics = options.topics ?? null;
+  }
+
+  register(topic: string, handler: OutboxHandler) {
+    this.handlers.set(topic, handler);
+    return this;
+  }
+
+  // Dates en UTC sans fuseau, comme les colonnes DateTime écrites par Prisma
+  private claim() {
+    return this.prisma.$queryRaw<ClaimedMessage[]>`
+      UPDATE "OutboxMessage"
+      SET "status" = 'PROCESSING', "attempts" = "attempts" + 1,
+          "lockedUntil" = (now() AT TIME ZONE 'UTC') + make_interval(secs => ${this.leaseMs / 1000})
+      WHERE "id" IN (
+        SELECT "id" FROM "OutboxMessage"
+        WHERE (("status" = 'PENDING' AND "availableAt" <= (now() AT TIME ZONE 'UTC'))
+           OR ("status" = 'PROCESSING' AND "lockedUntil" < (now() AT TIME ZONE 'UTC')))
+          ${this.topics ? Prisma.sql`AND "topic" = ANY(${this.topics})` : Prisma.empty}
+        ORDER BY "availableAt"
+        LIMIT ${this.batchSize}
+        FOR UPDATE SKIP LOCKED
+      )
+      RETURNING "id", "topic", "payload", "attempts"`;
+  }
+
+  private async fail(message: ClaimedMessage, error: any) {
+    const permanent = error instanceof OutboxPermanentError || error?.permanent === true;
+    const lastError = String(error?.message || error).slice(0, 1000);
+    if (permanent || message.attempts >= this.maxAttempts) {
+      this.counters.dead++;
+      console.error(`[OUTBOX] ${message.topic} ${message.id} dead after ${message.attempts} attempt(s):`, lastError);
+      await this.prisma.outboxMessage.update({ where: { id: message.id }, data: { status: 'DEAD', lockedUntil: null, lastError } });
+      return;
+    }
+    this.counters.retried++;
+    const delay = Math.min(this.baseDelayMs * 2 ** (message.attempts - 1) * (0.5 + Math.random()), MAX_RETRY_DELAY_MS);
+    await this.prisma.outboxMessage.update({
+      where: { id: message.id },
+      data: { status: 'PENDING', lockedUntil: null, lastError, availableAt: new Date(Date.now() + delay) }
+    });
+  }
+
+  // Un lot : réservation, traitement parallèle borné, puis un seul UPDATE pour les messages envoyés
+  async runOnce() {
+    const batch = await this.claim();
+    if (!batch.length) return 0;
+    this.counters.batches++;
+    this.counters.claimed += batch.length;
+    const sent: string[] = [];
+    await runPool(batch, this.concurrency, async message => {
+      try {
+        const handler = this.handlers.get(message.topic);
+        if (!handler) throw new OutboxPermanentError(`No handler for topic ${message.topic}`);
+        await handler(message.payload, message);
+        sent.push(message.id);
+      } catch (error) {
+        await this.fail(message, error);
+      }
+    });
+    if (sent.length) {
+      await this.prisma.outboxMessage.updateMany({
+        where: { id: { in: sent } },
+        data: { status: 'SENT', processedAt: new Date(), lockedUntil: null, lastError: null }
+      });
+      this.counters.sent += sent.length;
+    }
+    return batch.length;
+  }
+
+  // Traite tout ce qui est disponible maintenant (cron, benchmark)
+  async drain() {
+    let total = 0;
+    for (let count = await this.runOnce(); count > 0; count = await this.runOnce()) total += count;
+    return total;
+  }
+
+  start() {
+    if (this.running) return;
+    this.running = true;
+    this.loop = this.run();
+  }
+
+  async stop() {
+    this.running = false;
+    this.wake();
+    await this.loop;
+  }
+
+  // Appelé après un enqueue dans ce process : pas d'attente du prochain intervalle de scrutation
+  wake() {
+    if (this.wakeUp) this.wakeUp();
+    else this.woken = true;
+  }
+
+  private async run() {
+    while (this.running) {
+      let count = 0;
+      try {
+        count = await this.runOnce();
+        if (Date.now() - this.lastPurge > PURGE_INTERVAL_MS) await this.purge();
+      } catch (error) {
+        console.error('[OUTBOX] Worker error:', error);
+      }
+      // Lot plein, ou message ajouté pendant le lot : on enchaîne sans attendre
+      if (count < this.batchSize && !this.woken && this.running) await this.idle();
+      this.woken = false;
+    }
+  }
+
+  private idle() {
+    return new Promise<void>(resolve => {
+      const done = () => {
+        clearTimeout(timer);
+        this.wakeUp = null;
+        resolve();
+      };
+      const timer = setTimeout(done, this.pollMs);
+      this.wakeUp = done;
+    });
+  }
+
+  // Messages envoyés conservés retentionDays jours (diagnostic), puis supprimés
+  async purge() {
+    this.lastPurge = Date.now();
+    const { count } = await this.prisma.outboxMessage.deleteMany({
+      where: { status: 'SENT', processedAt: { lt: new Date(Date.now() - this.retentionDays * 86400000) } }
+    });
+    return count;
+  }
+
+  async stats() {
+    const [byStatus, oldest] = await Promise.all([
+      this.prisma.outboxMessage.groupBy({ by: ['status'], _count: { _all: true } }),
+      this.prisma.outboxMessage.findFirst({ where: { status: 'PENDING' }, orderBy: { availableAt: 'asc' }, select: { availableAt: true } })
+    ]);
+    const totals: Record<string, number> = {};
+    byStatus.forEach(s => { totals[s.status] = s._count._all; });
+    return {
+      running: this.running,
+      totals,
+      oldestPendingMs: oldest ? Math.max(0, Date.now() - oldest.availableAt.getTime()) : 0,
+      worker: { ...this.counters }
+    };
+  }
+}
+
+let sharedWorker: OutboxWorker | null = null;
+
+export function getOutboxWorker(prisma: PrismaClient) {
+  if (!sharedWorker) sharedWorker = new OutboxWorker(prisma);
+  return sharedWorker;
+}
@@ -0,0 +1,66 @@
+// Pagination par curseur (keyset) sur (createdAt DESC, id DESC).
+// Le curseur encode la dernière ligne renvoyée : la page suivante ne relit pas les lignes déjà servies,
+// contrairement à skip/offset dont le coût augmente avec la profondeur.
+
+export const DEFAULT_PAGE_SIZE = 100;
+export const MAX_PAGE_SIZE = 500;
+
+export const KEYSET_ORDER_BY = [{ createdAt: 'desc' as const }, { id: 'desc' as const }];
+
+interface KeysetRow {
+  id: string;
+  createdAt: Date;
+}
+
+// Date d'un paramètre de requête (chaîne ISO ou timestamp) : null si invalide ou hors des années 0 à 9999,
+// qu'une colonne DateTime ne peut pas recevoir (erreur Prisma au lieu d'un 400)
+export function parseQueryDate(value: unknown): Date | null {
+  if (typeof value !== 'string' && typeof value !== 'number') return null;
+  const date = new Date(value);
+  const year = date.getUTCFullYear();
+  return isNaN(date.getTime()) || year < 0 || year > 9999 ? null : date;
+}
+
+export function encodeCursor(row: KeysetRow) {
+  return Buffer.from(JSON.stringify({ c: row.createdAt.toISOString(), i: row.id })).toString('base64url');
+}
+
+export function decodeCursor(cursor?: string): { createdAt: Date; id: string } | null {
+  if (!cursor) return null;
+  try {
+    const { c, i } = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+    const createdAt = parseQueryDate(c);
+    if (typeof i !== 'string' || !createdAt) return null;
+    return { createdAt, id: i };
+  } catch {
+    return null;
+  }
+}
+
+// Condition Prisma "après le curseur" pour l'ordre KEYSET_ORDER_BY
+export function keysetWhere(cursor: { createdAt: Date; id: string } | null) {
+  if (!cursor) return {};
+  return {
+    OR: [
+      { createdAt: { lt: cursor.createdAt } },
+      { createdAt: cursor.createdAt, id: { lt: cursor.id } }
+    ]
+  };
+}
+
+export function parseLimit(value: unknown, max = MAX_PAGE_SIZE) {
+  const limit = parseInt(String(value ?? ''), 10);
+  if (isNaN(limit) || limit <= 0) return DEFAULT_PAGE_SIZE;
+  return Math.min(limit, max);
+}
+
+// À appeler avec limit + 1 lignes lues : la ligne en trop indique qu'une page suivante existe
+export function toPage<T extends KeysetRow>(rows: T[], limit: number) {
+  const items = rows.slice(0, limit);
+  const nextCursor = rows.length > limit ? encodeCursor(items[items.length - 1]) : null;
+  return { items, nextCursor };
+}
+
+export function isPaginated(query: Record<string, unknown>) {
+  return query.limit !== undefined || query.cursor !== undefined;
+}
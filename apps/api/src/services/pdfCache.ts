@@ -0,0 +1,175 @@
+import { PrismaClient, Prisma } from '@prisma/client';
+import { createHash } from 'crypto';
+import fs from 'fs';
+import path from 'path';
+import { isCompletePdf } from './pdfPool';
+
+// Cache des PDF générés (contrat, facture) :
+// - clé = type + id du contrat + hash du contenu + langue : toute modification des données change la clé
+// - niveau mémoire LRU borné en octets, niveau disque optionnel (PDF_CACHE_DIR) qui survit aux redémarrages
+// - rendus concurrents du même document mutualisés
+// - rendu incomplet (logo indisponible, voir pdfPool) : servi mais pas mis en cache, le suivant réessaie
+// - écritures sur RentalContract / ContractDeduction : entrées du contrat supprimées (libère la place,
+//   le hash suffit déjà à ne jamais servir un PDF périmé)
+
+export type PdfKind = 'contract' | 'invoice';
+
+export interface PdfCacheStats {
+  entries: number;
+  bytes: number;
+  hits: number;
+  diskHits: number;
+  misses: number;
+}
+
+// Hash stable du contenu servant au rendu (les Date sont sérialisées en ISO par JSON.stringify)
+export function contentHash(...parts: unknown[]) {
+  const hash = createHash('sha1');
+  for (const part of parts) hash.update(JSON.stringify(part ?? null));
+  return hash.digest('hex').slice(0, 16);
+}
+
+export class PdfCache {
+  private entries = new Map<string, Buffer>();
+  private pending = new Map<string, Promise<Buffer>>();
+  private bytes = 0;
+  private counters = { hits: 0, diskHits: 0, misses: 0 };
+
+  constructor(private maxBytes: number, private diskDir: string | null = null) {
+    if (diskDir) fs.mkdirSync(diskDir, { recursive: true });
+  }
+
+  // Le contractId en tête du nom de fichier permet l'invalidation par préfixe
+  private fileName(kind: PdfKind, contractId: string, hash: string, lang: string) {
+    return `${contractId}-${kind}-${hash}-${lang}.pdf`.replace(/[^\w.-]/g, '_');
+  }
+
+  // Mémoire puis disque ; null si le document n'a jamais été rendu avec ce contenu
+  async lookup(kind: PdfKind, contractId: string, hash: string, lang: string): Promise<Buffer | null> {
+    const key = this.fileName(kind, contractId, hash, lang);
+    const cached = this.entries.get(key);
+    if (cached) {
+      // Réinsertion = position la plus récente pour l'éviction LRU
+      this.entries.delete(key);
+      this.entries.set(key, cached);
+      this.counters.hits++;
+      return cached;
+    }
+    const fromDisk = await this.readDisk(key);
+    if (fromDisk) {
+      this.counters.diskHits++;
+      this.remember(key, fromDisk);
+      return fromDisk;
+    }
+    return null;
+  }
+
+  store(kind: PdfKind, contractId: string, hash: string, lang: string, buffer: Buffer) {
+    const key = this.fileName(kind, contractId, hash, lang);
+    this.counters.misses++;
+    this.remember(key, buffer);
+    this.writeDisk(key, buffer);
+  }
+
+  async render(kind: PdfKind, contractId: string, hash: string, lang: string, render: () => Promise<Buffer>): Promise<Buffer> {
+    const key = this.fileName(kind, contractId, hash, lang);
+    const inFlight = this.pending.get(key);
+    if (inFlight) return inFlight;
+
+    const promise = (async () => {
+      const cached = await this.lookup(kind, contractId, hash, lang);
+      if (cached) return cached;
+      const buffer = await render();
+      if (isCompletePdf(buffer)) this.store(kind, contractId, hash, lang, buffer);
+      return buffer;
+    })();
+    this.pending.set(key, promise);
+    try {
+      return await promise;
+    } finally {
+      this.pending.delete(key);
+    }
+  }
+
+  invalidate(contractId: string) {
+    const prefix = contractId.replace(/[^\w.-]/g, '_') + '-';
+    for (const [key, buffer] of this.entries) {
+      if (key.startsWith(prefix)) {
+        this.entries.delete(key);
+        this.bytes -= buffer.length;
+      }
+    }
+    if (this.diskDir) {
+      const dir = this.diskDir;
+      fs.promises.readdir(dir)
+        .then(files => Promise.all(files.filter(f => f.startsWith(prefix)).map(f => fs.promises.unlink(path.join(dir, f)))))
+        .catch(error => console.error('PDF cache invalidation error:', error));
+    }
+  }
+
+  // Niveau mémoire uniquement : sur disque, les entrées périmées ne correspondent plus à aucun hash
+  clear() {
+    this.entries.clear();
+    this.bytes = 0;
+  }
+
+  stats(): PdfCacheStats {
+    return { entries: this.entries.size, bytes: this.bytes, ...this.counters };
+  }
+
+  private remember(key: string, buffer: Buffer) {
+    if (buffer.length > this.maxBytes) return;
+    this.entries.set(key, buffer);
+    this.bytes += buffer.length;
+    // Map = ordre d'insertion : la première clé est la moins récemment utilisée
+    for (const [oldest, old] of this.entries) {
+      if (this.bytes <= this.maxBytes) break;
+      this.entries.delete(oldest);
+      this.bytes -= old.length;
+    }
+  }
+
+  private async readDisk(key: string) {
+    if (!this.diskDir) return null;
+    try {
+      return await fs.promises.readFile(path.join(this.diskDir, key));
+    } catch {
+      return null;
+    }
+  }
+
+  private writeDisk(key: string, buffer: Buffer) {
+    if (!this.diskDir) return;
+    // Écriture atomique : un lecteur ne voit jamais un fichier partiel
+    const file = path.join(this.diskDir, key);
+    const tmp = `${file}.${process.pid}.tmp`;
+    fs.promises.writeFile(tmp, buffer)
+      .then(() => fs.promises.rename(tmp, file))
+      .catch(error => console.error('PDF cache write error:', error));
+  }
+}
+
+// Middleware Prisma : toute écriture sur un contrat (ou ses déductions) invalide ses PDF
+export function trackPdfInvalidation(client: PrismaClient, cache: PdfCache) {
+  client.$use(async (params: Prisma.MiddlewareParams, next) => {
+    const result = await next(params);
+    if (params.model !== 'RentalContract' && params.model !== 'ContractDeduction') return result;
+    if (['createMany', 'updateMany', 'deleteMany'].includes(params.action)) {
+      cache.clear();
+    } else if (['update', 'upsert', 'delete'].includes(params.action) || (params.action === 'create' && params.model === 'ContractDeduction')) {
+      const contractId = params.model === 'RentalContract' ? result?.id : result?.contractId;
+      if (contractId) cache.invalidate(contractId);
+    }
+    return result;
+  });
+}
+
+let sharedCache: PdfCache | null = null;
+
+export function getPdfCache() {
+  if (!sharedCache) {
+    const maxBytes = parseInt(process.env.PDF_CACHE_MAX_MB || '64', 10) * 1024 * 1024;
+    sharedCache = new PdfCache(maxBytes, process.env.PDF_CACHE_DIR || null);
+  }
+  return sharedCache;
+}
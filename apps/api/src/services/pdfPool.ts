@@ -0,0 +1,190 @@
+import { Worker } from 'worker_threads';
+import { PassThrough, Readable, finished } from 'stream';
+import { Response } from 'express';
+import os from 'os';
+import path from 'path';
+
+// Pool de threads pour le rendu pdfkit : le rendu ne bloque plus la boucle d'événements Express.
+// - un document à la fois par thread, taille du pool = cœurs - 1 (PDF_WORKERS pour forcer)
+// - file d'attente bornée (PDF_QUEUE_MAX) : au-delà, PdfQueueFullError -> 503 côté route
+// - les morceaux du PDF arrivent au fil du rendu et sont poussés dans un flux lisible ; flux plein (client lent),
+//   le thread est mis en pause et n'est rendu au pool qu'une fois le document lu : au plus un document
+//   en mémoire par thread
+
+export type PdfJobKind = 'contract' | 'invoice' | 'extension' | 'maintenance';
+
+export class PdfQueueFullError extends Error {
+  constructor() {
+    super('PDF queue is full');
+  }
+}
+
+// Flux et documents rendus sans un de leurs éléments (logo indisponible) : servis, jamais mis en cache
+const incompletePdfs = new WeakSet<object>();
+
+export const isCompletePdf = (pdf: Readable | Buffer) => !incompletePdfs.has(pdf);
+
+interface PdfJob {
+  id: number;
+  kind: PdfJobKind;
+  args: any[];
+  output: PassThrough;
+}
+
+interface PoolWorker {
+  worker: Worker;
+  job: PdfJob | null;
+}
+
+// dist/pdfWorker.js une fois compilé, src/pdfWorker.ts via ts-node en développement
+const WORKER_FILE = path.join(__dirname, '..', 'pdfWorker' + path.extname(__filename));
+const WORKER_EXEC_ARGV = ['-r', 'ts-node/register'];
+
+export class PdfWorkerPool {
+  private workers: PoolWorker[] = [];
+  private queue: PdfJob[] = [];
+  private nextId = 1;
+  private counters = { completed: 0, failed: 0, rejected: 0 };
+
+  constructor(private size: number, private maxQueue: number, private workerFile = WORKER_FILE) {}
+
+  // Flux du PDF : à brancher sur la réponse HTTP (pipePdf) ou à lire en entier (render)
+  stream(kind: PdfJobKind, args: any[]): Readable {
+    if (this.queue.length >= this.maxQueue) {
+      this.counters.rejected++;
+      throw new PdfQueueFullError();
+    }
+    // Passage en JSON : les Decimal Prisma ne survivent pas au clonage vers le thread (chaînes, comme leur valueOf)
+    const job = { id: this.nextId++, kind, args: JSON.parse(JSON.stringify(args)), output: new PassThrough() };
+    this.queue.push(job);
+    this.schedule();
+    return job.output;
+  }
+
+  render(kind: PdfJobKind, args: any[]): Promise<Buffer> {
+    const output = this.stream(kind, args);
+    return new Promise((resolve, reject) => {
+      const chunks: Buffer[] = [];
+      output.on('data', (chunk: Buffer) => chunks.push(chunk));
+      output.on('end', () => {
+        const pdf = Buffer.concat(chunks);
+        if (!isCompletePdf(output)) incompletePdfs.add(pdf);
+        resolve(pdf);
+      });
+      output.on('error', reject);
+    });
+  }
+
+  // Démarre tous les threads (chacun précharge logos et polices) avant les premières requêtes
+  warmUp() {
+    while (this.workers.length < this.size) this.spawn();
+  }
+
+  stats() {
+    return {
+      workers: this.size,
+      started: this.workers.length,
+      busy: this.workers.filter(w => w.job).length,
+      queued: this.queue.length,
+      maxQueue: this.maxQueue,
+      ...this.counters
+    };
+  }
+
+  private schedule() {
+    while (this.queue.length) {
+      let slot = this.workers.find(w => !w.job);
+      if (!slot && this.workers.length < this.size) slot = this.spawn();
+      if (!slot) return;
+      const job = this.queue.shift()!;
+      slot.job = job;
+      slot.worker.postMessage({ id: job.id, kind: job.kind, args: job.args });
+      // Flux abandonné (client parti) : le thread ne doit pas rester en pause
+      job.output.once('close', () => slot.worker.postMessage({ id: job.id, resume: true }));
+    }
+  }
+
+  // Threads démarrés à la demande, remplacés s'ils meurent
+  private spawn(): PoolWorker {
+    const slot: PoolWorker = { worker: new Worker(this.workerFile, { execArgv: this.workerFile.endsWith('.ts') ? WORKER_EXEC_ARGV : [] }), job: null };
+    slot.worker.on('message', (message: { id: number; chunk?: Uint8Array; done?: boolean; complete?: boolean; error?: string }) => {
+      const job = slot.job;
+      if (!job || job.id !== message.id) return;
+      if (message.chunk) {
+        if (!job.output.write(Buffer.from(message.chunk.buffer, message.chunk.byteOffset, message.chunk.byteLength)) && !job.output.destroyed) {
+          slot.worker.postMessage({ id: job.id, pause: true });
+          job.output.once('drain', () => slot.worker.postMessage({ id: job.id, resume: true }));
+        }
+        return;
+      }
+      const release = () => {
+        if (slot.job !== job) return;
+        slot.job = null;
+        this.schedule();
+      };
+      if (message.error) {
+        this.counters.failed++;
+        job.output.destroy(new Error(message.error));
+        release();
+      } else {
+        this.counters.completed++;
+        if (message.complete === false) incompletePdfs.add(job.output);
+        job.output.end();
+        // Thread rendu au pool quand le document a été lu (ou abandonné), pas dès la fin du rendu
+        finished(job.output, { readable: false }, release);
+      }
+    });
+    const fail = (error: Error) => {
+      if (slot.job) {
+        this.counters.failed++;
+        slot.job.output.destroy(error);
+        slot.job = null;
+      }
+      this.workers = this.workers.filter(w => w !== slot);
+      this.schedule();
+    };
+    slot.worker.on('error', fail);
+    slot.worker.on('exit', code => { if (code !== 0) fail(new Error('PDF worker exited with code ' + code)); });
+    this.workers.push(slot);
+    return slot;
+  }
+}
+
+// Envoie le flux PDF en réponse ; `onComplete` reçoit le document entier (ex. pour le cache), s'il est complet
+export function pipePdf(res: Response, output: Readable, filename: string, disposition: 'inline' | 'attachment' = 'inline', onComplete?: (pdf: Buffer) => void) {
+  const chunks: Buffer[] = [];
+  let started = false;
+  output.on('data', (chunk: Buffer) => {
+    if (!started) {
+      started = true;
+      res.setHeader('Content-Type', 'application/pdf');
+      res.setHeader('Content-Disposition', `${disposition}; filename="${filename}"`);
+    }
+    if (onComplete) chunks.push(chunk);
+    // Client lent : on suspend la lecture jusqu'au drain de la socket
+    if (!res.write(chunk)) {
+      output.pause();
+      res.once('drain', () => output.resume());
+    }
+  });
+  output.on('end', () => {
+    res.end();
+    if (onComplete && isCompletePdf(output)) onComplete(Buffer.concat(chunks));
+  });
+  output.on('error', (error: Error) => {
+    console.error('PDF stream error:', error);
+    if (!started) res.status(500).json({ error: 'Failed to generate PDF', details: error.message });
+    else res.destroy(error);
+  });
+  res.on('close', () => { if (!output.readableEnded) output.destroy(); });
+}
+
+let sharedPool: PdfWorkerPool | null = null;
+
+export function getPdfPool() {
+  if (!sharedPool) {
+    const size = parseInt(process.env.PDF_WORKERS || '', 10) || Math.max(1, os.cpus().length - 1);
+    sharedPool = new PdfWorkerPool(size, parseInt(process.env.PDF_QUEUE_MAX || '100', 10));
+  }
+  return sharedPool;
+}
@@ -0,0 +1,180 @@
+import type webpush from 'web-push';
+import { PrismaClient } from '@prisma/client';
+import { getNotificationInbox } from './notificationInbox';
+import { lazyModule } from './startup';
+
+// Envoi groupé des notifications push :
+// - historique (Notification) écrit en un seul createMany par la boîte de réception (compteurs de non lues)
+// - abonnements de tous les destinataires lus en une seule requête
+// - envois web-push en parallèle borné, avec retry / backoff sur les erreurs temporaires ;
+//   un Retry-After au-delà de maxRetryAfterMs n'est pas attendu : l'envoi est gardé en mémoire et rejoué
+//   par le premier envoi qui suit l'échéance (perdu si le process redémarre)
+// - abonnements expirés (404 / 410) supprimés en un seul deleteMany
+
+export interface PushPayload {
+  title: string;
+  body: string;
+  icon?: string;
+  badge?: string;
+  tag?: string;
+  data?: Record<string, any>;
+  actions?: Array<{ action: string; title: string; icon?: string }>;
+}
+
+export interface PushTarget {
+  endpoint: string;
+  p256dh: string;
+  auth: string;
+}
+
+export type PushSender = (subscription: webpush.PushSubscription, payload: string) => Promise<unknown>;
+
+export interface DispatchOptions {
+  concurrency?: number;
+  retries?: number;
+  baseDelayMs?: number;
+  maxRetryAfterMs?: number;
+  sender?: PushSender;
+}
+
+export interface DispatchResult {
+  total: number;
+  success: number;
+  failed: number;
+  deferred: number;
+  removed: number;
+}
+
+// web-push chargé et configuré (VAPID) au premier envoi plutôt qu'à l'import
+const loadWebPush = lazyModule('web-push', () => {
+  const webpush = require('web-push') as typeof import('web-push');
+  webpush.setVapidDetails(
+    process.env.VAPID_EMAIL || 'mailto:contact@voltride.com',
+    process.env.VAPID_PUBLIC_KEY || '',
+    process.env.VAPID_PRIVATE_KEY || ''
+  );
+  return webpush;
+});
+
+const webPushSender: PushSender = (subscription, payload) => loadWebPush().sendNotification(subscription, payload);
+
+// PUSH_STUB_URL : service push simulé (loadtest/stubs.py), reçoit { endpoint, payload } en JSON ;
+// ses codes HTTP suivent les mêmes règles que ceux de web-push (404 / 410 expiré, 429 / 5xx temporaire)
+const stubSender = (url: string): PushSender => async (subscription, payload) => {
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ endpoint: subscription.endpoint, payload })
+  });
+  if (!response.ok) {
+    throw Object.assign(new Error(`Push stub ${response.status}`), {
+      statusCode: response.status,
+      headers: { 'retry-after': response.headers.get('retry-after') || undefined }
+    });
+  }
+};
+
+const isGone = (error: any) => error?.statusCode === 404 || error?.statusCode === 410;
+
+// 429, 5xx et erreurs réseau (sans statusCode) sont temporaires ; les autres 4xx ne le sont pas
+const isRetryable = (error: any) => !error?.statusCode || error.statusCode === 429 || error.statusCode >= 500;
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Envois reportés gardés au plus (les plus anciens sont abandonnés au-delà)
+const MAX_DEFERRED = 1000;
+
+interface PushJob {
+  target: PushTarget;
+  body: string;
+  // Envoi reporté rejoué : hors des compteurs du résultat
+  replay?: boolean;
+}
+
+// Exécute `worker` sur chaque élément avec au plus `concurrency` appels en cours
+export async function runPool<T>(items: T[], concurrency: number, worker: (item: T) => Promise<void>) {
+  let next = 0;
+  const runners = Array.from({ length: Math.min(concurrency, items.length) }, async () => {
+    while (next < items.length) {
+      const item = items[next++];
+      await worker(item);
+    }
+  });
+  await Promise.all(runners);
+}
+
+export function createPushDispatcher(prisma: PrismaClient, options: DispatchOptions = {}) {
+  // PUSH_CONCURRENCY absent ou invalide : 10 ; jamais moins d'un envoi à la fois
+  const envConcurrency = parseInt(process.env.PUSH_CONCURRENCY || '', 10);
+  const concurrency = Math.max(1, options.concurrency ?? (isNaN(envConcurrency) ? 10 : envConcurrency));
+  const retries = options.retries ?? 2;
+  const baseDelayMs = options.baseDelayMs ?? 500;
+  const maxRetryAfterMs = options.maxRetryAfterMs ?? 30000;
+  let deferredJobs: (PushJob & { notBefore: number })[] = [];
+  const sender = options.sender ?? (process.env.PUSH_STUB_URL ? stubSender(process.env.PUSH_STUB_URL) : webPushSender);
+
+  // 'deferred' : le service push demande d'attendre plus que maxRetryAfterMs, pas d'attente ici
+  const sendWithRetry = async (target: PushTarget, body: string): Promise<'sent' | 'deferred'> => {
+    for (let attempt = 0; ; attempt++) {
+      try {
+        await sender({ endpoint: target.endpoint, keys: { p256dh: target.p256dh, auth: target.auth } }, body);
+        return 'sent';
+      } catch (error: any) {
+        if (isGone(error) || !isRetryable(error)) throw error;
+        const retryAfter = parseInt(error?.headers?.['retry-after'] || '', 10);
+        if (!isNaN(retryAfter) && retryAfter * 1000 > maxRetryAfterMs) {
+          deferredJobs.push({ target, body, notBefore: Date.now() + retryAfter * 1000 });
+          if (deferredJobs.length > MAX_DEFERRED) deferredJobs.splice(0, deferredJobs.length - MAX_DEFERRED);
+          return 'deferred';
+        }
+        if (attempt >= retries) throw error;
+        const delay = !isNaN(retryAfter) ? retryAfter * 1000 : baseDelayMs * 2 ** attempt * (0.5 + Math.random());
+        await sleep(delay);
+      }
+    }
+  };
+
+  // Envoie `payload` à chaque abonnement (et les envois reportés arrivés à échéance), purge les abonnements expirés
+  const sendToSubscriptions = async (targets: PushTarget[], payload: PushPayload): Promise<DispatchResult> => {
+    const body = JSON.stringify(payload);
+    const now = Date.now();
+    const due = deferredJobs.filter(job => job.notBefore <= now).map(({ target, body }) => ({ target, body, replay: true }));
+    deferredJobs = deferredJobs.filter(job => job.notBefore > now);
+    const jobs: PushJob[] = [...targets.map(target => ({ target, body })), ...due];
+    const gone: string[] = [];
+    let success = 0;
+    let deferred = 0;
+    await runPool(jobs, concurrency, async ({ target, body, replay }) => {
+      try {
+        const outcome = await sendWithRetry(target, body);
+        if (replay) return;
+        if (outcome === 'deferred') deferred++;
+        else success++;
+      } catch (error: any) {
+        if (isGone(error)) gone.push(target.endpoint);
+        else console.error('Push send error:', error?.statusCode || error?.message || error);
+      }
+    });
+    if (gone.length) await prisma.pushSubscription.deleteMany({ where: { endpoint: { in: gone } } });
+    return { total: targets.length, success, failed: targets.length - success - deferred, deferred, removed: gone.length };
+  };
+
+  // userIds = null : tous les abonnements. history : lignes Notification à créer (userId null = diffusion)
+  const dispatch = async (userIds: string[] | null, payload: PushPayload, history: (string | null)[] = []): Promise<DispatchResult> => {
+    if (history.length) {
+      await getNotificationInbox(prisma).create(
+        history.map(userId => ({ userId, title: payload.title, body: payload.body, icon: payload.icon, data: payload.data || {} }))
+      );
+    }
+    if (userIds && userIds.length === 0) return { total: 0, success: 0, failed: 0, deferred: 0, removed: 0 };
+    const targets = await prisma.pushSubscription.findMany({
+      where: userIds ? { userId: { in: userIds } } : {},
+      select: { endpoint: true, p256dh: true, auth: true }
+    });
+    return sendToSubscriptions(targets, payload);
+  };
+
+  return { sendToSubscriptions, dispatch };
+}
+
+export type PushDispatcher = ReturnType<typeof createPushDispatcher>;
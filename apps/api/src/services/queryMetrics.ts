@@ -0,0 +1,207 @@
+import { AsyncLocalStorage } from 'async_hooks';
+import { PrismaClient, Prisma } from '@prisma/client';
+import { NextFunction, Request, Response } from 'express';
+
+// Mesures des requêtes Prisma et des routes HTTP, exposées sur /metrics (format Prometheus ou JSON).
+// - histogramme de latence par modèle / opération Prisma
+// - histogramme de latence et nombre de requêtes SQL par route Express ("GET /api/bookings/:id")
+// - journal des requêtes lentes (au-delà de SLOW_QUERY_MS) avec la route qui les a émises
+// La route courante est portée par AsyncLocalStorage : requestMetrics ouvre le contexte,
+// bindQueryContext le rétablit après les parseurs de corps (leurs callbacks perdent le contexte).
+
+const BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000];
+const SLOW_LOG_SIZE = 100;
+
+export class Histogram {
+  counts = new Array(BUCKETS_MS.length + 1).fill(0);
+  sum = 0;
+  count = 0;
+  max = 0;
+
+  observe(ms: number) {
+    let i = 0;
+    while (i < BUCKETS_MS.length && ms > BUCKETS_MS[i]) i++;
+    this.counts[i]++;
+    this.sum += ms;
+    this.count++;
+    if (ms > this.max) this.max = ms;
+  }
+
+  // Approximation par la borne supérieure du bucket
+  percentile(p: number) {
+    if (!this.count) return 0;
+    const rank = Math.ceil(this.count * p);
+    let seen = 0;
+    for (let i = 0; i < this.counts.length; i++) {
+      seen += this.counts[i];
+      if (seen >= rank) return Math.round((i < BUCKETS_MS.length ? Math.min(BUCKETS_MS[i], this.max) : this.max) * 10) / 10;
+    }
+    return Math.round(this.max * 10) / 10;
+  }
+
+  summary() {
+    return {
+      count: this.count,
+      totalMs: Math.round(this.sum),
+      avgMs: this.count ? Math.round(this.sum / this.count * 10) / 10 : 0,
+      p50Ms: this.percentile(0.5),
+      p95Ms: this.percentile(0.95),
+      p99Ms: this.percentile(0.99),
+      maxMs: Math.round(this.max)
+    };
+  }
+}
+
+interface RequestState {
+  req: Request;
+  queries: number;
+  queryMs: number;
+}
+
+interface RouteStats {
+  latency: Histogram;
+  queries: number;
+  queryMs: number;
+  errors: number;
+}
+
+export interface SlowQuery {
+  at: string;
+  model: string;
+  action: string;
+  durationMs: number;
+  route: string;
+}
+
+const routeLabel = (req: Request) =>
+  `${req.method} ${req.route ? req.baseUrl + req.route.path : 'unmatched'}`;
+
+export class QueryMetrics {
+  private context = new AsyncLocalStorage<RequestState>();
+  private queries = new Map<string, Histogram>();
+  private routes = new Map<string, RouteStats>();
+  private slowLog: SlowQuery[] = [];
+  private startedAt = Date.now();
+
+  constructor(public slowQueryMs: number) {}
+
+  currentRoute() {
+    const state = this.context.getStore();
+    return state ? routeLabel(state.req) : 'background';
+  }
+
+  recordQuery(model: string, action: string, durationMs: number) {
+    const key = `${model}.${action}`;
+    let histogram = this.queries.get(key);
+    if (!histogram) this.queries.set(key, histogram = new Histogram());
+    histogram.observe(durationMs);
+
+    const state = this.context.getStore();
+    if (state) {
+      state.queries++;
+      state.queryMs += durationMs;
+    }
+    if (durationMs >= this.slowQueryMs) {
+      const entry = { at: new Date().toISOString(), model, action, durationMs: Math.round(durationMs), route: this.currentRoute() };
+      this.slowLog.push(entry);
+      if (this.slowLog.length > SLOW_LOG_SIZE) this.slowLog.shift();
+      console.warn(`Slow query ${key} ${entry.durationMs}ms (${entry.route})`);
+    }
+  }
+
+  // Premier middleware de l'app : chronomètre la requête HTTP et ouvre le contexte de route
+  requestMetrics = (req: Request, res: Response, next: NextFunction) => {
+    const state: RequestState = { req, queries: 0, queryMs: 0 };
+    (req as any).queryMetricsState = state;
+    const start = process.hrtime.bigint();
+    res.on('finish', () => {
+      const label = routeLabel(req);
+      let stats = this.routes.get(label);
+      if (!stats) this.routes.set(label, stats = { latency: new Histogram(), queries: 0, queryMs: 0, errors: 0 });
+      stats.latency.observe(Number(process.hrtime.bigint() - start) / 1e6);
+      stats.queries += state.queries;
+      stats.queryMs += state.queryMs;
+      if (res.statusCode >= 500) stats.errors++;
+    });
+    this.context.run(state, next);
+  };
+
+  // À placer après express.json / express.raw
+  bindQueryContext = (req: Request, res: Response, next: NextFunction) => {
+    const state = (req as any).queryMetricsState as RequestState | undefined;
+    if (state && this.context.getStore() !== state) this.context.run(state, next);
+    else next();
+  };
+
+  snapshot() {
+    const routes = [...this.routes].map(([route, stats]) => ({
+      route,
+      ...stats.latency.summary(),
+      queries: stats.queries,
+      queryMs: Math.round(stats.queryMs),
+      errors: stats.errors
+    })).sort((a, b) => b.totalMs - a.totalMs);
+    const queries = [...this.queries].map(([key, histogram]) => {
+      const [model, action] = key.split('.');
+      return { model, action, ...histogram.summary() };
+    }).sort((a, b) => b.totalMs - a.totalMs);
+    return {
+      uptimeSeconds: Math.round((Date.now() - this.startedAt) / 1000),
+      slowQueryMs: this.slowQueryMs,
+      routes,
+      queries,
+      slowQueries: [...this.slowLog].reverse()
+    };
+  }
+
+  prometheus() {
+    const lines: string[] = [];
+    const escape = (value: string) => value.replace(/\\/g, '\\\\').replace(/"/g, '\\"');
+    const histogram = (name: string, labels: string, h: Histogram) => {
+      let cumulative = 0;
+      BUCKETS_MS.forEach((le, i) => {
+        cumulative += h.counts[i];
+        lines.push(`${name}_bucket{${labels},le="${le}"} ${cumulative}`);
+      });
+      lines.push(`${name}_bucket{${labels},le="+Inf"} ${h.count}`);
+      lines.push(`${name}_sum{${labels}} ${h.sum.toFixed(3)}`);
+      lines.push(`${name}_count{${labels}} ${h.count}`);
+    };
+
+    lines.push('# HELP prisma_query_duration_ms Prisma query latency by model and operation');
+    lines.push('# TYPE prisma_query_duration_ms histogram');
+    for (const [key, h] of this.queries) {
+      const [model, action] = key.split('.');
+      histogram('prisma_query_duration_ms', `model="${escape(model)}",action="${escape(action)}"`, h);
+    }
+    lines.push('# HELP http_request_duration_ms HTTP latency by route');
+    lines.push('# TYPE http_request_duration_ms histogram');
+    for (const [route, stats] of this.routes) histogram('http_request_duration_ms', `route="${escape(route)}"`, stats.latency);
+    lines.push('# HELP http_request_queries_total Prisma queries issued by route');
+    lines.push('# TYPE http_request_queries_total counter');
+    for (const [route, stats] of this.routes) lines.push(`http_request_queries_total{route="${escape(route)}"} ${stats.queries}`);
+    lines.push('# HELP http_request_errors_total 5xx responses by route');
+    lines.push('# TYPE http_request_errors_total counter');
+    for (const [route, stats] of this.routes) lines.push(`http_request_errors_total{route="${escape(route)}"} ${stats.errors}`);
+    return lines.join('\n') + '\n';
+  }
+}
+
+// Middleware Prisma : à enregistrer en premier pour couvrir le temps des autres middlewares
+export function trackQueries(client: PrismaClient, metrics: QueryMetrics) {
+  client.$use(async (params: Prisma.MiddlewareParams, next) => {
+    const start = process.hrtime.bigint();
+    try {
+      return await next(params);
+    } finally {
+      metrics.recordQuery(params.model || 'raw', params.action, Number(process.hrtime.bigint() - start) / 1e6);
+    }
+  });
+}
+
+let sharedMetrics: QueryMetrics | null = null;
+
+export function getQueryMetrics() {
+  if (!sharedMetrics) sharedMetrics = new QueryMetrics(parseInt(process.env.SLOW_QUERY_MS || '200', 10));
+  return sharedMetrics;
+}
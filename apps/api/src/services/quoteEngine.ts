@@ -0,0 +1,232 @@
+import { Prisma, PrismaClient } from '@prisma/client';
+
+// Moteur de tarification unique (widget, opérateur, validation des réservations, prolongations).
+// - grilles Pricing / Option chargées en tableaux compacts : day1..day14 à la suite (14 valeurs par modèle),
+//   prix du jour supplémentaire et heures supplémentaires dans des tableaux parallèles
+// - un devis calcule tous les modèles et toutes les options pour une durée en un seul parcours,
+//   mémorisé par (version des tarifs, jours, heures supplémentaires)
+// - version incrémentée à chaque écriture sur Pricing / Option / Vehicle (middleware Prisma) ;
+//   grilles rechargées après TARIFF_CACHE_TTL_MS pour les écritures des autres instances
+// Règle de prix (celle du widget) : dayN jusqu'à 14 jours ; au-delà, day14 + (jours - 14) x day14 / 14
+// arrondi à l'euro inférieur (extraDayPrice n'est pas utilisé par le widget) ; heures supplémentaires
+// extraHour1..extraHour4 cumulées (4 au plus), véhicules seulement.
+
+const TABLE_DAYS = 14;
+const EXTRA_HOURS = 4;
+const DAY_MS = 1000 * 60 * 60 * 24;
+export const MAX_QUOTE_DAYS = 366;
+
+export interface TariffTables {
+  version: number;
+  loadedAt: number;
+  vehicleIds: string[];
+  vehicleDays: Float64Array; // n x 14
+  vehicleExtraHours: Float64Array; // n x 4
+  optionIds: string[];
+  optionDays: Float64Array;
+}
+
+export interface Quote {
+  version: number;
+  days: number;
+  extraHours: number;
+  vehicles: Record<string, number>;
+  options: Record<string, number>;
+}
+
+export interface QuoteLine {
+  id: string;
+  quantity: number;
+}
+
+export interface PricedBooking {
+  days: number;
+  extraHours: number;
+  items: { vehicleId: string; quantity: number; unitPrice: number; totalPrice: number }[];
+  options: { optionId: string; quantity: number; unitPrice: number; totalPrice: number }[];
+  total: number;
+}
+
+// Durée facturée : jours entamés entre les deux dates, 1 au minimum
+export const rentalDays = (start: Date | string, end: Date | string) =>
+  Math.max(1, Math.ceil((new Date(end).getTime() - new Date(start).getTime()) / DAY_MS));
+
+// Heures entamées au-delà de l'heure de départ (retour plus tard dans la journée)
+export const rentalExtraHours = (startTime?: string | null, endTime?: string | null) => {
+  if (!startTime || !endTime) return 0;
+  const [sH, sM] = startTime.split(':').map(Number);
+  const [eH, eM] = endTime.split(':').map(Number);
+  const diff = (eH * 60 + eM) - (sH * 60 + sM);
+  return diff > 0 ? Math.ceil(diff / 60) : 0;
+};
+
+const tableValue = (row: any, key: string) => Number(row[key]) || 0;
+
+export function buildTariffTables(pricing: any[], options: any[], version: number): TariffTables {
+  // Une grille par modèle : la première trouvée (pricing[0] côté widget)
+  const byVehicle = new Map<string, any>();
+  for (const row of pricing) if (!byVehicle.has(row.vehicleId)) byVehicle.set(row.vehicleId, row);
+  const vehicleIds = [...byVehicle.keys()];
+  const vehicleDays = new Float64Array(vehicleIds.length * TABLE_DAYS);
+  const vehicleExtraHours = new Float64Array(vehicleIds.length * EXTRA_HOURS);
+  vehicleIds.forEach((id, i) => {
+    const row = byVehicle.get(id);
+    for (let d = 0; d < TABLE_DAYS; d++) vehicleDays[i * TABLE_DAYS + d] = tableValue(row, `day${d + 1}`);
+    for (let h = 0; h < EXTRA_HOURS; h++) vehicleExtraHours[i * EXTRA_HOURS + h] = tableValue(row, `extraHour${h + 1}`);
+  });
+  const optionIds = options.map(o => o.id);
+  const optionDays = new Float64Array(optionIds.length * TABLE_DAYS);
+  options.forEach((row, i) => {
+    for (let d = 0; d < TABLE_DAYS; d++) optionDays[i * TABLE_DAYS + d] = tableValue(row, `day${d + 1}`);
+  });
+  return {
+    version,
+    loadedAt: Date.now(),
+    vehicleIds,
+    vehicleDays,
+    vehicleExtraHours,
+    optionIds,
+    optionDays
+  };
+}
+
+// Prix de tous les modèles d'une grille pour une durée : un parcours des tableaux
+function priceAll(days: Float64Array, count: number, duration: number, extraHours?: Float64Array, hours = 0) {
+  const prices = new Float64Array(count);
+  const column = Math.min(duration, TABLE_DAYS) - 1;
+  const beyond = Math.max(0, duration - TABLE_DAYS);
+  const paidHours = Math.min(hours, EXTRA_HOURS);
+  for (let i = 0; i < count; i++) {
+    let price = days[i * TABLE_DAYS + column];
+    // Même ordre d'opérations que le widget : beyond * day14 / 14 et non beyond * (day14 / 14)
+    if (beyond) price += Math.floor(beyond * days[i * TABLE_DAYS + TABLE_DAYS - 1] / TABLE_DAYS);
+    if (extraHours) for (let h = 0; h < paidHours; h++) price += extraHours[i * EXTRA_HOURS + h];
+    prices[i] = price;
+  }
+  return prices;
+}
+
+const round2 = (value: number) => Math.round(value * 100) / 100;
+
+export class QuoteEngine {
+  private tables: TariffTables | null = null;
+  private loading: Promise<TariffTables> | null = null;
+  private version = 1;
+  private memo = new Map<string, { vehicles: Float64Array; options: Float64Array; json: Quote }>();
+  private counters = { quotes: 0, memoHits: 0, reloads: 0 };
+
+  constructor(private load: () => Promise<{ pricing: any[]; options: any[] }>, private ttlMs: number) {}
+
+  private async current(): Promise<TariffTables> {
+    if (this.tables && this.tables.version === this.version && Date.now() - this.tables.loadedAt < this.ttlMs) return this.tables;
+    if (!this.loading) {
+      const version = this.version;
+      this.counters.reloads++;
+      this.loading = this.load()
+        .then(({ pricing, options }) => {
+          const tables = buildTariffTables(pricing, options, version);
+          // Écriture pendant le chargement : grilles utilisées pour cette lecture mais pas gardées
+          if (version === this.version) {
+            this.tables = tables;
+            this.memo.clear();
+          }
+          return tables;
+        })
+        .finally(() => { this.loading = null; });
+    }
+    return this.loading;
+  }
+
+  invalidate() {
+    this.version++;
+  }
+
+  private async compute(days: number, extraHours: number) {
+    this.counters.quotes++;
+    const tables = await this.current();
+    const key = `${tables.version}:${days}:${extraHours}`;
+    const cached = this.memo.get(key);
+    if (cached) {
+      this.counters.memoHits++;
+      return cached;
+    }
+    const vehicles = priceAll(tables.vehicleDays, tables.vehicleIds.length, days, tables.vehicleExtraHours, extraHours);
+    const options = priceAll(tables.optionDays, tables.optionIds.length, days);
+    const json: Quote = {
+      version: tables.version,
+      days,
+      extraHours,
+      vehicles: Object.fromEntries(tables.vehicleIds.map((id, i) => [id, vehicles[i]])),
+      options: Object.fromEntries(tables.optionIds.map((id, i) => [id, options[i]]))
+    };
+    const entry = { vehicles, options, json };
+    if (tables === this.tables) this.memo.set(key, entry);
+    return entry;
+  }
+
+  // Tous les modèles et options pour une durée (endpoint /api/quote)
+  async quote(days: number, extraHours = 0): Promise<Quote> {
+    return (await this.compute(clampDays(days), Math.min(EXTRA_HOURS, Math.max(0, Math.floor(extraHours) || 0)))).json;
+  }
+
+  // Prix serveur d'une réservation : lignes véhicules (avec heures supplémentaires) et options
+  async priceBooking(days: number, extraHours: number, items: QuoteLine[], options: QuoteLine[] = []): Promise<PricedBooking> {
+    const quote = await this.quote(days, extraHours);
+    const line = (prices: Record<string, number>, { id, quantity }: QuoteLine) => {
+      const unitPrice = prices[id] ?? 0;
+      return { unitPrice, totalPrice: round2(unitPrice * quantity) };
+    };
+    const pricedItems = items.filter(i => i.quantity > 0).map(i => ({ vehicleId: i.id, quantity: i.quantity, ...line(quote.vehicles, i) }));
+    const pricedOptions = options.filter(o => o.quantity > 0).map(o => ({ optionId: o.id, quantity: o.quantity, ...line(quote.options, o) }));
+    const total = round2([...pricedItems, ...pricedOptions].reduce((sum, l) => sum + l.totalPrice, 0));
+    return { days: quote.days, extraHours: quote.extraHours, items: pricedItems, options: pricedOptions, total };
+  }
+
+  // Prolongation : différence entre le prix de la durée totale prolongée et celui de la durée actuelle
+  async extensionPrice(items: QuoteLine[], currentDays: number, additionalDays: number) {
+    const [before, after] = await Promise.all([
+      this.priceBooking(currentDays, 0, items),
+      this.priceBooking(currentDays + additionalDays, 0, items)
+    ]);
+    const amount = round2(Math.max(0, after.total - before.total));
+    return { amount, dailyRate: additionalDays > 0 ? round2(amount / additionalDays) : 0 };
+  }
+
+  stats() {
+    return { version: this.version, memo: this.memo.size, vehicles: this.tables?.vehicleIds.length ?? 0, options: this.tables?.optionIds.length ?? 0, ...this.counters };
+  }
+}
+
+// Tarif journalier d'une prolongation du véhicule loué, depuis la grille de son modèle (0 sans grille : l'appelant garde son repli)
+export async function extensionDailyRate(engine: QuoteEngine, vehicleId: string | null | undefined, startDate: Date, currentEndDate: Date, additionalDays: number) {
+  if (!vehicleId || additionalDays <= 0) return 0;
+  const { dailyRate } = await engine.extensionPrice([{ id: vehicleId, quantity: 1 }], rentalDays(startDate, currentEndDate), additionalDays);
+  return dailyRate;
+}
+
+const clampDays = (days: number) => Math.min(MAX_QUOTE_DAYS, Math.max(1, Math.floor(days) || 1));
+
+export function trackTariffChanges(client: PrismaClient, engine: QuoteEngine) {
+  client.$use(async (params: Prisma.MiddlewareParams, next) => {
+    const result = await next(params);
+    if ((params.model === 'Pricing' || params.model === 'Option' || params.model === 'Vehicle') && !params.action.startsWith('find') && params.action !== 'count' && params.action !== 'aggregate' && params.action !== 'groupBy') {
+      engine.invalidate();
+    }
+    return result;
+  });
+}
+
+let sharedEngine: QuoteEngine | null = null;
+
+export function getQuoteEngine(prisma: PrismaClient) {
+  if (!sharedEngine) {
+    sharedEngine = new QuoteEngine(async () => {
+      const [pricing, options] = await Promise.all([
+        prisma.pricing.findMany({ orderBy: { createdAt: 'asc' } }),
+        prisma.option.findMany()
+      ]);
+      return { pricing, options };
+    }, parseInt(process.env.TARIFF_CACHE_TTL_MS || '60000', 10));
+  }
+  return sharedEngine;
+}
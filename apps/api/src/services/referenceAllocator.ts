@@ -0,0 +1,102 @@
+import { PrismaClient } from '@prisma/client';
+
+// Numéros de réservation (VR-00042, MR-00007) sans collision entre requêtes ni entre instances API :
+// - compteur par préfixe (table ReferenceCounter) incrémenté atomiquement par Postgres (INSERT ... ON CONFLICT ... RETURNING)
+// - chaque instance réserve un bloc de numéros (REFERENCE_BLOCK_SIZE, 10 par défaut) et les distribue en mémoire :
+//   un aller-retour base pour tout le bloc, aucun pour les suivants
+// - une seule réservation de bloc en cours par préfixe : les requêtes simultanées attendent la même
+// Conséquences assumées : les numéros d'un bloc non utilisés avant un redémarrage sont perdus (trous dans la
+// numérotation) et deux instances n'attribuent pas les numéros dans l'ordre chronologique strict.
+
+export interface CounterStore {
+  // Réserve `size` numéros et renvoie le dernier ; `seed` donne le point de départ si le compteur n'existe pas encore
+  reserve(key: string, size: number, seed: () => Promise<number>): Promise<number>;
+}
+
+export function prismaCounterStore(prisma: PrismaClient): CounterStore {
+  return {
+    async reserve(key, size, seed) {
+      const updated = await prisma.$queryRaw<{ value: number }[]>`
+        UPDATE "ReferenceCounter" SET "value" = "value" + ${size}, "updatedAt" = now()
+        WHERE "key" = ${key}
+        RETURNING "value"`;
+      if (updated.length) return Number(updated[0].value);
+      // Premier usage : départ après le plus grand numéro existant ; ON CONFLICT si une autre instance a créé le compteur entre-temps
+      const start = await seed();
+      const inserted = await prisma.$queryRaw<{ value: number }[]>`
+        INSERT INTO "ReferenceCounter" ("key", "value", "updatedAt") VALUES (${key}, ${start + size}, now())
+        ON CONFLICT ("key") DO UPDATE SET "value" = "ReferenceCounter"."value" + ${size}, "updatedAt" = now()
+        RETURNING "value"`;
+      return Number(inserted[0].value);
+    }
+  };
+}
+
+// Compteur en mémoire avec latence simulée (benchmarks)
+export function createMemoryCounterStore(latencyMs = 2) {
+  const values = new Map<string, number>();
+  const calls = { reserve: 0 };
+  const store: CounterStore = {
+    async reserve(key, size, seed) {
+      calls.reserve++;
+      const start = values.has(key) ? 0 : await seed();
+      await new Promise(resolve => setTimeout(resolve, latencyMs));
+      const value = (values.get(key) ?? start) + size;
+      values.set(key, value);
+      return value;
+    }
+  };
+  return { store, calls };
+}
+
+export class ReferenceAllocator {
+  private blocks = new Map<string, { next: number; end: number }>();
+  private refills = new Map<string, Promise<void>>();
+
+  constructor(private store: CounterStore, private blockSize: number, private seed: (key: string) => Promise<number>) {}
+
+  async next(key: string): Promise<number> {
+    for (;;) {
+      const block = this.blocks.get(key);
+      if (block && block.next <= block.end) return block.next++;
+      let refill = this.refills.get(key);
+      if (!refill) {
+        refill = this.store.reserve(key, this.blockSize, () => this.seed(key))
+          .then(end => { this.blocks.set(key, { next: end - this.blockSize + 1, end }); })
+          .finally(() => { this.refills.delete(key); });
+        this.refills.set(key, refill);
+      }
+      await refill;
+    }
+  }
+}
+
+// Plus grand numéro déjà attribué pour un préfixe (une seule fois par préfixe, à la création du compteur)
+export async function maxBookingNumber(prisma: PrismaClient, prefix: string) {
+  const rows = await prisma.$queryRaw<{ max: number | null }[]>`
+    SELECT MAX(CAST(SUBSTRING("reference" FROM ${prefix.length + 1}) AS INTEGER)) AS "max"
+    FROM "Booking"
+    WHERE "reference" LIKE ${prefix + '%'} AND SUBSTRING("reference" FROM ${prefix.length + 1}) ~ '^[0-9]{1,9}$'`;
+  return Number(rows[0]?.max ?? 0);
+}
+
+export const bookingReferencePrefix = (brand: string) => brand === 'MOTOR-RENT' ? 'MR-' : 'VR-';
+export const formatBookingReference = (prefix: string, value: number) => prefix + String(value).padStart(5, '0');
+
+let sharedAllocator: ReferenceAllocator | null = null;
+
+export function getBookingReferenceAllocator(prisma: PrismaClient) {
+  if (!sharedAllocator) {
+    sharedAllocator = new ReferenceAllocator(
+      prismaCounterStore(prisma),
+      parseInt(process.env.REFERENCE_BLOCK_SIZE || '10', 10),
+      key => maxBookingNumber(prisma, key.replace(/^booking:/, ''))
+    );
+  }
+  return sharedAllocator;
+}
+
+export async function nextBookingReference(prisma: PrismaClient, brand: string) {
+  const prefix = bookingReferencePrefix(brand);
+  return formatBookingReference(prefix, await getBookingReferenceAllocator(prisma).next('booking:' + prefix));
+}
@@ -0,0 +1,520 @@
+import { Prisma, PrismaClient } from '@prisma/client';
+import { formatDay } from './agencyCalendar';
+import { withClusterLock } from './clusterLock';
+
+// Agrégats de reporting (table ReportDaily) : une ligne par jour UTC × agence × modèle (Vehicle), lue par /api/reports/*.
+// Une saison pour toutes les agences = quelques centaines / milliers de lignes au lieu de tous les contrats et paiements.
+// - unitDays : unités Fleet actives (hors RETIRED / OUT_OF_SERVICE) ; pas d'historique des statuts en base, donc
+//   la valeur d'un jour passé est celle calculée ce jour-là et n'est plus réécrite (reconstruction : état actuel)
+// - rentedDays / contractsStarted : contrats ACTIVE, COMPLETED, DISPUTED sur [currentStartDate, currentEndDate),
+//   attribués à l'agence du contrat (retour et départ le même jour comptent une fois, comme bookingOverlap)
+// - rentalRevenue : ContractPayment RENTAL encaissés (completedAt), refunds : leurs remboursements (refundedAt)
+// - extensionRevenue : ContractExtension payées (paidAt) ; les ContractPayment EXTENSION ne sont pas recomptés
+// - deductions : ContractDeduction (createdAt), mileage : MileageLog.difference (recordedAt, agence de l'unité)
+// Mise à jour incrémentale : le middleware trackReportWrites note les clés touchées (contrat, unité, jours) et
+// recalcule ces seules clés après REPORT_FLUSH_MS ; écritures non localisables (updateMany…) et autres réplicas :
+// rattrapage chaque nuit (REPORT_RECONCILE_HOUR UTC) sur les REPORT_RECONCILE_DAYS derniers jours, un seul réplica.
+// Idem pour l'ancienne clé d'un contrat réaffecté à une unité d'un autre modèle (seule la nouvelle est connue).
+
+const DAY_MS = 86400000;
+export const MAX_REPORT_DAYS = 1096;
+export const REPORT_INTERVALS = ['day', 'week', 'month', 'year', 'total'] as const;
+export const REPORT_DIMENSIONS = ['agency', 'vehicle'] as const;
+// Verrou de cluster commun à la réconciliation et aux reconstructions manuelles
+export const REPORT_LOCK = 'report-rollups';
+const REBUILD_MAX_DURATION_MS = 30 * 60 * 1000;
+// Reconstruction par tranches : une instruction par mois, toutes clés confondues
+const REBUILD_CHUNK_DAYS = 31;
+
+export type ReportInterval = typeof REPORT_INTERVALS[number];
+export type ReportDimension = typeof REPORT_DIMENSIONS[number];
+
+export interface ReportFilter {
+  from: string; // AAAA-MM-JJ inclus
+  to: string;
+  interval: ReportInterval;
+  groupBy: ReportDimension[];
+  agencyId?: string;
+  vehicleId?: string;
+}
+
+export interface ReportRow {
+  period: string | null;
+  agencyId?: string;
+  agencyCode?: string;
+  vehicleId?: string;
+  vehicleSku?: string;
+  vehicleName?: unknown;
+  unitDays: number;
+  rentedDays: number;
+  contractsStarted: number;
+  rentalRevenue: number;
+  extensionRevenue: number;
+  refunds: number;
+  deductions: number;
+  mileage: number;
+}
+
+interface Target {
+  agencyId: string;
+  vehicleId: string;
+  from: number; // numéros de jour (jours depuis 1970-01-01 UTC)
+  to: number;
+}
+
+const dayOf = (date: Date) => Math.floor(date.getTime() / DAY_MS);
+const today = () => dayOf(new Date());
+
+const TODAY = Prisma.sql`(now() AT TIME ZONE 'UTC')::date`;
+
+// Recalcul complet des lignes des clés ciblées, chacune sur sa plage de jours, depuis les tables sources.
+// Les lignes devenues vides sont remises à zéro (unitDays des jours passés conservé).
+// Une clé ne doit apparaître qu'une fois dans targets (ON CONFLICT ne touche pas deux fois la même ligne).
+const recomputeSql = (targets: Target[]) => Prisma.sql`
+  WITH targets AS (
+    SELECT * FROM unnest(${targets.map(t => t.agencyId)}::text[], ${targets.map(t => t.vehicleId)}::text[],
+      ${targets.map(t => formatDay(t.from))}::text[]::date[], ${targets.map(t => formatDay(t.to))}::text[]::date[])
+      AS t("agencyId", "vehicleId", "fromDay", "toDay")
+  ), bounds AS (
+    SELECT min("fromDay") AS "fromDay", max("toDay") + 1 AS "endDay" FROM targets
+  ), units AS (
+    SELECT g."day"::date AS "day", t."agencyId", t."vehicleId", count(*)::int AS "unitDays"
+    FROM targets t
+    JOIN "Fleet" f ON f."agencyId" = t."agencyId" AND f."vehicleId" = t."vehicleId"
+    CROSS JOIN LATERAL generate_series(GREATEST(t."fromDay", f."createdAt"::date), t."toDay", interval '1 day') AS g("day")
+    WHERE f."isActive" AND f."status" NOT IN ('RETIRED', 'OUT_OF_SERVICE')
+    GROUP BY 1, 2, 3
+  ), rented AS (
+    SELECT g."day"::date AS "day", t."agencyId", t."vehicleId",
+      count(DISTINCT c."fleetVehicleId")::int AS "rentedDays",
+      count(*) FILTER (WHERE g."day" = c."currentStartDate"::date)::int AS "contractsStarted"
+    FROM bounds b
+    JOIN "RentalContract" c ON c."currentStartDate" < b."endDay" AND c."currentEndDate" >= b."fromDay"
+    JOIN "Fleet" f ON f."id" = c."fleetVehicleId"
+    JOIN targets t ON t."agencyId" = c."agencyId" AND t."vehicleId" = f."vehicleId"
+    CROSS JOIN LATERAL generate_series(
+      GREATEST(t."fromDay", c."currentStartDate"::date),
+      LEAST(t."toDay", GREATEST(c."currentEndDate"::date - 1, c."currentStartDate"::date)),
+      interval '1 day') AS g("day")
+    WHERE c."status" IN ('ACTIVE', 'COMPLETED', 'DISPUTED')
+    GROUP BY 1, 2, 3
+  ), events AS (
+    SELECT p."completedAt" AS "at", p."contractId", p."amount" AS "rentalRevenue", 0 AS "extensionRevenue", 0 AS "refunds", 0 AS "deductions"
+    FROM bounds b JOIN "ContractPayment" p ON p."completedAt" >= b."fromDay" AND p."completedAt" < b."endDay"
+    WHERE p."type" = 'RENTAL' AND p."status" IN ('COMPLETED', 'REFUNDED')
+    UNION ALL
+    SELECT p."refundedAt", p."contractId", 0, 0, p."refundedAmount", 0
+    FROM bounds b JOIN "ContractPayment" p ON p."refundedAt" >= b."fromDay" AND p."refundedAt" < b."endDay"
+    WHERE p."type" = 'RENTAL' AND p."refundedAmount" > 0
+    UNION ALL
+    SELECT e."paidAt", e."contractId", 0, COALESCE(e."paidAmount", e."totalAmount"), 0, 0
+    FROM bounds b JOIN "ContractExtension" e ON e."paidAt" >= b."fromDay" AND e."paidAt" < b."endDay"
+    WHERE e."paymentStatus" = 'PAID'
+    UNION ALL
+    SELECT d."createdAt", d."contractId", 0, 0, 0, d."totalPrice"
+    FROM bounds b JOIN "ContractDeduction" d ON d."createdAt" >= b."fromDay" AND d."createdAt" < b."endDay"
+  ), money AS (
+    SELECT ev."at"::date AS "day", t."agencyId", t."vehicleId",
+      sum(ev."rentalRevenue") AS "rentalRevenue", sum(ev."extensionRevenue") AS "extensionRevenue",
+      sum(ev."refunds") AS "refunds", sum(ev."deductions") AS "deductions"
+    FROM events ev
+    JOIN "RentalContract" c ON c."id" = ev."contractId"
+    JOIN "Fleet" f ON f."id" = c."fleetVehicleId"
+    JOIN targets t ON t."agencyId" = c."agencyId" AND t."vehicleId" = f."vehicleId" AND ev."at"::date BETWEEN t."fromDay" AND t."toDay"
+    GROUP BY 1, 2, 3
+  ), mileage AS (
+    SELECT m."recordedAt"::date AS "day", t."agencyId", t."vehicleId", sum(m."difference")::int AS "mileage"
+    FROM bounds b
+    JOIN "MileageLog" m ON m."recordedAt" >= b."fromDay" AND m."recordedAt" < b."endDay"
+    JOIN "Fleet" f ON f."id" = m."fleetId"
+    JOIN targets t ON t."agencyId" = f."agencyId" AND t."vehicleId" = f."vehicleId" AND m."recordedAt"::date BETWEEN t."fromDay" AND t."toDay"
+    GROUP BY 1, 2, 3
+  ), computed AS (
+    SELECT k."day", k."agencyId", k."vehicleId",
+      COALESCE(u."unitDays", 0) AS "unitDays", COALESCE(r."rentedDays", 0) AS "rentedDays", COALESCE(r."contractsStarted", 0) AS "contractsStarted",
+      COALESCE(m."rentalRevenue", 0) AS "rentalRevenue", COALESCE(m."extensionRevenue", 0) AS "extensionRevenue",
+      COALESCE(m."refunds", 0) AS "refunds", COALESCE(m."deductions", 0) AS "deductions", COALESCE(km."mileage", 0) AS "mileage"
+    FROM (
+      SELECT "day", "agencyId", "vehicleId" FROM units UNION SELECT "day", "agencyId", "vehicleId" FROM rented
+      UNION SELECT "day", "agencyId", "vehicleId" FROM money UNION SELECT "day", "agencyId", "vehicleId" FROM mileage
+    ) k
+    LEFT JOIN units u USING ("day", "agencyId", "vehicleId")
+    LEFT JOIN rented r USING ("day", "agencyId", "vehicleId")
+    LEFT JOIN money m USING ("day", "agencyId", "vehicleId")
+    LEFT JOIN mileage km USING ("day", "agencyId", "vehicleId")
+  ), upserted AS (
+    INSERT INTO "ReportDaily" ("day", "agencyId", "vehicleId", "unitDays", "rentedDays", "contractsStarted",
+      "rentalRevenue", "extensionRevenue", "refunds", "deductions", "mileage", "updatedAt")
+    SELECT *, (now() AT TIME ZONE 'UTC') FROM computed
+    ON CONFLICT ("day", "agencyId", "vehicleId") DO UPDATE SET
+      "unitDays" = CASE WHEN "ReportDaily"."day" < ${TODAY} THEN "ReportDaily"."unitDays" ELSE EXCLUDED."unitDays" END,
+      "rentedDays" = EXCLUDED."rentedDays", "contractsStarted" = EXCLUDED."contractsStarted",
+      "rentalRevenue" = EXCLUDED."rentalRevenue", "extensionRevenue" = EXCLUDED."extensionRevenue",
+      "refunds" = EXCLUDED."refunds", "deductions" = EXCLUDED."deductions", "mileage" = EXCLUDED."mileage",
+      "updatedAt" = EXCLUDED."updatedAt"
+    RETURNING 1
+  ), cleared AS (
+    UPDATE "ReportDaily" r SET
+      "unitDays" = CASE WHEN r."day" < ${TODAY} THEN r."unitDays" ELSE 0 END,
+      "rentedDays" = 0, "contractsStarted" = 0, "rentalRevenue" = 0, "extensionRevenue" = 0, "refunds" = 0, "deductions" = 0, "mileage" = 0,
+      "updatedAt" = (now() AT TIME ZONE 'UTC')
+    FROM targets t
+    WHERE r."agencyId" = t."agencyId" AND r."vehicleId" = t."vehicleId" AND r."day" BETWEEN t."fromDay" AND t."toDay"
+      AND NOT EXISTS (SELECT 1 FROM computed c WHERE c."day" = r."day" AND c."agencyId" = r."agencyId" AND c."vehicleId" = r."vehicleId")
+    RETURNING 1
+  )
+  SELECT (SELECT count(*)::int FROM upserted) AS "upserted", (SELECT count(*)::int FROM cleared) AS "cleared"`;
+
+const PERIODS: Record<Exclude<ReportInterval, 'total'>, Prisma.Sql> = {
+  day: Prisma.sql`r."day"`,
+  week: Prisma.sql`date_trunc('week', r."day")::date`,
+  month: Prisma.sql`date_trunc('month', r."day")::date`,
+  year: Prisma.sql`date_trunc('year', r."day")::date`
+};
+
+export class ReportRollups {
+  // Clés en attente : `${agencyId}|${fleetId}` (agencyId vide : agence de l'unité) et contrats -> [premier, dernier jour]
+  // (premier jour null : depuis le début du contrat)
+  private dirtyUnits = new Map<string, [number, number]>();
+  private dirtyContracts = new Map<string, [number | null, number]>();
+  private allToday = false;
+  private flushTimer: NodeJS.Timeout | null = null;
+  private flushing: Promise<void> | null = null;
+  private timer: NodeJS.Timeout | null = null;
+  private running = false;
+  private lastReconcile: { at: string; from: string; to: string; rows: number; durationMs: number } | null = null;
+  private counters = { marks: 0, flushes: 0, targets: 0, rows: 0, unresolved: 0, errors: 0 };
+  readonly flushMs: number;
+  readonly reconcileDays: number;
+  readonly reconcileHour: number;
+
+  constructor(private prisma: PrismaClient) {
+    this.flushMs = parseInt(process.env.REPORT_FLUSH_MS || '2000', 10);
+    this.reconcileDays = parseInt(process.env.REPORT_RECONCILE_DAYS || '35', 10);
+    this.reconcileHour = parseInt(process.env.REPORT_RECONCILE_HOUR || '3', 10);
+  }
+
+  // Unité (et agence du contrat pour les jours loués), jours touchés par une écriture
+  markUnit(fleetId: string, from: Date | number, to: Date | number = from, agencyId = '') {
+    const key = `${agencyId}|${fleetId}`;
+    const first = typeof from === 'number' ? from : dayOf(from);
+    const last = typeof to === 'number' ? to : dayOf(to);
+    const current = this.dirtyUnits.get(key);
+    this.dirtyUnits.set(key, current ? [Math.min(current[0], first), Math.max(current[1], last)] : [first, last]);
+    this.scheduleFlush();
+  }
+
+  // Paiement, extension ou déduction d'un contrat : jours connus, ou tout le contrat (from null)
+  markContract(contractId: string, from: Date | null = null, to: Date | null = from) {
+    this.mergeContract(contractId, [from ? dayOf(from) : null, to ? dayOf(to) : today()]);
+  }
+
+  // Unité changée d'agence ou de modèle, écriture de masse : le jour courant de toutes les clés
+  markToday() {
+    this.allToday = true;
+    this.scheduleFlush();
+  }
+
+  unresolved() {
+    this.counters.unresolved++;
+  }
+
+  private scheduleFlush() {
+    this.counters.marks++;
+    if (this.flushTimer) return;
+    this.flushTimer = setTimeout(() => {
+      this.flushTimer = null;
+      this.flush().catch(() => {});
+    }, this.flushMs);
+    this.flushTimer.unref?.();
+  }
+
+  // Recalcule les clés en attente ; en cas d'échec elles restent en attente pour le prochain passage
+  async flush(): Promise<void> {
+    if (this.flushing) {
+      await this.flushing;
+      if (this.dirtyUnits.size || this.dirtyContracts.size || this.allToday) return this.flush();
+      return;
+    }
+    const units = this.dirtyUnits;
+    const contracts = this.dirtyContracts;
+    const allToday = this.allToday;
+    if (!units.size && !contracts.size && !allToday) return;
+    this.dirtyUnits = new Map();
+    this.dirtyContracts = new Map();
+    this.allToday = false;
+    this.flushing = (async () => {
+      try {
+        const targets = await this.resolve(units, contracts, allToday);
+        const rows = await this.recompute(targets);
+        this.counters.flushes++;
+        this.counters.targets += targets.length;
+        this.counters.rows += rows;
+      } catch (error) {
+        this.counters.errors++;
+        console.error('[REPORTS] Rollup update failed:', error);
+        for (const [key, [from, to]] of units) {
+          const [agencyId, fleetId] = key.split('|');
+          this.markUnit(fleetId, from, to, agencyId);
+        }
+        for (const [contractId, range] of contracts) this.mergeContract(contractId, range);
+        if (allToday) this.markToday();
+      } finally {
+        this.flushing = null;
+      }
+    })();
+    return this.flushing;
+  }
+
+  private mergeContract(contractId: string, [from, to]: [number | null, number]) {
+    const current = this.dirtyContracts.get(contractId);
+    this.dirtyContracts.set(contractId, current
+      ? [current[0] === null || from === null ? null : Math.min(current[0], from), Math.max(current[1], to)]
+      : [from, to]);
+    this.scheduleFlush();
+  }
+
+  // Clés agence × modèle et plages de jours (bornées à aujourd'hui, une plage par clé)
+  private async resolve(units: Map<string, [number, number]>, contracts: Map<string, [number | null, number]>, allToday: boolean) {
+    const last = today();
+    const targets = new Map<string, Target>();
+    const add = (agencyId: string, vehicleId: string, from: number, to: number) => {
+      to = Math.min(to, last);
+      if (from > to) return;
+      const key = `${agencyId}|${vehicleId}`;
+      const current = targets.get(key);
+      if (current) {
+        current.from = Math.min(current.from, from);
+        current.to = Math.max(current.to, to);
+      } else targets.set(key, { agencyId, vehicleId, from, to });
+    };
+
+    if (units.size) {
+      const fleetIds = [...new Set([...units.keys()].map(key => key.split('|')[1]))];
+      const fleets = await this.prisma.fleet.findMany({ where: { id: { in: fleetIds } }, select: { id: true, agencyId: true, vehicleId: true } });
+      const byId = new Map(fleets.map(f => [f.id, f]));
+      for (const [key, [from, to]] of units) {
+        const [agencyId, fleetId] = key.split('|');
+        const fleet = byId.get(fleetId);
+        if (!fleet) continue; // unité supprimée : rattrapée par la réconciliation
+        add(agencyId || fleet.agencyId, fleet.vehicleId, from, to);
+      }
+    }
+    if (contracts.size) {
+      const rows = await this.prisma.$queryRaw<{ id: string; agencyId: string; vehicleId: string; firstDay: Date }[]>`
+        SELECT c."id", c."agencyId", f."vehicleId",
+          LEAST(c."originalStartDate", c."currentStartDate", c."createdAt")::date AS "firstDay"
+        FROM "RentalContract" c JOIN "Fleet" f ON f."id" = c."fleetVehicleId"
+        WHERE c."id" = ANY(${[...contracts.keys()]})`;
+      for (const row of rows) {
+        const [from, to] = contracts.get(row.id)!;
+        add(row.agencyId, row.vehicleId, from ?? dayOf(row.firstDay), to);
+      }
+    }
+    if (allToday) {
+      for (const key of await this.keys()) add(key.agencyId, key.vehicleId, last, last);
+    }
+    return [...targets.values()];
+  }
+
+  // Toutes les clés connues : unités en flotte et contrats (une agence peut louer une unité d'une autre agence)
+  private keys() {
+    return this.prisma.$queryRaw<{ agencyId: string; vehicleId: string }[]>`
+      SELECT "agencyId", "vehicleId" FROM "Fleet"
+      UNION
+      SELECT DISTINCT c."agencyId", f."vehicleId" FROM "RentalContract" c JOIN "Fleet" f ON f."id" = c."fleetVehicleId"`;
+  }
+
+  private async recompute(targets: Target[]) {
+    if (!targets.length) return 0;
+    const [result] = await this.prisma.$queryRaw<{ upserted: number; cleared: number }[]>(recomputeSql(targets));
+    return result.upserted + result.cleared;
+  }
+
+  // Recalcul de toutes les clés sur [from, to] par tranches d'un mois (reconstruction, réconciliation)
+  async rebuild(from: number, to: number) {
+    const started = Date.now();
+    to = Math.min(to, today());
+    const keys = await this.keys();
+    let rows = 0;
+    for (let first = from; first <= to; first += REBUILD_CHUNK_DAYS) {
+      const last = Math.min(to, first + REBUILD_CHUNK_DAYS - 1);
+      rows += await this.recompute(keys.map(k => ({ ...k, from: first, to: last })));
+    }
+    return { from: formatDay(from), to: formatDay(Math.max(from, to)), keys: keys.length, rows, durationMs: Date.now() - started };
+  }
+
+  // Reconstruction manuelle (POST /api/reports/rebuild) : exclusive avec la réconciliation ; null si déjà en cours
+  async rebuildExclusive(from: number, to: number) {
+    const run = await withClusterLock(this.prisma, REPORT_LOCK, () => this.rebuild(from, to), REBUILD_MAX_DURATION_MS);
+    return run.acquired ? run.result : null;
+  }
+
+  // Premier jour couvert par les données sources (reconstruction complète)
+  async firstDay() {
+    const [{ first }] = await this.prisma.$queryRaw<{ first: Date | null }[]>`
+      SELECT LEAST(
+        (SELECT min("createdAt") FROM "Fleet"),
+        (SELECT min("currentStartDate") FROM "RentalContract"),
+        (SELECT min("recordedAt") FROM "MileageLog")
+      ) AS "first"`;
+    return first ? dayOf(first) : today();
+  }
+
+  // Réconciliation nocturne : un seul réplica ; table vide (premier déploiement) : reconstruction complète
+  async reconcile() {
+    const run = await withClusterLock(this.prisma, REPORT_LOCK, async () => {
+      const last = today();
+      const result = await this.rebuild(await this.isEmpty() ? await this.firstDay() : last - this.reconcileDays + 1, last);
+      this.lastReconcile = { at: new Date().toISOString(), from: result.from, to: result.to, rows: result.rows, durationMs: result.durationMs };
+      return result;
+    }, REBUILD_MAX_DURATION_MS);
+    return run.acquired ? run.result : null;
+  }
+
+  private async isEmpty() {
+    const [{ empty }] = await this.prisma.$queryRaw<{ empty: boolean }[]>`
+      SELECT NOT EXISTS (SELECT 1 FROM "ReportDaily") AS "empty"`;
+    return empty;
+  }
+
+  private nextReconcileDelay() {
+    const now = new Date();
+    const next = Date.UTC(now.getUTCFullYear(), now.getUTCMonth(), now.getUTCDate(), this.reconcileHour);
+    return (next > now.getTime() ? next : next + DAY_MS) - now.getTime();
+  }
+
+  start() {
+    if (this.running) return;
+    this.running = true;
+    const schedule = () => {
+      if (this.running) this.timer = setTimeout(tick, this.nextReconcileDelay());
+    };
+    const tick = async () => {
+      try {
+        const result = await this.reconcile();
+        if (result) console.log(`[REPORTS] Rollups reconciled ${result.from} -> ${result.to}: ${result.rows} rows in ${result.durationMs} ms`);
+      } catch (error) {
+        console.error('[REPORTS] Reconciliation error:', error);
+      }
+      schedule();
+    };
+    // Au démarrage : reconstruction immédiate si la table est vide (premier déploiement), sinon à l'heure prévue
+    this.timer = setTimeout(async () => {
+      const empty = await this.isEmpty().catch(error => {
+        console.error('[REPORTS] Reconciliation error:', error);
+        return false;
+      });
+      if (empty) return tick();
+      schedule();
+    }, 0);
+  }
+
+  stop() {
+    this.running = false;
+    if (this.timer) clearTimeout(this.timer);
+    this.timer = null;
+  }
+
+  // Agrégation des lignes quotidiennes : période (jour, semaine ISO, mois, année, ou tout) × agence et/ou modèle
+  async query(filter: ReportFilter): Promise<ReportRow[]> {
+    const byAgency = filter.groupBy.includes('agency');
+    const byVehicle = filter.groupBy.includes('vehicle');
+    const period = filter.interval === 'total' ? Prisma.sql`NULL::date` : PERIODS[filter.interval];
+    const conditions = [Prisma.sql`r."day" BETWEEN ${filter.from}::date AND ${filter.to}::date`];
+    if (filter.agencyId) conditions.push(Prisma.sql`r."agencyId" = ${filter.agencyId}`);
+    if (filter.vehicleId) conditions.push(Prisma.sql`r."vehicleId" = ${filter.vehicleId}`);
+    const groups = [Prisma.sql`1`];
+    if (byAgency) groups.push(Prisma.sql`r."agencyId"`);
+    if (byVehicle) groups.push(Prisma.sql`r."vehicleId"`);
+
+    const rows = await this.prisma.$queryRaw<(Omit<ReportRow, 'period'> & { period: Date | null })[]>`
+      SELECT s.*
+        ${byAgency ? Prisma.sql`, a."code" AS "agencyCode"` : Prisma.empty}
+        ${byVehicle ? Prisma.sql`, v."sku" AS "vehicleSku", v."name" AS "vehicleName"` : Prisma.empty}
+      FROM (
+        SELECT ${period} AS "period"
+          ${byAgency ? Prisma.sql`, r."agencyId"` : Prisma.empty}
+          ${byVehicle ? Prisma.sql`, r."vehicleId"` : Prisma.empty},
+          sum(r."unitDays")::int AS "unitDays", sum(r."rentedDays")::int AS "rentedDays",
+          sum(r."contractsStarted")::int AS "contractsStarted",
+          sum(r."rentalRevenue")::float8 AS "rentalRevenue", sum(r."extensionRevenue")::float8 AS "extensionRevenue",
+          sum(r."refunds")::float8 AS "refunds", sum(r."deductions")::float8 AS "deductions",
+          sum(r."mileage")::int AS "mileage"
+        FROM "ReportDaily" r
+        WHERE ${Prisma.join(conditions, ' AND ')}
+        GROUP BY ${Prisma.join(groups, ', ')}
+      ) s
+      ${byAgency ? Prisma.sql`LEFT JOIN "Agency" a ON a."id" = s."agencyId"` : Prisma.empty}
+      ${byVehicle ? Prisma.sql`LEFT JOIN "Vehicle" v ON v."id" = s."vehicleId"` : Prisma.empty}
+      ORDER BY 1 ${byAgency ? Prisma.sql`, a."code"` : Prisma.empty} ${byVehicle ? Prisma.sql`, v."sku"` : Prisma.empty}`;
+    return rows.map(row => ({ ...row, period: row.period ? formatDay(dayOf(row.period)) : null }));
+  }
+
+  async stats() {
+    const [table] = await this.prisma.$queryRaw<{ rows: number; firstDay: Date | null; lastDay: Date | null; updatedAt: Date | null }[]>`
+      SELECT count(*)::int AS "rows", min("day") AS "firstDay", max("day") AS "lastDay", max("updatedAt") AS "updatedAt" FROM "ReportDaily"`;
+    return {
+      rows: table.rows,
+      firstDay: table.firstDay ? formatDay(dayOf(table.firstDay)) : null,
+      lastDay: table.lastDay ? formatDay(dayOf(table.lastDay)) : null,
+      updatedAt: table.updatedAt,
+      pending: this.dirtyUnits.size + this.dirtyContracts.size + (this.allToday ? 1 : 0),
+      lastReconcile: this.lastReconcile,
+      ...this.counters
+    };
+  }
+}
+
+const CONTRACT_CHILDREN = new Set(['ContractPayment', 'ContractExtension', 'ContractDeduction']);
+
+// Jours d'un paiement, d'une extension ou d'une déduction pris en compte par les agrégats
+const childDays = (model: string, row: any): Date[] => {
+  if (model === 'ContractPayment') return [row.completedAt, row.refundedAt].filter(Boolean);
+  if (model === 'ContractExtension') return [row.paidAt].filter(Boolean);
+  return [row.createdAt].filter(Boolean);
+};
+
+// Middleware Prisma : note les clés touchées par les écritures sur les tables sources des agrégats.
+// Les écritures de masse sans clé exploitable (updateMany sans contractId…) attendent la réconciliation.
+export function trackReportWrites(client: PrismaClient, rollups: ReportRollups) {
+  client.$use(async (params: Prisma.MiddlewareParams, next) => {
+    const result = await next(params);
+    const model = params.model;
+    if (!model || params.action.startsWith('find') || params.action === 'count' || params.action === 'aggregate' || params.action === 'groupBy') return result;
+    const many = params.action.endsWith('Many');
+    const row = !many && result && typeof result === 'object' ? result : null;
+
+    if (model === 'RentalContract') {
+      if (row?.fleetVehicleId) {
+        // Période avant et après une modification de dates ; suppression : ses paiements disparaissent avec lui
+        const first = [row.originalStartDate, row.currentStartDate, ...(params.action === 'delete' ? [row.createdAt] : [])].filter(Boolean);
+        const last = params.action === 'delete' ? [new Date()] : [row.originalEndDate, row.currentEndDate].filter(Boolean);
+        rollups.markUnit(row.fleetVehicleId, Math.min(...first.map(dayOf)), Math.max(...last.map(dayOf)), row.agencyId);
+      } else if (many) rollups.unresolved();
+    } else if (CONTRACT_CHILDREN.has(model)) {
+      if (row?.contractId) {
+        const days = childDays(model, row);
+        if (days.length) rollups.markContract(row.contractId, new Date(Math.min(...days.map(d => d.getTime()))), new Date(Math.max(...days.map(d => d.getTime()))));
+      } else if (typeof params.args?.where?.contractId === 'string') rollups.markContract(params.args.where.contractId);
+      else if (many) rollups.unresolved();
+    } else if (model === 'MileageLog') {
+      const rows = row ? [row] : params.action === 'createMany' && Array.isArray(params.args?.data) ? params.args.data : [];
+      for (const log of rows) if (log.fleetId) rollups.markUnit(log.fleetId, log.recordedAt ? new Date(log.recordedAt) : new Date());
+      if (many && !rows.length) rollups.unresolved();
+    } else if (model === 'Fleet') {
+      const data = params.action === 'upsert' ? { ...params.args?.create, ...params.args?.update } : params.args?.data;
+      // Changement d'agence ou de modèle : l'ancienne clé perd l'unité, le jour courant de toutes les clés est recalculé
+      if (many || params.action === 'delete' || (data && ('agencyId' in data || 'vehicleId' in data || 'agency' in data || 'vehicle' in data))) rollups.markToday();
+      else if (row?.id) rollups.markUnit(row.id, new Date());
+    }
+    return result;
+  });
+}
+
+let sharedRollups: ReportRollups | null = null;
+
+export function getReportRollups(prisma: PrismaClient) {
+  if (!sharedRollups) sharedRollups = new ReportRollups(prisma);
+  return sharedRollups;
+}
@@ -0,0 +1,99 @@
+import { performance } from 'perf_hooks';
+import type { NextFunction, Request, Response } from 'express';
+
+// Mesure du démarrage à froid (déploiement, scale-up) :
+// - phases synchrones (import d'un module de routes, création d'un client) et asynchrones (connexion Prisma, warm-up)
+//   datées depuis le lancement du process (performance.now() part de l'origine du process)
+// - chargements différés (lazyModule) : Stripe, Resend, QRCode, web-push, Cloudinary ne sont requis qu'au premier usage
+// - délai jusqu'à la première requête servie, comparé à STARTUP_TARGET_MS
+// Un import mesuré ne compte que ce qui n'était pas encore en cache : les modules partagés sont imputés au premier qui les charge.
+
+export type PhaseKind = 'import' | 'init' | 'lazy';
+
+export interface StartupPhase {
+  name: string;
+  kind: PhaseKind;
+  startMs: number;
+  durationMs: number;
+}
+
+const round = (ms: number) => Math.round(ms * 10) / 10;
+
+export class StartupTimer {
+  readonly phases: StartupPhase[] = [];
+  // Temps passé par Node avant le premier module de l'application
+  readonly bootMs = performance.now();
+  readonly targetMs = parseInt(process.env.STARTUP_TARGET_MS || '1500', 10);
+  private listeningMs: number | null = null;
+  private firstRequest: { ms: number; route: string; status: number } | null = null;
+
+  measure<T>(name: string, kind: PhaseKind, fn: () => T): T {
+    const startMs = performance.now();
+    try {
+      return fn();
+    } finally {
+      this.phases.push({ name, kind, startMs, durationMs: performance.now() - startMs });
+    }
+  }
+
+  // Module chargé de façon synchrone (require) pour mesurer son coût d'import et d'initialisation
+  load<T>(name: string, fn: () => T): T {
+    return this.measure(name, 'import', fn);
+  }
+
+  async track<T>(name: string, promise: Promise<T>): Promise<T> {
+    const startMs = performance.now();
+    try {
+      return await promise;
+    } finally {
+      this.phases.push({ name, kind: 'init', startMs, durationMs: performance.now() - startMs });
+    }
+  }
+
+  listening() {
+    this.listeningMs = performance.now();
+    const imports = this.phases.filter(p => p.kind === 'import');
+    const slowest = [...imports].sort((a, b) => b.durationMs - a.durationMs).slice(0, 5);
+    console.log(`[STARTUP] listening after ${round(this.listeningMs)} ms (node ${round(this.bootMs)} ms, imports ${round(imports.reduce((s, p) => s + p.durationMs, 0))} ms: ${slowest.map(p => `${p.name} ${round(p.durationMs)}`).join(', ')})`);
+  }
+
+  // Première réponse envoyée : délai depuis le lancement du process (time-to-first-request)
+  firstRequestMiddleware = (req: Request, res: Response, next: NextFunction) => {
+    if (!this.firstRequest) {
+      res.on('finish', () => {
+        if (this.firstRequest) return;
+        this.firstRequest = { ms: performance.now(), route: `${req.method} ${req.originalUrl.split('?')[0]}`, status: res.statusCode };
+        const { ms, route } = this.firstRequest;
+        const verdict = ms <= this.targetMs ? 'within' : 'OVER';
+        console.log(`[STARTUP] first request ${route} served after ${round(ms)} ms (${verdict} target ${this.targetMs} ms)`);
+      });
+    }
+    next();
+  };
+
+  report() {
+    return {
+      bootMs: round(this.bootMs),
+      listeningMs: this.listeningMs === null ? null : round(this.listeningMs),
+      firstRequest: this.firstRequest && { ...this.firstRequest, ms: round(this.firstRequest.ms) },
+      targetMs: this.targetMs,
+      phases: this.phases.map(p => ({ ...p, startMs: round(p.startMs), durationMs: round(p.durationMs) }))
+    };
+  }
+}
+
+let sharedTimer: StartupTimer | null = null;
+
+export function getStartupTimer() {
+  if (!sharedTimer) sharedTimer = new StartupTimer();
+  return sharedTimer;
+}
+
+// Dépendance lourde requise au premier appel (puis en cache), durée du chargement enregistrée comme phase "lazy"
+export function lazyModule<T>(name: string, load: () => T): () => T {
+  let loaded: { value: T } | null = null;
+  return () => {
+    if (!loaded) loaded = { value: getStartupTimer().measure(name, 'lazy', load) };
+    return loaded.value;
+  };
+}
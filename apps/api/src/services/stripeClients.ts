@@ -0,0 +1,46 @@
+import type Stripe from 'stripe';
+import { lazyModule } from './startup';
+
+// Un client Stripe par marque (comptes séparés), créé au premier paiement : le SDK n'est pas chargé au démarrage.
+// STRIPE_API_BASE (ex. http://localhost:4010) : API Stripe simulée pour les tests de charge (loadtest/stubs.py)
+
+// Module CommonJS : export par défaut ou module lui-même selon la version du SDK
+const loadStripe = lazyModule('stripe', () => {
+  const stripe = require('stripe');
+  return (stripe.default ?? stripe) as typeof Stripe;
+});
+
+const SECRET_KEYS: Record<string, string | undefined> = {
+  VOLTRIDE: process.env.STRIPE_SECRET_KEY_VOLTRIDE,
+  'MOTOR-RENT': process.env.STRIPE_SECRET_KEY_MOTORRENT
+};
+
+const clients = new Map<string, Stripe | null>();
+
+function stripeConfig(): Stripe.StripeConfig {
+  const base = process.env.STRIPE_API_BASE ? new URL(process.env.STRIPE_API_BASE) : null;
+  return {
+    apiVersion: '2024-12-18.acacia' as any,
+    ...(base && { host: base.hostname, port: Number(base.port) || undefined, protocol: base.protocol.replace(':', '') as 'http' | 'https' })
+  };
+}
+
+function clientFor(key: string): Stripe | null {
+  if (!clients.has(key)) {
+    const secret = SECRET_KEYS[key];
+    clients.set(key, secret ? new (loadStripe())(secret, stripeConfig()) : null);
+  }
+  return clients.get(key) ?? null;
+}
+
+// Toute marque autre que MOTOR-RENT utilise le compte VOLTRIDE
+export function getStripeInstance(brand: string): Stripe {
+  const stripe = clientFor(brand === 'MOTOR-RENT' ? 'MOTOR-RENT' : 'VOLTRIDE');
+  if (!stripe) throw new Error('Stripe not configured');
+  return stripe;
+}
+
+// Vérification de signature des webhooks (calcul local) : n'importe quel compte configuré convient
+export function getWebhookStripe(): Stripe | null {
+  return clientFor('VOLTRIDE') || clientFor('MOTOR-RENT');
+}
@@ -0,0 +1,62 @@
+import { Prisma, PrismaClient } from '@prisma/client';
+import { OutboxMessageInput, enqueueOutbox } from './outbox';
+
+// Webhook Stripe, chemin rapide : dans une seule transaction, l'événement est enregistré (StripeWebhookEvent,
+// unique par stripeEventId), la réservation mise à jour et les effets de bord déposés dans l'outbox.
+// Stripe reçoit sa réponse sans attendre Resend ; un événement rejoué par Stripe est reconnu et ignoré.
+
+export interface StripeEventLike {
+  id: string;
+  type: string;
+  data: { object: any };
+}
+
+export interface AcceptedEvent {
+  duplicate: boolean;
+  queued: number;
+  error?: string;
+}
+
+type Tx = Prisma.TransactionClient;
+
+// Objet concerné par l'événement (colonnes referenceType / referenceId)
+function eventReference(event: StripeEventLike) {
+  const bookingId = event.data?.object?.metadata?.bookingId;
+  return bookingId ? { referenceType: 'Booking', referenceId: bookingId } : {};
+}
+
+// Effets d'un type d'événement : écritures en base + messages outbox
+async function applyEvent(tx: Tx, event: StripeEventLike) {
+  const messages: OutboxMessageInput[] = [];
+  let error: string | undefined;
+
+  if (event.type === 'checkout.session.completed') {
+    const bookingId = event.data.object?.metadata?.bookingId;
+    if (bookingId) {
+      const { count } = await tx.booking.updateMany({ where: { id: bookingId }, data: { status: 'CONFIRMED' } });
+      if (count) messages.push({ topic: 'booking.confirmed', payload: { bookingId }, dedupeKey: `booking.confirmed:${bookingId}` });
+      else error = 'Booking not found';
+    }
+  }
+
+  return { messages, error };
+}
+
+export async function acceptStripeEvent(prisma: PrismaClient, event: StripeEventLike): Promise<AcceptedEvent> {
+  try {
+    return await prisma.$transaction(async tx => {
+      // Insertion d'abord : un doublon échoue ici, avant de toucher à la réservation
+      await tx.stripeWebhookEvent.create({
+        data: { stripeEventId: event.id, type: event.type, payload: event as any, processedAt: new Date(), ...eventReference(event) }
+      });
+      const { messages, error } = await applyEvent(tx, event);
+      if (error) await tx.stripeWebhookEvent.update({ where: { stripeEventId: event.id }, data: { processingError: error } });
+      if (messages.length) await enqueueOutbox(tx, messages);
+      return { duplicate: false, queued: messages.length, error };
+    });
+  } catch (e: any) {
+    // Événement déjà enregistré (rejeu Stripe ou livraisons concurrentes) : la transaction est annulée
+    if (e instanceof Prisma.PrismaClientKnownRequestError && e.code === 'P2002') return { duplicate: true, queued: 0 };
+    throw e;
+  }
+}
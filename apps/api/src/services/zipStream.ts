@@ -0,0 +1,101 @@
+import { PassThrough } from 'stream';
+
+// Archive ZIP écrite au fil de l'eau (méthode "stored", sans compression : les PDF sont déjà compressés).
+// Chaque fichier est ajouté une fois complet ; le répertoire central est écrit par finish().
+// addFile renvoie false quand le lecteur ne suit pas : attendre drained() avant d'ajouter la suite.
+// Limites du format ZIP classique : 65535 fichiers, 4 Go.
+
+const CRC_TABLE = (() => {
+  const table = new Uint32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+    table[n] = c >>> 0;
+  }
+  return table;
+})();
+
+export function crc32(data: Buffer) {
+  let crc = 0xffffffff;
+  for (let i = 0; i < data.length; i++) crc = CRC_TABLE[(crc ^ data[i]) & 0xff] ^ (crc >>> 8);
+  return (crc ^ 0xffffffff) >>> 0;
+}
+
+const dosDateTime = (date: Date) => ({
+  time: (date.getHours() << 11) | (date.getMinutes() << 5) | Math.floor(date.getSeconds() / 2),
+  date: ((date.getFullYear() - 1980) << 9) | ((date.getMonth() + 1) << 5) | date.getDate()
+});
+
+export function createZipStream() {
+  const stream = new PassThrough();
+  const central: Buffer[] = [];
+  let offset = 0;
+  let count = 0;
+
+  const addFile = (name: string, data: Buffer, modified = new Date()) => {
+    const fileName = Buffer.from(name, 'utf8');
+    const crc = crc32(data);
+    const { time, date } = dosDateTime(modified);
+
+    const local = Buffer.alloc(30);
+    local.writeUInt32LE(0x04034b50, 0);
+    local.writeUInt16LE(20, 4); // version requise
+    local.writeUInt16LE(0x0800, 6); // noms en UTF-8
+    local.writeUInt16LE(0, 8); // stored
+    local.writeUInt16LE(time, 10);
+    local.writeUInt16LE(date, 12);
+    local.writeUInt32LE(crc, 14);
+    local.writeUInt32LE(data.length, 18);
+    local.writeUInt32LE(data.length, 22);
+    local.writeUInt16LE(fileName.length, 26);
+    local.writeUInt16LE(0, 28);
+
+    const header = Buffer.alloc(46);
+    header.writeUInt32LE(0x02014b50, 0);
+    header.writeUInt16LE(20, 4);
+    header.writeUInt16LE(20, 6);
+    header.writeUInt16LE(0x0800, 8);
+    header.writeUInt16LE(0, 10);
+    header.writeUInt16LE(time, 12);
+    header.writeUInt16LE(date, 14);
+    header.writeUInt32LE(crc, 16);
+    header.writeUInt32LE(data.length, 20);
+    header.writeUInt32LE(data.length, 24);
+    header.writeUInt16LE(fileName.length, 28);
+    header.writeUInt32LE(offset, 42);
+    central.push(header, fileName);
+
+    stream.write(local);
+    stream.write(fileName);
+    const flushed = stream.write(data);
+    offset += local.length + fileName.length + data.length;
+    count++;
+    return flushed;
+  };
+
+  // Flux vidé par le lecteur, ou fermé (résolue immédiatement s'il n'y a pas d'attente)
+  const drained = () => new Promise<void>(resolve => {
+    if (!stream.writableNeedDrain || stream.destroyed) return resolve();
+    const done = () => {
+      stream.off('drain', done);
+      stream.off('close', done);
+      resolve();
+    };
+    stream.on('drain', done);
+    stream.on('close', done);
+  });
+
+  const finish = () => {
+    const directory = Buffer.concat(central);
+    const end = Buffer.alloc(22);
+    end.writeUInt32LE(0x06054b50, 0);
+    end.writeUInt16LE(count, 8);
+    end.writeUInt16LE(count, 10);
+    end.writeUInt32LE(directory.length, 12);
+    end.writeUInt32LE(offset, 16);
+    stream.write(directory);
+    stream.end(end);
+  };
+
+  return { stream, addFile, drained, finish };
+}
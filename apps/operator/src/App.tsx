@@ -10,6 +10,15 @@ import { getName } from './types'
 
 const API_URL = 'https://api-voltrideandmotorrent-production.up.railway.app'
 
+// Fusionne un delta /api/sync dans une liste : remplace ou ajoute `upserts`, retire `removedIds`
+const mergeRows = (rows: any[], upserts: any[], removedIds: string[]) => {
+  const removed = new Set(removedIds)
+  const byId = new Map(upserts.map(r => [r.id, r]))
+  const existing = new Set(rows.map(r => r.id))
+  const merged = rows.filter(r => !removed.has(r.id)).map(r => byId.get(r.id) || r)
+  return [...upserts.filter(r => !existing.has(r.id) && !removed.has(r.id)), ...merged]
+}
+
 export default function App() {
   // Authentication state
   const [user, setUser] = useState<any>(null)
@@ -412,6 +421,10 @@ export default function App() {
   const [permissions, setPermissions] = useState<any[]>([])
   const [usersList, setUsersList] = useState<any[]>([])
   const [contracts, setContracts] = useState<any[]>([])
+  const [contractsCursor, setContractsCursor] = useState<string | null>(null)
+  const [bookingHistory, setBookingHistory] = useState<any[]>([])
+  const [bookingHistoryCursor, setBookingHistoryCursor] = useState<string | null>(null)
+  const [customerBookings, setCustomerBookings] = useState<any[]>([])
   const [contractsFilter, setContractsFilter] = useState({ startDate: "", endDate: "", status: "" })
   const [contractSearch, setContractSearch] = useState("")
   const [showExtensionModal, setShowExtensionModal] = useState(false)
@@ -425,13 +438,27 @@ export default function App() {
     return d
   })
 
-  // Auto-refresh toutes les 45 secondes
+  // Chargement initial puis synchronisation incrémentale : le flux SSE /api/events signale chaque écriture
+  // et /api/sync ne renvoie que les lignes modifiées. Filet de sécurité toutes les 5 minutes
+  // (écriture sur une autre instance de l'API, connexion SSE coupée silencieusement).
+  // Le chargement attend "ready" { serverTime } pour connaître l'horloge du serveur ; si le flux est
+  // indisponible, chargement sans synchronisation, reprise complète à la première connexion.
   useEffect(() => {
-    loadData()
-    const refreshInterval = setInterval(() => {
-      if (user) loadData()
-    }, 45000)
-    return () => clearInterval(refreshInterval)
+    if (!user) { loadData(); return }
+    let syncTimer: any = null
+    let loaded = false
+    const scheduleSync = () => { clearTimeout(syncTimer); syncTimer = setTimeout(() => syncChanges(), 500) }
+    const source = new EventSource(API_URL + '/api/events?token=' + encodeURIComponent(localStorage.getItem('token') || ''))
+    source.addEventListener('change', scheduleSync)
+    source.addEventListener('ready', (e: any) => {
+      serverClockOffsetRef.current = JSON.parse(e.data).serverTime - Date.now()
+      if (!loaded || syncSinceRef.current === null) { loaded = true; loadData() }
+      else scheduleSync() // reconnexion : rattraper les changements manqués
+    })
+    source.addEventListener('error', () => { if (!loaded) { loaded = true; loadData() } })
+    source.addEventListener('unread', (e: any) => applyUnreadCounts(JSON.parse(e.data)))
+    const safetyInterval = setInterval(scheduleSync, 300000)
+    return () => { source.close(); clearTimeout(syncTimer); clearInterval(safetyInterval) }
   }, [selectedAgency, brand, user])
   
   // QR Code detection - scan booking or vehicle
@@ -440,11 +467,14 @@ export default function App() {
     const scanBookingId = urlParams.get('scan')
     const vehicleId = urlParams.get('vehicle')
     
-    if (scanBookingId && bookings.length > 0) {
+    if (scanBookingId && !loading) {
+      const openBooking = (booking: any) => { setSelectedBookingDetail(booking); setShowBookingDetail(true) }
       const booking = bookings.find((b: any) => b.id === scanBookingId)
-      if (booking) {
-        setSelectedBookingDetail(booking); setShowBookingDetail(true)
-      }
+      // Réservation hors de la fenêtre du planning chargée : lue par son id
+      if (booking) openBooking(booking)
+      else api.getBooking(scanBookingId)
+        .then(data => data?.id ? openBooking(data) : alert('Réservation non trouvée'))
+        .catch(() => alert('Erreur lors du scan QR'))
       window.history.replaceState({}, '' , window.location.pathname)
     }
     
@@ -468,7 +498,7 @@ export default function App() {
         .catch(() => alert('Erreur lors du scan QR'))
       window.history.replaceState({}, '' , window.location.pathname)
     }
-  }, [bookings])
+  }, [bookings, loading])
   // Auto-sélectionner l'agence pour COLLABORATOR/FRANCHISEE
   useEffect(() => {
     if (user && (user.role === 'COLLABORATOR' || user.role === 'FRANCHISEE') && user.agencyIds?.length > 0 && !selectedAgency) {
@@ -580,11 +610,13 @@ export default function App() {
       setUsersList(Array.isArray(data) ? data : [])
     } catch (e) { console.error('Erreur chargement utilisateurs:', e) }
   }
-  const loadContracts = async () => {
+  // Contrats : projection "list", 200 par page (curseur)
+  const loadContracts = async (cursor?: string) => {
     try {
-      const res = await fetch(API_URL + "/api/contracts")
-      const data = await res.json()
-      setContracts(Array.isArray(data) ? data.filter(c => c.agency?.brand === brand) : [])
+      const data = await api.getContracts({ brand, view: 'list', limit: '200', ...(cursor ? { cursor } : {}) })
+      const items = Array.isArray(data.items) ? data.items : []
+      setContracts(prev => cursor ? [...prev, ...items] : items)
+      setContractsCursor(data.nextCursor || null)
     } catch (e) { console.error("Erreur chargement contrats:", e) }
   }
 
@@ -633,26 +665,36 @@ export default function App() {
     } catch (e) { console.error('Erreur chargement notifications:', e) }
   }
   
+  // Compteurs de non lues renvoyés par les écritures et diffusés en SSE ({ clé: non lues }, '*' = toutes)
+  const applyUnreadCounts = (counts?: Record<string, number>) => {
+    if (counts && typeof counts['*'] === 'number') setUnreadCount(counts['*'])
+  }
+
   const markAsRead = async (id: string) => {
-    await fetch(API_URL + '/api/notifications/' + id + '/read', { method: 'PUT' })
-    loadNotifications()
+    const res = await fetch(API_URL + '/api/notifications/' + id + '/read', { method: 'PUT' })
+    setNotifications(prev => prev.map(n => n.id === id ? { ...n, isRead: true } : n))
+    if (res.ok) applyUnreadCounts((await res.json()).counts)
   }
   
   const deleteNotification = async (id: string) => {
-    await fetch(API_URL + '/api/notifications/' + id, { method: 'DELETE' })
-    loadNotifications()
+    const res = await fetch(API_URL + '/api/notifications/' + id, { method: 'DELETE' })
+    setNotifications(prev => prev.filter(n => n.id !== id))
+    if (res.ok) applyUnreadCounts((await res.json()).counts)
   }
   
   const markAllAsRead = async () => {
-    await fetch(API_URL + '/api/notifications/read-all', { 
+    const res = await fetch(API_URL + '/api/notifications/read-all', { 
       method: 'PUT',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({})
     })
-    loadNotifications()
+    setNotifications(prev => prev.map(n => ({ ...n, isRead: true })))
+    if (res.ok) applyUnreadCounts((await res.json()).counts)
   }
   
-  useEffect(() => { loadNotifications(); const interval = setInterval(loadNotifications, 30000); return () => clearInterval(interval) }, [])
+  // Chargement initial ; ensuite liste rechargée par syncChanges quand une notification est créée,
+  // compteur poussé par l'événement SSE "unread" et renvoyé par /api/sync (plus de scrutation)
+  useEffect(() => { loadNotifications() }, [])
   
 
   // Vérifier si l'utilisateur a accès à une permission
@@ -801,39 +843,141 @@ export default function App() {
     }
   }
 
+  // Fenêtre de réservations chargée : les 14 jours du planning + aujourd'hui (départs / retours du jour),
+  // plus les locations en cours. Ref pour que l'auto-refresh utilise la semaine affichée.
+  const weekStartRef = useRef(weekStart)
+  weekStartRef.current = weekStart
+  const planningBookingsQuery = () => {
+    const now = Date.now()
+    const start = weekStartRef.current.getTime()
+    return {
+      brand,
+      from: new Date(Math.min(start, now) - 86400000).toISOString(),
+      to: new Date(Math.max(start, now) + 15 * 86400000).toISOString(),
+      includeOpen: 'true',
+      view: 'planning'
+    }
+  }
+
+  // COLLABORATOR et FRANCHISEE: ne voir que leur agence
+  const filterBookingsForUser = (data: any) => {
+    let filtered = Array.isArray(data) ? data.filter(b => b.agency?.brand === brand) : []
+    if (user && (user.role === 'COLLABORATOR' || user.role === 'FRANCHISEE')) {
+      const userAgencyIds = user.agencyIds || []
+      filtered = filtered.filter(b => userAgencyIds.includes(b.agencyId))
+    }
+    return filtered
+  }
+
+  const refreshPlanningBookings = async () => {
+    try {
+      setBookings(filterBookingsForUser(await api.getBookings(planningBookingsQuery())))
+    } catch (e) { console.error(e) }
+  }
+
+  // Onglet Réservations : tout l'historique, 200 par page (curseur)
+  const loadBookingHistory = async (cursor?: string) => {
+    try {
+      const data = await api.getBookings({ brand, view: 'planning', limit: '200', ...(cursor ? { cursor } : {}) })
+      const items = filterBookingsForUser(data.items)
+      setBookingHistory(prev => cursor ? [...prev, ...items] : items)
+      setBookingHistoryCursor(data.nextCursor || null)
+    } catch (e) { console.error('Erreur chargement réservations:', e) }
+  }
+
+  // Le planning ne charge que la projection légère : le check-out a besoin des photos et de la caution
+  const openCheckout = async (booking: any) => {
+    try {
+      const full = await api.getBooking(booking.id)
+      setSelectedCheckoutBooking(full?.id ? full : booking)
+    } catch (e) { setSelectedCheckoutBooking(booking) }
+    setShowCheckoutModal(true)
+  }
+
+  const filterFleetForUser = (data: any) => {
+    let filtered = Array.isArray(data) ? data.filter(f => f.agency?.brand === brand || !brand) : []
+    if (user && (user.role === 'COLLABORATOR' || user.role === 'FRANCHISEE')) {
+      const userAgencyIds = user.agencyIds || []
+      filtered = filtered.filter(f => userAgencyIds.includes(f.agency?.id))
+    }
+    return filtered
+  }
+
+  // serverTime du dernier chargement / delta : point de départ du prochain /api/sync
+  const syncSinceRef = useRef<number | null>(null)
+  // Écart horloge serveur - horloge locale, mesuré à chaque "ready" du flux SSE (null : pas encore connecté)
+  const serverClockOffsetRef = useRef<number | null>(null)
+
   const loadData = async () => {
     setLoading(true)
+    // Heure serveur prise avant les lectures : les écritures concurrentes seront rejouées par /api/sync
+    const syncStart = serverClockOffsetRef.current === null ? null : Date.now() + serverClockOffsetRef.current
     try {
       const [agenciesData, fleetData, bookingsData] = await Promise.all([
         api.getAgencies(),
         api.getFleet({}),
-        api.getBookings(selectedAgency ? { agencyId: selectedAgency } : {})
+        api.getBookings(planningBookingsQuery())
       ])
       
       
       // Filtrer selon le role utilisateur
       let filteredAgencies = agenciesData.filter(a => a.brand === brand)
-      let filteredFleet = Array.isArray(fleetData) ? fleetData.filter(f => f.agency?.brand === brand || !brand) : []
-      let filteredBookings = Array.isArray(bookingsData) ? bookingsData.filter(b => b.agency?.brand === brand) : []
       
       
       // COLLABORATOR et FRANCHISEE: ne voir que leur agence
       if (user && (user.role === 'COLLABORATOR' || user.role === 'FRANCHISEE')) {
         const userAgencyIds = user.agencyIds || []
         filteredAgencies = filteredAgencies.filter(a => userAgencyIds.includes(a.id))
-        filteredFleet = filteredFleet.filter(f => userAgencyIds.includes(f.agency?.id))
-        filteredBookings = filteredBookings.filter(b => userAgencyIds.includes(b.agencyId))
       }
       
       
       setAgencies(filteredAgencies)
       setAllAgencies(agenciesData)
-      setFleet(filteredFleet)
-      setBookings(filteredBookings)
+      setFleet(filterFleetForUser(fleetData))
+      setBookings(filterBookingsForUser(bookingsData))
+      syncSinceRef.current = syncStart
+      if (tab === 'bookings') loadBookingHistory()
     } catch (e) { console.error(e) }
     setLoading(false)
   }
 
+  // Applique le delta depuis le dernier chargement aux listes déjà affichées
+  const syncChanges = async () => {
+    if (syncSinceRef.current === null) return
+    try {
+      const delta = await api.sync(syncSinceRef.current, brand)
+      if (delta.reset) { syncSinceRef.current = null; loadData(); return }
+      syncSinceRef.current = delta.serverTime
+
+      const { from, to } = planningBookingsQuery()
+      const inWindow = (b: any) => (new Date(b.startDate) <= new Date(to) && new Date(b.endDate) >= new Date(from)) || (b.checkedIn && !b.checkedOut)
+      const visibleBookings = filterBookingsForUser(delta.bookings)
+      const hiddenBookingIds = delta.bookings.filter(b => !visibleBookings.includes(b)).map(b => b.id)
+      setBookings(prev => mergeRows(prev, visibleBookings.filter(inWindow), [...delta.deleted.bookings, ...hiddenBookingIds, ...visibleBookings.filter(b => !inWindow(b)).map(b => b.id)]))
+      setBookingHistory(prev => prev.length ? mergeRows(prev, visibleBookings, [...delta.deleted.bookings, ...hiddenBookingIds]) : prev)
+
+      setContracts(prev => prev.length ? mergeRows(prev, delta.contracts, delta.deleted.contracts) : prev)
+
+      const visibleFleet = filterFleetForUser(delta.fleet.filter(f => f.isActive))
+      const hiddenFleetIds = delta.fleet.filter(f => !visibleFleet.includes(f)).map(f => f.id)
+      setFleet(prev => mergeRows(prev, visibleFleet, [...delta.deleted.fleet, ...hiddenFleetIds])
+        .sort((a, b) => (a.vehicleNumber || '').localeCompare(b.vehicleNumber || '')))
+
+      if (typeof delta.unread === 'number') setUnreadCount(delta.unread)
+      if (delta.notifications) loadNotifications()
+    } catch (e) { console.error('Erreur synchronisation:', e) }
+  }
+
+  // Changement de semaine : recharger uniquement la fenêtre de réservations, sans écran de chargement
+  useEffect(() => { if (user && !loading) refreshPlanningBookings() }, [weekStart])
+  useEffect(() => { if (tab === 'bookings') loadBookingHistory() }, [tab, brand])
+  useEffect(() => {
+    if (!selectedCustomer) { setCustomerBookings([]); return }
+    api.getBookings({ customerId: selectedCustomer.id, view: 'planning' })
+      .then(data => setCustomerBookings(Array.isArray(data) ? data : []))
+      .catch(() => setCustomerBookings([]))
+  }, [selectedCustomer])
+
   // Charger les paramètres d'une marque
   const loadBrandSettings = async (brandName: string) => {
     try {
@@ -954,13 +1098,21 @@ export default function App() {
       newFleetId = draggedBooking.fleetVehicleId
     }
 
-    // Check for conflicts
-    const hasConflict = bookings.some(b => {
+    // Check for conflicts : réservations du véhicule cible lues en base sur la nouvelle période
+    // (celles hors de la fenêtre chargée ne sont pas dans `bookings`) ; planning en mémoire si l'API échoue
+    const overlaps = (b: any) => {
       if (b.id === draggedBooking.id || b.fleetVehicleId !== newFleetId || b.status === 'CANCELLED') return false
       const bStart = b.startDate.split('T')[0]
       const bEnd = b.endDate.split('T')[0]
       return newStart <= bEnd && newEnd >= bStart
-    })
+    }
+    let hasConflict = false
+    if (newFleetId) {
+      try {
+        const existing = await api.getBookings({ fleetVehicleId: newFleetId, from: newStart, to: newEnd + 'T23:59:59.999Z', view: 'planning' })
+        hasConflict = Array.isArray(existing) ? existing.some(overlaps) : bookings.some(overlaps)
+      } catch (e) { hasConflict = bookings.some(overlaps) }
+    }
 
     if (hasConflict) {
       alert('❌ Conflicto: ya existe una reserva en este período')
@@ -2074,7 +2226,7 @@ export default function App() {
       
       {/* Compteur */}
       <div className="ml-auto text-sm text-gray-500">
-        {bookings.filter(b => {
+        {bookingHistory.filter(b => {
           if (bookingSearch) {
             const search = bookingSearch.toLowerCase()
             const matchesSearch = (
@@ -2111,7 +2263,7 @@ export default function App() {
           </tr>
         </thead>
         <tbody>
-          {bookings.filter(b => {
+          {bookingHistory.filter(b => {
             if (bookingSearch) {
               const search = bookingSearch.toLowerCase()
               const matchesSearch = (
@@ -2135,7 +2287,7 @@ export default function App() {
               </td>
             </tr>
           ) : (
-            bookings.filter(b => {
+            bookingHistory.filter(b => {
               if (bookingSearch) {
                 const search = bookingSearch.toLowerCase()
                 const matchesSearch = (
@@ -2226,6 +2378,13 @@ export default function App() {
         </tbody>
       </table>
     </div>
+    {bookingHistoryCursor && (
+      <div className="text-center">
+        <button onClick={() => loadBookingHistory(bookingHistoryCursor)} className="px-4 py-2 bg-white border rounded-lg text-sm hover:bg-gray-50">
+          {lang === 'fr' ? 'Charger plus' : 'Cargar más'}
+        </button>
+      </div>
+    )}
   </div>
 )}
 
@@ -2329,7 +2488,7 @@ export default function App() {
                 <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-4">
                   {rentedBookings.map(booking => (
                     <div key={booking.id} className="bg-white rounded-xl shadow p-4 hover:shadow-lg transition cursor-pointer"
-                      onClick={() => { setSelectedCheckoutBooking(booking); setShowCheckoutModal(true) }}>
+                      onClick={() => openCheckout(booking)}>
                       <div className="flex items-center gap-3">
                         <div className="w-16 h-16 bg-gray-100 rounded-lg overflow-hidden flex items-center justify-center">
                           {booking.fleetVehicle?.vehicle?.imageUrl ? (
@@ -2502,10 +2661,10 @@ export default function App() {
                       <div className="border-t pt-4 mt-4">
                         <h4 className="font-bold mb-3">{lang === 'fr' ? 'Historique des réservations' : 'Historial de reservas'}</h4>
                         <div className="space-y-2">
-                          {bookings.filter(b => b.customerId === selectedCustomer.id).length === 0 ? (
+                          {customerBookings.length === 0 ? (
                             <p className="text-gray-500 text-sm">{lang === 'fr' ? 'Aucune réservation' : 'Sin reservas'}</p>
                           ) : (
-                            bookings.filter(b => b.customerId === selectedCustomer.id).map(b => (
+                            customerBookings.map(b => (
                               <div key={b.id} className="flex items-center justify-between p-3 bg-gray-50 rounded-lg">
                                 <div>
                                   <span className="font-mono text-sm">{b.reference}</span>
@@ -2621,6 +2780,13 @@ export default function App() {
                   </tbody>
                 </table>
                 {contracts.length === 0 && <div className="p-8 text-center text-gray-500">{t[lang].noContracts}</div>}
+                {contractsCursor && (
+                  <div className="p-4 text-center border-t">
+                    <button onClick={() => loadContracts(contractsCursor)} className="px-4 py-2 bg-white border rounded-lg text-sm hover:bg-gray-50">
+                      {lang === 'fr' ? 'Charger plus' : 'Cargar más'}
+                    </button>
+                  </div>
+                )}
               </div>
             </div>
           )}
@@ -2759,7 +2925,7 @@ export default function App() {
             </button>
           )}
           {contextMenu.booking.checkedIn && !contextMenu.booking.checkedOut && (
-            <button onClick={() => { setSelectedCheckoutBooking(contextMenu.booking); setShowCheckoutModal(true); setContextMenu(null) }}
+            <button onClick={() => { openCheckout(contextMenu.booking); setContextMenu(null) }}
               className="w-full px-4 py-2 text-left hover:bg-gray-100 flex items-center gap-2">
               🏁 Check-out
             </button>
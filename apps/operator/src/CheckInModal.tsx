@@ -114,15 +114,7 @@ export function CheckInModal({ booking, fleetVehicle, settings, onClose, onCompl
   const uploadPhoto = async (file: File): Promise<string | null> => {
     setUploading(true)
     try {
-      const formData = new FormData()
-      formData.append('file', file)
-      formData.append('upload_preset', 'voltride')
-      const res = await fetch('https://api.cloudinary.com/v1_1/dis5pcnfr/auto/upload', {
-        method: 'POST',
-        body: formData
-      })
-      const data = await res.json()
-      return data.secure_url || null
+      return await api.uploadMedia(file)
     } catch (e) {
       console.error('Upload error:', e)
       return null
@@ -232,6 +224,17 @@ export function CheckInModal({ booking, fleetVehicle, settings, onClose, onCompl
   const handleComplete = async () => {
     setLoading(true)
     try {
+      // Signature envoyée comme fichier : le booking et le contrat ne gardent que son URL
+      let signatureUrl = signature
+      if (signature.startsWith('data:')) {
+        try {
+          const blob = await (await fetch(signature)).blob()
+          signatureUrl = await api.uploadMedia(blob, 'signature.png') || signature
+        } catch (e) {
+          console.error('Signature upload error:', e)
+        }
+      }
+
       // Mettre à jour le booking avec les infos de check-in
       await api.updateBooking(booking.id, {
         checkedIn: true,
@@ -242,7 +245,7 @@ export function CheckInModal({ booking, fleetVehicle, settings, onClose, onCompl
         idCardReversoUrl,
         licenseUrl,
         licenseReversoUrl,
-        signatureUrl: signature,
+        signatureUrl,
         checkInPhotos: photos,
         depositMethod,
         paidAmount: booking.totalPrice,
@@ -284,7 +287,7 @@ export function CheckInModal({ booking, fleetVehicle, settings, onClose, onCompl
             idCardReversoUrl: idCardReversoUrl,
             customerLicenseUrl: licenseUrl,
             licenseReversoUrl: licenseReversoUrl,
-            customerSignature: signature,
+            customerSignature: signatureUrl,
             photoFront: photos.front,
             photoLeft: photos.left,
             photoRight: photos.right,
@@ -53,6 +53,7 @@ export function NewBookingModal({ fleetVehicle, startDate, agencyId, brand, onCl
   const [payFullAmount, setPayFullAmount] = useState(false)
   
   const [calculatedPrice, setCalculatedPrice] = useState(0)
+  const [quote, setQuote] = useState<{ vehicles: Record<string, number>; options: Record<string, number> } | null>(null)
   const [depositAmount, setDepositAmount] = useState(0)
 
   useEffect(() => {
@@ -85,13 +86,21 @@ export function NewBookingModal({ fleetVehicle, startDate, agencyId, brand, onCl
     }
   }, [selectedFleet])
 
+  // Recherche client : attend 250 ms sans frappe, et annule la requête précédente encore en cours
   useEffect(() => {
-    if (searchQuery.length >= 2) {
-      api.searchCustomers(searchQuery).then(data => {
-        setSearchResults(Array.isArray(data) ? data : [])
-      })
-    } else {
+    if (searchQuery.trim().length < 2) {
       setSearchResults([])
+      return
+    }
+    const controller = new AbortController()
+    const timer = setTimeout(() => {
+      api.searchCustomers(searchQuery.trim(), controller.signal)
+        .then(data => setSearchResults(Array.isArray(data) ? data : []))
+        .catch(e => { if (e.name !== 'AbortError') console.error('Customer search error:', e) })
+    }, 250)
+    return () => {
+      clearTimeout(timer)
+      controller.abort()
     }
   }, [searchQuery])
 
@@ -145,33 +154,32 @@ export function NewBookingModal({ fleetVehicle, startDate, agencyId, brand, onCl
     }
   }
 
-  const getOptionPrice = (option: any, days: number): number => {
-    if (days <= 14) return option["day" + days] || option.day14 || 0
-    return option.day14 || 0
-  }
+  // Prix du moteur de devis de l'API (mêmes règles que le widget et la validation des réservations)
+  const getOptionPrice = (option: any): number => quote?.options[option.id] ?? 0
 
   const calculateOpcionesTotal = (): number => {
-    const start = new Date(bookingStartDate)
-    const end = new Date(bookingEndDate)
-    const days = Math.max(1, Math.ceil((end.getTime() - start.getTime()) / (1000 * 60 * 60 * 24)))
     return Object.entries(selectedOpciones).reduce((total, [optId, qty]) => {
       const opt = options.find((o: any) => o.id === optId)
-      if (opt && qty > 0) return total + (getOptionPrice(opt, days) * (qty as number))
+      if (opt && qty > 0) return total + (getOptionPrice(opt) * (qty as number))
       return total
     }, 0)
   }
 
   useEffect(() => {
-    if (selectedFleet && bookingStartDate && bookingEndDate && bookingStartTime && bookingEndTime) {
-      const start = new Date(bookingStartDate)
-      const end = new Date(bookingEndDate)
-      const days = Math.max(1, Math.ceil((end.getTime() - start.getTime()) / (1000 * 60 * 60 * 24)))
-      
-      const pricing = selectedFleet.vehicle?.pricing?.[0]
-      if (pricing) {
-        let price = 0
-        if (days <= 14) price = pricing['day' + days] || pricing.day14 || 0
-        else price = (pricing.day14 || 0) + ((days - 14) * (pricing.extraDayPrice || 10))
+    if (bookingStartDate && bookingEndDate && bookingStartTime && bookingEndTime) {
+      // Location sur la journée : facturée un jour, sans heures supplémentaires (réduction demi-journée ci-dessous)
+      const times = bookingStartDate !== bookingEndDate ? { startTime: bookingStartTime, endTime: bookingEndTime } : {}
+      api.getQuote({ startDate: bookingStartDate, endDate: bookingEndDate, ...times })
+        .then(data => setQuote(data?.vehicles ? data : null))
+        .catch(() => setQuote(null))
+    }
+  }, [bookingStartDate, bookingEndDate, bookingStartTime, bookingEndTime])
+
+  useEffect(() => {
+    if (selectedFleet && quote) {
+      const quoted = quote.vehicles[selectedFleet.vehicle?.id ?? selectedFleet.vehicleId]
+      if (quoted !== undefined) {
+        let price = quoted
         
         // Réduction 20% para demi-journée (4h exactement) le jour même
         const today = new Date().toISOString().split('T')[0]
@@ -190,7 +198,7 @@ export function NewBookingModal({ fleetVehicle, startDate, agencyId, brand, onCl
       }
       setDepositAmount(selectedFleet.vehicle?.deposit || 100)
     }
-  }, [selectedFleet, bookingStartDate, bookingEndDate, bookingStartTime, bookingEndTime])
+  }, [selectedFleet, quote])
 
   const calculatePaymentAmount = (): number => {
     const totalWithOpciones = calculatedPrice + calculateOpcionesTotal()
@@ -418,7 +426,7 @@ export function NewBookingModal({ fleetVehicle, startDate, agencyId, brand, onCl
                     const start = new Date(bookingStartDate)
                     const end = new Date(bookingEndDate)
                     const days = Math.max(1, Math.ceil((end.getTime() - start.getTime()) / (1000 * 60 * 60 * 24)))
-                    const price = getOptionPrice(option, days)
+                    const price = getOptionPrice(option)
                     return (
                       <div key={option.id} className="flex items-center justify-between p-3 bg-gray-50 rounded-lg">
                         <div className="flex items-center gap-3">
@@ -14,6 +14,11 @@ export const api = {
     const res = await fetch(API_URL + '/api/fleet' + query)
     return res.json()
   },
+  // Devis serveur : prix de tous les modèles et options pour des dates (moteur de tarification de l'API)
+  getQuote: async (params) => {
+    const res = await fetch(API_URL + '/api/quote?' + new URLSearchParams(params).toString())
+    return res.json()
+  },
   getAvailableFleet: async (agencyId) => {
     const res = await fetch(API_URL + '/api/fleet/available?agencyId=' + agencyId)
     return res.json()
@@ -33,6 +38,10 @@ export const api = {
     const res = await fetch(API_URL + '/api/bookings' + query)
     return res.json()
   },
+  getBooking: async (id) => {
+    const res = await fetch(API_URL + '/api/bookings/' + id)
+    return res.json()
+  },
   createBooking: async (data) => {
     const res = await fetch(API_URL + '/api/bookings/operator', {
       method: 'POST',
@@ -58,19 +67,28 @@ export const api = {
     return res.json()
   },
 
+  // Synchronisation incrémentale (delta depuis serverTime de l'appel précédent), authentifiée
+  sync: async (since: number, brand?: string) => {
+    const res = await fetch(API_URL + '/api/sync?since=' + since + (brand ? '&brand=' + brand : ''), {
+      headers: { Authorization: 'Bearer ' + (localStorage.getItem('token') || '') }
+    })
+    return res.json()
+  },
+
   // Customers
   getCustomers: async () => {
     const res = await fetch(API_URL + '/api/customers')
     return res.json()
   },
-  searchCustomers: async (query) => {
-    const res = await fetch(API_URL + '/api/customers/search?q=' + encodeURIComponent(query))
+  searchCustomers: async (query, signal?: AbortSignal) => {
+    const res = await fetch(API_URL + '/api/customers/search?q=' + encodeURIComponent(query), { signal })
     return res.json()
   },
 
   // Contracts
-  getContracts: async () => {
-    const res = await fetch(API_URL + '/api/contracts')
+  getContracts: async (params?) => {
+    const query = params ? '?' + new URLSearchParams(params).toString() : ''
+    const res = await fetch(API_URL + '/api/contracts' + query)
     return res.json()
   },
   createContract: async (data) => {
@@ -166,6 +184,16 @@ export const api = {
   deleteUser: async (id: string) => {
     const res = await fetch(API_URL + '/api/users/' + id, { method: 'DELETE' })
     return res.json()
+  },
+
+  // Media (photos, signatures) : envoi multipart, renvoie l'URL /api/media/<hash>
+  uploadMedia: async (file: Blob, filename = 'upload'): Promise<string | null> => {
+    const formData = new FormData()
+    formData.append('file', file, (file as File).name || filename)
+    const res = await fetch(API_URL + '/api/media', { method: 'POST', body: formData })
+    if (!res.ok) return null
+    const data = await res.json()
+    return data.files?.[0]?.url || null
   }
 }
 
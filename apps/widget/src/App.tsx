@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { loadStripe } from '@stripe/stripe-js'
 import { Elements, CardElement, useStripe, useElements } from '@stripe/react-stripe-js'
 
@@ -9,6 +9,7 @@ interface Agency { id: string; code: string; name: { fr: string; es: string; en:
 interface Vehicle { id: string; sku: string; name: { fr: string; es: string; en: string }; description: { fr: string; es: string; en: string }; deposit: number; hasPlate: boolean; licenseType?: { fr: string; es: string; en: string }; kmIncluded?: { fr: string; es: string; en: string }; imageUrl?: string; category: { id: string; name: { fr: string; es: string; en: string }; brand: string; bookingFee?: number; bookingFeePercentLow?: number; bookingFeePercentHigh?: number }; pricing: any[]; inventory: any[]; characteristics?: any[] }
 interface Option { id: string; code: string; name: { fr: string; es: string; en: string }; description?: { fr: string; es: string; en: string }; maxQuantity: number; imageUrl?: string; day1: number; day2: number; day3: number; day4: number; day5: number; day6: number; day7: number; day8: number; day9: number; day10: number; day11: number; day12: number; day13: number; day14: number; includedByDefault?: boolean; categories?: any[] }
 interface WidgetSettings { stripeEnabled: boolean; stripeMode: string; stripePublishableKey: string }
+interface CalendarDay { date: string; isClosed: boolean; openTime?: string | null; closeTime?: string | null; reason?: string }
 
 type Lang = 'fr' | 'es' | 'en'
 type Step = 'dates' | 'vehicles' | 'options' | 'customer' | 'payment' | 'deposit' | 'confirmation'
@@ -207,13 +208,13 @@ function App() {
   })
   const [step, setStep] = useState<Step>('dates')
   const [agencies, setAgencies] = useState<Agency[]>([])
-  const [startSchedule, setStartSchedule] = useState<{open: string, close: string} | null>(null)
-  const [closures, setClosures] = useState<{startDate: string; endDate: string; reason: string}[]>([])
+  const [calendar, setCalendar] = useState<Record<string, CalendarDay>>({})
+  const [calendarMonth, setCalendarMonth] = useState(() => new Date().toISOString().slice(0, 7))
   const [selectedChar, setSelectedChar] = useState<any>(null)
-  const [endSchedule, setEndSchedule] = useState<{open: string, close: string} | null>(null)
   const [vehicles, setVehicles] = useState<Vehicle[]>([])
   const [fleetAvailability, setFleetAvailability] = useState<Record<string, number>>({})
   const [options, setOptions] = useState<Option[]>([])
+  const [quote, setQuote] = useState<{ vehicles: Record<string, number>; options: Record<string, number> } | null>(null)
   const [loading, setLoading] = useState(true)
   const [selectedAgency, setSelectedAgency] = useState<string>('')
   const [startDate, setStartDate] = useState('')
@@ -326,6 +327,12 @@ function App() {
   const [processing, setProcessing] = useState(false)
 
   const t = translations[lang]
+  const scheduleOf = (date: string) => {
+    const day = calendar[date]
+    return day?.openTime && day?.closeTime ? { open: day.openTime, close: day.closeTime } : null
+  }
+  const startSchedule = scheduleOf(startDate)
+  const endSchedule = scheduleOf(endDate)
   const startTimeSlots = startSchedule ? generateTimeSlots(startSchedule.open, startSchedule.close) : getTimeSlotsDefault(startDate)
   const endTimeSlots = endSchedule ? generateTimeSlots(endSchedule.open, endSchedule.close) : getTimeSlotsDefault(endDate)
 
@@ -382,30 +389,30 @@ function App() {
     window.parent.postMessage({ type: 'voltride-widget-scroll-top' }, '*')
   }, [step])
   useEffect(() => { if (selectedAgency) loadVehicles() }, [selectedAgency])
-  useEffect(() => { if (selectedAgency) fetch(`${API_URL}/api/agencies/${selectedAgency}/closures`).then(r => r.json()).then(data => setClosures(data)).catch(() => setClosures([])) }, [selectedAgency])
   useEffect(() => { if (selectedAgency && startDate && endDate) loadFleetAvailability() }, [startDate, endDate])
+  useEffect(() => { if (startDate && endDate) loadQuote() }, [startDate, endDate, startTime, endTime])
+  // Horaires et fermetures par mois (un appel par mois affiché ou sélectionné) : jours fermés grisés, créneaux du jour choisi
+  const loadedMonths = useRef(new Set<string>())
+  useEffect(() => { loadedMonths.current.clear(); setCalendar({}) }, [selectedAgency])
   useEffect(() => {
-    if (selectedAgency && startDate) {
-      fetch(`${API_URL}/api/agencies/${selectedAgency}/schedule?date=${startDate}`)
-        .then(r => r.json())
-        .then(data => {
-          if (data.openTime && data.closeTime) setStartSchedule({ open: data.openTime, close: data.closeTime })
-          else setStartSchedule(null)
-        })
-        .catch(() => setStartSchedule(null))
-    }
-  }, [selectedAgency, startDate])
-  useEffect(() => {
-    if (selectedAgency && endDate) {
-      fetch(`${API_URL}/api/agencies/${selectedAgency}/schedule?date=${endDate}`)
+    if (!selectedAgency) return
+    const months = [calendarMonth, startDate.slice(0, 7), endDate.slice(0, 7)].filter(m => m && !loadedMonths.current.has(selectedAgency + m))
+    new Set(months).forEach(month => {
+      loadedMonths.current.add(selectedAgency + month)
+      fetch(`${API_URL}/api/agencies/${selectedAgency}/calendar?month=${month}`)
         .then(r => r.json())
         .then(data => {
-          if (data.openTime && data.closeTime) setEndSchedule({ open: data.openTime, close: data.closeTime })
-          else setEndSchedule(null)
+          if (!Array.isArray(data.days) || !loadedMonths.current.has(selectedAgency + month)) return // agence changée entre-temps
+          setCalendar(prev => {
+            const next = { ...prev }
+            data.days.forEach((d: CalendarDay) => { next[d.date] = d })
+            return next
+          })
         })
-        .catch(() => setEndSchedule(null))
-    }
-  }, [selectedAgency, endDate])
+        .catch(() => loadedMonths.current.delete(selectedAgency + month))
+    })
+  }, [selectedAgency, calendarMonth, startDate, endDate])
+  useEffect(() => { if (startDate) setCalendarMonth(startDate.slice(0, 7)) }, [startDate])
   useEffect(() => { if (startDate && !startTimeSlots.includes(startTime)) setStartTime(startTimeSlots[0] || '10:00') }, [startDate, startTimeSlots])
   useEffect(() => { if (endDate && !endTimeSlots.includes(endTime)) setEndTime(endTimeSlots[0] || '10:00') }, [endDate, endTimeSlots])
 
@@ -416,21 +423,21 @@ function App() {
     }
   }, [widgetSettings])
 
+  // Un seul appel au démarrage (agences, véhicules, options, réglages), mis en cache par l'API / le CDN
+  const catalogVehicles = useRef<Vehicle[] | null>(null)
+
   const loadData = async () => {
     try {
-      const [agenciesRes, optionsRes, settingsRes] = await Promise.all([
-        fetch(`${API_URL}/api/agencies`), 
-        fetch(`${API_URL}/api/options`),
-        fetch(`${API_URL}/api/widget-settings/voltride`)
-      ])
-      const agenciesData = await agenciesRes.json()
-      const filteredAgencies = agenciesData.filter((a: any) => a.brand === BRAND)
+      const res = await fetch(`${API_URL}/api/widget/bootstrap/${BRAND}`)
+      const data = await res.json()
+      catalogVehicles.current = Array.isArray(data.vehicles) ? data.vehicles : null
+      const filteredAgencies = (data.agencies || []).filter((a: any) => a.brand === BRAND)
       setAgencies(filteredAgencies)
       if (filteredAgencies.length > 0) setSelectedAgency(filteredAgencies[0].id)
-      setOptions(await optionsRes.json())
+      setOptions(data.options || [])
       
       // Charger les settings du widget
-      const settings = await settingsRes.json()
+      const settings = data.settings
       if (settings) {
         setWidgetSettings({
           stripeEnabled: settings.stripeEnabled || false,
@@ -444,8 +451,11 @@ function App() {
 
   const loadVehicles = async () => {
     try {
-      const res = await fetch(`${API_URL}/api/vehicles?agencyId=${selectedAgency}`)
-      const data = await res.json()
+      let data: any = catalogVehicles.current
+      if (!data) {
+        const res = await fetch(`${API_URL}/api/vehicles?agencyId=${selectedAgency}`)
+        data = await res.json()
+      }
       const filtered = (Array.isArray(data) ? data : []).filter((v: Vehicle) => {
         if (v.category?.brand !== BRAND) return false
         if (categoryFilter.length > 0) {
@@ -460,6 +470,14 @@ function App() {
     } catch (error) { console.error('Error:', error) }
   }
   
+  const loadQuote = async () => {
+    try {
+      const res = await fetch(`${API_URL}/api/quote?startDate=${startDate}&endDate=${endDate}&startTime=${startTime}&endTime=${endTime}`)
+      const data = await res.json()
+      setQuote(data.vehicles ? data : null)
+    } catch (error) { console.error('Quote error:', error) }
+  }
+
   const loadFleetAvailability = async () => {
     if (!selectedAgency) return
     try {
@@ -481,16 +499,23 @@ function App() {
     return d.getDay() === 0
   }
   
-  const isClosedDate = (date: string): boolean => {
-    if (!date || closures.length === 0) return false
-    const d = new Date(date + "T12:00:00")
-    return closures.some(c => {
-      const start = new Date(c.startDate)
-      start.setHours(0,0,0,0)
-      const end = new Date(c.endDate)
-      end.setHours(23,59,59,999)
-      return d >= start && d <= end
-    })
+  const isClosedDate = (date: string): boolean => !!date && calendar[date]?.isClosed === true
+
+  const shiftMonth = (month: string, delta: number) => {
+    const [y, m] = month.split('-').map(Number)
+    return new Date(Date.UTC(y, m - 1 + delta, 1)).toISOString().slice(0, 7)
+  }
+  const monthDays = (month: string) => {
+    const [y, m] = month.split('-').map(Number)
+    const count = new Date(Date.UTC(y, m, 0)).getUTCDate()
+    const offset = (new Date(Date.UTC(y, m - 1, 1)).getUTCDay() + 6) % 7 // semaine commençant le lundi
+    return [...Array(offset).fill(''), ...Array.from({ length: count }, (_, i) => `${month}-${String(i + 1).padStart(2, '0')}`)]
+  }
+  const pickCalendarDay = (date: string) => {
+    if (!startDate || endDate || date < startDate) {
+      setStartDate(date)
+      setEndDate('')
+    } else setEndDate(date)
   }
   const calculateDays = (): number => {
     if (!startDate || !endDate) return 0
@@ -509,20 +534,8 @@ function App() {
     return diff > 0 ? Math.ceil(diff / 60) : 0
   }
   
-  const getVehiclePrice = (vehicle: Vehicle, days: number, extraHours: number): number => {
-    const pricing = vehicle.pricing?.[0]
-    if (!pricing) return 0
-    const dayKey = `day${Math.min(days, 14)}` as keyof typeof pricing
-    let total = Number(pricing[dayKey]) || 0
-    if (days > 14) {
-      const dailyRate = (Number(pricing.day14) || 0) / 14
-      total += Math.floor((days - 14) * dailyRate)
-    }
-    for (let i = 1; i <= Math.min(extraHours, 4); i++) {
-      total += Number(pricing[`extraHour${i}` as keyof typeof pricing]) || 0
-    }
-    return total
-  }
+  // Prix calculés par l'API (/api/quote) pour la durée choisie : même moteur que la validation de la réservation
+  const getVehiclePrice = (vehicle: Vehicle): number => quote?.vehicles[vehicle.id] ?? 0
   
   const getAvailableQuantity = (vehicle: Vehicle): number => {
     return fleetAvailability[vehicle.id] || 0
@@ -541,27 +554,20 @@ function App() {
     })
   }
 
-  const getOptionPrice = (option: Option, days: number): number => {
-    const dayKey = ("day" + Math.min(days, 14)) as keyof Option
-    let total = Number(option[dayKey]) || 0
-    if (days > 14) total += Math.floor((days - 14) * (Number(option.day14) || 0) / 14)
-    return total
-  }
+  const getOptionPrice = (option: Option): number => quote?.options[option.id] ?? 0
   
   const calculateTotal = (): number => {
-    const days = calculateDays()
-    const extraHours = calculateExtraHours()
     let total = 0
     Object.entries(selectedVehicles).forEach(([id, qty]) => {
       const v = vehicles.find(x => x.id === id)
       if (v && qty > 0) {
-        total += getVehiclePrice(v, days, extraHours) * qty
+        total += getVehiclePrice(v) * qty
       }
     })
     Object.entries(selectedOptions).forEach(([id, qty]) => {
       const o = options.find(x => x.id === id)
       if (o && qty > 0) {
-        total += getOptionPrice(o, days) * qty
+        total += getOptionPrice(o) * qty
       }
     })
     return total
@@ -654,20 +660,18 @@ function App() {
   const handleSubmit = async () => {
     setProcessing(true)
     try {
-      const days = calculateDays()
-      const extraHours = calculateExtraHours()
       const items = Object.entries(selectedVehicles)
         .filter(([, qty]) => qty > 0)
         .map(([id, qty]) => {
           const vehicle = vehicles.find(v => v.id === id)!
-          const unitPrice = getVehiclePrice(vehicle, days, extraHours)
+          const unitPrice = getVehiclePrice(vehicle)
           return { vehicleId: id, quantity: qty, unitPrice, totalPrice: unitPrice * qty }
         })
       const optionItems = Object.entries(selectedOptions)
         .filter(([, qty]) => qty > 0)
         .map(([id, qty]) => {
           const option = options.find(o => o.id === id)!
-          const unitPrice = getOptionPrice(option, days)
+          const unitPrice = getOptionPrice(option)
           return { optionId: id, quantity: qty, unitPrice, totalPrice: unitPrice * qty }
         })
       
@@ -686,6 +690,12 @@ function App() {
         })
       })
       const booking = await bookingRes.json()
+      // Tarifs modifiés depuis l'affichage : nouveaux prix chargés, le client revalide
+      if (bookingRes.status === 409) {
+        await loadQuote()
+        alert(lang === 'fr' ? 'Les prix ont été mis à jour, veuillez vérifier le total.' : lang === 'es' ? 'Los precios se han actualizado, compruebe el total.' : 'Prices have been updated, please check the total.')
+        return
+      }
       
       // Ajouter bookingId dans l'URL de retour pour l'étape caution
       const stripeRes = await fetch(`${API_URL}/api/create-checkout-session`, {
@@ -774,6 +784,29 @@ function App() {
                   </select>
                 </div>
               </div>
+              <div className="border border-gray-200 rounded-xl p-3">
+                <div className="flex items-center justify-between mb-2">
+                  <button type="button" onClick={() => setCalendarMonth(shiftMonth(calendarMonth, -1))} disabled={calendarMonth <= new Date().toISOString().slice(0, 7)} className="px-3 text-gray-600 disabled:opacity-30">‹</button>
+                  <span className="text-sm font-medium text-gray-700 capitalize">{new Date(calendarMonth + '-01T12:00:00').toLocaleDateString(lang, { month: 'long', year: 'numeric' })}</span>
+                  <button type="button" onClick={() => setCalendarMonth(shiftMonth(calendarMonth, 1))} className="px-3 text-gray-600">›</button>
+                </div>
+                <div className="grid grid-cols-7 gap-1 text-center text-xs">
+                  {[1, 2, 3, 4, 5, 6, 7].map(d => <span key={d} className="text-gray-400">{new Date(2024, 0, d).toLocaleDateString(lang, { weekday: 'narrow' })}</span>)}
+                  {monthDays(calendarMonth).map((date, i) => {
+                    if (!date) return <span key={'empty' + i} />
+                    const today = new Date().toISOString().split('T')[0]
+                    const closed = isClosedDate(date) || isSundayBlocked(date)
+                    const selected = date === startDate || date === endDate
+                    const inRange = startDate && endDate && date > startDate && date < endDate
+                    return (
+                      <button type="button" key={date} disabled={closed || date < today} onClick={() => pickCalendarDay(date)} title={calendar[date]?.reason || ''}
+                        className={`py-1 rounded-lg ${selected ? 'bg-[#ffaf10] text-white font-bold' : inRange ? 'bg-[#abdee6]/50' : ''} ${closed ? 'text-gray-300 line-through' : date < today ? 'text-gray-300' : 'text-gray-700 hover:bg-gray-100'}`}>
+                        {parseInt(date.slice(8), 10)}
+                      </button>
+                    )
+                  })}
+                </div>
+              </div>
               {(isSundayBlocked(startDate) || isSundayBlocked(endDate) || isClosedDate(startDate) || isClosedDate(endDate)) && <p className="text-red-500 text-sm mb-2">{lang === "fr" ? "⚠️ L'agence est fermée aux dates sélectionnées. Veuillez choisir d'autres dates." : lang === "es" ? "⚠️ La agencia está cerrada en las fechas seleccionadas. Por favor, elija otras fechas." : "⚠️ The agency is closed on the selected dates. Please choose other dates."}</p>}
               <button onClick={() => setStep("vehicles")} disabled={!startDate || !endDate || isSundayBlocked(startDate) || isSundayBlocked(endDate) || isClosedDate(startDate) || isClosedDate(endDate)} className="w-full py-3 bg-gradient-to-r from-[#abdee6] to-[#ffaf10] text-gray-800 font-bold rounded-xl hover:shadow-lg transition disabled:opacity-50">
                 {t.continue}
@@ -790,10 +823,10 @@ function App() {
                 <p className="text-center text-gray-500 py-8">{t.noVehicles}</p>
               ) : (
                 <div className="space-y-3">
-                  {[...vehicles].filter(v => getVehiclePrice(v, calculateDays(), calculateExtraHours()) > 0).sort((a, b) => getVehiclePrice(a, calculateDays(), calculateExtraHours()) - getVehiclePrice(b, calculateDays(), calculateExtraHours())).map(vehicle => {
+                  {[...vehicles].filter(v => getVehiclePrice(v) > 0).sort((a, b) => getVehiclePrice(a) - getVehiclePrice(b)).map(vehicle => {
                     const available = getAvailableQuantity(vehicle)
                     const maxQty = getMaxQuantity(vehicle)
-                    const price = getVehiclePrice(vehicle, calculateDays(), calculateExtraHours())
+                    const price = getVehiclePrice(vehicle)
                     const isPlated = vehicle.hasPlate
                     const otherPlatedSelected = hasPlatedVehicleSelected() && !selectedVehicles[vehicle.id]
                     
@@ -864,7 +897,7 @@ function App() {
               <div className="space-y-3">
                 {getFilteredOptions().map(option => {
                   const isIncluded = option.includedByDefault;
-                  const price = getOptionPrice(option, calculateDays());
+                  const price = getOptionPrice(option);
                   return (
                     <div key={option.id} className={'border rounded-xl p-4 flex justify-between items-center hover:shadow-md transition ' + (isIncluded ? 'border-green-300 bg-green-50/50' : 'border-gray-200')}>
                       <div className="flex items-center gap-3">
@@ -998,12 +1031,12 @@ function App() {
                 </div>
                 {Object.entries(selectedVehicles).filter(([, qty]) => qty > 0).map(([id, qty]) => {
                   const v = vehicles.find(x => x.id === id)!
-                  const price = getVehiclePrice(v, calculateDays(), calculateExtraHours())
+                  const price = getVehiclePrice(v)
                   return <div key={id} className="flex justify-between text-sm"><span>{getName(v.name)} x{qty}</span><span>{price * qty}€</span></div>
                 })}
                 {Object.entries(selectedOptions).filter(([, qty]) => qty > 0).map(([id, qty]) => {
                   const o = options.find(x => x.id === id)!
-                  return <div key={id} className="flex justify-between text-sm"><span>{getName(o.name)} x{qty}</span><span>{getOptionPrice(o, calculateDays()) * qty}€</span></div>
+                  return <div key={id} className="flex justify-between text-sm"><span>{getName(o.name)} x{qty}</span><span>{getOptionPrice(o) * qty}€</span></div>
                 })}
                 <div className="border-t border-[#ffaf10]/30 pt-2 flex justify-between font-bold text-lg">
                   <span>{t.total}</span>
@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+"""Conseiller d'index Prisma.
+
+Lit schema.prisma, relève les formes de requêtes (champs du `where` et de
+l'`orderBy`) des appels prisma.<model>.findMany / findFirst / count des
+sources de l'API, puis signale celles qu'aucun index ne sert.
+
+    python3 index_advisor.py                          # rapport, tous les modèles
+    python3 index_advisor.py --model Booking          # un seul modèle
+    python3 index_advisor.py --model Booking --sql apps/api/prisma/indexes/booking.sql
+    python3 index_advisor.py --model Booking --apply  # ajoute les @@index au schema
+    DATABASE_URL=... python3 index_advisor.py --model Booking --explain
+
+--sql écrit des CREATE INDEX CONCURRENTLY nommés comme Prisma
+(<Model>_<col>_<col>_idx) : à lancer en prod avant `prisma db push`, qui
+retrouve alors les index existants au lieu de les créer sous verrou.
+--explain (psycopg2) mesure chaque index recommandé sur la base pointée
+par DATABASE_URL : EXPLAIN ANALYZE avant, création, après, puis suppression
+(--keep pour les garder). À lancer sur une copie, pas sur la prod.
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+
+SCHEMA_PATH = 'apps/api/prisma/schema.prisma'
+SOURCE_GLOB = 'apps/api/src/**/*.ts'
+QUERY_METHODS = ('findMany', 'findFirst', 'findFirstOrThrow', 'count')
+
+EQ_OPERATORS = {'equals', 'in'}
+RANGE_OPERATORS = {'gt', 'gte', 'lt', 'lte'}
+PREFIX_OPERATORS = {'startsWith'}
+# Non sargables pour un index B-tree classique
+OTHER_OPERATORS = {'not', 'notIn', 'contains', 'endsWith', 'search', 'mode', 'has', 'hasSome', 'hasEvery', 'isEmpty'}
+RELATION_OPERATORS = {'some', 'every', 'none', 'is', 'isNot'}
+SCALAR_TYPES = {'String', 'Int', 'BigInt', 'Float', 'Decimal', 'Boolean', 'DateTime', 'Json', 'Bytes'}
+
+
+# ============== SCHEMA ==============
+
+def parse_schema(path):
+    """{ model: { 'fields': {name: type}, 'relations': set, 'indexes': [[cols]] } }"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    enums = set(re.findall(r'^enum\s+(\w+)\s*\{', content, re.M))
+    models = {}
+    for name, body in re.findall(r'^model\s+(\w+)\s*\{(.*?)^\}', content, re.M | re.S):
+        fields, relations, indexes = {}, set(), []
+        for raw in body.splitlines():
+            line = raw.split('//')[0].strip()
+            if not line:
+                continue
+            if line.startswith('@@'):
+                m = re.match(r'@@(index|unique|id)\(\s*(?:fields:\s*)?\[([^\]]*)\]', line)
+                if m:
+                    indexes.append([re.sub(r'\(.*\)', '', c).strip() for c in m.group(2).split(',') if c.strip()])
+                continue
+            parts = line.split()
+            if len(parts) < 2:
+                continue
+            field, ftype = parts[0], parts[1].rstrip('?').replace('[]', '')
+            if ftype not in SCALAR_TYPES and ftype not in enums:
+                relations.add(field)
+                continue
+            fields[field] = ftype
+            if '@id' in line or '@unique' in line:
+                indexes.append([field])
+        models[name] = {'fields': fields, 'relations': relations, 'indexes': indexes}
+    return models
+
+
+# ============== SOURCES ==============
+
+def skip_literal(text, i):
+    """Position après la chaîne / le commentaire qui commence en i (ou i si rien)."""
+    c = text[i]
+    if c in '\'"`':
+        j = i + 1
+        while j < len(text) and text[j] != c:
+            if text[j] == '\\':
+                j += 1
+            elif c == '`' and text.startswith('${', j):
+                j = match_brace(text, j + 1)
+            j += 1
+        return j + 1
+    if text.startswith('//', i):
+        end = text.find('\n', i)
+        return len(text) if end < 0 else end
+    if text.startswith('/*', i):
+        end = text.find('*/', i)
+        return len(text) if end < 0 else end + 2
+    return i
+
+
+def match_brace(text, start):
+    """Index du délimiteur fermant celui ouvert en start ({, [ ou ()."""
+    pairs = {'{': '}', '[': ']', '(': ')'}
+    stack = [pairs[text[start]]]
+    i = start + 1
+    while i < len(text) and stack:
+        j = skip_literal(text, i)
+        if j != i:
+            i = j
+            continue
+        c = text[i]
+        if c in pairs:
+            stack.append(pairs[c])
+        elif stack and c == stack[-1]:
+            stack.pop()
+        i += 1
+    return i - 1
+
+
+def split_top_level(body):
+    """Découpe le contenu d'un objet / tableau sur les virgules de premier niveau."""
+    items, depth, current, i = [], 0, '', 0
+    while i < len(body):
+        j = skip_literal(body, i)
+        if j != i:
+            current += body[i:j]
+            i = j
+            continue
+        c = body[i]
+        if c in '{[(':
+            depth += 1
+        elif c in '}])':
+            depth -= 1
+        if c == ',' and depth == 0:
+            items.append(current.strip())
+            current = ''
+        else:
+            current += c
+        i += 1
+    if current.strip():
+        items.append(current.strip())
+    return items
+
+
+def object_entries(text):
+    """[(clé, valeur)] d'un littéral objet ; valeur None pour un raccourci, clé '...' pour un spread."""
+    text = text.strip()
+    if text.startswith('(') and text.endswith(')'):
+        text = text[1:-1].strip()
+    if not text.startswith('{'):
+        return None
+    entries = []
+    for item in split_top_level(text[1:match_brace(text, 0)]):
+        if item.startswith('...'):
+            entries.append(('...', item[3:].strip()))
+            continue
+        m = re.match(r'^["\']?([\w$]+)["\']?\s*(?::\s*(.*))?$', item, re.S)
+        if m:
+            entries.append((m.group(1), m.group(2).strip() if m.group(2) is not None else None))
+    return entries
+
+
+class SourceIndex:
+    """Définitions `const NOM = { ... }` / `const NOM = (...) => ({ ... })` pour résoudre les identifiants."""
+
+    DEFINITION = re.compile(r'\bconst\s+([\w$]+)\s*(?::\s*[\w<>\[\]. |]+)?=\s*')
+
+    def __init__(self, files):
+        self.texts = {}
+        self.definitions = {}
+        for path in files:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            self.texts[path] = text
+            for m in self.DEFINITION.finditer(text):
+                value = self.definition_value(text, m.end())
+                if value is not None:
+                    self.definitions.setdefault(m.group(1), []).append((path, m.start(), value))
+
+    @staticmethod
+    def definition_value(text, i):
+        arrow = re.match(r'\([^()]*\)\s*(?::\s*[^=]+)?=>\s*', text[i:])
+        if arrow:
+            i += arrow.end()
+        if i < len(text) and text[i] == '(' and arrow:
+            i += 1
+            while text[i].isspace():
+                i += 1
+        if i < len(text) and text[i] in '{[':
+            return text[i:match_brace(text, i) + 1]
+        return None
+
+    def resolve(self, expr, path, position):
+        """Littéral correspondant à un identifiant / appel, le plus proche avant position dans le fichier."""
+        m = re.match(r'^([\w$]+)\s*(\(.*\))?$', expr.strip(), re.S)
+        if not m or m.group(1) not in self.definitions:
+            return None
+        candidates = self.definitions[m.group(1)]
+        local = [c for c in candidates if c[0] == path and c[1] < position]
+        chosen = local[-1] if local else candidates[0]
+        return chosen[2]
+
+    def assignments(self, name, path, position, window=2500):
+        """Champs ajoutés dynamiquement (where.status = ...) juste avant l'appel."""
+        text = self.texts[path][max(0, position - window):position]
+        return re.findall(r'\b' + re.escape(name) + r'\.(\w+)\s*=(?!=)', text)
+
+
+def value_kind(value):
+    """Type de filtre d'un champ : eq, range, prefix, other, relation."""
+    if value is None:
+        return {'eq'}
+    entries = object_entries(value)
+    if entries is None:
+        return {'eq'}
+    keys = {k for k, _ in entries}
+    kinds = set()
+    if keys & EQ_OPERATORS:
+        kinds.add('eq')
+    if keys & RANGE_OPERATORS:
+        kinds.add('range')
+    if keys & PREFIX_OPERATORS:
+        kinds.add('prefix')
+    if keys & (OTHER_OPERATORS - {'mode'}):
+        kinds.add('other')
+    if keys & RELATION_OPERATORS or not kinds:
+        kinds.add('relation')
+    return kinds
+
+
+def where_shape(text, model, sources, path, position, shape, depth=0):
+    entries = object_entries(text)
+    if entries is None:
+        resolved = sources.resolve(text, path, position)
+        name = re.match(r'^[\w$]+', text.strip())
+        if resolved is not None:
+            entries = object_entries(resolved)
+        elif name:
+            shape['dynamic'].update(f for f in sources.assignments(name.group(0), path, position) if f in model['fields'])
+            return
+    if entries is None or depth > 4:
+        return
+    for key, value in entries:
+        if key == '...':
+            where_shape(value, model, sources, path, position, shape, depth + 1)
+        elif key in ('AND',):
+            array = value.strip() if value else ''
+            branches = split_top_level(array[1:-1]) if array.startswith('[') else [array]
+            for branch in branches:
+                where_shape(branch, model, sources, path, position, shape, depth + 1)
+        elif key == 'OR' and value and value.strip().startswith('['):
+            # Chaque branche est évaluée avec les filtres communs (Postgres combine les index par BitmapOr)
+            shape['or'].append(split_top_level(value.strip()[1:-1]))
+        elif key in ('OR', 'NOT'):
+            continue
+        elif key in model['fields']:
+            for kind in value_kind(value):
+                # Booléens : trop peu sélectifs pour une colonne d'index, gardés comme simples filtres
+                if kind == 'eq' and model['fields'][key] == 'Boolean':
+                    kind = 'flag'
+                if key not in shape[kind]:
+                    shape[kind].append(key)
+        elif key in model['relations']:
+            shape['relation'].append(key)
+
+
+def order_fields(text, model, sources, path, position):
+    text = text.strip()
+    if not text.startswith(('{', '[')):
+        text = sources.resolve(text, path, position) or ''
+    if text.startswith('['):
+        fields = []
+        for item in split_top_level(text[1:-1]):
+            fields += order_fields(item, model, sources, path, position)
+        return fields
+    return [k for k, _ in (object_entries(text) or []) if k in model['fields']]
+
+
+def extract_queries(models, sources):
+    accessors = {name[0].lower() + name[1:]: name for name in models}
+    pattern = re.compile(r'\b(?:prisma|tx|client)\.(\w+)\.(' + '|'.join(QUERY_METHODS) + r')\s*\(')
+    queries = []
+    for path, text in sources.texts.items():
+        for m in pattern.finditer(text):
+            model_name = accessors.get(m.group(1))
+            if not model_name:
+                continue
+            model = models[model_name]
+            open_paren = m.end() - 1
+            args = text[open_paren + 1:match_brace(text, open_paren)].strip()
+            shape = empty_shape()
+            for key, value in object_entries(args) or []:
+                if key == 'where':
+                    where_shape(value if value is not None else 'where', model, sources, path, m.start(), shape)
+                elif key == 'orderBy' and value:
+                    shape['order'] = order_fields(value, model, sources, path, m.start())
+            line = text.count('\n', 0, m.start()) + 1
+            for variant in expand_or(shape, model, sources, path, m.start()):
+                queries.append({'model': model_name, 'method': m.group(2), 'location': f'{os.path.relpath(path)}:{line}', 'shape': variant})
+    return queries
+
+
+def empty_shape():
+    return {'eq': [], 'flag': [], 'range': [], 'prefix': [], 'other': [], 'relation': [], 'dynamic': set(), 'or': [], 'order': []}
+
+
+def expand_or(shape, model, sources, path, position):
+    """Une forme par branche de OR (filtres communs + filtres de la branche)."""
+    variants = [shape]
+    for branches in shape['or']:
+        expanded = []
+        for base in variants:
+            for branch in branches:
+                variant = {k: (list(v) if isinstance(v, list) else set(v) if isinstance(v, set) else v) for k, v in base.items()}
+                variant['or'] = []
+                where_shape(branch, model, sources, path, position, variant)
+                expanded.append(variant)
+        variants = expanded
+    return variants
+
+
+# ============== ANALYSE ==============
+
+def order_tail(shape):
+    """Colonnes du tri après les égalités, dans l'ordre du orderBy."""
+    return [f for f in shape['order'] if f not in shape['eq'] and f not in shape['flag']]
+
+
+def ideal_columns(shape):
+    """Colonnes d'un index composite pour la forme : égalités (clés étrangères d'abord), puis une plage ou le tri."""
+    eq = sorted(shape['eq'], key=lambda f: (not f.endswith('Id'), shape['eq'].index(f)))
+    tail = shape['range'][:1] or shape['prefix'][:1] or order_tail(shape)
+    return eq + [f for f in tail if f not in eq]
+
+
+def usable_prefix(index, shape):
+    """Nombre de colonnes de tête de l'index utilisables par la forme : égalités, puis une plage,
+    ou les colonnes du tri dans le même ordre ((id) ne sert pas orderBy [createdAt, id])."""
+    used = 0
+    while used < len(index) and (index[used] in shape['eq'] or index[used] in shape['flag']):
+        used += 1
+    rest = index[used:]
+    if rest and (rest[0] in shape['range'] or rest[0] in shape['prefix']):
+        return used + 1
+    for column, ordered in zip(rest, order_tail(shape)):
+        if column != ordered:
+            break
+        used += 1
+    return used
+
+
+def analyse(models, queries):
+    grouped = {}
+    for q in queries:
+        shape = q['shape']
+        if not (shape['eq'] or shape['range'] or shape['prefix'] or shape['order']):
+            continue
+        ideal = ideal_columns(shape)
+        key = (q['model'], tuple(ideal))
+        entry = grouped.setdefault(key, {'model': q['model'], 'ideal': ideal, 'shape': shape, 'locations': [], 'methods': set()})
+        entry['locations'].append(q['location'])
+        entry['methods'].add(q['method'])
+
+    results = []
+    for entry in grouped.values():
+        indexes = models[entry['model']]['indexes']
+        best = max(indexes, key=lambda idx: usable_prefix(idx, entry['shape']), default=[])
+        used = usable_prefix(best, entry['shape'])
+        # Un index unique en tête (id, reference...) sur une égalité suffit
+        unique_hit = any(len(idx) == 1 and idx[0] in entry['shape']['eq'] for idx in indexes)
+        if unique_hit or any(served_by(idx, entry) for idx in indexes):
+            status = 'ok'
+        elif used:
+            status = 'partial'
+        else:
+            status = 'missing'
+        entry.update(status=status, best=best[:used])
+        results.append(entry)
+    return sorted(results, key=lambda r: (r['model'], ['missing', 'partial', 'ok'].index(r['status']), -len(r['locations'])))
+
+
+def served_by(index, entry):
+    """Vrai si l'index sert la forme : toutes ses colonnes idéales, ou sa clé étrangère de tête
+    (une égalité sur fleetVehicleId / customerId ne ramène que quelques lignes)."""
+    used = usable_prefix(index, entry['shape'])
+    if used >= len(entry['ideal']):
+        return True
+    return used >= 1 and index[0] == entry['ideal'][0] and entry['ideal'][0].endswith('Id')
+
+
+def recommendations(results):
+    """Ensemble réduit d'index : formes les plus fréquentes et les plus complètes d'abord,
+    puis chaque forme restante n'ajoute un index que si aucun index retenu ne la sert."""
+    pending = sorted((r for r in results if r['status'] != 'ok' and r['ideal']),
+                     key=lambda r: (-len(r['locations']), -len(r['ideal'])))
+    chosen = {}
+    for entry in pending:
+        indexes = chosen.setdefault(entry['model'], [])
+        if any(served_by(idx, entry) for idx in indexes):
+            continue
+        longer = [r['ideal'] for r in pending if r['model'] == entry['model'] and r['ideal'] != entry['ideal']
+                  and r['ideal'][:len(entry['ideal'])] == entry['ideal']]
+        indexes.append(max(longer, key=len) if longer else entry['ideal'])
+    return [(model, cols) for model, indexes in chosen.items() for cols in indexes]
+
+
+def index_name(model, columns):
+    return f'{model}_{"_".join(columns)}_idx'
+
+
+def migration_sql(recommended):
+    lines = ['-- Généré par index_advisor.py : index composites (noms Prisma, reconnus par `prisma db push`)',
+             '-- CONCURRENTLY : pas de verrou d\'écriture ; à exécuter hors transaction.']
+    for model, cols in recommended:
+        columns = ', '.join(f'"{c}"' for c in cols)
+        lines.append(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name(model, cols)}" ON "{model}" ({columns});')
+    return '\n'.join(lines) + '\n'
+
+
+def apply_to_schema(path, recommended):
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    added = 0
+    for model, cols in recommended:
+        line = f'  @@index([{", ".join(cols)}])'
+        m = re.search(r'^model\s+' + model + r'\s*\{(.*?)^\}', content, re.M | re.S)
+        if not m or line.strip() in m.group(1):
+            continue
+        separator = '\n' if '@@' in m.group(1) else '\n\n'
+        body = m.group(1).rstrip() + separator + line + '\n'
+        content = content[:m.start(1)] + body + content[m.end(1):]
+        added += 1
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return added
+
+
+# ============== EXPLAIN ==============
+
+def sample_query(cur, model, cols, shape):
+    """Requête représentative : valeurs d'égalité prises sur une ligne existante, plage de 7 jours."""
+    quoted = ', '.join(f'"{c}"' for c in cols)
+    cur.execute(f'SELECT {quoted} FROM "{model}" WHERE {" AND ".join(f"{chr(34)}{c}{chr(34)} IS NOT NULL" for c in cols)} '
+                f'OFFSET floor(random() * LEAST(1000, (SELECT count(*) FROM "{model}"))) LIMIT 1')
+    row = cur.fetchone()
+    if not row:
+        return None, None
+    conditions, params, order = [], [], ''
+    for col, value in zip(cols, row):
+        if col in shape['eq']:
+            conditions.append(f'"{col}" = %s')
+            params.append(value)
+        elif col in shape['range'] or col in shape['prefix']:
+            conditions.append(f'"{col}" >= %s AND "{col}" < %s + interval \'7 days\'' if hasattr(value, 'year') else f'"{col}" >= %s')
+            params += [value, value] if hasattr(value, 'year') else [value]
+        else:
+            order = f' ORDER BY "{col}"'
+    return f'SELECT * FROM "{model}" WHERE {" AND ".join(conditions) or "true"}{order} LIMIT 100', params
+
+
+def explain(cur, sql, params, runs=5):
+    best, plan = None, ''
+    for _ in range(runs):
+        cur.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql, params)
+        result = cur.fetchone()[0][0]
+        ms = result['Execution Time']
+        if best is None or ms < best:
+            best, plan = ms, result['Plan']
+    nodes, stack = [], [plan]
+    while stack:
+        node = stack.pop(0)
+        nodes.append(node)
+        stack += node.get('Plans', [])
+    scan = next((n['Node Type'] for n in nodes if 'Scan' in n['Node Type']), plan['Node Type'])
+    index = next((n['Index Name'] for n in nodes if 'Index Name' in n), None)
+    return best, scan + (f' ({index})' if index else '')
+
+
+def run_explain(recommended, results, keep):
+    try:
+        import psycopg2
+    except ImportError:
+        sys.exit('❌ --explain nécessite psycopg2 (pip install psycopg2-binary)')
+    url = os.environ.get('DATABASE_URL')
+    if not url:
+        sys.exit('❌ DATABASE_URL non défini')
+    # Paramètres propres à Prisma refusés par libpq
+    url = re.sub(r'([?&])(schema|connection_limit|pool_timeout|pgbouncer|connect_timeout|socket_timeout)=[^&]*&?', r'\1', url).rstrip('?&')
+    conn = psycopg2.connect(url)
+    conn.autocommit = True
+    cur = conn.cursor()
+    shapes = {(r['model'], tuple(r['ideal'])): r['shape'] for r in results}
+    print('\n📊 EXPLAIN ANALYZE (meilleur de 5)')
+    for model, cols in recommended:
+        shape = shapes.get((model, tuple(cols)))
+        sql, params = sample_query(cur, model, cols, shape)
+        if not sql:
+            print(f'   {model}: table vide, ignoré')
+            continue
+        name = index_name(model, cols)
+        cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+        before_ms, before_plan = explain(cur, sql, params)
+        cur.execute(f'CREATE INDEX "{name}" ON "{model}" ({", ".join(chr(34) + c + chr(34) for c in cols)})')
+        cur.execute(f'ANALYZE "{model}"')
+        after_ms, after_plan = explain(cur, sql, params)
+        if not keep:
+            cur.execute(f'DROP INDEX "{name}"')
+        print(f'   {name}')
+        print(f'      avant : {before_ms:8.2f} ms  {before_plan}')
+        print(f'      après : {after_ms:8.2f} ms  {after_plan}')
+    conn.close()
+
+
+# ============== MAIN ==============
+
+def main():
+    parser = argparse.ArgumentParser(description='Conseiller d\'index pour schema.prisma')
+    parser.add_argument('--schema', default=SCHEMA_PATH)
+    parser.add_argument('--sources', default=SOURCE_GLOB)
+    parser.add_argument('--model', help='limiter à un modèle (ex. Booking)')
+    parser.add_argument('--all', action='store_true', help='afficher aussi les formes déjà indexées')
+    parser.add_argument('--sql', help='écrire la migration CREATE INDEX CONCURRENTLY dans ce fichier')
+    parser.add_argument('--apply', action='store_true', help='ajouter les @@index recommandés au schema')
+    parser.add_argument('--explain', action='store_true', help='mesurer avant / après sur DATABASE_URL')
+    parser.add_argument('--keep', action='store_true', help='avec --explain : garder les index créés')
+    args = parser.parse_args()
+
+    models = parse_schema(args.schema)
+    sources = SourceIndex(sorted(glob.glob(args.sources, recursive=True)))
+    queries = [q for q in extract_queries(models, sources) if not args.model or q['model'] == args.model]
+    results = analyse(models, queries)
+
+    icons = {'missing': '❌', 'partial': '⚠️ ', 'ok': '✅'}
+    print(f'🔎 {len(queries)} requêtes analysées ({args.schema})')
+    for r in results:
+        if r['status'] == 'ok' and not args.all:
+            continue
+        shape = r['shape']
+        filters = ', '.join([f'{f}=' for f in shape['eq'] + shape['flag']] + [f'{f}~' for f in shape['range'] + shape['prefix']])
+        print(f"\n{icons[r['status']]} {r['model']} [{filters}]" + (f" orderBy {shape['order']}" if shape['order'] else ''))
+        print(f"   index idéal : ({', '.join(r['ideal'])})" + (f"  — existant utilisable : ({', '.join(r['best'])})" if r['best'] else ''))
+        for location in r['locations'][:5]:
+            print(f'   • {location}')
+        if len(r['locations']) > 5:
+            print(f"   • … +{len(r['locations']) - 5}")
+
+    dynamic = [q for q in queries if q['shape']['dynamic']]
+    if dynamic:
+        print('\nℹ️  Filtres construits dynamiquement (non évalués) :')
+        for q in dynamic:
+            print(f"   • {q['location']} {q['model']} : {', '.join(sorted(q['shape']['dynamic']))}")
+
+    recommended = recommendations(results)
+    print('\n📋 Index recommandés :' if recommended else '\n✅ Aucun index manquant')
+    for model, cols in recommended:
+        print(f'   {model}: @@index([{", ".join(cols)}])')
+
+    if args.sql and recommended:
+        os.makedirs(os.path.dirname(args.sql) or '.', exist_ok=True)
+        with open(args.sql, 'w', encoding='utf-8') as f:
+            f.write(migration_sql(recommended))
+        print(f'✅ Migration écrite : {args.sql}')
+    if args.apply and recommended:
+        print(f'✅ {apply_to_schema(args.schema, recommended)} @@index ajouté(s) à {args.schema}')
+    if args.explain and recommended:
+        run_explain(recommended, results, args.keep)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+"""Tests de charge de l'API (asyncio, bibliothèque standard + psycopg2 pour le jeu de données).
+
+    python3 -m loadtest seed --agencies 6 --years 3          # jeu de données LT-* dans DATABASE_URL
+    python3 -m loadtest stubs --port 4010                     # Stripe / Resend / web-push simulés
+    python3 -m loadtest run --widget-users 50 --operator-users 10 --duration 60 --save
+    python3 -m loadtest compare loadtest/baselines/main.json loadtest/baselines/last.json
+
+L'API doit tourner avec les services externes redirigés vers les stubs :
+
+    STRIPE_API_BASE=http://localhost:4010 STRIPE_SECRET_KEY_VOLTRIDE=sk_test_loadtest \\
+    STRIPE_WEBHOOK_SECRET_VOLTRIDE=whsec_loadtest RESEND_BASE_URL=http://localhost:4010 \\
+    RESEND_API_KEY=re_loadtest PUSH_STUB_URL=http://localhost:4010/push npm run dev
+
+Voir __main__.py pour toutes les options.
+"""
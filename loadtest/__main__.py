@@ -0,0 +1,133 @@
+"""python3 -m loadtest {seed,stubs,run,compare} — voir __init__.py."""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from . import scenarios, seed, stats, stubs
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+# Options de run reportées dans la baseline (deux runs ne se comparent qu'à charge égale)
+RUN_CONFIG_KEYS = ('base_url', 'brand', 'widget_users', 'operator_users', 'duration', 'ramp_up', 'think_time', 'book_rate',
+                   'poll_interval', 'notification_every', 'horizon_days', 'seed')
+
+
+async def run_with_stubs(args, recorder):
+    stub = None
+    server = None
+    if args.with_stubs:
+        stub = stubs.StubServer(f'http://127.0.0.1:{args.stubs_port}', latency_ms=args.stub_latency_ms)
+        server = await asyncio.start_server(stub.serve_connection, '127.0.0.1', args.stubs_port)
+    try:
+        await scenarios.run(args, recorder)
+    finally:
+        if server:
+            server.close()
+            await server.wait_closed()
+    return stub
+
+
+def cmd_run(args):
+    args.think_time = (args.think_min, args.think_max)
+    recorder = stats.Recorder()
+    print(f'🚀 {args.widget_users} visiteur(s) widget + {args.operator_users} opérateur(s) pendant {args.duration} s sur {args.base_url}')
+    stub = asyncio.run(run_with_stubs(args, recorder))
+    report = recorder.report()
+    stats.print_report(report)
+    if stub:
+        print('   stubs : ' + json.dumps(stub.counters))
+    config = {key: getattr(args, key) for key in RUN_CONFIG_KEYS}
+    if args.save:
+        stats.save_baseline(args.save, report, config)
+        print(f'✅ Baseline écrite : {args.save}')
+    if args.baseline:
+        base = stats.load_baseline(args.baseline)
+        if base.get('config') != json.loads(json.dumps(config)):
+            print('⚠️  Charge différente de celle de la baseline : comparaison indicative')
+        current = {'createdAt': 'ce run', 'revision': stats.git_revision(), **report}
+        rows, regressions, missing = stats.compare(base, current, threshold=args.threshold)
+        stats.print_comparison(rows, regressions, missing, base, current)
+        if regressions:
+            sys.exit(1)
+
+
+def cmd_compare(args):
+    base, current = stats.load_baseline(args.base), stats.load_baseline(args.current)
+    rows, regressions, missing = stats.compare(base, current, threshold=args.threshold)
+    stats.print_comparison(rows, regressions, missing, base, current)
+    if regressions:
+        sys.exit(1)
+
+
+def cmd_stubs(args):
+    try:
+        asyncio.run(stubs.serve(args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 -m loadtest', description="Tests de charge de l'API")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('seed', help='jeu de données LT-* dans DATABASE_URL (remplace le précédent)')
+    p.add_argument('--agencies', type=int, default=6)
+    p.add_argument('--models', type=int, default=3, help='modèles par catégorie (4 catégories)')
+    p.add_argument('--units', type=int, default=8, help='unités de flotte par agence et par modèle')
+    p.add_argument('--customers', type=int, default=50000)
+    p.add_argument('--years', type=int, default=3, help='années de réservations passées')
+    p.add_argument('--future-days', type=int, default=120, help='réservations à venir sur N jours')
+    p.add_argument('--users', type=int, default=20, help='opérateurs (abonnements push + notifications)')
+    p.add_argument('--seed', type=int, default=42, help='graine aléatoire (jeu de données reproductible)')
+    p.add_argument('--reset-only', action='store_true', help='supprimer le jeu de données sans le recréer')
+    p.set_defaults(func=seed.run)
+
+    p = commands.add_parser('stubs', help='Stripe / Resend / web-push simulés')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=4010)
+    p.add_argument('--latency-ms', type=float, default=50)
+    p.add_argument('--jitter-ms', type=float, default=20)
+    p.add_argument('--failure-rate', type=float, default=0.0, help="part des appels en erreur temporaire (0.05 = 5 %%)")
+    p.set_defaults(func=cmd_stubs)
+
+    p = commands.add_parser('run', help='rejouer les parcours widget et opérateur')
+    p.add_argument('--base-url', default=os.environ.get('LOADTEST_BASE_URL', 'http://127.0.0.1:8080'))
+    p.add_argument('--brand', default='VOLTRIDE')
+    p.add_argument('--agency-prefix', default=seed.TAG, help='agences visitées par le widget (code)')
+    p.add_argument('--widget-users', type=int, default=50)
+    p.add_argument('--operator-users', type=int, default=10)
+    p.add_argument('--duration', type=float, default=60, help='secondes, après la montée en charge')
+    p.add_argument('--ramp-up', type=float, default=10, help='départs étalés sur N secondes')
+    p.add_argument('--think-min', type=float, default=0.5, help='pause entre deux parcours widget (s)')
+    p.add_argument('--think-max', type=float, default=3.0)
+    p.add_argument('--book-rate', type=float, default=0.3, help='part des devis suivis d\'une réservation')
+    p.add_argument('--payment-delay', type=float, default=2.0, help='délai max avant le webhook Stripe (s)')
+    p.add_argument('--horizon-days', type=int, default=60, help='départs entre J+1 et J+N')
+    p.add_argument('--language', default='es')
+    p.add_argument('--poll-interval', type=float, default=5.0, help='intervalle des /api/sync opérateur (s)')
+    p.add_argument('--notification-every', type=int, default=6, help='notifications toutes les N synchronisations')
+    p.add_argument('--webhook-secret', default=os.environ.get('STRIPE_WEBHOOK_SECRET_VOLTRIDE', 'whsec_loadtest'),
+                   help='secret de signature du webhook (vide : non signé)')
+    p.add_argument('--timeout', type=float, default=30.0)
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--with-stubs', action='store_true', help='lancer aussi les stubs dans ce processus')
+    p.add_argument('--stubs-port', type=int, default=4010)
+    p.add_argument('--stub-latency-ms', type=float, default=50)
+    p.add_argument('--save', nargs='?', const=os.path.join(BASELINE_DIR, 'last.json'), help='écrire la baseline JSON (défaut loadtest/baselines/last.json)')
+    p.add_argument('--baseline', help='comparer à cette baseline (code de sortie 1 si régression)')
+    p.add_argument('--threshold', type=float, default=0.2, help='écart toléré sur p95 / p99 / débit (0.2 = 20 %%)')
+    p.set_defaults(func=cmd_run)
+
+    p = commands.add_parser('compare', help='comparer deux baselines (code de sortie 1 si régression)')
+    p.add_argument('base')
+    p.add_argument('current')
+    p.add_argument('--threshold', type=float, default=0.2)
+    p.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Client HTTP/1.1 minimal sur asyncio : connexions keep-alive réutilisées, corps
+Content-Length ou chunked, mesure du temps de chaque requête (réponse complète lue).
+"""
+import asyncio
+import json
+import time
+from urllib.parse import urlencode, urlsplit
+
+NO_BODY_STATUSES = {204, 304}
+
+
+class Response:
+    __slots__ = ('status', 'headers', 'body', 'elapsed_ms')
+
+    def __init__(self, status, headers, body, elapsed_ms):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.elapsed_ms = elapsed_ms
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class HttpClient:
+    """Un client par utilisateur simulé, comme un navigateur : quelques connexions gardées ouvertes."""
+
+    def __init__(self, base_url, timeout=30.0, max_idle=4):
+        parts = urlsplit(base_url)
+        if parts.scheme != 'http':
+            raise ValueError('seul http:// est géré (API locale)')
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = []
+
+    async def _connect(self):
+        if self._idle:
+            return self._idle.pop()
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+
+    def _release(self, conn, keep_alive):
+        if keep_alive and len(self._idle) < self.max_idle:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+
+    async def request(self, method, path, params=None, body=None, headers=None):
+        if params:
+            path += ('&' if '?' in path else '?') + urlencode({k: v for k, v in params.items() if v is not None})
+        payload = b''
+        lines = [f'{method} {self.prefix}{path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Connection: keep-alive']
+        if body is not None:
+            payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+            lines.append('Content-Type: application/json')
+        if payload or method in ('POST', 'PUT', 'PATCH'):
+            lines.append(f'Content-Length: {len(payload)}')
+        for name, value in (headers or {}).items():
+            lines.append(f'{name}: {value}')
+        raw = ('\r\n'.join(lines) + '\r\n\r\n').encode() + payload
+
+        start = time.perf_counter()
+        # Une connexion gardée peut avoir été fermée par le serveur (keepAliveTimeout) : un nouvel essai sur une neuve
+        for attempt in (0, 1):
+            reused = bool(self._idle)
+            conn = await self._connect()
+            try:
+                conn[1].write(raw)
+                status, resp_headers, data, keep_alive = await asyncio.wait_for(self._read(conn[0], method), self.timeout)
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn[1].close()
+                if attempt or not reused:
+                    raise
+            except BaseException:
+                conn[1].close()
+                raise
+        self._release(conn, keep_alive)
+        return Response(status, resp_headers, data, (time.perf_counter() - start) * 1000)
+
+    async def _read(self, reader, method):
+        status_line = await reader.readuntil(b'\r\n')
+        version, status = status_line.split(b' ', 2)[:2]
+        status = int(status)
+        headers = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = version == b'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+        if method == 'HEAD' or status in NO_BODY_STATUSES or 100 <= status < 200:
+            return status, headers, b'', keep_alive
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    # Trailers éventuels jusqu'à la ligne vide
+                    while await reader.readuntil(b'\r\n') != b'\r\n':
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            return status, headers, b''.join(chunks), keep_alive
+        if 'content-length' in headers:
+            return status, headers, await reader.readexactly(int(headers['content-length'])), keep_alive
+        # Ni longueur ni chunked : corps jusqu'à la fermeture
+        return status, headers, await reader.read(), False
+
+    async def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
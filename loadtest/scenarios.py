@@ -0,0 +1,274 @@
+"""Parcours rejoués contre l'API, avec les mêmes appels que les front-ends.
+
+Widget (apps/widget) : bootstrap (ETag / 304) -> calendrier du mois -> disponibilités -> horaires des
+jours de départ et de retour -> devis ; une partie des visiteurs (--book-rate) réserve, crée la session
+Checkout (Stripe simulé) puis reçoit le webhook checkout.session.completed signé comme Stripe.
+Opérateur (apps/operator) : chargement initial (agences, flotte, planning, /api/sync?since=0) puis
+synchronisations incrémentales (/api/sync) et notifications à intervalle régulier.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import secrets
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from .client import HttpClient
+
+NETWORK_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError)
+
+
+class Session:
+    """Client d'un utilisateur simulé ; chaque appel est enregistré sous le gabarit de sa route."""
+
+    def __init__(self, config, recorder):
+        self.config = config
+        self.http = HttpClient(config.base_url, timeout=config.timeout)
+        self.recorder = recorder
+
+    async def call(self, endpoint, path, params=None, body=None, headers=None):
+        method = endpoint.split(' ', 1)[0]
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, path, params=params, body=body, headers=headers)
+        except NETWORK_ERRORS:
+            self.recorder.record(endpoint, (time.perf_counter() - start) * 1000, 0, False)
+            return None
+        self.recorder.record(endpoint, response.elapsed_ms, response.status, response.status < 400)
+        return response
+
+    async def close(self):
+        await self.http.close()
+
+
+def iso_day(day):
+    return day.isoformat()
+
+
+def stripe_signature(payload, secret, timestamp=None):
+    """En-tête Stripe-Signature (t=…,v1=HMAC-SHA256(secret, "t.payload")), vérifié par stripe.webhooks.constructEvent."""
+    timestamp = timestamp or int(time.time())
+    digest = hmac.new(secret.encode(), f'{timestamp}.'.encode() + payload, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+# ============== WIDGET ==============
+
+class WidgetVisitor:
+    def __init__(self, config, recorder, index):
+        self.config = config
+        self.session = Session(config, recorder)
+        self.rng = random.Random(config.seed * 100003 + index)
+        self.index = index
+        self.etag = None
+        self.catalog = None
+        self.counters = recorder.flows
+
+    async def bootstrap(self):
+        headers = {'If-None-Match': self.etag} if self.etag else None
+        response = await self.session.call('GET /api/widget/bootstrap/:brand', f'/api/widget/bootstrap/{self.config.brand}', headers=headers)
+        if response and response.status == 200:
+            self.etag = response.headers.get('etag')
+            self.catalog = response.json()
+        return self.catalog
+
+    async def run_once(self):
+        catalog = await self.bootstrap()
+        if not catalog:
+            return
+        agencies = [a for a in catalog['agencies'] if a['code'].startswith(self.config.agency_prefix)] or catalog['agencies']
+        if not agencies:
+            return
+        agency = self.rng.choice(agencies)
+        start = date.today() + timedelta(days=self.rng.randint(1, self.config.horizon_days))
+        length = self.rng.choice([1, 1, 2, 3, 3, 4, 5, 7, 7, 10, 14])
+
+        # Calendrier du mois : premier jour ouvert à partir de la date visée
+        response = await self.session.call('GET /api/agencies/:id/calendar', f'/api/agencies/{agency["id"]}/calendar', params={'month': start.strftime('%Y-%m')})
+        if not response or response.status != 200:
+            return
+        open_days = [d['date'] for d in response.json()['days'] if not d['isClosed'] and d['date'] >= iso_day(start)]
+        if not open_days:
+            self.counters['widget.closed'] += 1
+            return
+        start = date.fromisoformat(open_days[0])
+        end = start + timedelta(days=length)
+
+        response = await self.session.call('GET /api/fleet-availability', '/api/fleet-availability',
+                                           params={'agencyId': agency['id'], 'startDate': iso_day(start), 'endDate': iso_day(end)})
+        if not response or response.status != 200:
+            return
+        available = response.json()
+        vehicles = [v for v in catalog['vehicles'] if available.get(v['id'], 0) > 0 and v.get('pricing')]
+        if not vehicles:
+            self.counters['widget.unavailable'] += 1
+            return
+        vehicle = self.rng.choice(vehicles)
+
+        # Horaires des deux jours (départ / retour), comme startSchedule / endSchedule du widget
+        schedules = []
+        for day in (start, end):
+            response = await self.session.call('GET /api/agencies/:id/schedule', f'/api/agencies/{agency["id"]}/schedule', params={'date': iso_day(day)})
+            schedules.append(response.json() if response and response.status == 200 else {})
+        start_time = schedules[0].get('openTime') or '10:00'
+        end_time = start_time if self.rng.random() < 0.8 else f'{int(start_time[:2]) + 2:02d}:{start_time[3:]}'
+
+        response = await self.session.call('GET /api/quote', '/api/quote',
+                                           params={'startDate': iso_day(start), 'endDate': iso_day(end), 'startTime': start_time, 'endTime': end_time})
+        if not response or response.status != 200:
+            return
+        quote = response.json()
+        self.counters['widget.quoted'] += 1
+        if self.rng.random() >= self.config.book_rate:
+            return
+        await self.book(agency, vehicle, start, end, start_time, end_time, quote)
+
+    async def book(self, agency, vehicle, start, end, start_time, end_time, quote):
+        price = quote['vehicles'].get(vehicle['id'], 0)
+        options = []
+        category_id = vehicle.get('categoryId')
+        eligible = [o for o in self.catalog['options'] if o['id'] in quote['options'] and any(c['categoryId'] == category_id for c in o.get('categories', []))]
+        if eligible and self.rng.random() < 0.5:
+            option = self.rng.choice(eligible)
+            options.append({'optionId': option['id'], 'quantity': 1, 'unitPrice': quote['options'][option['id']], 'totalPrice': quote['options'][option['id']]})
+        total = round(price + sum(o['totalPrice'] for o in options), 2)
+        deposit = round(total * 0.2, 2)
+        # Clients récurrents : même email d'une visite à l'autre pour une partie des réservations
+        number = self.rng.randint(1, 5000) if self.rng.random() < 0.3 else f'{self.index}-{secrets.token_hex(4)}'
+        customer = {
+            'firstName': 'Load', 'lastName': f'Test {self.index}', 'email': f'widget.{number}@loadtest.invalid',
+            'phone': f'+34 600 {self.rng.randint(100000, 999999)}', 'address': 'Calle Mayor 1', 'postalCode': '43840', 'city': 'Salou', 'country': 'ES',
+            'language': self.config.language,
+        }
+        response = await self.session.call('POST /api/bookings', '/api/bookings', body={
+            'brand': self.config.brand, 'agencyId': agency['id'], 'startDate': iso_day(start), 'endDate': iso_day(end),
+            'startTime': start_time, 'endTime': end_time, 'totalPrice': total, 'depositAmount': deposit, 'language': self.config.language,
+            'customer': customer, 'items': [{'vehicleId': vehicle['id'], 'quantity': 1, 'unitPrice': price, 'totalPrice': price}], 'options': options,
+        })
+        if not response or response.status != 200:
+            if response and response.status == 409:
+                self.counters['widget.priceChanged'] += 1
+            return
+        booking = response.json()
+        self.counters['widget.booked'] += 1
+
+        response = await self.session.call('POST /api/create-checkout-session', '/api/create-checkout-session', body={
+            'brand': self.config.brand, 'bookingId': booking['id'], 'amount': deposit, 'customerEmail': customer['email'],
+            'successUrl': 'https://widget.loadtest.invalid/success', 'cancelUrl': 'https://widget.loadtest.invalid/cancel', 'locale': self.config.language,
+        })
+        if not response or response.status != 200:
+            return
+        session_id = response.json().get('sessionId')
+
+        # Paiement : Stripe appelle le webhook quelques secondes plus tard
+        await asyncio.sleep(self.rng.uniform(0, self.config.payment_delay))
+        event = {
+            'id': 'evt_lt_' + secrets.token_hex(12), 'object': 'event', 'type': 'checkout.session.completed', 'api_version': '2024-12-18.acacia',
+            'created': int(time.time()), 'livemode': False,
+            'data': {'object': {'id': session_id, 'object': 'checkout.session', 'amount_total': round(deposit * 100), 'currency': 'eur',
+                                'payment_status': 'paid', 'status': 'complete', 'customer_email': customer['email'],
+                                'metadata': {'bookingId': booking['id'], 'brand': self.config.brand}}},
+        }
+        payload = json.dumps(event).encode()
+        headers = {'Stripe-Signature': stripe_signature(payload, self.config.webhook_secret)} if self.config.webhook_secret else None
+        response = await self.session.call('POST /api/stripe-webhook', '/api/stripe-webhook', body=payload, headers=headers)
+        if response and response.status == 200:
+            self.counters['widget.paid'] += 1
+
+
+# ============== OPÉRATEUR ==============
+
+class OperatorConsole:
+    def __init__(self, config, recorder, index):
+        self.config = config
+        self.session = Session(config, recorder)
+        self.rng = random.Random(config.seed * 100019 + index)
+        self.since = None
+        self.etag = None
+        self.counters = recorder.flows
+
+    def planning_query(self):
+        now = datetime.now(timezone.utc)
+        return {
+            'brand': self.config.brand,
+            'from': (now - timedelta(days=1)).isoformat().replace('+00:00', 'Z'),
+            'to': (now + timedelta(days=15)).isoformat().replace('+00:00', 'Z'),
+            'includeOpen': 'true',
+            'view': 'planning',
+        }
+
+    async def load(self):
+        headers = {'If-None-Match': self.etag} if self.etag else None
+        responses = await asyncio.gather(
+            self.session.call('GET /api/agencies', '/api/agencies', headers=headers),
+            self.session.call('GET /api/fleet', '/api/fleet'),
+            self.session.call('GET /api/bookings?view=planning', '/api/bookings', params=self.planning_query()),
+            self.session.call('GET /api/sync', '/api/sync', params={'since': 0}),
+        )
+        if responses[0] and responses[0].status == 200:
+            self.etag = responses[0].headers.get('etag')
+        if responses[3] and responses[3].status == 200:
+            self.since = responses[3].json()['serverTime']
+        self.counters['operator.loads'] += 1
+
+    async def sync(self):
+        response = await self.session.call('GET /api/sync', '/api/sync', params={'since': self.since, 'brand': self.config.brand})
+        if not response or response.status != 200:
+            return
+        delta = response.json()
+        self.counters['operator.syncs'] += 1
+        if delta.get('reset'):
+            # Journal trop court pour l'écart demandé : rechargement complet, comme l'app
+            self.counters['operator.resets'] += 1
+            await self.load()
+        else:
+            self.since = delta['serverTime']
+
+    async def notifications(self):
+        await asyncio.gather(
+            self.session.call('GET /api/notifications', '/api/notifications'),
+            self.session.call('GET /api/notifications/unread-count', '/api/notifications/unread-count'),
+        )
+
+
+# ============== EXÉCUTION ==============
+
+async def widget_loop(config, recorder, index, deadline):
+    visitor = WidgetVisitor(config, recorder, index)
+    # Départs étalés : pas de rafale synchronisée au démarrage
+    await asyncio.sleep(visitor.rng.uniform(0, config.ramp_up))
+    try:
+        while time.monotonic() < deadline:
+            await visitor.run_once()
+            await asyncio.sleep(visitor.rng.uniform(*config.think_time))
+    finally:
+        await visitor.session.close()
+
+
+async def operator_loop(config, recorder, index, deadline):
+    console = OperatorConsole(config, recorder, index)
+    await asyncio.sleep(console.rng.uniform(0, config.ramp_up))
+    try:
+        await console.load()
+        polls = 0
+        while time.monotonic() < deadline:
+            await asyncio.sleep(config.poll_interval * console.rng.uniform(0.8, 1.2))
+            if console.since is None:
+                await console.load()
+                continue
+            await console.sync()
+            polls += 1
+            if polls % config.notification_every == 0:
+                await console.notifications()
+    finally:
+        await console.session.close()
+
+
+async def run(config, recorder):
+    deadline = time.monotonic() + config.ramp_up + config.duration
+    tasks = [widget_loop(config, recorder, i, deadline) for i in range(config.widget_users)]
+    tasks += [operator_loop(config, recorder, i, deadline) for i in range(config.operator_users)]
+    await asyncio.gather(*tasks)
+    recorder.stop()
@@ -0,0 +1,301 @@
+"""Jeu de données de test de charge dans la base pointée par DATABASE_URL (psycopg2).
+
+Tout est marqué pour être supprimé sans toucher au reste : agences / catégories / modèles / options
+en code LT-*, clients et utilisateurs en @loadtest.invalid, références de réservation LT-*.
+Réservations : par unité de flotte, des locations successives sans chevauchement sur `years` années
+passées et `future_days` jours à venir, plus denses l'été ; passées terminées (quelques annulées),
+en cours sorties, futures confirmées ou en attente.
+"""
+import io
+import os
+import random
+import re
+import secrets
+import sys
+import time
+import unicodedata
+from datetime import date, datetime, timedelta
+
+TAG = 'LT-'
+EMAIL_DOMAIN = 'loadtest.invalid'
+BRAND = 'VOLTRIDE'
+TABLE_DAYS = 14
+
+FIRST_NAMES = ['Lucía', 'Hugo', 'Martín', 'Sofía', 'Léa', 'Chloé', 'José', 'Noé', 'Emma', 'Jürgen', 'Anaïs', 'Pablo', 'Olivia', 'Mateo', 'Inès', 'Lars']
+LAST_NAMES = ['García', 'Martínez', 'Dupont', 'Müller', 'López', 'Lefèvre', 'Sánchez', 'Smith', 'Rossi', 'Núñez', 'Moreau', 'Jansen', 'Fernández', 'Brown']
+CITIES = ['Barcelona', 'Tarragona', 'Salou', 'Cambrils', 'Lloret de Mar', 'Sitges', 'Girona', 'Reus']
+CATEGORIES = [('EBIKE', 'Vélo électrique', 25), ('SCOOTER', 'Scooter 50cc', 35), ('MOTO', 'Moto 125cc', 55), ('BUGGY', 'Buggy', 90)]
+OPTIONS = [('HELMET', 'Casque', 3), ('LOCK', 'Antivol', 2), ('BASKET', 'Panier', 2), ('CHILD-SEAT', 'Siège enfant', 5)]
+LANGUAGES = ['es', 'es', 'fr', 'en']
+TIMES = ['09:00', '10:00', '11:00', '12:00', '16:00', '17:00', '18:00']
+
+
+def cuid():
+    # Même forme que les cuid Prisma (c + 24 caractères), préfixe lt pour les repérer
+    return 'clt' + secrets.token_hex(11)
+
+
+def normalize_text(value):
+    """Même normalisation que services/customerSearch.normalizeText."""
+    value = unicodedata.normalize('NFD', value or '')
+    value = ''.join(c for c in value if not 0x300 <= ord(c) <= 0x36f)
+    return re.sub(r'\s+', ' ', value.lower()).strip()
+
+
+def normalize_phone(value):
+    return re.sub(r'^00', '', re.sub(r'\D', '', value or ''))
+
+
+def tariff(base):
+    """Grille day1..day14 dégressive, comme les grilles saisies dans le back-office."""
+    return [round(base * n * max(0.6, 1 - 0.03 * (n - 1))) for n in range(1, TABLE_DAYS + 1)]
+
+
+def rental_price(days_table, extra_day, days):
+    """Même règle que services/quoteEngine (sans heures supplémentaires)."""
+    if days <= TABLE_DAYS:
+        return days_table[days - 1]
+    return days_table[-1] + int((days - TABLE_DAYS) * (extra_day or days_table[-1] / TABLE_DAYS))
+
+
+def copy_rows(cur, table, columns, rows):
+    """COPY FROM STDIN par lots (bien plus rapide que des INSERT pour les centaines de milliers de réservations)."""
+    def cell(value):
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(value, list):
+            return '{' + ','.join('"' + v + '"' for v in value) + '}'
+        return str(value).replace('\\', '\\\\').replace('\t', ' ').replace('\n', ' ')
+
+    buffer = io.StringIO()
+    count = 0
+    sql = f'COPY "{table}" ({", ".join(chr(34) + c + chr(34) for c in columns)}) FROM STDIN'
+    for row in rows:
+        buffer.write('\t'.join(cell(v) for v in row) + '\n')
+        count += 1
+        if count % 50000 == 0:
+            buffer.seek(0)
+            cur.copy_expert(sql, buffer)
+            buffer = io.StringIO()
+    if buffer.tell():
+        buffer.seek(0)
+        cur.copy_expert(sql, buffer)
+    return count
+
+
+def reset(cur):
+    """Supprime le jeu de données LT-* (et les réservations créées dessus par les scénarios)."""
+    cur.execute('SELECT id FROM "Agency" WHERE code LIKE %s', (TAG + '%',))
+    agencies = [r[0] for r in cur.fetchall()]
+    cur.execute('SELECT id FROM "User" WHERE email LIKE %s', ('%@' + EMAIL_DOMAIN,))
+    users = [r[0] for r in cur.fetchall()]
+    steps = [
+        ('DELETE FROM "Booking" WHERE "agencyId" = ANY(%s)', (agencies,)),
+        ('DELETE FROM "AvailabilityEvent" WHERE "agencyId" = ANY(%s)', (agencies,)),
+        ('DELETE FROM "Fleet" WHERE "agencyId" = ANY(%s)', (agencies,)),
+        ('DELETE FROM "Agency" WHERE id = ANY(%s)', (agencies,)),
+        # Clients LT encore liés à une réservation hors agences LT : gardés
+        ('DELETE FROM "Customer" WHERE email LIKE %s AND id NOT IN (SELECT "customerId" FROM "Booking")', ('%@' + EMAIL_DOMAIN,)),
+        ('DELETE FROM "Vehicle" WHERE sku LIKE %s', (TAG + '%',)),
+        ('DELETE FROM "Category" WHERE code LIKE %s', (TAG + '%',)),
+        ('DELETE FROM "Option" WHERE code LIKE %s', (TAG + '%',)),
+        ('DELETE FROM "Notification" WHERE "userId" = ANY(%s)', (users,)),
+        ('DELETE FROM "NotificationCounter" WHERE key = ANY(%s)', (users,)),
+        ('DELETE FROM "PushSubscription" WHERE "userId" = ANY(%s)', (users,)),
+        ('DELETE FROM "User" WHERE id = ANY(%s)', (users,)),
+    ]
+    for sql, params in steps:
+        cur.execute(sql, params)
+        table = sql.split('"')[1]
+        if cur.rowcount:
+            print(f'   🗑️  {table} : {cur.rowcount}')
+
+
+def seed(cur, agencies=6, models=3, units=8, customers=50000, years=3, future_days=120, users=20, rng=None):
+    rng = rng or random.Random()
+    now = datetime.utcnow().replace(microsecond=0)
+    today = date.today()
+    counts = {}
+
+    # ---- Catalogue : agences, catégories, modèles + grilles, options ----
+    agency_rows = []
+    for i in range(agencies):
+        city = CITIES[i % len(CITIES)]
+        agency_rows.append((cuid(), f'{TAG}{i + 1:03d}', f'{{"es": "Loadtest {city} {i + 1}", "fr": "Loadtest {city} {i + 1}", "en": "Loadtest {city} {i + 1}"}}',
+                            f'Calle Mayor {i + 1}', city, f'43{i:03d}', '+34 977 000 000', f'agency{i + 1}@{EMAIL_DOMAIN}', BRAND, True, i % 3 == 2, now, now))
+    counts['Agency'] = copy_rows(cur, 'Agency', ['id', 'code', 'name', 'address', 'city', 'postalCode', 'phone', 'email', 'brand', 'isActive', 'closedOnSunday', 'createdAt', 'updatedAt'], agency_rows)
+    agency_ids = [r[0] for r in agency_rows]
+
+    category_rows, vehicle_rows, pricing_rows, tariffs = [], [], [], {}
+    for code, label, base in CATEGORIES:
+        category_id = cuid()
+        category_rows.append((category_id, f'{TAG}{code}', f'{{"es": "{label}", "fr": "{label}", "en": "{label}"}}', BRAND, now, now))
+        for m in range(models):
+            vehicle_id = cuid()
+            name = f'{label} {m + 1}'
+            vehicle_rows.append((vehicle_id, f'{TAG}{code}-{m + 1}', f'{{"es": "{name}", "fr": "{name}", "en": "{name}"}}', '{"es": "", "fr": "", "en": ""}',
+                                 base * 4, code in ('MOTO', 'BUGGY'), category_id, True, now, now))
+            days = tariff(base + 5 * m)
+            extra_day = 0 if m % 2 else round(days[-1] / TABLE_DAYS * 0.8)
+            extra_hours = [round(days[0] * 0.15)] * 4
+            tariffs[vehicle_id] = (days, extra_day)
+            pricing_rows.append((cuid(), vehicle_id, *days, extra_day, *extra_hours, now, now))
+    counts['Category'] = copy_rows(cur, 'Category', ['id', 'code', 'name', 'brand', 'createdAt', 'updatedAt'], category_rows)
+    counts['Vehicle'] = copy_rows(cur, 'Vehicle', ['id', 'sku', 'name', 'description', 'deposit', 'hasPlate', 'categoryId', 'isActive', 'createdAt', 'updatedAt'], vehicle_rows)
+    day_columns = [f'day{n}' for n in range(1, TABLE_DAYS + 1)]
+    counts['Pricing'] = copy_rows(cur, 'Pricing', ['id', 'vehicleId', *day_columns, 'extraDayPrice', 'extraHour1', 'extraHour2', 'extraHour3', 'extraHour4', 'createdAt', 'updatedAt'], pricing_rows)
+
+    option_rows, option_category_rows = [], []
+    for o, (code, label, price) in enumerate(OPTIONS):
+        option_id = cuid()
+        option_rows.append((option_id, f'{TAG}{code}', f'{{"es": "{label}", "fr": "{label}", "en": "{label}"}}', 4, True, *[price * min(n, 7) for n in range(1, TABLE_DAYS + 1)], o, now, now))
+        option_category_rows += [(cuid(), option_id, category[0]) for category in category_rows]
+    counts['Option'] = copy_rows(cur, 'Option', ['id', 'code', 'name', 'maxQuantity', 'isActive', *day_columns, 'sortOrder', 'createdAt', 'updatedAt'], option_rows)
+    counts['OptionCategory'] = copy_rows(cur, 'OptionCategory', ['id', 'optionId', 'categoryId'], option_category_rows)
+
+    # ---- Horaires : période par défaut + été, fermeture de Noël ----
+    period_rows, closure_rows = [], []
+    for agency_id in agency_ids:
+        for year in range(today.year - years, today.year + 2):
+            period_rows.append((cuid(), agency_id, f'Été {year}', datetime(year, 4, 1), datetime(year, 9, 30), False,
+                                *(['10:00', '19:00', False] * 6), '10:00', '14:00', False, now, now))
+            closure_rows.append((cuid(), agency_id, datetime(year, 12, 25), datetime(year, 12, 26), 'Navidad', now))
+        period_rows.append((cuid(), agency_id, 'Horario general', datetime(2000, 1, 1), datetime(2099, 12, 31), True,
+                            *(['10:00', '16:00', False] * 6), None, None, True, now, now))
+    weekdays = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+    counts['AgencySchedulePeriod'] = copy_rows(cur, 'AgencySchedulePeriod', ['id', 'agencyId', 'name', 'startDate', 'endDate', 'isDefault',
+                                                                             *[f'{d}{k}' for d in weekdays for k in ('Open', 'Close', 'IsClosed')], 'createdAt', 'updatedAt'], period_rows)
+    counts['AgencyClosure'] = copy_rows(cur, 'AgencyClosure', ['id', 'agencyId', 'startDate', 'endDate', 'reason', 'createdAt'], closure_rows)
+
+    # ---- Flotte : stock (Inventory) et unités (Fleet) par agence et modèle ----
+    inventory_rows, fleet_rows = [], []
+    for a, agency_id in enumerate(agency_ids):
+        for v, vehicle in enumerate(vehicle_rows):
+            inventory_rows.append((cuid(), vehicle[0], agency_id, units, now, now))
+            for u in range(units):
+                number = f'{TAG}{a + 1:03d}-{v + 1:02d}-{u + 1:03d}'
+                fleet_rows.append((cuid(), number, f'LTCH{a:03d}{v:03d}{u:04d}', vehicle[0], agency_id, rng.randint(500, 40000), 'AVAILABLE', now, now))
+    counts['Inventory'] = copy_rows(cur, 'Inventory', ['id', 'vehicleId', 'agencyId', 'quantity', 'createdAt', 'updatedAt'], inventory_rows)
+    counts['Fleet'] = copy_rows(cur, 'Fleet', ['id', 'vehicleNumber', 'chassisNumber', 'vehicleId', 'agencyId', 'currentMileage', 'status', 'createdAt', 'updatedAt'], fleet_rows)
+
+    # ---- Clients ----
+    customer_ids = []
+
+    def customer_rows():
+        for i in range(customers):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            email = f'{normalize_text(first)}.{normalize_text(last).replace(" ", "")}.{i}@{EMAIL_DOMAIN}'
+            phone = f'+34 6{rng.randint(10, 99)} {rng.randint(100, 999)} {rng.randint(100, 999)}'
+            customer_id = cuid()
+            customer_ids.append(customer_id)
+            yield (customer_id, first, last, email, phone, rng.choice(CITIES), rng.choice(LANGUAGES),
+                   normalize_text(f'{first} {last} {email}'), normalize_phone(phone), now, now)
+    counts['Customer'] = copy_rows(cur, 'Customer', ['id', 'firstName', 'lastName', 'email', 'phone', 'city', 'language', 'searchText', 'phoneDigits', 'createdAt', 'updatedAt'], customer_rows())
+
+    # ---- Réservations : locations successives par unité ----
+    first_day = today - timedelta(days=365 * years)
+    last_day = today + timedelta(days=future_days)
+    reference = [0]
+    items = []
+
+    def booking_rows():
+        for fleet in fleet_rows:
+            fleet_id, vehicle_id, agency_id = fleet[0], fleet[3], fleet[4]
+            days_table, extra_day = tariffs[vehicle_id]
+            day = first_day + timedelta(days=rng.randint(0, 6))
+            while day < last_day:
+                summer = 6 <= day.month <= 9
+                length = max(1, min(30, int(rng.expovariate(1 / (4 if summer else 2.5)))))
+                start, end = day, day + timedelta(days=length)
+                reference[0] += 1
+                booking_id = cuid()
+                price = rental_price(days_table, extra_day, length)
+                created = datetime.combine(start, datetime.min.time()) - timedelta(days=rng.randint(1, 45), minutes=rng.randint(0, 1439))
+                start_dt, end_dt = datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+                if end < today:
+                    cancelled = rng.random() < 0.05
+                    status, checked_in, checked_out = ('CANCELLED', False, False) if cancelled else ('COMPLETED', True, True)
+                elif start <= today:
+                    status, checked_in, checked_out = 'CONFIRMED', True, False
+                else:
+                    status, checked_in, checked_out = ('PENDING' if rng.random() < 0.2 else 'CONFIRMED'), False, False
+                updated = min(now, end_dt + timedelta(hours=18)) if checked_out else max(created, min(now, start_dt))
+                items.append((cuid(), booking_id, vehicle_id, 1, price, price, created))
+                yield (booking_id, f'{TAG}{reference[0]:07d}', agency_id, rng.choice(customer_ids), start_dt, end_dt,
+                       rng.choice(TIMES[:4]), rng.choice(TIMES), price, days_table[0] * 4, status, rng.choice(LANGUAGES), created, updated,
+                       fleet_id, 'AUTOMATIC', created, 'WIDGET', checked_in, start_dt if checked_in else None, checked_out, end_dt if checked_out else None,
+                       round(price * 0.2, 2) if status != 'PENDING' else 0, 'RELEASED' if checked_out else 'PENDING')
+                # Écart avant la location suivante : plus court l'été
+                day = end + timedelta(days=int(rng.expovariate(1 / (1.5 if summer else 4))))
+    counts['Booking'] = copy_rows(cur, 'Booking', ['id', 'reference', 'agencyId', 'customerId', 'startDate', 'endDate', 'startTime', 'endTime', 'totalPrice', 'depositAmount',
+                                                   'status', 'language', 'createdAt', 'updatedAt', 'fleetVehicleId', 'assignmentType', 'assignedAt', 'source',
+                                                   'checkedIn', 'checkedInAt', 'checkedOut', 'checkedOutAt', 'paidAmount', 'depositStatus'], booking_rows())
+    counts['BookingItem'] = copy_rows(cur, 'BookingItem', ['id', 'bookingId', 'vehicleId', 'quantity', 'unitPrice', 'totalPrice', 'createdAt'], items)
+
+    # ---- Opérateurs, abonnements push (vers le stub) et historique de notifications ----
+    user_rows, subscription_rows, notification_rows = [], [], []
+    for i in range(users):
+        user_id = cuid()
+        user_rows.append((user_id, f'operator{i + 1}@{EMAIL_DOMAIN}', '-', 'Operator', str(i + 1), 'OPERATOR' if i else 'ADMIN', [BRAND], agency_ids, 'es', True, now, now))
+        subscription_rows.append((cuid(), f'https://push.{EMAIL_DOMAIN}/{user_id}', 'BLoadtestP256dh', 'loadtestAuth', user_id, now, now))
+        for n in range(50):
+            notification_rows.append((cuid(), user_id, '🆕 Nouvelle réservation', f'Loadtest {n}', '{}', n >= 5, now - timedelta(hours=n * 7)))
+    counts['User'] = copy_rows(cur, 'User', ['id', 'email', 'password', 'firstName', 'lastName', 'role', 'brands', 'agencyIds', 'language', 'isActive', 'createdAt', 'updatedAt'], user_rows)
+    counts['PushSubscription'] = copy_rows(cur, 'PushSubscription', ['id', 'endpoint', 'p256dh', 'auth', 'userId', 'createdAt', 'updatedAt'], subscription_rows)
+    counts['Notification'] = copy_rows(cur, 'Notification', ['id', 'userId', 'title', 'body', 'data', 'isRead', 'createdAt'], notification_rows)
+    return counts
+
+
+def rebuild_notification_counters(cur):
+    """Compteurs de non lues recalculés après les COPY / DELETE directs (même calcul que NotificationInbox.rebuildCounters)."""
+    cur.execute('LOCK TABLE "NotificationCounter" IN SHARE ROW EXCLUSIVE MODE')
+    cur.execute('UPDATE "NotificationCounter" SET unread = 0, "updatedAt" = now() AT TIME ZONE \'UTC\' WHERE unread <> 0')
+    cur.execute('''
+        INSERT INTO "NotificationCounter" (key, unread, "updatedAt")
+        SELECT key, unread, now() AT TIME ZONE 'UTC' FROM (
+            SELECT "userId" AS key, count(*)::int AS unread FROM "Notification" WHERE NOT "isRead" AND "userId" IS NOT NULL GROUP BY "userId"
+            UNION ALL SELECT '*', count(*)::int FROM "Notification" WHERE NOT "isRead"
+        ) c ORDER BY key
+        ON CONFLICT (key) DO UPDATE SET unread = EXCLUDED.unread, "updatedAt" = EXCLUDED."updatedAt"''')
+
+
+def connect():
+    try:
+        import psycopg2
+    except ImportError:
+        sys.exit('❌ seed nécessite psycopg2 (pip install psycopg2-binary)')
+    url = os.environ.get('DATABASE_URL')
+    if not url:
+        sys.exit('❌ DATABASE_URL non défini')
+    # Paramètres propres à Prisma refusés par libpq
+    url = re.sub(r'([?&])(schema|connection_limit|pool_timeout|pgbouncer|connect_timeout|socket_timeout)=[^&]*&?', r'\1', url).rstrip('?&')
+    conn = psycopg2.connect(url)
+    conn.set_client_encoding('UTF8')
+    return conn
+
+
+def run(args):
+    conn = connect()
+    cur = conn.cursor()
+    started = time.perf_counter()
+    # Tout ou rien : une seule transaction
+    print('🧹 Suppression du jeu de données précédent')
+    reset(cur)
+    if not args.reset_only:
+        print(f'🌱 {args.agencies} agences x {len(CATEGORIES) * args.models} modèles x {args.units} unités, {args.customers} clients, {args.years} an(s) de réservations')
+        counts = seed(cur, agencies=args.agencies, models=args.models, units=args.units, customers=args.customers, years=args.years,
+                      future_days=args.future_days, users=args.users, rng=random.Random(args.seed))
+        for table, count in counts.items():
+            print(f'   {table:<22} {count:>9}')
+    rebuild_notification_counters(cur)
+    conn.commit()
+    if not args.reset_only:
+        conn.autocommit = True
+        for table in ('Booking', 'BookingItem', 'Customer', 'Fleet', 'Notification'):
+            cur.execute(f'ANALYZE "{table}"')
+    conn.close()
+    print(f'✅ Terminé en {time.perf_counter() - started:.1f} s')
@@ -0,0 +1,141 @@
+"""Mesures par endpoint (débit, p50 / p95 / p99), baselines JSON et comparaison entre deux runs."""
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from collections import defaultdict
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, p):
+    """Rang le plus proche sur une liste triée."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))]
+
+
+class Recorder:
+    """Échantillons bruts par endpoint (gabarit de route, ex. GET /api/agencies/:id/calendar)."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.flows = defaultdict(int)  # étapes des parcours (réservations, paiements, resynchronisations…)
+        self.started = time.perf_counter()
+        self.stopped = None
+
+    def record(self, endpoint, elapsed_ms, status, ok):
+        self.samples[endpoint].append(elapsed_ms)
+        self.statuses[endpoint][status] += 1
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def stop(self):
+        self.stopped = time.perf_counter()
+
+    def report(self):
+        duration = (self.stopped or time.perf_counter()) - self.started
+        endpoints = {}
+        for endpoint in sorted(self.samples):
+            values = sorted(self.samples[endpoint])
+            entry = {
+                'count': len(values),
+                'errors': self.errors[endpoint],
+                'rps': round(len(values) / duration, 2) if duration else 0,
+                'mean': round(sum(values) / len(values), 2),
+                'max': round(values[-1], 2),
+                'statuses': {str(k): v for k, v in sorted(self.statuses[endpoint].items())},
+            }
+            for p in PERCENTILES:
+                entry[f'p{p}'] = round(percentile(values, p), 2)
+            endpoints[endpoint] = entry
+        total = sum(e['count'] for e in endpoints.values())
+        return {
+            'duration': round(duration, 2),
+            'requests': total,
+            'errors': sum(e['errors'] for e in endpoints.values()),
+            'rps': round(total / duration, 2) if duration else 0,
+            'flows': dict(sorted(self.flows.items())),
+            'endpoints': endpoints,
+        }
+
+
+def print_report(report):
+    print(f"\n📊 {report['requests']} requêtes en {report['duration']} s — {report['rps']} req/s, {report['errors']} erreur(s)")
+    width = max([len(e) for e in report['endpoints']] + [8])
+    print(f"   {'endpoint':<{width}}  {'n':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for endpoint, e in report['endpoints'].items():
+        print(f"   {endpoint:<{width}}  {e['count']:>7} {e['errors']:>5} {e['rps']:>8.1f} {e['p50']:>8.1f} {e['p95']:>8.1f} {e['p99']:>8.1f} {e['max']:>8.1f}")
+    print('   (latences en ms)')
+    if report.get('flows'):
+        print('   parcours : ' + ', '.join(f'{k} {v}' for k, v in report['flows'].items()))
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_baseline(path, report, config):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    data = {
+        'createdAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'revision': git_revision(),
+        'host': platform.node(),
+        'config': config,
+        **report,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def load_baseline(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(base, current, threshold=0.2, min_ms=2.0, min_count=20):
+    """Endpoints dont le p95 / p99 dépasse la baseline de plus de `threshold` (et de `min_ms` en absolu),
+    dont le débit baisse d'autant, ou qui renvoient des erreurs absentes de la baseline.
+    En dessous de `min_count` échantillons, les percentiles ne sont pas comparés (trop de bruit)."""
+    rows, regressions = [], []
+    for endpoint, now in current['endpoints'].items():
+        before = base['endpoints'].get(endpoint)
+        if not before:
+            rows.append((endpoint, None, now, ['nouveau']))
+            continue
+        notes = []
+        if min(before['count'], now['count']) >= min_count:
+            for key in ('p95', 'p99'):
+                if now[key] > before[key] * (1 + threshold) and now[key] - before[key] > min_ms:
+                    notes.append(f"{key} {before[key]:.1f} → {now[key]:.1f} ms")
+        if before['rps'] and now['rps'] < before['rps'] * (1 - threshold):
+            notes.append(f"débit {before['rps']:.1f} → {now['rps']:.1f} req/s")
+        error_rate = now['errors'] / now['count']
+        if error_rate > before['errors'] / before['count'] + 0.01:
+            notes.append(f"erreurs {before['errors']}/{before['count']} → {now['errors']}/{now['count']}")
+        if notes:
+            regressions.append(endpoint)
+        rows.append((endpoint, before, now, notes))
+    missing = [e for e in base['endpoints'] if e not in current['endpoints']]
+    return rows, regressions, missing
+
+
+def print_comparison(rows, regressions, missing, base, current):
+    print(f"🔎 baseline {base.get('revision') or '?'} ({base.get('createdAt')}) → {current.get('revision') or '?'} ({current.get('createdAt')})")
+    width = max([len(r[0]) for r in rows] + [8])
+    print(f"   {'endpoint':<{width}}  {'p50':>15} {'p95':>15} {'p99':>15}")
+    for endpoint, before, now, notes in rows:
+        cells = [f"{before[k]:.1f}→{now[k]:.1f}" if before else f"{now[k]:.1f}" for k in ('p50', 'p95', 'p99')]
+        icon = '❌' if endpoint in regressions else '✅'
+        print(f"{icon} {endpoint:<{width}}  {cells[0]:>15} {cells[1]:>15} {cells[2]:>15}  {'; '.join(notes)}")
+    for endpoint in missing:
+        print(f"⚠️  {endpoint} absent de ce run")
+    print(f"\n{'❌ ' + str(len(regressions)) + ' régression(s)' if regressions else '✅ Aucune régression'}")
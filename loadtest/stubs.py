@@ -0,0 +1,138 @@
+"""Stripe, Resend et web-push simulés sur un seul port (asyncio, bibliothèque standard).
+
+Côté API (voir __init__.py) : STRIPE_API_BASE, RESEND_BASE_URL et PUSH_STUB_URL pointent ici.
+    POST /v1/checkout/sessions      session Checkout (id cs_test_…, url de paiement factice)
+    POST|GET /v1/<ressource>[/…]    autres appels Stripe : objet minimal { id, object }
+    POST /emails, /emails/batch     Resend
+    POST /push                      envoi web-push ({ endpoint, payload })
+    GET  /_stats, POST /_reset      compteurs par service
+Latence (--latency-ms ± --jitter-ms) et taux d'erreurs temporaires (--failure-rate) réglables.
+"""
+import asyncio
+import json
+import random
+import secrets
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl, urlsplit
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 429: 'Too Many Requests', 503: 'Service Unavailable'}
+
+
+def stripe_form(body):
+    """Corps form-urlencoded du SDK Stripe -> dict imbriqué (metadata[bookingId]=… -> {'metadata': {'bookingId': …}})."""
+    data = {}
+    for key, value in parse_qsl(body.decode(), keep_blank_values=True):
+        parts = key.replace(']', '').split('[')
+        node = data
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return data
+
+
+class StubServer:
+    def __init__(self, public_url, latency_ms=50, jitter_ms=20, failure_rate=0.0):
+        self.public_url = public_url.rstrip('/')
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.reset()
+
+    def reset(self):
+        self.counters = defaultdict(lambda: defaultdict(int))
+        self.started = time.time()
+
+    async def handle(self, method, path, body):
+        """(status, objet JSON) pour une requête ; le service est compté avant la latence simulée."""
+        path = urlsplit(path).path
+        if path == '/_stats':
+            return 200, {'uptime': round(time.time() - self.started, 1), 'services': self.counters}
+        if path == '/_reset':
+            self.reset()
+            return 200, {'reset': True}
+
+        service = 'stripe' if path.startswith('/v1/') else 'resend' if path.startswith('/emails') else 'push' if path == '/push' else None
+        if not service:
+            return 404, {'error': 'not found'}
+        self.counters[service]['requests'] += 1
+        await asyncio.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+        if random.random() < self.failure_rate:
+            self.counters[service]['failures'] += 1
+            # Erreurs temporaires : l'API doit réessayer (SDK Stripe, outbox, retry du dispatcher push)
+            if service == 'stripe':
+                return 503, {'error': {'type': 'api_error', 'message': 'Stub failure'}}
+            if service == 'resend':
+                return 429, {'name': 'rate_limit_exceeded', 'message': 'Stub failure', 'statusCode': 429}
+            return 503, {'error': 'Stub failure'}
+
+        if service == 'stripe':
+            return 200, self.stripe(method, path, body)
+        if service == 'resend':
+            if path == '/emails/batch':
+                messages = json.loads(body or b'[]')
+                self.counters['resend']['emails'] += len(messages)
+                return 200, {'data': [{'id': 'em_' + secrets.token_hex(8)} for _ in messages]}
+            self.counters['resend']['emails'] += 1
+            return 200, {'id': 'em_' + secrets.token_hex(8)}
+        self.counters['push']['delivered'] += 1
+        return 201, {}
+
+    def stripe(self, method, path, body):
+        resource = path[len('/v1/'):].split('/')
+        params = stripe_form(body) if body else {}
+        if resource == ['checkout', 'sessions'] and method == 'POST':
+            session_id = 'cs_test_' + secrets.token_hex(12)
+            self.counters['stripe']['checkoutSessions'] += 1
+            return {
+                'id': session_id,
+                'object': 'checkout.session',
+                'url': f'{self.public_url}/pay/{session_id}',
+                'status': 'open',
+                'payment_status': 'unpaid',
+                'customer_email': params.get('customer_email'),
+                'metadata': params.get('metadata', {}),
+            }
+        # Autres ressources (payment_intents, customers…) : objet minimal, assez pour les appels non testés
+        kind = resource[0].rstrip('s') if resource and resource[0] else 'object'
+        object_id = resource[1] if len(resource) > 1 and method == 'GET' else f'{kind[:3]}_' + secrets.token_hex(10)
+        return {'id': object_id, 'object': kind, 'status': 'succeeded', **{k: v for k, v in params.items() if isinstance(v, str)}}
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await reader.readuntil(b'\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readuntil(b'\r\n')
+                    if line == b'\r\n':
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+                status, payload = await self.handle(method, path, body)
+                data = json.dumps(payload).encode()
+                writer.write((
+                    f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+                    f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n'
+                    f'Request-Id: req_{secrets.token_hex(6)}\r\n\r\n'
+                ).encode() + data)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host='127.0.0.1', port=4010, **options):
+    stub = StubServer(f'http://{host}:{port}', **options)
+    server = await asyncio.start_server(stub.serve_connection, host, port)
+    print(f'🧪 Stubs Stripe / Resend / push sur http://{host}:{port} (latence {stub.latency_ms}±{stub.jitter_ms} ms, échecs {stub.failure_rate:.0%})')
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Tests du conseiller d'index : python3 -m unittest test_index_advisor"""
+import os
+import tempfile
+import unittest
+
+import index_advisor as advisor
+
+SCHEMA = '''
+model Booking {
+  id        String   @id @default(cuid())
+  agencyId  String
+  status    String
+  createdAt DateTime @default(now())
+  startDate DateTime
+  @@index([agencyId, status, startDate])
+}
+'''
+
+SOURCE = '''
+export const list = () => prisma.booking.findMany({ orderBy: [{ createdAt: 'desc' }, { id: 'desc' }] })
+export const byAgency = (agencyId: string) => prisma.booking.findMany({ where: { agencyId, status: 'CONFIRMED' }, orderBy: { startDate: 'asc' } })
+'''
+
+
+def shape(**fields):
+    return {**advisor.empty_shape(), **fields}
+
+
+class OrderByTest(unittest.TestCase):
+    def test_order_follows_column_sequence(self):
+        order = shape(order=['createdAt', 'id'])
+        self.assertEqual(advisor.usable_prefix(['id'], order), 0)
+        self.assertEqual(advisor.usable_prefix(['createdAt'], order), 1)
+        self.assertEqual(advisor.usable_prefix(['createdAt', 'id'], order), 2)
+        self.assertEqual(advisor.usable_prefix(['id', 'createdAt'], order), 0)
+
+    def test_order_after_equalities(self):
+        order = shape(eq=['agencyId'], order=['agencyId', 'startDate'])
+        self.assertEqual(advisor.ideal_columns(order), ['agencyId', 'startDate'])
+        self.assertEqual(advisor.usable_prefix(['agencyId', 'startDate'], order), 2)
+        self.assertEqual(advisor.usable_prefix(['status', 'startDate'], order), 0)
+
+    def test_keyset_order_needs_composite_index(self):
+        with tempfile.TemporaryDirectory() as root:
+            schema = os.path.join(root, 'schema.prisma')
+            with open(schema, 'w', encoding='utf-8') as f:
+                f.write(SCHEMA)
+            with open(os.path.join(root, 'bookings.ts'), 'w', encoding='utf-8') as f:
+                f.write(SOURCE)
+            models = advisor.parse_schema(schema)
+            sources = advisor.SourceIndex([os.path.join(root, 'bookings.ts')])
+            results = advisor.analyse(models, advisor.extract_queries(models, sources))
+            keyset = next(r for r in results if r['shape']['order'] == ['createdAt', 'id'])
+            self.assertEqual(keyset['status'], 'missing')
+            self.assertEqual(keyset['ideal'], ['createdAt', 'id'])
+            self.assertIn(('Booking', ['createdAt', 'id']), advisor.recommendations(results))
+
+            models['Booking']['indexes'].append(['createdAt', 'id'])
+            results = advisor.analyse(models, advisor.extract_queries(models, sources))
+            self.assertTrue(all(r['status'] == 'ok' for r in results))
+
+
+if __name__ == '__main__':
+    unittest.main()